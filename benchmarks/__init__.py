@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks - 以合成工作簿量度主要的熱點路徑
+
+    python -m benchmarks --preset small --output bench.json
+
+workbook_generator 按參數產生內容固定 (相同 seed 相同內容) 的 xlsx 及外部連結檔案；
+suite 對依賴爆炸、resolved 讀取、公式篩選、範圍合併、外部連結摘要及圖形轉換計時，
+並以 tracemalloc 記錄峰值記憶體，結果輸出為 JSON 以便比較不同版本。
+fake_excel 以 openpyxl 模擬 Excel COM 物件模型 (可設定每次呼叫的延遲)，
+令 COM 掃描路徑亦可以在沒有 Excel 的電腦上量度及測試。
+"""
+
+from benchmarks.workbook_generator import WorkbookSpec, generate_workbook_set, PRESETS
+from benchmarks.suite import run_benchmarks, measure
+from benchmarks.fake_excel import FakeExcel, fake_com_modules
+
+__all__ = ['WorkbookSpec', 'generate_workbook_set', 'PRESETS', 'run_benchmarks', 'measure',
+           'FakeExcel', 'fake_com_modules']
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+python -m benchmarks [--preset small] [--formulas N ...] [--output result.json]
+"""
+
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+from dataclasses import replace
+
+from benchmarks.workbook_generator import PRESETS, generate_workbook_set
+from benchmarks.suite import run_benchmarks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Excel tools benchmark suite')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--sheets', type=int)
+    parser.add_argument('--formulas', type=int)
+    parser.add_argument('--chain-depth', type=int)
+    parser.add_argument('--fan-out', type=int)
+    parser.add_argument('--external-ratio', type=float)
+    parser.add_argument('--indirect-ratio', type=float)
+    parser.add_argument('--range-size', type=int)
+    parser.add_argument('--external-files', type=int)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-depth', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--range-cells', type=int, default=100, help='optimize_ranges benchmark 的地址數目')
+    parser.add_argument('--com-latency-us', type=float, default=100.0,
+                        help='FakeExcel 每次 COM 呼叫的模擬延遲 (微秒)')
+    parser.add_argument('--com-cells', type=int, default=2000, help='COM 掃描 benchmark 的公式儲存格上限')
+    parser.add_argument('--only', help='逗號分隔的 benchmark 名稱')
+    parser.add_argument('--no-memory', action='store_true', help='不以 tracemalloc 量度峰值記憶體')
+    parser.add_argument('--workdir', help='工作簿輸出目錄 (預設為暫存目錄，完成後刪除)')
+    parser.add_argument('--output', help='JSON 輸出檔案 (預設輸出到 stdout)')
+    args = parser.parse_args(argv)
+
+    overrides = {name: getattr(args, name) for name in
+                 ('sheets', 'formulas', 'chain_depth', 'fan_out', 'external_ratio', 'indirect_ratio',
+                  'range_size', 'external_files', 'seed') if getattr(args, name) is not None}
+    spec = replace(PRESETS[args.preset], **overrides)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='excel_tools_bench_')
+    try:
+        print(f"Generating workbooks in {workdir} ...", file=sys.stderr)
+        workbook_set = generate_workbook_set(workdir, spec)
+        only = {name.strip() for name in args.only.split(',')} if args.only else None
+        result = run_benchmarks(workbook_set, spec=spec, repeat=args.repeat, only=only, max_depth=args.max_depth,
+                                range_cells=args.range_cells, workers=args.workers,
+                                com_latency=args.com_latency_us / 1e6, com_cells=args.com_cells,
+                                track_memory=not args.no_memory,
+                                progress_callback=lambda name: print(f"Running {name} ...", file=sys.stderr))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
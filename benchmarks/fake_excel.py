@@ -0,0 +1,807 @@
+# -*- coding: utf-8 -*-
+"""
+Fake Excel - 以 openpyxl 讀取檔案內容的 Excel COM 物件模型替身 (不需要 Windows / Excel)
+
+實作本工具使用的子集：
+    Application: Workbooks、ActiveWorkbook、ActiveSheet、Selection、ActiveCell、Union、
+                 Calculation、CalculateBeforeSave、EnableEvents、Interactive、ScreenUpdating、
+                 DisplayAlerts、AskToUpdateLinks、Visible、CalculateFullRebuild ...
+    Workbook:    Name、FullName、Path、Worksheets、ActiveSheet、Activate、Save、Close
+    Worksheet:   Name、UsedRange、Range、Cells、Activate
+    Range:       Formula / Value / Text 讀寫、SpecialCells、Areas、Cells、Rows / Columns、
+                 Row / Column / Count、Address、Range、Select
+
+每次讀寫 COM 成員 (名稱以大寫開頭的屬性 / 方法) 計為一次 COM 呼叫：
+    - FakeExcel.com_calls 累計呼叫次數
+    - latency (秒) 為每次呼叫的等待時間，模擬跨 process 的成本，
+      陣列讀取與逐格讀取的差異因此可以在沒有 Excel 的電腦上量度
+
+    app = FakeExcel(latency=0.0001)
+    app.Workbooks.Open("book.xlsx")
+    with fake_com_modules(app):
+        # win32com.client.GetActiveObject / Dispatch 返回 app，pythoncom 的 marshal 直接傳遞物件，
+        # core.scan_worker 的 ScanWorker / WorkbookScanWorker / DisplayTextWorker 可直接執行
+        ...
+
+限制：不會重新計算公式 (Value / Text 為檔案內快取的計算結果，寫入公式後不變)。
+"""
+
+import os
+import sys
+import time
+import types
+import threading
+import contextlib
+
+xlCalculationAutomatic = -4105
+xlCalculationManual = -4135
+xlCellTypeConstants = 2
+xlCellTypeFormulas = -4123
+
+MAX_ROWS = 1048576
+MAX_COLUMNS = 16384
+
+# SpecialCells 找不到儲存格時的錯誤訊息 (core.scan_worker.is_no_formula_error 以此判斷)
+NO_CELLS_MESSAGE = "(-2146827284, 'OLE error.', None, None)"
+
+
+class FakeCOMError(Exception):
+    """模擬 pywintypes.com_error"""
+
+
+def _column_letter(column):
+    from openpyxl.utils import get_column_letter
+    return get_column_letter(column)
+
+
+def _parse_area(text):
+    """'$A$1:$C$5' / 'C:D' / '10:20' -> (first_row, first_col, last_row, last_col)"""
+    from openpyxl.utils.cell import range_boundaries
+
+    try:
+        min_col, min_row, max_col, max_row = range_boundaries(text.replace('$', '').strip().upper())
+    except Exception:
+        raise FakeCOMError(f"Method 'Range' of object '_Worksheet' failed: {text!r}")
+    return (min_row or 1, min_col or 1, max_row or MAX_ROWS, max_col or MAX_COLUMNS)
+
+
+def _area_address(area):
+    first_row, first_col, last_row, last_col = area
+    top_left = f"${_column_letter(first_col)}${first_row}"
+    if (first_row, first_col) == (last_row, last_col):
+        return top_left
+    return f"{top_left}:${_column_letter(last_col)}${last_row}"
+
+
+def _rectangles(cells):
+    """
+    將 (row, column) 儲存格合併為矩形 areas (按列次序)：
+    每列的連續欄為一段，與上一列相同的段向下延伸。
+    """
+    columns_by_row = {}
+    for row, column in cells:
+        columns_by_row.setdefault(row, []).append(column)
+
+    finished = []
+    # (first_col, last_col) -> [first_row, last_row]
+    open_areas = {}
+    for row in sorted(columns_by_row):
+        columns = sorted(columns_by_row[row])
+        runs = []
+        run_start = previous = columns[0]
+        for column in columns[1:]:
+            if column != previous + 1:
+                runs.append((run_start, previous))
+                run_start = column
+            previous = column
+        runs.append((run_start, previous))
+
+        next_open = {}
+        for run in runs:
+            area = open_areas.pop(run, None)
+            if area is not None and area[1] == row - 1:
+                area[1] = row
+            else:
+                if area is not None:
+                    finished.append((area[0], run[0], area[1], run[1]))
+                area = [row, row]
+            next_open[run] = area
+        for run, area in open_areas.items():
+            finished.append((area[0], run[0], area[1], run[1]))
+        open_areas = next_open
+    for run, area in open_areas.items():
+        finished.append((area[0], run[0], area[1], run[1]))
+    return sorted(finished)
+
+
+class _FakeTypeInfo:
+    def __init__(self, name):
+        self._name = name
+
+    def GetDocumentation(self, member_id):
+        return (self._name, None, 0, None)
+
+
+class _FakeOleObject:
+    """代替 _oleobj_：pythoncom 替身的 marshal 直接傳遞此物件，Dispatch 取回原來的物件"""
+
+    def __init__(self, target):
+        self._target = target
+
+    def GetTypeInfo(self):
+        return _FakeTypeInfo(self._target._type_name)
+
+
+class _FakeDispatch:
+    """
+    所有替身物件的基礎：名稱以大寫開頭的屬性讀寫及方法取得計為一次 COM 呼叫。
+    內部狀態使用底線開頭的屬性，不計算在內。
+    """
+
+    _type_name = 'Object'
+
+    def __init__(self, app):
+        object.__setattr__(self, '_app', app)
+
+    def __getattribute__(self, name):
+        if name[:1].isupper():
+            object.__getattribute__(self, '_app')._tick()
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        if name[:1].isupper():
+            self._app._tick()
+            if not (hasattr(type(self), name) or name in self.__dict__):
+                raise AttributeError(f"Property '{type(self)._type_name}.{name}' can not be set.")
+        object.__setattr__(self, name, value)
+
+    def _init_properties(self, **properties):
+        """設定可讀寫的簡單屬性 (不計算呼叫)"""
+        for name, value in properties.items():
+            object.__setattr__(self, name, value)
+
+    @property
+    def _oleobj_(self):
+        return _FakeOleObject(self)
+
+    @property
+    def Application(self):
+        return self._app
+
+
+class _FakeCount(_FakeDispatch):
+    """Rows / Columns：只提供 Count"""
+
+    _type_name = 'Range'
+
+    def __init__(self, app, count):
+        super().__init__(app)
+        self._count = count
+
+    @property
+    def Count(self):
+        return self._count
+
+
+class _FakeCollection(_FakeDispatch):
+    """Workbooks / Worksheets / Areas：Count、Item、以名稱或 1 開始的索引呼叫、逐項迭代"""
+
+    def __init__(self, app, type_name, items_getter):
+        super().__init__(app)
+        self._type_name = type_name
+        self._items = items_getter
+
+    @property
+    def Count(self):
+        return len(self._items())
+
+    def Item(self, index):
+        items = self._items()
+        if isinstance(index, str):
+            for item in items:
+                if item._name.lower() == index.lower():
+                    return item
+        elif 1 <= index <= len(items):
+            return items[index - 1]
+        raise FakeCOMError(f"{self._type_name}({index!r}): subscript out of range")
+
+    def __call__(self, index):
+        self._app._tick()
+        return object.__getattribute__(self, 'Item')(index)
+
+    def __iter__(self):
+        for item in list(self._items()):
+            self._app._tick()
+            yield item
+
+    def __len__(self):
+        return len(self._items())
+
+
+class _FakeWindow(_FakeDispatch):
+    _type_name = 'Window'
+
+    def Activate(self):
+        pass
+
+
+class FakeRange(_FakeDispatch):
+    """一個或多個矩形 areas (first_row, first_col, last_row, last_col)；讀寫直接存取工作表的儲存格"""
+
+    _type_name = 'Range'
+
+    def __init__(self, worksheet, areas):
+        super().__init__(worksheet._app)
+        self._worksheet = worksheet
+        self._areas = list(areas)
+
+    # --- 位置 ---
+    @property
+    def Row(self):
+        return self._areas[0][0]
+
+    @property
+    def Column(self):
+        return self._areas[0][1]
+
+    @property
+    def Rows(self):
+        first_row, _, last_row, _ = self._areas[0]
+        return _FakeCount(self._app, last_row - first_row + 1)
+
+    @property
+    def Columns(self):
+        _, first_col, _, last_col = self._areas[0]
+        return _FakeCount(self._app, last_col - first_col + 1)
+
+    @property
+    def Count(self):
+        return sum((area[2] - area[0] + 1) * (area[3] - area[1] + 1) for area in self._areas)
+
+    @property
+    def Address(self):
+        return ','.join(_area_address(area) for area in self._areas)
+
+    @property
+    def Worksheet(self):
+        return self._worksheet
+
+    @property
+    def Parent(self):
+        return self._worksheet
+
+    @property
+    def Areas(self):
+        return _FakeCollection(self._app, 'Areas',
+                               lambda: [FakeRange(self._worksheet, [area]) for area in self._areas])
+
+    @property
+    def Cells(self):
+        return FakeRange(self._worksheet, self._areas)
+
+    def _cells(self):
+        for first_row, first_col, last_row, last_col in self._areas:
+            for row in range(first_row, last_row + 1):
+                for column in range(first_col, last_col + 1):
+                    yield row, column
+
+    def __iter__(self):
+        # For Each cell In Range：逐格 (每格一次呼叫)
+        for row, column in list(self._cells()):
+            self._app._tick()
+            yield FakeRange(self._worksheet, [(row, column, row, column)])
+
+    def __call__(self, row_index, column_index=None):
+        """Cells(r, c) / Range.Item：相對於第一個 area 左上角 (1 開始)"""
+        self._app._tick()
+        first_row, first_col, _, last_col = self._areas[0]
+        if column_index is None:
+            width = last_col - first_col + 1
+            row_index, column_index = (row_index - 1) // width + 1, (row_index - 1) % width + 1
+        row = first_row + row_index - 1
+        column = first_col + column_index - 1
+        return FakeRange(self._worksheet, [(row, column, row, column)])
+
+    def Range(self, address, address2=None):
+        """相對於左上角的範圍，例如 area.Range('A1:C10')"""
+        first_row, first_col = self._areas[0][:2]
+        areas = []
+        for area in self._worksheet._parse_address(address, address2):
+            areas.append((area[0] + first_row - 1, area[1] + first_col - 1,
+                          area[2] + first_row - 1, area[3] + first_col - 1))
+        return FakeRange(self._worksheet, areas)
+
+    # --- 內容 ---
+    def _read(self, reader):
+        """第一個 area 的值：單一儲存格為純值，否則為 tuple of tuples (與 COM 相同)"""
+        first_row, first_col, last_row, last_col = self._areas[0]
+        if (first_row, first_col) == (last_row, last_col):
+            return reader(first_row, first_col)
+        return tuple(tuple(reader(row, column) for column in range(first_col, last_col + 1))
+                     for row in range(first_row, last_row + 1))
+
+    def _write(self, value, writer):
+        if isinstance(value, (tuple, list)):
+            first_row, first_col = self._areas[0][:2]
+            for r_offset, row_values in enumerate(value):
+                if not isinstance(row_values, (tuple, list)):
+                    row_values = (row_values,)
+                for c_offset, cell_value in enumerate(row_values):
+                    writer(first_row + r_offset, first_col + c_offset, cell_value)
+        else:
+            for row, column in self._cells():
+                writer(row, column, value)
+
+    @property
+    def Formula(self):
+        return self._read(self._worksheet._formula)
+
+    @Formula.setter
+    def Formula(self, value):
+        self._write(value, self._worksheet._set_formula)
+
+    @property
+    def Value(self):
+        return self._read(self._worksheet._value)
+
+    @Value.setter
+    def Value(self, value):
+        self._write(value, self._worksheet._set_value)
+
+    @property
+    def Value2(self):
+        return self._read(self._worksheet._value)
+
+    @Value2.setter
+    def Value2(self, value):
+        self._write(value, self._worksheet._set_value)
+
+    @property
+    def Text(self):
+        """顯示文字 (「一般」格式)；多個儲存格的文字不同時為 None"""
+        texts = {self._worksheet._text(row, column) for row, column in self._cells()}
+        return texts.pop() if len(texts) == 1 else None
+
+    @property
+    def HasFormula(self):
+        flags = {self._worksheet._is_formula(row, column) for row, column in self._cells()}
+        return flags.pop() if len(flags) == 1 else None
+
+    def SpecialCells(self, cell_type, value=None):
+        if cell_type == xlCellTypeFormulas:
+            candidates = self._worksheet._formulas
+        elif cell_type == xlCellTypeConstants:
+            candidates = self._worksheet._constants()
+        else:
+            raise FakeCOMError(f"SpecialCells type {cell_type} is not supported by FakeExcel.")
+        cells = [cell for cell in candidates if any(
+            area[0] <= cell[0] <= area[2] and area[1] <= cell[1] <= area[3] for area in self._areas)]
+        if not cells:
+            raise FakeCOMError(NO_CELLS_MESSAGE)
+        return FakeRange(self._worksheet, _rectangles(cells))
+
+    # --- 操作 ---
+    def Select(self):
+        self._worksheet._activate()
+        self._app._selection = self
+
+    def Activate(self):
+        self.Select()
+
+    def __repr__(self):
+        return f"<FakeRange {self._worksheet._name}!{','.join(_area_address(area) for area in self._areas)}>"
+
+
+class FakeWorksheet(_FakeDispatch):
+    """儲存格保存在 _formulas (公式文字) 及 _values (快取的計算結果 / 常數) 兩個 dict"""
+
+    _type_name = 'Worksheet'
+
+    def __init__(self, workbook, name):
+        super().__init__(workbook._app)
+        self._workbook = workbook
+        self._name = name
+        self._formulas = {}
+        self._values = {}
+        self._dirty = set()
+
+    @property
+    def Name(self):
+        return self._name
+
+    @property
+    def Parent(self):
+        return self._workbook
+
+    @property
+    def Index(self):
+        return self._workbook._worksheets.index(self) + 1
+
+    @property
+    def UsedRange(self):
+        cells = set(self._formulas) | {cell for cell, value in self._values.items() if value is not None}
+        if not cells:
+            return FakeRange(self, [(1, 1, 1, 1)])
+        rows = [cell[0] for cell in cells]
+        columns = [cell[1] for cell in cells]
+        return FakeRange(self, [(min(rows), min(columns), max(rows), max(columns))])
+
+    @property
+    def Cells(self):
+        return FakeRange(self, [(1, 1, MAX_ROWS, MAX_COLUMNS)])
+
+    def Range(self, address, address2=None):
+        return FakeRange(self, self._parse_address(address, address2))
+
+    def Activate(self):
+        self._activate()
+
+    def Select(self):
+        self._activate()
+
+    def Calculate(self):
+        pass
+
+    def _activate(self):
+        self._workbook._activate()
+        self._workbook._active_sheet = self
+
+    def _parse_address(self, address, address2=None):
+        if isinstance(address, FakeRange):
+            areas = list(address._areas)
+        else:
+            areas = [_parse_area(part) for part in str(address).split(',')]
+        if address2 is not None:
+            # Range(cell1, cell2)：兩者的外接矩形
+            other = address2._areas if isinstance(address2, FakeRange) else [_parse_area(address2)]
+            corners = areas + list(other)
+            areas = [(min(area[0] for area in corners), min(area[1] for area in corners),
+                      max(area[2] for area in corners), max(area[3] for area in corners))]
+        return areas
+
+    # --- 儲存格存取 (不計算呼叫) ---
+    def _is_formula(self, row, column):
+        return (row, column) in self._formulas
+
+    def _formula(self, row, column):
+        formula = self._formulas.get((row, column))
+        if formula is not None:
+            return formula
+        from core.offline_scanner import _general_text
+        return _general_text(self._values.get((row, column)))
+
+    def _value(self, row, column):
+        from core.offline_scanner import _com_value
+        return _com_value(self._values.get((row, column)))
+
+    def _text(self, row, column):
+        from core.offline_scanner import _general_text
+        return _general_text(self._values.get((row, column)))
+
+    def _constants(self):
+        return [cell for cell, value in self._values.items()
+                if value is not None and cell not in self._formulas]
+
+    def _set_formula(self, row, column, formula):
+        cell = (row, column)
+        self._dirty.add(cell)
+        if isinstance(formula, str) and formula.startswith('='):
+            self._formulas[cell] = formula
+            return
+        self._formulas.pop(cell, None)
+        self._values[cell] = _parse_constant(formula)
+
+    def _set_value(self, row, column, value):
+        cell = (row, column)
+        self._dirty.add(cell)
+        self._formulas.pop(cell, None)
+        self._values[cell] = value
+
+
+def _parse_constant(text):
+    """寫入 Formula 的常數文字：數字轉為數值，空白為清除"""
+    if text is None or text == "":
+        return None
+    if not isinstance(text, str):
+        return text
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+class FakeWorkbook(_FakeDispatch):
+    _type_name = 'Workbook'
+
+    def __init__(self, app, full_name):
+        super().__init__(app)
+        self._full_name = full_name
+        self._worksheets = []
+        self._active_sheet = None
+
+    @classmethod
+    def load(cls, app, file_path):
+        """以 openpyxl 讀取公式及快取的計算結果 (各一次 read_only 串流讀取)"""
+        import openpyxl
+
+        workbook = cls(app, os.path.abspath(file_path))
+        formula_book = openpyxl.load_workbook(file_path, read_only=True)
+        value_book = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet_name in formula_book.sheetnames:
+                worksheet = FakeWorksheet(workbook, sheet_name)
+                for row_index, row in enumerate(formula_book[sheet_name].iter_rows(values_only=True), 1):
+                    for column_index, value in enumerate(row, 1):
+                        value = getattr(value, 'text', value)
+                        if isinstance(value, str) and value.startswith('='):
+                            worksheet._formulas[(row_index, column_index)] = value
+                        elif value is not None:
+                            worksheet._values[(row_index, column_index)] = value
+                for row_index, row in enumerate(value_book[sheet_name].iter_rows(values_only=True), 1):
+                    for column_index, value in enumerate(row, 1):
+                        if value is not None and (row_index, column_index) in worksheet._formulas:
+                            worksheet._values[(row_index, column_index)] = value
+                workbook._worksheets.append(worksheet)
+        finally:
+            formula_book.close()
+            value_book.close()
+        workbook._active_sheet = workbook._worksheets[0] if workbook._worksheets else None
+        return workbook
+
+    @property
+    def _name(self):
+        return os.path.basename(self._full_name)
+
+    @property
+    def Name(self):
+        return self._name
+
+    @property
+    def FullName(self):
+        return self._full_name
+
+    @property
+    def Path(self):
+        return os.path.dirname(self._full_name)
+
+    @property
+    def Worksheets(self):
+        return _FakeCollection(self._app, 'Sheets', lambda: self._worksheets)
+
+    @property
+    def Sheets(self):
+        return _FakeCollection(self._app, 'Sheets', lambda: self._worksheets)
+
+    @property
+    def ActiveSheet(self):
+        return self._active_sheet
+
+    @property
+    def Parent(self):
+        return self._app
+
+    @property
+    def Saved(self):
+        return not any(worksheet._dirty for worksheet in self._worksheets)
+
+    def Activate(self):
+        self._activate()
+
+    def _activate(self):
+        self._app._active_workbook = self
+
+    def Save(self):
+        """把修改過的儲存格寫回檔案 (其餘內容以 openpyxl 保留)"""
+        import openpyxl
+
+        if self.Saved:
+            return
+        keep_vba = self._full_name.lower().endswith('.xlsm')
+        book = openpyxl.load_workbook(self._full_name, keep_vba=keep_vba)
+        try:
+            for worksheet in self._worksheets:
+                sheet = book[worksheet._name]
+                for row, column in worksheet._dirty:
+                    formula = worksheet._formulas.get((row, column))
+                    sheet.cell(row=row, column=column).value = formula if formula is not None \
+                        else worksheet._values.get((row, column))
+                worksheet._dirty.clear()
+            book.save(self._full_name)
+        finally:
+            book.close()
+
+    def Close(self, SaveChanges=False, *args, **kwargs):
+        if SaveChanges:
+            self.Save()
+        self._app._workbooks.remove(self)
+        if self._app._active_workbook is self:
+            self._app._active_workbook = self._app._workbooks[-1] if self._app._workbooks else None
+
+
+class _FakeWorkbooks(_FakeCollection):
+    def __init__(self, app):
+        super().__init__(app, 'Workbooks', lambda: app._workbooks)
+
+    def Open(self, Filename, *args, **kwargs):
+        full_name = os.path.abspath(Filename)
+        for workbook in self._app._workbooks:
+            if os.path.normcase(workbook._full_name) == os.path.normcase(full_name):
+                workbook._activate()
+                return workbook
+        if not os.path.exists(full_name):
+            raise FakeCOMError(f"Sorry, we couldn't find {Filename}.")
+        workbook = FakeWorkbook.load(self._app, full_name)
+        self._app._workbooks.append(workbook)
+        workbook._activate()
+        return workbook
+
+
+class FakeExcel(_FakeDispatch):
+    """
+    Excel.Application 替身。
+
+    Args:
+        latency: 每次 COM 呼叫的等待秒數 (0 為不等待)；以 time.sleep 實現，極小的值會有排程誤差
+    """
+
+    _type_name = 'Application'
+
+    def __init__(self, latency=0.0):
+        super().__init__(self)
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._workbooks = []
+        self._active_workbook = None
+        self._selection = None
+        self._init_properties(
+            Calculation=xlCalculationAutomatic,
+            CalculateBeforeSave=True,
+            EnableEvents=True,
+            Interactive=True,
+            ScreenUpdating=True,
+            DisplayAlerts=True,
+            AskToUpdateLinks=True,
+            Visible=True,
+        )
+
+    def _tick(self):
+        with self._lock:
+            self._calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def com_calls(self):
+        return self._calls
+
+    def reset_com_calls(self):
+        with self._lock:
+            self._calls = 0
+
+    @property
+    def Workbooks(self):
+        return _FakeWorkbooks(self)
+
+    @property
+    def ActiveWorkbook(self):
+        if self._active_workbook is None:
+            raise FakeCOMError("No active workbook.")
+        return self._active_workbook
+
+    @property
+    def ActiveSheet(self):
+        if self._active_workbook is None or self._active_workbook._active_sheet is None:
+            raise FakeCOMError("No active sheet.")
+        return self._active_workbook._active_sheet
+
+    @property
+    def Selection(self):
+        if self._selection is None:
+            sheet = self._active_workbook._active_sheet if self._active_workbook else None
+            return FakeRange(sheet, [(1, 1, 1, 1)]) if sheet is not None else None
+        return self._selection
+
+    @property
+    def ActiveCell(self):
+        selection = object.__getattribute__(self, 'Selection')
+        if selection is None:
+            return None
+        first_row, first_col = selection._areas[0][:2]
+        return FakeRange(selection._worksheet, [(first_row, first_col, first_row, first_col)])
+
+    @property
+    def ActiveWindow(self):
+        return _FakeWindow(self)
+
+    @property
+    def Hwnd(self):
+        return 0
+
+    def Union(self, *ranges):
+        ranges = [item for item in ranges if item is not None]
+        worksheet = ranges[0]._worksheet
+        if any(item._worksheet is not worksheet for item in ranges):
+            raise FakeCOMError("Method 'Union' of object '_Application' failed")
+        return FakeRange(worksheet, [area for item in ranges for area in item._areas])
+
+    def Calculate(self):
+        pass
+
+    def CalculateFull(self):
+        pass
+
+    def CalculateFullRebuild(self):
+        pass
+
+    def Quit(self):
+        self._workbooks.clear()
+        self._active_workbook = None
+
+
+def _set_attributes(module, attributes, saved):
+    for name, value in attributes.items():
+        saved.append((module, name, getattr(module, name, _MISSING)))
+        setattr(module, name, value)
+
+
+_MISSING = object()
+
+
+@contextlib.contextmanager
+def fake_com_modules(app):
+    """
+    在 with 區塊內令 win32com.client.GetActiveObject / Dispatch 返回 app 的物件，
+    pythoncom 的 CoInitialize / marshal 函數直接傳遞物件。
+    模組已匯入時 (例如 Windows 上的真正 pywin32) 只替換這些函數，離開時還原；
+    未安裝時暫時加入替身模組。
+    """
+    def get_active_object(prog_id, *args, **kwargs):
+        return app
+
+    def dispatch(target, *args, **kwargs):
+        if isinstance(target, _FakeOleObject):
+            return target._target
+        if isinstance(target, _FakeDispatch):
+            return target
+        return app
+
+    added_modules = []
+    saved = []
+
+    def ensure_module(name):
+        module = sys.modules.get(name)
+        if module is None:
+            try:
+                __import__(name)
+                module = sys.modules[name]
+            except ImportError:
+                module = sys.modules[name] = types.ModuleType(name)
+                added_modules.append(name)
+        return module
+
+    win32com = ensure_module('win32com')
+    client = ensure_module('win32com.client')
+    if getattr(win32com, 'client', None) is not client:
+        _set_attributes(win32com, {'client': client}, saved)
+    pythoncom = ensure_module('pythoncom')
+    _set_attributes(client, {'GetActiveObject': get_active_object, 'Dispatch': dispatch}, saved)
+    _set_attributes(pythoncom, {
+        'IID_IDispatch': getattr(pythoncom, 'IID_IDispatch', 'IID_IDispatch'),
+        'CoInitialize': lambda *args: None,
+        'CoUninitialize': lambda *args: None,
+        'CoMarshalInterThreadInterfaceInStream': lambda iid, ole_object: ole_object,
+        'CoGetInterfaceAndReleaseStream': lambda stream, iid: stream,
+    }, saved)
+    try:
+        yield app
+    finally:
+        for module, name, value in reversed(saved):
+            if value is _MISSING:
+                delattr(module, name)
+            else:
+                setattr(module, name, value)
+        for name in added_modules:
+            sys.modules.pop(name, None)
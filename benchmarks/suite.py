@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark Suite - 對主要熱點路徑計時及量度峰值記憶體
+
+每個 benchmark 先執行 repeat 次計時 (每次之前清除 workbook / tokenizer 快取，量度冷啟動)，
+再額外執行一次並以 tracemalloc 記錄峰值記憶體 (tracemalloc 會拖慢執行，所以不與計時混合)。
+"""
+
+import gc
+import os
+import sys
+import time
+import platform
+import tracemalloc
+
+TREE_COLUMNS = ("type", "address", "formula", "result", "display_value")
+
+
+def reset_caches():
+    """清除所有模組層級快取，令每次量度都由冷啟動開始"""
+    from utils.workbook_cache import get_workbook_cache
+    from utils.formula_tokenizer import clear_tokenizer_cache
+    get_workbook_cache().clear()
+    clear_tokenizer_cache()
+
+
+def measure(func, repeat=3, setup=reset_caches, track_memory=True):
+    """
+    量度 func() 的執行時間及峰值記憶體。
+
+    Returns:
+        dict: {'seconds': 最快一次, 'mean_seconds', 'runs', 'peak_bytes', 'result'}
+    """
+    timings = []
+    result = None
+    for _ in range(max(1, repeat)):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    peak_bytes = None
+    if track_memory:
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'seconds': min(timings),
+        'mean_seconds': sum(timings) / len(timings),
+        'runs': len(timings),
+        'peak_bytes': peak_bytes,
+        'result': result,
+    }
+
+
+def load_formula_rows(workbook_path, sheet_name):
+    """以 openpyxl 讀取工作表公式，組成與掃描結果相同的 (type, address, formula, result, display) 列表"""
+    import openpyxl
+    from core.formula_classifier import classify_formula_type
+
+    wb = openpyxl.load_workbook(workbook_path, read_only=True)
+    try:
+        rows = []
+        for row in wb[sheet_name].iter_rows():
+            for cell in row:
+                if isinstance(cell.value, str) and cell.value.startswith('='):
+                    rows.append((classify_formula_type(cell.value), cell.coordinate, cell.value, '', ''))
+        return rows
+    finally:
+        wb.close()
+
+
+def _bench_explode(workbook_set, engine, chains, max_depth, workers, dag=False):
+    from utils.dependency_exploder import explode_cell_dependencies
+
+    def run():
+        nodes = 0
+        for sheet_name, address in chains:
+            tree, summary = explode_cell_dependencies(workbook_set.root_path, sheet_name, address,
+                                                      max_depth=max_depth, dag=dag, engine=engine, workers=workers)
+            nodes += summary.get('total_nodes', 0)
+        return nodes
+    return run
+
+
+_SUMMARY_KEYS = ('total_nodes', 'max_depth', 'type_distribution', 'circular_references')
+
+
+def check_dag_summaries(starts, max_depth, workers=0):
+    """
+    DAG 模式 (dfs / bfs) 的摘要與完整樹狀展開的摘要比較；不同時拋出 ValueError。
+    starts: [(workbook_path, sheet_name, address), ...]
+    """
+    from utils.dependency_exploder import explode_cell_dependencies
+
+    for workbook_path, sheet_name, address in starts:
+        for depth in sorted({3, 4, max_depth}):
+            reset_caches()
+            summary = explode_cell_dependencies(workbook_path, sheet_name, address, max_depth=depth)[1]
+            expected = {key: summary[key] for key in _SUMMARY_KEYS}
+            for engine in ('dfs', 'bfs'):
+                reset_caches()
+                dag_summary = explode_cell_dependencies(workbook_path, sheet_name, address, max_depth=depth,
+                                                        dag=True, engine=engine, workers=workers)[1]
+                actual = {key: dag_summary[key] for key in _SUMMARY_KEYS}
+                if actual != expected:
+                    raise ValueError(f"DAG summary ({engine}) of {sheet_name}!{address} at max_depth {depth} "
+                                     f"differs from the tree: {actual} != {expected}")
+    return len(starts)
+
+
+def _bench_dag_summary_check(workbook_set, chains, max_depth, workers):
+    from benchmarks.workbook_generator import CYCLE_SHEET_NAME, CYCLE_START_CELLS
+
+    starts = [(workbook_set.root_path, sheet_name, address) for sheet_name, address in chains]
+    if workbook_set.cycle_path:
+        starts += [(workbook_set.cycle_path, CYCLE_SHEET_NAME, address) for address in CYCLE_START_CELLS]
+
+    def run():
+        return check_dag_summaries(starts, max_depth, workers)
+    return run
+
+
+def _bench_resolved_reads(workbook_set, cells):
+    from utils.openpyxl_resolver import read_cell_with_resolved_references
+
+    def run():
+        for sheet_name, address in cells:
+            read_cell_with_resolved_references(workbook_set.root_path, sheet_name, address)
+        return len(cells)
+    return run
+
+
+def _bench_filter(formula_rows):
+    from core.formula_filter import filter_formulas, parse_address_filters
+
+    address_filters = parse_address_filters("B1:B500, C:D, 10:20")
+
+    def run():
+        matched = 0
+        matched += len(filter_formulas(formula_rows, formula_text='sum'))
+        matched += len(filter_formulas(formula_rows, type_flags={'external link': False}, sort_index=2))
+        matched += len(filter_formulas(formula_rows, parsed_address_filters=address_filters))
+        return matched
+    return run
+
+
+def _bench_filter_typing(formula_table, use_engine):
+    """逐字輸入公式條件 (每個按鍵篩選一次)；use_engine 時使用 FilterEngine 沿用上一次的結果"""
+    from core.formula_filter import filter_formulas, FilterEngine
+
+    formulas = [row[2] for row in formula_table[:1]]
+    text = formulas[0][:8].lower() if formulas else '=sum('
+
+    def run():
+        engine = FilterEngine() if use_engine else None
+        matched = 0
+        for length in range(1, len(text) + 1):
+            if engine is not None:
+                matched = len(engine.filter(formula_table, formula_text=text[:length]))
+            else:
+                matched = len(filter_formulas(formula_table, formula_text=text[:length]))
+        return matched
+    return run
+
+
+def _bench_filter_text_index(formula_table):
+    """公式文字條件使用 trigram 索引 (索引在計時之前建立)"""
+    from core.formula_filter import filter_formulas
+    from core.text_index import TrigramIndex
+
+    pool = formula_table.pools.formulas
+    lower_strings = pool.lower_strings()
+    pool.text_index = TrigramIndex.build(lower_strings, len(lower_strings))
+
+    def run():
+        return len(filter_formulas(formula_table, formula_text='sum')) + \
+            len(filter_formulas(formula_table, formula_text='xlsx]'))
+    return run
+
+
+def _bench_filter_query(formula_rows):
+    """Query 欄的查詢 (編譯一次，以查詢計劃篩選；formula_rows 為 list 時逐列比較)"""
+    from core.formula_filter import filter_formulas
+    from core.formula_query import compile_query
+
+    queries = [compile_query(text) for text in (
+        'type:external AND formula~/VLOOKUP|INDEX/ AND NOT sheet:Archive AND row:100..500',
+        'sum OR (col:B..D -r:0)',
+    )]
+
+    def run():
+        return sum(len(filter_formulas(formula_rows, query=query)) for query in queries)
+    return run
+
+
+def _bench_build_formula_table(formula_rows):
+    from core.formula_table import FormulaTable
+
+    def run():
+        return len(FormulaTable(formula_rows))
+    return run
+
+
+def _bench_optimize_ranges(formula_rows, range_cells):
+    from utils.range_optimizer import optimize_ranges, parse_cell_address
+
+    # optimize_ranges 的矩形偵測隨地址數目急劇增長，只取前 range_cells 個地址
+    parsed = sorted((parse_cell_address(row[1]), row[1]) for row in formula_rows[:range_cells])
+
+    def run():
+        return len(optimize_ranges(parsed))
+    return run
+
+
+def _bench_link_summary(formula_rows, expect_links):
+    from core.data_processor import get_unique_external_links
+
+    def run():
+        links = get_unique_external_links(formula_rows, TREE_COLUMNS)
+        if expect_links and not links:
+            raise ValueError("No external links found in the generated formulas.")
+        return len(links)
+    return run
+
+
+def _bench_pattern_grouping(formula_rows):
+    """R1C1 分組 (formula_rows 為 FormulaView 時使用 table 的 pattern 編號，只計算一次，與 apply_filter 相同)"""
+    from core.formula_patterns import group_formula_patterns, pattern_link_addresses
+    from core.formula_table import table_source
+
+    source = table_source(formula_rows)
+    if source is not None:
+        source[0].pattern_index()
+
+    def run():
+        patterns = group_formula_patterns(formula_rows)
+        pattern_link_addresses(patterns)
+        return len(patterns)
+    return run
+
+
+def _bench_graph_conversion(tree):
+    from utils.dependency_converter import convert_tree_to_graph_data
+
+    def run():
+        nodes, edges = convert_tree_to_graph_data(tree)[:2]
+        return len(nodes)
+    return run
+
+
+def _bench_com_scan(app, worksheet, bulk, max_cells):
+    """以 FakeExcel 量度 COM 掃描 (陣列讀取 / 逐格讀取)；items 包括 COM 呼叫次數"""
+    from core.scan_worker import get_formula_areas, iter_area_rows
+
+    def run():
+        app.reset_com_calls()
+        rows = 0
+        for area in get_formula_areas(worksheet.UsedRange)[0]:
+            for _ in iter_area_rows(area, 'quick', bulk):
+                rows += 1
+                if rows >= max_cells:
+                    return {'rows': rows, 'com_calls': app.com_calls}
+        return {'rows': rows, 'com_calls': app.com_calls}
+    return run
+
+
+def _git_revision(repo_dir):
+    import subprocess
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmarks(workbook_set, spec=None, repeat=3, only=None, explode_chains=5, max_depth=10,
+                   resolved_cells=200, range_cells=100, workers=0, com_latency=0.0001, com_cells=2000,
+                   track_memory=True, progress_callback=None):
+    """
+    對已產生的工作簿執行所有 benchmark。
+
+    Args:
+        workbook_set: generate_workbook_set 的結果
+        spec: 產生工作簿所用的 WorkbookSpec (記錄在輸出中)
+        repeat: 每個 benchmark 計時次數
+        only: 只執行名稱在此集合內的 benchmark (None 為全部)
+        explode_chains: 依賴爆炸分析的起點數目 (取各依賴鏈末端)
+        max_depth: 爆炸分析最大深度
+        resolved_cells: read_cell_with_resolved_references 讀取的儲存格數目
+        range_cells: optimize_ranges 處理的地址數目
+        workers: bfs 引擎的 worker process 數目 (0 為不平行)
+        com_latency: FakeExcel 每次 COM 呼叫的模擬延遲 (秒)
+        com_cells: COM 掃描 benchmark 讀取的公式儲存格上限
+        progress_callback: callable(name)，每個 benchmark 開始時呼叫
+
+    Returns:
+        dict: 可直接輸出為 JSON 的結果
+    """
+    from utils.dependency_exploder import explode_cell_dependencies
+
+    sheet_name = workbook_set.sheet_names[0]
+    formula_rows = load_formula_rows(workbook_set.root_path, sheet_name)
+    chains = workbook_set.chain_ends[:explode_chains]
+    cells = workbook_set.formula_cells[:resolved_cells]
+    graph_tree = explode_cell_dependencies(workbook_set.root_path, *chains[0], max_depth=max_depth)[0] \
+        if chains else {}
+
+    from core.formula_table import FormulaTable
+    from benchmarks.workbook_generator import windows_link_rows
+    formula_table = FormulaTable(formula_rows)
+    # 外部連結摘要只接受 Windows 路徑；產生的公式應有外部連結 (找不到時計時沒有意義)
+    link_rows = windows_link_rows(formula_rows, workbook_set.directory)
+    expect_links = bool(workbook_set.external_paths) and (spec is None or spec.external_ratio > 0)
+
+    benchmarks = [
+        ('explode_cell_dependencies_dfs', _bench_explode(workbook_set, 'dfs', chains, max_depth, workers)),
+        ('explode_cell_dependencies_bfs', _bench_explode(workbook_set, 'bfs', chains, max_depth, workers)),
+        ('explode_cell_dependencies_dag', _bench_explode(workbook_set, 'dfs', chains, max_depth, workers, dag=True)),
+        ('dag_summary_check', _bench_dag_summary_check(workbook_set, chains, max_depth, workers)),
+        ('read_cell_with_resolved_references', _bench_resolved_reads(workbook_set, cells)),
+        ('filter_formulas', _bench_filter(formula_rows)),
+        ('filter_formulas_table', _bench_filter(formula_table)),
+        ('filter_typing', _bench_filter_typing(formula_table, False)),
+        ('filter_typing_engine', _bench_filter_typing(formula_table, True)),
+        ('filter_query', _bench_filter_query(formula_rows)),
+        ('filter_query_table', _bench_filter_query(formula_table)),
+        ('build_formula_table', _bench_build_formula_table(formula_rows)),
+        ('optimize_ranges', _bench_optimize_ranges(formula_rows, range_cells)),
+        ('external_link_summary', _bench_link_summary(link_rows, expect_links)),
+        ('external_link_summary_table', _bench_link_summary(FormulaTable(link_rows), expect_links)),
+        ('group_formula_patterns', _bench_pattern_grouping(formula_rows)),
+        ('group_formula_patterns_table', _bench_pattern_grouping(formula_table.view())),
+        ('convert_tree_to_graph_data', _bench_graph_conversion(graph_tree)),
+    ]
+    if not only or 'filter_text_index' in only:
+        # 使用獨立的 pools，索引不影響其他篩選 benchmark
+        benchmarks.append(('filter_text_index', _bench_filter_text_index(FormulaTable(formula_rows))))
+    if not only or any(name.startswith('com_scan') for name in only):
+        from benchmarks.fake_excel import FakeExcel
+
+        app = FakeExcel(latency=com_latency)
+        fake_worksheet = app.Workbooks.Open(workbook_set.root_path).Worksheets(sheet_name)
+        benchmarks += [
+            ('com_scan_bulk', _bench_com_scan(app, fake_worksheet, True, com_cells)),
+            ('com_scan_per_cell', _bench_com_scan(app, fake_worksheet, False, com_cells)),
+        ]
+
+    results = {}
+    for name, func in benchmarks:
+        if only and name not in only:
+            continue
+        if progress_callback:
+            progress_callback(name)
+        try:
+            measured = measure(func, repeat=repeat, track_memory=track_memory)
+            measured['items'] = measured.pop('result')
+            results[name] = measured
+        except Exception as e:
+            results[name] = {'error': str(e)}
+
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return {
+        'revision': _git_revision(repo_dir),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'spec': spec.to_dict() if spec is not None else None,
+        'settings': {'repeat': repeat, 'explode_chains': len(chains), 'max_depth': max_depth,
+                     'resolved_cells': len(cells), 'range_cells': min(range_cells, len(formula_rows)),
+                     'workers': workers, 'formula_rows': len(formula_rows),
+                     'com_latency': com_latency, 'com_cells': com_cells},
+        'benchmarks': results,
+    }
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Workbook Generator - 產生 benchmark 用的合成工作簿
+
+主工作簿 bench_root.xlsx 每個工作表：
+- A 欄為常數 (範圍引用及跨表引用的目標)
+- B 欄起為公式，按 chain_depth 組成依賴鏈 (每條鏈留在同一工作表)
+- 每條公式另有 fan_out 個前置引用：本表常數、跨表常數、SUM 範圍、外部連結或 INDIRECT
+
+外部檔案 bench_ext_N.xlsx 的 Data 工作表 A 欄為常數、B 欄為引用 A 欄的公式，
+外部連結以完整路徑寫入公式 ('dir\\[bench_ext_0.xlsx]Data'!B5)，引用解析及爆炸分析可以開啟。
+外部連結摘要只接受 Windows 路徑，其他平台上由 windows_link_rows 把目錄換成 Windows 形式後使用。
+bench_cycles.xlsx 為幾組固定的循環引用 (DAG 摘要與樹狀展開的比較用)。
+相同參數及 seed 產生相同的公式及數值。
+"""
+
+import os
+import random
+import datetime
+from dataclasses import dataclass, asdict, field
+
+ROOT_FILE_NAME = 'bench_root.xlsx'
+EXTERNAL_SHEET_NAME = 'Data'
+ROWS_PER_COLUMN = 1000
+CYCLE_FILE_NAME = 'bench_cycles.xlsx'
+CYCLE_SHEET_NAME = 'Cycles'
+
+# 循環引用的儲存格：兩條路徑到達同一個循環、巢狀循環、引用自己
+_CYCLE_CELLS = {
+    'A1': '=B1+C1', 'B1': '=D1', 'C1': '=D1', 'D1': '=B1+1',
+    'A3': '=B3+C3+E3', 'B3': '=D3', 'C3': '=D3+E3', 'D3': '=B3+C3+F3', 'E3': '=F3', 'F3': '=E3*2+G3', 'G3': 5,
+    'A5': '=A5+B5', 'B5': '=C5', 'C5': '=B5',
+}
+# 爆炸分析的起點
+CYCLE_START_CELLS = ('A1', 'A3', 'A5')
+
+# 固定的文件屬性時間，使輸出不隨執行時間改變
+_FIXED_TIMESTAMP = datetime.datetime(2025, 1, 1)
+
+
+@dataclass
+class WorkbookSpec:
+    """合成工作簿的參數"""
+    sheets: int = 3
+    formulas: int = 2000
+    chain_depth: int = 20
+    fan_out: int = 3
+    external_ratio: float = 0.1
+    indirect_ratio: float = 0.05
+    range_size: int = 10
+    external_files: int = 2
+    constant_rows: int = 500
+    seed: int = 0
+
+    def to_dict(self):
+        return asdict(self)
+
+
+PRESETS = {
+    'tiny': WorkbookSpec(sheets=2, formulas=200, chain_depth=8, constant_rows=100),
+    'small': WorkbookSpec(),
+    'medium': WorkbookSpec(sheets=5, formulas=20000, chain_depth=40, fan_out=4, constant_rows=2000),
+    'large': WorkbookSpec(sheets=8, formulas=100000, chain_depth=60, fan_out=4, external_files=4,
+                          constant_rows=5000),
+}
+
+
+@dataclass
+class GeneratedWorkbookSet:
+    """generate_workbook_set 的結果"""
+    directory: str
+    root_path: str
+    external_paths: list
+    sheet_names: list
+    # 每條依賴鏈最後的儲存格 [(sheet_name, address), ...]，作為爆炸分析的起點
+    chain_ends: list
+    formula_cells: list = field(default_factory=list)
+    formula_count: int = 0
+    cycle_path: str = None
+
+
+def _formula_position(slot):
+    """工作表內第 slot 條公式的地址 (B1..B1000, C1..)"""
+    from openpyxl.utils import get_column_letter
+    return f"{get_column_letter(2 + slot // ROWS_PER_COLUMN)}{1 + slot % ROWS_PER_COLUMN}"
+
+
+def _external_reference(directory, file_index, row):
+    column = 'B' if row % 2 else 'A'
+    return f"'{directory}{os.sep}[bench_ext_{file_index}.xlsx]{EXTERNAL_SHEET_NAME}'!${column}${row}"
+
+
+def windows_link_rows(formula_rows, directory):
+    """
+    外部連結目錄換成 Windows 形式 ('C:\\dir\\[...]') 的掃描結果列，只供外部連結摘要使用
+    (檔案無法從該路徑開啟)；Windows 上直接返回 formula_rows。
+    """
+    if os.sep == '\\':
+        return formula_rows
+    prefix = f"'{directory}{os.sep}["
+    windows_prefix = "'C:" + directory.replace('/', '\\') + "\\["
+    return [row[:2] + (row[2].replace(prefix, windows_prefix),) + row[3:] if isinstance(row[2], str) else row
+            for row in formula_rows]
+
+
+def _build_formula(rng, spec, directory, sheet_names, sheet_index, previous_address):
+    """按 spec 的比例組成一條公式"""
+    terms = []
+    if previous_address:
+        terms.append(previous_address)
+    extra = spec.fan_out - (1 if previous_address else 0)
+    for _ in range(max(1, extra)):
+        row = rng.randint(1, max(1, spec.constant_rows - spec.range_size))
+        roll = rng.random()
+        if spec.external_files and roll < spec.external_ratio:
+            terms.append(_external_reference(directory, rng.randrange(spec.external_files), row))
+        elif roll < spec.external_ratio + spec.indirect_ratio:
+            terms.append(f'INDIRECT("A{row}")')
+        elif roll < 0.45:
+            terms.append(f"SUM(A{row}:A{row + spec.range_size - 1})")
+        elif roll < 0.7 and len(sheet_names) > 1:
+            other = rng.choice([name for i, name in enumerate(sheet_names) if i != sheet_index])
+            terms.append(f"'{other}'!A{row}" if ' ' in other else f"{other}!A{row}")
+        else:
+            terms.append(f"$A${row}")
+    return "=" + "+".join(terms)
+
+
+def _save(workbook, path):
+    workbook.properties.created = _FIXED_TIMESTAMP
+    workbook.properties.modified = _FIXED_TIMESTAMP
+    workbook.properties.creator = 'benchmarks'
+    workbook.save(path)
+
+
+def generate_workbook_set(output_dir, spec=None, **overrides):
+    """
+    在 output_dir 產生主工作簿及外部連結檔案。
+
+    Args:
+        output_dir: 輸出目錄 (不存在時建立)
+        spec: WorkbookSpec；None 使用預設值
+        **overrides: 覆蓋 spec 的欄位 (例如 formulas=5000)
+
+    Returns:
+        GeneratedWorkbookSet
+    """
+    import openpyxl
+    from dataclasses import replace
+
+    spec = replace(spec or WorkbookSpec(), **overrides)
+    directory = os.path.abspath(output_dir)
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(spec.seed)
+
+    external_paths = []
+    for file_index in range(spec.external_files):
+        ext_wb = openpyxl.Workbook()
+        ext_ws = ext_wb.active
+        ext_ws.title = EXTERNAL_SHEET_NAME
+        for row in range(1, spec.constant_rows + 1):
+            ext_ws.cell(row=row, column=1, value=rng.randint(1, 1000))
+            ext_ws.cell(row=row, column=2, value=f"=A{row}*2")
+        path = os.path.join(directory, f"bench_ext_{file_index}.xlsx")
+        _save(ext_wb, path)
+        external_paths.append(path)
+
+    wb = openpyxl.Workbook()
+    sheet_names = [f"Sheet{i + 1}" for i in range(spec.sheets)]
+    wb.active.title = sheet_names[0]
+    worksheets = [wb.active] + [wb.create_sheet(name) for name in sheet_names[1:]]
+    for ws in worksheets:
+        for row in range(1, spec.constant_rows + 1):
+            ws.cell(row=row, column=1, value=rng.randint(1, 1000))
+
+    slots = [0] * spec.sheets
+    chain_ends = []
+    formula_cells = []
+    previous_address = None
+    sheet_index = 0
+    for formula_index in range(spec.formulas):
+        if formula_index % spec.chain_depth == 0:
+            if previous_address:
+                chain_ends.append((sheet_names[sheet_index], previous_address))
+            previous_address = None
+            sheet_index = (formula_index // spec.chain_depth) % spec.sheets
+        address = _formula_position(slots[sheet_index])
+        slots[sheet_index] += 1
+        worksheets[sheet_index][address] = _build_formula(rng, spec, directory, sheet_names, sheet_index,
+                                                          previous_address)
+        formula_cells.append((sheet_names[sheet_index], address))
+        previous_address = address
+    if previous_address:
+        chain_ends.append((sheet_names[sheet_index], previous_address))
+
+    root_path = os.path.join(directory, ROOT_FILE_NAME)
+    _save(wb, root_path)
+
+    cycle_wb = openpyxl.Workbook()
+    cycle_wb.active.title = CYCLE_SHEET_NAME
+    for address, value in _CYCLE_CELLS.items():
+        cycle_wb.active[address] = value
+    cycle_path = os.path.join(directory, CYCLE_FILE_NAME)
+    _save(cycle_wb, cycle_path)
+
+    return GeneratedWorkbookSet(
+        directory=directory,
+        root_path=root_path,
+        external_paths=external_paths,
+        sheet_names=sheet_names,
+        chain_ends=chain_ends,
+        formula_cells=formula_cells,
+        formula_count=spec.formulas,
+        cycle_path=cycle_path,
+    )
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Address Index - 地址篩選的列號 / 欄號索引及工作簿名稱
+
+AddressIndex 把 FormulaTable 的列索引按列號及按欄號各排序一次 (每次掃描結果建立一次，
+由 FormulaTable.address_index 快取)。地址條件 ("A1:C3"、"10:20"、"D:F") 以 bisect 取出
+範圍內的列索引，矩形範圍只取列或欄兩者中候選較少的一方再檢查另一方，不需逐列比較。
+
+地址篩選亦接受工作簿中已定義的名稱 (例如 "Inputs")：掃描開始時以 read_com_names /
+read_file_names 讀取名稱及其參照的範圍 (可以是多個範圍的聯集)，
+parse_address_filters 把名稱展開為各個範圍。
+"""
+
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+from utils.range_optimizer import parse_excel_address
+
+# 不限列 / 欄時的上限 (大於 Excel 的最大列號及欄號)
+_NO_LIMIT = 2 ** 31
+
+# 名稱的參照 ("Sheet1!$A$1:$B$3"、"'My Sheet'!$D:$D"、"Sheet1!$2:$5") 中的一個範圍
+_AREA_PATTERN = re.compile(
+    r"(?:'((?:[^'\[\]]|'')+)'|([^'!,=()\s\[\]]+))!"
+    r"(\$?[A-Za-z]{1,3}\$?[0-9]+(?::\$?[A-Za-z]{1,3}\$?[0-9]+)?|\$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3}|\$?[0-9]+:\$?[0-9]+)"
+)
+
+
+class AddressIndex:
+    """FormulaTable 的列號 / 欄號排序索引 (table 的資料改變後需重新建立)"""
+
+    __slots__ = ('_rows', '_cols', '_sheets', '_row_ids', '_row_keys', '_col_ids', '_col_keys')
+
+    def __init__(self, table):
+        rows, cols = table.column('rows'), table.column('cols')
+        self._rows, self._cols, self._sheets = rows, cols, table.column('sheets')
+        row_ids = sorted(range(len(rows)), key=rows.__getitem__)
+        col_ids = sorted(range(len(cols)), key=cols.__getitem__)
+        self._row_ids = array('I', row_ids)
+        self._row_keys = array('I', (rows[i] for i in row_ids))
+        self._col_ids = array('I', col_ids)
+        self._col_keys = array('H', (cols[i] for i in col_ids))
+
+    def query(self, first_row, first_col, last_row, last_col, sheet_id=None):
+        """
+        範圍內的列索引 (不排序)；None 為不限。非標準地址 (列號 0) 不包括在內。
+        sheet_id: 只包括此工作表的列 (沒有工作表的列亦包括)；None 為不限
+        """
+        first_row = first_row or 1
+        first_col = first_col or 1
+        last_row = _NO_LIMIT if last_row is None else last_row
+        last_col = _NO_LIMIT if last_col is None else last_col
+        row_start, row_end = bisect_left(self._row_keys, first_row), bisect_right(self._row_keys, last_row)
+        col_start, col_end = bisect_left(self._col_keys, first_col), bisect_right(self._col_keys, min(last_col, 0xFFFF))
+        rows, cols = self._rows, self._cols
+        if row_end - row_start <= col_end - col_start:
+            ids = self._row_ids[row_start:row_end]
+            if first_col > 1 or last_col < _NO_LIMIT:
+                ids = [i for i in ids if first_col <= cols[i] <= last_col]
+        else:
+            ids = self._col_ids[col_start:col_end]
+            if first_row > 1 or last_row < _NO_LIMIT:
+                ids = [i for i in ids if first_row <= rows[i] <= last_row]
+        if sheet_id is not None:
+            sheets = self._sheets
+            ids = [i for i in ids if sheets[i] < 0 or sheets[i] == sheet_id]
+        return ids
+
+
+def parse_refers_to(refers_to):
+    """
+    名稱的參照文字 -> [(sheet_name, parse_excel_address 結果), ...]。
+    常數、公式、外部工作簿的參照等不是儲存格範圍的參照返回空列表。
+    """
+    text = (refers_to or '').strip()
+    if text.startswith('='):
+        text = text[1:]
+    areas = []
+    position = 0
+    while position < len(text):
+        match = _AREA_PATTERN.match(text, position)
+        if not match:
+            return []
+        sheet_name = match.group(1).replace("''", "'") if match.group(1) is not None else match.group(2)
+        try:
+            areas.append((sheet_name, parse_excel_address(match.group(3))))
+        except ValueError:
+            return []
+        position = match.end()
+        if position < len(text):
+            if text[position] != ',':
+                return []
+            position += 1
+    return areas
+
+
+def _add_name(names, full_name, refers_to, sheet_name):
+    """
+    把一個名稱加入 names。sheet_name 不為 None 時 (單一工作表掃描) 只保留該工作表上的範圍，
+    並去除工作表 (結果列沒有工作表欄)。
+    """
+    key = full_name.rsplit('!', 1)[-1].upper()
+    areas = parse_refers_to(refers_to)
+    if sheet_name is not None:
+        areas = [(None, parsed) for area_sheet, parsed in areas if area_sheet.lower() == sheet_name.lower()]
+    if areas:
+        names.setdefault(key, []).extend(areas)
+
+
+def read_com_names(workbook, sheet_name=None):
+    """
+    以 COM 讀取工作簿的名稱：{名稱 (大寫): [(sheet_name 或 None, parse_excel_address 結果), ...]}。
+    sheet_name: 單一工作表掃描的工作表 (只保留該工作表上的範圍)；None 為整個工作簿
+    """
+    names = {}
+    if workbook is None:
+        return names
+    try:
+        for name in workbook.Names:
+            try:
+                if name.Visible:
+                    _add_name(names, name.Name, name.RefersTo, sheet_name)
+            except Exception:
+                continue
+    except Exception as e:
+        print(f"Could not read workbook names: {e}")
+    return names
+
+
+def read_file_names(file_path, sheet_name=None):
+    """與 read_com_names 相同，從 xlsx / xlsm 檔案的 workbook.xml 讀取 (不載入工作表)"""
+    from utils.sheet_xml_reader import get_workbook_xml_index, is_xml_workbook
+
+    names = {}
+    if not file_path or not is_xml_workbook(file_path):
+        return names
+    try:
+        for full_name, refers_to in get_workbook_xml_index(file_path).defined_names:
+            _add_name(names, full_name, refers_to, sheet_name)
+    except Exception as e:
+        print(f"Could not read workbook names: {e}")
+    return names
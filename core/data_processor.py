@@ -1,20 +1,32 @@
-import re
 from utils.range_optimizer import smart_range_display
+from utils.formula_tokenizer import external_link_paths
+from core.formula_table import table_source
 
 def _get_summary_data(controller):
-    formulas_to_summarize = [controller.view.result_tree.item(item, "values") for item in controller.view.result_tree.get_children()]
+    from core.worksheet_tree import get_visible_rows
+    formulas_to_summarize = get_visible_rows(controller)
     is_filtered = len(formulas_to_summarize) != len(controller.all_formulas) if controller.all_formulas else True
     return formulas_to_summarize, is_filtered
 
 def get_unique_external_links(formulas_to_summarize, tree_columns):
-    external_path_pattern = re.compile(r"'([^']+\\[^\]]+\.(?:xlsx|xls|xlsm|xlsb)\][^']*?)'", re.IGNORECASE)
+    source = table_source(formulas_to_summarize)
+    if source is not None:
+        # FormulaTable / FormulaView：每個不同的公式字串只分析一次
+        table, indices = source
+        formula_ids = table.column('formulas')
+        formula_strings = table.pools.formulas.strings
+        unique_full_paths = set()
+        for formula_id in {formula_ids[i] for i in indices}:
+            unique_full_paths.update(external_link_paths(formula_strings[formula_id]))
+        return sorted(unique_full_paths)
+
     unique_full_paths = set()
     formula_idx = tree_columns.index("formula")
 
     for formula_data in formulas_to_summarize:
         if len(formula_data) > formula_idx:
             formula_content = formula_data[formula_idx]
-            matches = external_path_pattern.findall(str(formula_content))
+            matches = external_link_paths(str(formula_content))
             if matches:
                 unique_full_paths.update(matches)
 
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Display Text - 延遲讀取 Full 掃描的顯示文字 (Range.Text)
+
+Full 掃描逐格讀取 Range.Text 是最慢的部分，而使用者只會看到其中一小部分。
+Excel 掃描改用 scan_mode 'lazy'：結果列的顯示文字為 LAZY_TEXT 佔位，
+列表捲動 / 改變大小時只請求畫面上可見的列，由 DisplayTextWorker 在背景分批讀取，
+結果存入 controller.display_text_cache 並更新列表。選取的列在 on_select 中即時讀取。
+
+快取的鍵為 (sheet_name, address)；單一工作表掃描的 sheet_name 為 None。
+顯示文字一律從 start_display_text_worker 的 com_obj 讀取 (controller.display_text_source)，
+從另一個窗格同步的結果亦從其來源的工作表讀取，而不是目前窗格連接的工作表。
+"""
+
+from array import array
+
+from core.scan_worker import DisplayTextWorker, LAZY_TEXT
+
+DISPLAY_TEXT_POLL_MS = 50
+DISPLAY_TEXT_DEBOUNCE_MS = 80
+
+
+def _row_key(row):
+    sheet_name = row[5] if len(row) > 5 and row[5] else None
+    return sheet_name, str(row[1]).replace('$', '')
+
+
+def reset_display_text(controller):
+    """清除快取 (重新掃描後數值可能已改變)"""
+    controller.display_text_cache = {}
+    controller.display_text_requested = set()
+    controller.display_text_items = {}
+
+
+def stop_display_text_worker(controller):
+    worker = getattr(controller, 'display_text_worker', None)
+    if worker is not None:
+        worker.stop()
+    controller.display_text_worker = None
+    controller.display_text_source = None
+    reset_display_text(controller)
+
+
+def start_display_text_worker(controller, com_obj):
+    """
+    為新的延遲掃描建立 DisplayTextWorker。
+    com_obj: 單一工作表掃描為 worksheet；整個工作簿掃描為 workbook (快取鍵帶工作表名稱)
+    """
+    stop_display_text_worker(controller)
+    worker = DisplayTextWorker(com_obj)
+    controller.display_text_worker = worker
+    controller.display_text_source = com_obj
+    worker.start()
+    controller.root.after(DISPLAY_TEXT_POLL_MS, lambda: _poll_display_text(controller, worker))
+
+
+def resolve_display_text(controller, row):
+    """以快取的顯示文字取代佔位；沒有快取時返回原來的列"""
+    if len(row) < 5 or row[4] != LAZY_TEXT:
+        return row
+    text = controller.display_text_cache.get(_row_key(row))
+    if text is None:
+        return row
+    return tuple(row[:4]) + (text,) + tuple(row[5:])
+
+
+def table_display_text(controller, table):
+    """FormulaTable 列索引 -> 顯示文字的函數 (佔位以快取的文字取代)"""
+    displays, sheets = table.column('displays'), table.column('sheets')
+    strings, sheet_names = table.pools.values.strings, table.pools.sheets.strings
+    lazy_id = table.pools.values.find(LAZY_TEXT)
+    cache = controller.display_text_cache
+
+    def display_text(index):
+        text_id = displays[index]
+        if text_id != lazy_id:
+            return strings[text_id]
+        sheet = sheets[index]
+        key = (sheet_names[sheet] if sheet >= 0 else None, table.address(index).replace('$', ''))
+        return cache.get(key, LAZY_TEXT)
+    return display_text
+
+
+def filter_lazy_display_text(controller, view, display_filter, sort_reverse=None):
+    """
+    按已讀取的顯示文字篩選及排序 FilterEngine 的結果 (FormulaView，其他條件已篩選)。
+    只有結果中顯示文字為佔位的列需要查找快取，其他列按 pool 的字串編號比較。
+
+    Args:
+        display_filter: 顯示文字需包含的文字 (不分大小寫；空白為不篩選)
+        sort_reverse: 按顯示文字排序的方向；None 為不排序
+    """
+    from core.formula_filter import _matching_ids
+    from core.formula_table import FormulaView
+
+    table, indices = view.table, view.indices
+    display_text = table_display_text(controller, table)
+    if display_filter:
+        display_filter = display_filter.lower()
+        displays = table.column('displays')
+        lazy_id = table.pools.values.find(LAZY_TEXT)
+        # 佔位字串本身 ("(loading...)") 不按 pool 比較，只比較各列已讀取的文字
+        matched_ids = _matching_ids(table.pools.values, display_filter) - {lazy_id}
+        indices = array('I', (i for i in indices if displays[i] in matched_ids or
+                              (displays[i] == lazy_id and display_filter in display_text(i).lower())))
+    if sort_reverse is not None:
+        indices = array('I', sorted(indices, key=display_text, reverse=sort_reverse))
+    return FormulaView(table, indices)
+
+
+def _visible_items(tree):
+    """Treeview 目前可見的項目 (包括展開的子項目)"""
+    items = []
+    try:
+        height = tree.winfo_height()
+    except Exception:
+        return items
+    y = 1
+    last_item = None
+    while y < height:
+        item_id = tree.identify_row(y)
+        if not item_id:
+            break
+        if item_id != last_item:
+            items.append(item_id)
+            last_item = item_id
+        bbox = tree.bbox(item_id)
+        y = (bbox[1] + bbox[3] + 1) if bbox else y + 18
+    return items
+
+
+def request_visible_display_text(controller):
+    """請求可見列中尚未讀取的顯示文字；已在快取中的直接更新"""
+    controller.display_text_after = None
+    worker = getattr(controller, 'display_text_worker', None)
+    if worker is None:
+        return
+    tree = controller.view.result_tree
+    display_index = controller.view.tree_columns.index("display_value")
+    keys = []
+    for item_id in _visible_items(tree):
+        values = tree.item(item_id, "values")
+        if len(values) <= display_index or values[display_index] != LAZY_TEXT:
+            continue
+        key = _row_key(values)
+        text = controller.display_text_cache.get(key)
+        if text is not None:
+            tree.set(item_id, "display_value", text)
+            continue
+        controller.display_text_items.setdefault(key, set()).add(item_id)
+        if key not in controller.display_text_requested:
+            controller.display_text_requested.add(key)
+            keys.append(key)
+    worker.request(keys)
+
+
+def schedule_display_text(controller, event=None):
+    """捲動 / 改變大小後稍作等待才請求，連續捲動時只在停下後讀取"""
+    if getattr(controller, 'display_text_worker', None) is None:
+        return
+    pending = getattr(controller, 'display_text_after', None)
+    if pending is not None:
+        controller.root.after_cancel(pending)
+    controller.display_text_after = controller.root.after(DISPLAY_TEXT_DEBOUNCE_MS,
+                                                          lambda: request_visible_display_text(controller))
+
+
+def ensure_display_text(controller, item_id, values):
+    """
+    on_select 使用：選取列的顯示文字未讀取時在 UI 執行緒即時讀取一個儲存格 (並更新快取及列表)。
+    無法讀取時返回原有的值。
+    """
+    display_index = controller.view.tree_columns.index("display_value")
+    if len(values) <= display_index or values[display_index] != LAZY_TEXT:
+        return values[display_index] if len(values) > display_index else ""
+    key = _row_key(values)
+    text = controller.display_text_cache.get(key)
+    if text is None:
+        source = getattr(controller, 'display_text_source', None)
+        if source is None:
+            return values[display_index]
+        try:
+            sheet_name, address = key
+            worksheet = source.Worksheets(sheet_name) if sheet_name else source
+            text = str(worksheet.Range(address).Text).strip()
+        except Exception:
+            return values[display_index]
+        controller.display_text_cache[key] = text
+    controller.view.result_tree.set(item_id, "display_value", text)
+    return text
+
+
+def _poll_display_text(controller, worker):
+    if getattr(controller, 'display_text_worker', None) is not worker:
+        return
+    import queue
+
+    tree = controller.view.result_tree
+    while True:
+        try:
+            event = worker.events.get_nowait()
+        except queue.Empty:
+            break
+        if event['event'] == 'error':
+            print(f"Display text worker stopped: {event['error']}")
+            controller.display_text_worker = None
+            return
+        for key, text in event['texts'].items():
+            controller.display_text_cache[key] = text
+            for item_id in controller.display_text_items.pop(key, ()):
+                # 虛擬列表的項目捲動後會顯示其他列，只更新仍顯示同一儲存格的項目
+                if tree.exists(item_id) and _row_key(tree.item(item_id, "values")) == key:
+                    tree.set(item_id, "display_value", text)
+    controller.root.after(DISPLAY_TEXT_POLL_MS, lambda: _poll_display_text(controller, worker))
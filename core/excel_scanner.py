@@ -1,79 +1,58 @@
 import os
-import time
 import win32com.client
 from tkinter import messagebox
 import psutil
 import win32gui
 import win32process
 import win32con
-from core.formula_classifier import classify_formula_type
-from core.worksheet_tree import apply_filter
+from core.worksheet_tree import apply_filter, append_scan_results, set_scan_sheets, clear_result_tree
+from core.scan_worker import ScanWorker, WorkbookScanWorker, get_formula_areas, iter_area_rows, is_no_formula_error
+from core.display_text import start_display_text_worker, stop_display_text_worker, reset_display_text
+from utils.com_instrumentation import begin_operation, end_operation
+from core.formula_table import FormulaTable
+from core.address_index import read_com_names, read_file_names
+from core.text_index import start_text_index, stop_text_index
 
-def _get_formulas_from_excel(worksheet_com_obj, scan_range_com_obj, scan_mode, progress_update_callback):
+# UI 取出掃描結果的間隔 (毫秒) 及每次最多加入 Treeview 的數目
+SCAN_POLL_MS = 50
+SCAN_ROWS_PER_POLL = 2000
+
+
+def _get_formulas_from_excel(worksheet_com_obj, scan_range_com_obj, scan_mode, progress_update_callback, bulk=True):
+    """同步掃描 (在呼叫者的執行緒讀取 COM)；UI 掃描使用 core.scan_worker.ScanWorker"""
     all_formulas_local = []
     formula_cells_found = 0
     
     try:
-        xlCellTypeFormulas = -4123
-        formula_range = scan_range_com_obj.SpecialCells(xlCellTypeFormulas)
-        
-        areas_to_process = []
-        if formula_range.Areas.Count > 1:
-            for area in formula_range.Areas:
-                areas_to_process.append(area)
-        else:
-            areas_to_process.append(formula_range)
-            
-        total_cells_to_process = sum(area.Cells.Count for area in areas_to_process)
+        areas_to_process, total_cells_to_process = get_formula_areas(scan_range_com_obj)
         current_cell_count = 0
         
         for area in areas_to_process:
-            for cell in area.Cells:
+            for row in iter_area_rows(area, scan_mode, bulk):
                 current_cell_count += 1
                 formula_cells_found += 1
-                
-                formula = ""
-                formula_type = "unknown"
-                cell_value = None
-                display_val = "Error"
-                cell_text = "Error"
-                cell_address = ""
-                
-                try:
-                    formula = cell.Formula
-                    formula_type = classify_formula_type(formula)
-                    cell_value = cell.Value
-                    display_val = str(cell_value)[:50] if cell_value is not None else "No Value"
-                    if scan_mode == 'quick':
-                        cell_text = "N/A (Quick Scan)"
-                    else:
-                        cell_text = str(cell.Text).strip()
-                    cell_address = cell.Address.replace('$', '')
-                    all_formulas_local.append((formula_type, cell_address, formula, display_val, cell_text))
-                except Exception as cell_processing_e:
-                    all_formulas_local.append((formula_type, cell_address if cell_address else "ERROR_ADDR", str(formula), str(display_val), f"ERROR: {cell_processing_e}"))
+                all_formulas_local.append(row)
                 
                 if current_cell_count % 100 == 0 or current_cell_count == total_cells_to_process:
                     progress_update_callback(current_cell_count, total_cells_to_process, formula_cells_found)
                     
     except Exception as e:
-        no_formula_error = (
-            "(-2146827284, 'OLE error.', None, None)" in str(e)
-            or "0x800A03EC" in str(e)
-            or '找不到所要找的儲存格' in str(e)
-            or 'Unable to get the' in str(e)
-        )
-        if no_formula_error:
+        if is_no_formula_error(e):
             return [], 0, 0 # Return empty list if no formulas found
         else:
             raise # Re-raise other exceptions
 
     return all_formulas_local, formula_cells_found, total_cells_to_process
 
-def refresh_data(controller, btn, scan_mode='full'):
+def refresh_data(controller, btn, scan_mode='full', on_complete=None):
+    """
+    連接 Excel 並在背景執行緒掃描公式；結果逐批加入列表。
+    on_complete: 掃描結束 (完成、取消或沒有公式) 後在 UI 執行緒呼叫的 callable(controller)
+    """
     if not controller.view.ui_initialized:
         return
 
+    begin_operation("Scan worksheet")
     controller.clear_filter_inputs()
     
     if btn is not None:
@@ -155,81 +134,38 @@ def refresh_data(controller, btn, scan_mode='full'):
         controller.view.progress_label.config(text=f"Searching for formulas in Excel in {scan_info.lower()} {scan_range_str} (this may take a moment)...")
         controller.root.update_idletasks()
         
-        start_time = time.time()
+        # 取消仍在執行的掃描 (其結果不再加入)
+        previous_worker = getattr(controller, 'scan_worker', None)
+        if previous_worker is not None:
+            previous_worker.cancel()
+        # 只有完整工作表掃描記錄區塊雜湊 (增量重新掃描用)
+        controller.scan_snapshot = None
+        # Full 掃描不在掃描時讀取 Range.Text，改為顯示時才讀取 (core.display_text)
+        row_mode = 'lazy' if scan_mode == 'full' else scan_mode
         try:
-            def progress_callback(current_cell_count, total_cells_to_process, formula_cells_found):
-                progress = 30 + (current_cell_count / total_cells_to_process) * 60
-                controller.view.progress_bar['value'] = min(int(progress), 90)
-                controller.view.progress_label.config(text=f"Found {formula_cells_found} formulas. Processing {current_cell_count}/{total_cells_to_process} cells...")
-                controller.root.update_idletasks()
-
-            controller.all_formulas, formula_cells_found, total_cells_to_process = _get_formulas_from_excel(
-                controller.worksheet, scan_range, scan_mode, progress_callback
-            )
-            
+            worker = ScanWorker(controller.worksheet, scan_range_str, scan_mode=row_mode,
+                                record_snapshot=not is_selected_range_scan)
+            if row_mode == 'lazy':
+                start_display_text_worker(controller, controller.worksheet)
+            else:
+                stop_display_text_worker(controller)
         except Exception as e:
             import traceback
-            err_detail = traceback.format_exc()
-            no_formula_error = (
-                "(-2146827284, 'OLE error.', None, None)" in str(e)
-                or "0x800A03EC" in str(e)
-                or '找不到所要找的儲存格' in str(e)
-                or 'Unable to get the' in str(e)
-            )
-            if no_formula_error:
-                controller.view.progress_label.config(text=f"No formulas found in this worksheet's {scan_info.lower()} ({scan_range_str}).")
-                if hasattr(controller, 'scanning_selected_range'):
-                    controller.scanning_selected_range = False
-                if hasattr(controller, 'selected_scan_address'):
-                    controller.selected_scan_address = None
-                if hasattr(controller, 'selected_scan_count'):
-                    controller.selected_scan_count = None
-                    
-                controller.view.progress_bar['value'] = 100
-                controller.root.update_idletasks()
-                if controller.view.formula_list_label:
-                    controller.view.formula_list_label.config(text="Formula List (No Formula Found)")
-                apply_filter(controller)
-                if btn is not None:
-                    btn.config(state='normal')
-                return
-            else:
-                messagebox.showerror("Scan Error", f"An error occurred while scanning formulas: {e}\n\nTraceback:\n{err_detail}")
+            messagebox.showerror("Scan Error", f"An error occurred while scanning formulas: {e}\n\nTraceback:\n{traceback.format_exc()}")
             if btn is not None:
                 btn.config(state='normal')
             return
-        
-        end_time = time.time()
-        time_taken = end_time - start_time
-        controller.view.progress_bar['value'] = 90
-        controller.view.progress_label.config(text=f"Found {len(controller.all_formulas)} formulas. Loading... (Scan took {time_taken:.2f} seconds)")
-        controller.root.update_idletasks()
-
-        if hasattr(controller, 'original_user_selection') and controller.original_user_selection:
-            controller._filter_results_to_original_selection()
-        
-        if hasattr(controller, 'scanning_selected_range'):
-            controller.scanning_selected_range = False
-        if hasattr(controller, 'selected_scan_address'):
-            controller.selected_scan_address = None
-        if hasattr(controller, 'selected_scan_count'):
-            controller.selected_scan_count = None
-        if hasattr(controller, 'original_user_selection'):
-            controller.original_user_selection = None
-        if hasattr(controller, 'original_user_count'):
-            controller.original_user_count = None
-            
-        apply_filter(controller)
-        controller.view.progress_bar['value'] = 100
-        controller.view.progress_label.config(text=f"Completed: Found {len(controller.all_formulas)} formulas. (Total scan time: {time_taken:.2f} seconds)")
-        if btn is not None:
-            btn.config(state='normal')
-        if controller.view.formula_list_label:
-            total_count = len(controller.all_formulas)
-            if total_count == 0:
-                controller.view.formula_list_label.config(text="Formula List (No Formula Found)")
-            else:
-                controller.view.formula_list_label.config(text=f"Formula List ({total_count} records):")
+        stop_text_index(controller)
+        controller.scan_worker = worker
+        # 地址篩選可使用的名稱 (只保留此工作表上的範圍)
+        controller.address_names = read_com_names(controller.workbook, controller.worksheet.Name)
+        clear_result_tree(controller)
+        set_scan_sheets(controller, None)
+        controller.scan_context = {'btn': btn, 'scan_info': scan_info, 'scan_range_str': scan_range_str,
+                                   'on_complete': on_complete, 'incremental': False}
+        _set_scan_controls(controller, running=True)
+        worker.start()
+        controller.root.after(SCAN_POLL_MS, lambda: _drain_scan_events(controller, worker))
     except Exception as e:
         import traceback
         err_detail = traceback.format_exc()
@@ -245,4 +181,386 @@ def refresh_data(controller, btn, scan_mode='full'):
             btn.config(state='normal')
         controller.view.progress_bar['value'] = 0
         controller.view.progress_label.config(text="Connection Failed.")
-        return
\ No newline at end of file
+        return
+
+
+def _set_scan_controls(controller, running):
+    """啟用 / 停用 Pause 及 Cancel 按鈕"""
+    view = controller.view
+    pause_button = getattr(view, 'pause_scan_button', None)
+    cancel_button = getattr(view, 'cancel_scan_button', None)
+    if pause_button is not None:
+        pause_button.config(text="Pause", state='normal' if running else 'disabled')
+    if cancel_button is not None:
+        cancel_button.config(state='normal' if running else 'disabled')
+
+
+def toggle_scan_pause(controller):
+    """暫停 / 繼續目前的掃描"""
+    worker = getattr(controller, 'scan_worker', None)
+    if worker is None or not worker.is_alive():
+        return
+    if worker.paused:
+        worker.resume()
+        controller.view.pause_scan_button.config(text="Pause")
+    else:
+        worker.pause()
+        controller.view.pause_scan_button.config(text="Resume")
+        controller.view.progress_label.config(text=f"Paused. Found {len(controller.all_formulas)} formulas so far.")
+
+
+def cancel_scan(controller):
+    """取消目前的掃描 (worker 停止讀取，已找到的結果保留)"""
+    worker = getattr(controller, 'scan_worker', None)
+    if worker is None or not worker.is_alive():
+        return
+    worker.cancel()
+    controller.view.progress_label.config(text="Cancelling scan...")
+
+
+def _drain_scan_events(controller, worker):
+    """在 UI 執行緒取出 worker 的事件；不作任何 COM 呼叫"""
+    if getattr(controller, 'scan_worker', None) is not worker:
+        return
+    import queue
+
+    rows_added = 0
+    while rows_added < SCAN_ROWS_PER_POLL:
+        try:
+            event = worker.events.get_nowait()
+        except queue.Empty:
+            break
+        kind = event['event']
+        if kind == 'start' and event.get('incremental'):
+            controller.view.progress_label.config(text=f"Checking {event['total']} row blocks for changed formulas...")
+        elif kind == 'start':
+            context = controller.scan_context
+            if context.get('incremental'):
+                # 範圍的欄改變，worker 改為完整掃描：清除舊結果
+                context['incremental'] = False
+                controller.all_formulas = FormulaTable()
+                clear_result_tree(controller)
+            if event.get('sheets') is not None:
+                set_scan_sheets(controller, event['sheets'])
+                controller.view.progress_label.config(text=f"Scanning {len(event['sheets'])} worksheets...")
+            elif event['total'] is None:
+                controller.view.progress_label.config(text="Reading worksheet file...")
+            else:
+                controller.view.progress_label.config(text=f"Found {event['total']} formula cells. Reading...")
+        elif kind == 'block':
+            controller.scan_context.setdefault('blocks', []).append(event)
+            controller.view.progress_bar['value'] = min(int(30 + (event['processed'] / (event['total'] or 1)) * 60), 90)
+            controller.view.progress_label.config(text=f"Rescanning changed rows {event['first_row']}-{event['last_row']}...")
+        elif kind == 'snapshot':
+            controller.scan_context['snapshot'] = event['snapshot']
+        elif kind == 'rows':
+            first_new = len(controller.all_formulas)
+            controller.all_formulas.extend(event['rows'])
+            append_scan_results(controller, controller.all_formulas[first_new:])
+            rows_added += len(event['rows'])
+            if event.get('sheets_total'):
+                controller.view.progress_bar['value'] = min(int(30 + (event['sheets_done'] / event['sheets_total']) * 60), 90)
+            elif event['total'] is not None:
+                total = event['total'] or 1
+                controller.view.progress_bar['value'] = min(int(30 + (event['processed'] / total) * 60), 90)
+            if not worker.paused and not worker.cancelled:
+                if event.get('sheets_total'):
+                    controller.view.progress_label.config(
+                        text=f"Found {len(controller.all_formulas)} formulas. Scanned {event['sheets_done']}/{event['sheets_total']} worksheets (last: {event['sheet']})...")
+                else:
+                    progress_text = f"{event['processed']}/{event['total']}" if event['total'] is not None else f"{event['processed']}"
+                    controller.view.progress_label.config(
+                        text=f"Found {len(controller.all_formulas)} formulas. Processing {progress_text} cells...")
+        elif kind in ('done', 'error'):
+            _finish_scan(controller, worker, event)
+            return
+    controller.root.after(1 if rows_added >= SCAN_ROWS_PER_POLL else SCAN_POLL_MS,
+                          lambda: _drain_scan_events(controller, worker))
+
+
+def _reset_selected_scan_state(controller):
+    for attr in ('scanning_selected_range', 'selected_scan_address', 'selected_scan_count',
+                 'original_user_selection', 'original_user_count'):
+        if hasattr(controller, attr):
+            setattr(controller, attr, False if attr == 'scanning_selected_range' else None)
+
+
+def _finish_scan(controller, worker, event):
+    context = getattr(controller, 'scan_context', None) or {}
+    btn = context.get('btn')
+    scan_info = context.get('scan_info', 'Full Worksheet')
+    scan_range_str = context.get('scan_range_str', '')
+    controller.scan_worker = None
+    controller.scan_context = None
+    _set_scan_controls(controller, running=False)
+    # 背景掃描的 COM 呼叫統計 (EXCEL_TOOLS_COM_TRACE 啟用時)
+    end_operation()
+
+    no_formulas = event.get('reason') == 'no_formulas' or (event['event'] == 'error' and event.get('no_formulas'))
+    if event['event'] == 'error' and not no_formulas:
+        messagebox.showerror("Scan Error", f"An error occurred while scanning formulas: {event['error']}\n\nTraceback:\n{event['traceback']}")
+        if btn is not None:
+            btn.config(state='normal')
+        return
+
+    if no_formulas:
+        if controller.scan_sheets is not None:
+            controller.view.progress_label.config(text=f"No formulas found in any of the {len(controller.scan_sheets)} worksheets.")
+        else:
+            controller.view.progress_label.config(text=f"No formulas found in this worksheet's {scan_info.lower()} ({scan_range_str}).")
+        _reset_selected_scan_state(controller)
+        controller.view.progress_bar['value'] = 100
+        if controller.view.formula_list_label:
+            controller.view.formula_list_label.config(text="Formula List (No Formula Found)")
+        apply_filter(controller)
+        if btn is not None:
+            btn.config(state='normal')
+        if context.get('on_complete'):
+            context['on_complete'](controller)
+        return
+
+    time_taken = event.get('elapsed', 0)
+    if context.get('blocks'):
+        _patch_changed_blocks(controller, context['blocks'])
+    if context.get('snapshot') is not None:
+        controller.scan_snapshot = context['snapshot']
+    if hasattr(controller, 'original_user_selection') and controller.original_user_selection:
+        controller._filter_results_to_original_selection()
+    _reset_selected_scan_state(controller)
+
+    apply_filter(controller)
+    # 大量結果的文字篩選使用 trigram 索引 (背景建立)
+    start_text_index(controller)
+    controller.view.progress_bar['value'] = 100
+    if event.get('incremental') and event.get('reason') == 'completed':
+        controller.view.progress_label.config(text=f"Completed: Rescanned {event['changed_blocks']} of {event['total']} row blocks, {len(controller.all_formulas)} formulas. ({time_taken:.2f} seconds)")
+    elif event.get('reason') == 'cancelled':
+        controller.view.progress_label.config(text=f"Cancelled: Found {len(controller.all_formulas)} formulas before stopping ({event['processed']}/{event['total']} cells, {time_taken:.2f} seconds).")
+    else:
+        controller.view.progress_label.config(text=f"Completed: Found {len(controller.all_formulas)} formulas. (Total scan time: {time_taken:.2f} seconds)")
+    if btn is not None:
+        btn.config(state='normal')
+    if controller.view.formula_list_label:
+        total_count = len(controller.all_formulas)
+        if total_count == 0:
+            controller.view.formula_list_label.config(text="Formula List (No Formula Found)")
+        else:
+            controller.view.formula_list_label.config(text=f"Formula List ({total_count} records):")
+    if context.get('on_complete'):
+        context['on_complete'](controller)
+
+
+def _patch_changed_blocks(controller, blocks):
+    """
+    以增量重新掃描的區塊結果取代 all_formulas 中對應列的舊結果；
+    新結果放在該區塊第一個舊結果的位置 (沒有舊結果時放在最後)，其他結果保持原有次序。
+    """
+    import bisect
+
+    blocks = sorted(blocks, key=lambda block: block['first_row'])
+    starts = [block['first_row'] for block in blocks]
+    placed = set()
+    table = controller.all_formulas
+    row_numbers = table.column('rows')
+    patched = FormulaTable(pools=table.pools)
+    # 沿用的舊結果按段複製 (take)，區塊的新結果在對應位置加入
+    kept = []
+    for i in range(len(table)):
+        row_number = row_numbers[i]
+        index = bisect.bisect_right(starts, row_number) - 1 if row_number else -1
+        if index >= 0 and row_number <= blocks[index]['last_row']:
+            if index not in placed:
+                placed.add(index)
+                patched.extend_from(table, kept)
+                kept = []
+                patched.extend(blocks[index]['rows'])
+            continue
+        kept.append(i)
+    patched.extend_from(table, kept)
+    for index, block in enumerate(blocks):
+        if index not in placed:
+            patched.extend(block['rows'])
+    controller.all_formulas = patched
+
+
+def rescan_incremental(controller, btn=None, scan_mode=None, on_complete=None):
+    """
+    增量重新掃描目前的工作表：只重新讀取公式有改變的列區塊並更新 all_formulas。
+    沒有上次完整掃描的記錄 (或掃描中) 時改為 refresh_data 完整掃描。
+    未改變區塊的結果 (包括數值) 沿用上次掃描。
+    """
+    snapshot = getattr(controller, 'scan_snapshot', None)
+    scan_mode = scan_mode or (snapshot or {}).get('scan_mode') or 'quick'
+    running_worker = getattr(controller, 'scan_worker', None)
+    if snapshot is None or controller.worksheet is None or running_worker is not None:
+        refresh_data(controller, btn, scan_mode=scan_mode, on_complete=on_complete)
+        return
+    if not controller.view.ui_initialized:
+        return
+
+    if btn is not None:
+        btn.config(state='disabled')
+    controller.view.progress_bar['value'] = 0
+    controller.view.progress_label.config(text="Checking worksheet for changed formulas...")
+    begin_operation("Incremental rescan")
+    # 重新計算後顯示文字可能已改變
+    reset_display_text(controller)
+    try:
+        worker = ScanWorker(controller.worksheet, None, scan_mode=scan_mode, snapshot=snapshot)
+    except Exception as e:
+        print(f"Incremental rescan unavailable, running full scan: {e}")
+        controller.scan_snapshot = None
+        if btn is not None:
+            btn.config(state='normal')
+        refresh_data(controller, btn, scan_mode=scan_mode, on_complete=on_complete)
+        return
+    controller.scan_worker = worker
+    controller.scan_context = {'btn': btn, 'scan_info': 'Full Worksheet', 'scan_range_str': 'UsedRange',
+                               'on_complete': on_complete, 'incremental': True}
+    _set_scan_controls(controller, running=True)
+    worker.start()
+    controller.root.after(SCAN_POLL_MS, lambda: _drain_scan_events(controller, worker))
+
+
+def refresh_data_offline(controller, btn, file_path, sheet_name, addresses=None, scan_mode='quick', on_complete=None):
+    """
+    不經 Excel 掃描已關閉的 xlsx/xlsm 檔案 (core.offline_scanner)，結果與 refresh_data 相同地加入列表。
+    addresses: None 為整個工作表；否則為 'A1:C10, E5' 形式的範圍
+    """
+    from core.offline_scanner import OfflineScanWorker
+
+    if not controller.view.ui_initialized:
+        return
+
+    controller.clear_filter_inputs()
+    previous_worker = getattr(controller, 'scan_worker', None)
+    if previous_worker is not None:
+        previous_worker.cancel()
+
+    # 離線結果沒有對應的 Excel 物件；增量重新掃描不適用
+    stop_display_text_worker(controller)
+    controller.xl = None
+    controller.workbook = None
+    controller.worksheet = None
+    controller.scan_snapshot = None
+    controller.last_workbook_path = file_path
+    controller.last_worksheet_name = sheet_name
+    _reset_selected_scan_state(controller)
+
+    display_path = os.path.dirname(file_path)
+    max_path_display_length = 60
+    if len(display_path) > max_path_display_length:
+        display_path = "..." + display_path[-(max_path_display_length-3):]
+    scan_info = "Selected Range" if addresses else "Full Worksheet"
+    scan_range_str = addresses if isinstance(addresses, str) else ", ".join(addresses or []) or "UsedRange"
+    controller.view.file_label.config(text=f"{os.path.basename(file_path)} (offline)", foreground="black")
+    controller.view.path_label.config(text=display_path, foreground="black")
+    controller.view.sheet_label.config(text=sheet_name, foreground="black")
+    controller.view.range_label.config(text=f"Scanning: {scan_info} ({scan_range_str})", foreground="black")
+
+    if btn is not None:
+        btn.config(state='disabled')
+    controller.all_formulas = FormulaTable()
+    controller.address_names = read_file_names(file_path, sheet_name)
+    clear_result_tree(controller)
+    set_scan_sheets(controller, None)
+    controller.view.progress_bar['value'] = 30
+    controller.view.progress_label.config(text="Reading worksheet file...")
+
+    worker = OfflineScanWorker(file_path, sheet_name, addresses=addresses, scan_mode=scan_mode)
+    stop_text_index(controller)
+    controller.scan_worker = worker
+    controller.scan_context = {'btn': btn, 'scan_info': scan_info, 'scan_range_str': scan_range_str,
+                               'on_complete': on_complete, 'incremental': False}
+    _set_scan_controls(controller, running=True)
+    worker.start()
+    controller.root.after(SCAN_POLL_MS, lambda: _drain_scan_events(controller, worker))
+
+
+def _start_workbook_scan(controller, btn, worker, file_path, scan_range_str, on_complete):
+    """整個工作簿掃描的共用部分：清除舊結果、更新標籤並開始 worker"""
+    previous_worker = getattr(controller, 'scan_worker', None)
+    if previous_worker is not None:
+        previous_worker.cancel()
+    # 結果橫跨多個工作表：沒有單一的 worksheet，增量重新掃描不適用
+    controller.worksheet = None
+    controller.scan_snapshot = None
+    controller.last_workbook_path = file_path
+    controller.last_worksheet_name = None
+    _reset_selected_scan_state(controller)
+
+    display_path = os.path.dirname(file_path)
+    max_path_display_length = 60
+    if len(display_path) > max_path_display_length:
+        display_path = "..." + display_path[-(max_path_display_length-3):]
+    scan_info = "Entire Workbook"
+    controller.view.path_label.config(text=display_path, foreground="black")
+    controller.view.sheet_label.config(text="(all worksheets)", foreground="black")
+    controller.view.range_label.config(text=f"Scanning: {scan_info} ({scan_range_str})", foreground="black")
+
+    if btn is not None:
+        btn.config(state='disabled')
+    controller.all_formulas = FormulaTable()
+    clear_result_tree(controller)
+    set_scan_sheets(controller, [])
+    controller.view.progress_bar['value'] = 30
+    controller.view.progress_label.config(text="Listing worksheets...")
+
+    stop_text_index(controller)
+    controller.scan_worker = worker
+    controller.scan_context = {'btn': btn, 'scan_info': scan_info, 'scan_range_str': scan_range_str,
+                               'on_complete': on_complete, 'incremental': False}
+    _set_scan_controls(controller, running=True)
+    worker.start()
+    controller.root.after(SCAN_POLL_MS, lambda: _drain_scan_events(controller, worker))
+
+
+def refresh_workbook(controller, btn, scan_mode='quick', on_complete=None):
+    """
+    掃描使用中 Excel 工作簿的所有工作表。COM 只能在單一執行緒使用，
+    所以由 WorkbookScanWorker 逐個工作表以陣列讀取；結果列包含工作表名稱。
+    """
+    if not controller.view.ui_initialized:
+        return
+
+    begin_operation("Scan workbook")
+    controller.clear_filter_inputs()
+    try:
+        controller.xl = win32com.client.GetActiveObject("Excel.Application")
+        controller.workbook = controller.xl.ActiveWorkbook
+        file_path = controller.workbook.FullName
+        row_mode = 'lazy' if scan_mode == 'full' else scan_mode
+        worker = WorkbookScanWorker(controller.workbook, scan_mode=row_mode)
+        if row_mode == 'lazy':
+            start_display_text_worker(controller, controller.workbook)
+        else:
+            stop_display_text_worker(controller)
+    except Exception as e:
+        messagebox.showerror("Connection Error", f"Could not find an open Excel workbook.\nPlease open a file in Excel and try again.\n\nError: {e}")
+        controller.view.progress_bar['value'] = 0
+        controller.view.progress_label.config(text="No active workbook.")
+        return
+
+    controller.view.file_label.config(text=os.path.basename(file_path), foreground="black")
+    controller.address_names = read_com_names(controller.workbook)
+    _start_workbook_scan(controller, btn, worker, file_path, "UsedRange of each worksheet", on_complete)
+
+
+def refresh_workbook_offline(controller, btn, file_path, scan_mode='quick', workers=None, on_complete=None):
+    """
+    不經 Excel 掃描已關閉檔案的所有工作表；每個工作表由 process pool 的一個 process 解析。
+    workers: process 數目 (None 為 CPU 核心數，1 為不使用 process pool)
+    """
+    from core.offline_scanner import OfflineWorkbookScanWorker
+
+    if not controller.view.ui_initialized:
+        return
+
+    controller.clear_filter_inputs()
+    stop_display_text_worker(controller)
+    controller.xl = None
+    controller.workbook = None
+    controller.view.file_label.config(text=f"{os.path.basename(file_path)} (offline)", foreground="black")
+    worker = OfflineWorkbookScanWorker(file_path, scan_mode=scan_mode, workers=workers)
+    controller.address_names = read_file_names(file_path)
+    _start_workbook_scan(controller, btn, worker, file_path, "UsedRange of each worksheet", on_complete)
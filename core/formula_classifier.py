@@ -1,17 +1,19 @@
 import re
-from .link_analyzer import is_external_link_regex_match
+from utils.formula_tokenizer import extract_references, EXCEL_EXTENSIONS
 
 def classify_formula_type(formula):
     formula_str = str(formula)
     
-    # Use the more comprehensive external link detection
-    if is_external_link_regex_match(formula_str):
+    # 沒有 '!' 的公式不可能有工作表或外部引用，不必進行詞法分析
+    if '!' not in formula_str:
+        return 'formula'
+    
+    # 使用快取的 tokenizer：字串常數內的 '!' 或 [file.xlsx] 不會被誤判
+    references = extract_references(formula_str)
+    if any(ref.workbook is not None or (ref.sheet or '').lower().endswith(EXCEL_EXTENSIONS) for ref in references):
         return 'external link'
     
-    if '!' in formula_str:
+    if any(ref.sheet_prefix for ref in references):
         return 'local link'
     
-    if formula_str.startswith('='):
-        return 'formula'
-    
     return 'formula'
\ No newline at end of file
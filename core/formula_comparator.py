@@ -9,10 +9,11 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import win32com.client
 import re
+import os
 
 from ui.worksheet.controller import WorksheetController
 from ui.worksheet.view import WorksheetView
-from core.excel_scanner import refresh_data
+from core.excel_scanner import refresh_data, refresh_data_offline, refresh_workbook, refresh_workbook_offline
 
 class ExcelFormulaComparator:
     def __init__(self, parent_frame, main_window):
@@ -66,6 +67,10 @@ class ExcelFormulaComparator:
         self.scan_full_button.pack(side=tk.LEFT, padx=2)
         self.scan_selected_button = ttk.Button(first_row, text="Selected Range", command=self.scan_worksheet_selected, style="Large.TButton")
         self.scan_selected_button.pack(side=tk.LEFT, padx=2)
+        self.scan_file_button = ttk.Button(first_row, text="Closed File...", command=self.scan_closed_file, style="Large.TButton")
+        self.scan_file_button.pack(side=tk.LEFT, padx=2)
+        self.scan_workbook_button = ttk.Button(first_row, text="Entire Workbook", command=self.scan_workbook, style="Large.TButton")
+        self.scan_workbook_button.pack(side=tk.LEFT, padx=2)
         
         # Remove second row with Selection info
         
@@ -156,6 +161,65 @@ class ExcelFormulaComparator:
         except Exception as e:
             print("Error getting selection")
     
+    def scan_workbook(self):
+        """掃描使用中 Excel 工作簿的所有工作表"""
+        controller = self._get_active_controller()
+        refresh_workbook(controller, self.scan_workbook_button, scan_mode=self.current_mode)
+
+    def scan_closed_file(self):
+        """不經 Excel 掃描已關閉的檔案：選擇檔案、工作表及範圍 (空白為整個工作表)"""
+        from tkinter import filedialog
+        from core.offline_scanner import list_sheet_names
+
+        file_path = filedialog.askopenfilename(
+            title="Select Workbook to Scan Offline",
+            filetypes=[("Excel Workbook", "*.xlsx *.xlsm"), ("All Files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            sheet_names = list_sheet_names(file_path)
+        except Exception as e:
+            messagebox.showerror("Offline Scan", f"Could not read workbook:\n{e}")
+            return
+        if not sheet_names:
+            messagebox.showwarning("Offline Scan", "The workbook has no worksheets.")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Offline Scan")
+        dialog.transient(self.main_window)
+        dialog.resizable(False, False)
+        frame = ttk.Frame(dialog, padding=10)
+        frame.pack(fill='both', expand=True)
+        ttk.Label(frame, text=os.path.basename(file_path), font=("Arial", 10, "bold")).grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 8))
+        ttk.Label(frame, text="Worksheet:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        # 第一個選項掃描所有工作表 (每個工作表一個 process)
+        all_sheets_option = "(All Worksheets)"
+        sheet_var = tk.StringVar(value=sheet_names[0])
+        ttk.Combobox(frame, textvariable=sheet_var, values=[all_sheets_option] + sheet_names, state="readonly", width=30).grid(row=1, column=1, sticky=tk.W, pady=2)
+        ttk.Label(frame, text="Range (blank = full):").grid(row=2, column=0, sticky=tk.W, pady=2)
+        range_entry = ttk.Entry(frame, width=32)
+        range_entry.grid(row=2, column=1, sticky=tk.W, pady=2)
+
+        def start_scan():
+            addresses = range_entry.get().strip() or None
+            sheet_name = sheet_var.get()
+            dialog.destroy()
+            controller = self._get_active_controller()
+            if sheet_name == all_sheets_option:
+                refresh_workbook_offline(controller, self.scan_file_button, file_path, scan_mode=self.current_mode)
+                return
+            refresh_data_offline(controller, self.scan_file_button, file_path, sheet_name,
+                                 addresses=addresses, scan_mode=self.current_mode)
+
+        button_row = ttk.Frame(frame)
+        button_row.grid(row=3, column=0, columnspan=2, sticky=tk.E, pady=(10, 0))
+        ttk.Button(button_row, text="Scan", command=start_scan).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_row, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT)
+        range_entry.bind("<Return>", lambda event: start_scan())
+        dialog.grab_set()
+
     def update_selection_info(self, controller):
         """Update selection info (now just prints to console since UI element removed)"""
         try:
@@ -195,10 +259,21 @@ class ExcelFormulaComparator:
             messagebox.showwarning("Warning", f"No formulas found in {target_name}. Please scan first.")
             return
 
+        from core.display_text import start_display_text_worker, stop_display_text_worker
+
         target.all_formulas = source.all_formulas.copy()
         target.cell_addresses = source.cell_addresses.copy()
+        # 延遲讀取的顯示文字：目標窗格改為從來源的工作表 / 工作簿讀取，並沿用已讀取的部分
+        if source.display_text_worker is not None and source.display_text_source is not None:
+            start_display_text_worker(target, source.display_text_source)
+        else:
+            stop_display_text_worker(target)
+        target.display_text_cache = dict(source.display_text_cache)
+        # 同步後的結果與目標工作表的掃描記錄不再對應
+        target.scan_snapshot = None
         # We need to call apply_filter on the target's view
-        from core.worksheet_tree import apply_filter
+        from core.worksheet_tree import apply_filter, set_scan_sheets
+        set_scan_sheets(target, source.scan_sheets)
         apply_filter(target) # apply_filter now takes controller as argument
         messagebox.showinfo("Success", f"Synced {len(source.all_formulas)} formulas from {source_name} to {target_name}")
 
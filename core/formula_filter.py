@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+Formula Filter - 公式清單的篩選邏輯 (不依賴 UI)
+
+apply_filter 從介面讀取條件後交由 filter_formulas 處理；
+benchmark 及其他非 UI 的地方可以直接使用同一套篩選邏輯。
+
+輸入為 core.formula_table 的 FormulaTable / FormulaView 時直接使用欄資料：
+文字條件對每個不同的字串只比較一次，地址條件比較列號 / 欄號 (不再以 regex 解析地址)，
+結果為 FormulaView (只記錄列索引)。字串的小寫形式由 StringPool 快取，每個字串只轉換一次；
+pool 已建立 trigram 索引 (core.text_index) 時，文字條件只確認索引給出的候選字串。
+
+FilterEngine 記住上一次的結果：條件變得更窄時 (例如逐字輸入公式條件) 只篩選上一次符合的列。
+Query 欄的查詢 (core.formula_query.compile_query) 在其他條件之後執行，只處理其他條件留下的列。
+"""
+
+import re
+from array import array
+from openpyxl.utils import column_index_from_string
+
+from utils.range_optimizer import parse_excel_address
+from core.formula_table import table_source
+
+_CELL_PATTERN = re.compile(r"([A-Z]+)([0-9]+)")
+
+
+def parse_address_filters(address_filter_str, placeholder_text=None, names=None):
+    """
+    將 "A1, B:C, 3:5, D1:E9, Inputs" 形式的地址條件解析為 parse_excel_address 結果列表。
+    names: 工作簿名稱 (core.address_index.read_com_names 的結果)；名稱展開為其參照的各個範圍，
+    指定工作表的範圍為 ('area', (sheet_name, parse_excel_address 結果))。
+    地址無效時拋出異常 (由呼叫者顯示錯誤)。
+    """
+    address_filter_str = (address_filter_str or '').strip()
+    if not address_filter_str or address_filter_str == placeholder_text:
+        return []
+    address_tokens = [token.strip() for token in address_filter_str.split(',') if token.strip()]
+    parsed_filters = []
+    for token in address_tokens:
+        areas = names.get(token.upper()) if names else None
+        if areas is None:
+            parsed_filters.append(parse_excel_address(token))
+            continue
+        for sheet_name, parsed in areas:
+            parsed_filters.append(parsed if sheet_name is None else ('area', (sheet_name, parsed)))
+    return parsed_filters
+
+
+def address_matches(address, parsed_address_filters, sheet_name=None):
+    """儲存格地址是否符合任何一個地址條件；sheet_name 為資料列的工作表 (指定工作表的名稱範圍只符合該工作表)"""
+    addr_upper = address.replace("$", "").upper()
+    current_cell_match = _CELL_PATTERN.match(addr_upper)
+    if not current_cell_match:
+        return False
+    cell_col_str, cell_row_str = current_cell_match.groups()
+    cell_col_idx = column_index_from_string(cell_col_str)
+    cell_row_idx = int(cell_row_str)
+    for f_type, f_val in parsed_address_filters:
+        if f_type == 'area':
+            area_sheet, area_filter = f_val
+            if (not sheet_name or area_sheet == sheet_name) and address_matches(address, [area_filter]):
+                return True
+        elif f_type == 'cell' and addr_upper == f_val:
+            return True
+        elif f_type == 'row_range':
+            start_r, end_r = map(int, f_val.split(':'))
+            if start_r <= cell_row_idx <= end_r:
+                return True
+        elif f_type == 'col_range':
+            start_c, end_c = f_val.split(':')
+            if column_index_from_string(start_c) <= cell_col_idx <= column_index_from_string(end_c):
+                return True
+        elif f_type == 'range':
+            start_cell, end_cell = f_val.split(':')
+            sc_str, sr_str = _CELL_PATTERN.match(start_cell).groups()
+            ec_str, er_str = _CELL_PATTERN.match(end_cell).groups()
+            if (column_index_from_string(sc_str) <= cell_col_idx <= column_index_from_string(ec_str) and
+                    int(sr_str) <= cell_row_idx <= int(er_str)):
+                return True
+    return False
+
+
+def address_filter_bounds(parsed_address_filters):
+    """
+    地址條件 -> (first_row, first_col, last_row, last_col, sheet_name) 列表
+    (None 為不限；sheet_name 只用於指定工作表的名稱範圍)
+    """
+    bounds = []
+    for f_type, f_val in parsed_address_filters:
+        sheet_name = None
+        if f_type == 'area':
+            sheet_name, (f_type, f_val) = f_val
+        if f_type == 'cell':
+            col_str, row_str = _CELL_PATTERN.match(f_val).groups()
+            row, col = int(row_str), column_index_from_string(col_str)
+            bounds.append((row, col, row, col, sheet_name))
+        elif f_type == 'row_range':
+            start_r, end_r = map(int, f_val.split(':'))
+            bounds.append((start_r, None, end_r, None, sheet_name))
+        elif f_type == 'col_range':
+            start_c, end_c = (column_index_from_string(part) for part in f_val.split(':'))
+            bounds.append((None, start_c, None, end_c, sheet_name))
+        elif f_type == 'range':
+            start_cell, end_cell = f_val.split(':')
+            sc_str, sr_str = _CELL_PATTERN.match(start_cell).groups()
+            ec_str, er_str = _CELL_PATTERN.match(end_cell).groups()
+            bounds.append((int(sr_str), column_index_from_string(sc_str), int(er_str), column_index_from_string(ec_str),
+                           sheet_name))
+    return bounds
+
+
+def _address_bounds_ids(pools, bounds):
+    """address_filter_bounds 的結果中的工作表名稱 -> 工作表編號 (不在結果中的工作表為 -2，不符合任何列)"""
+    resolved = []
+    for first_row, first_col, last_row, last_col, sheet_name in bounds:
+        sheet_id = None
+        if sheet_name:
+            sheet_id = pools.sheets.find(sheet_name)
+            if sheet_id is None:
+                sheet_id = -2
+        resolved.append((first_row, first_col, last_row, last_col, sheet_id))
+    return resolved
+
+
+def _matching_ids(pool, text, candidates=None):
+    """
+    pool 中包含 text (不分大小寫) 的字串編號集合；text 為空時返回 None (不篩選)。
+    candidates: 只測試這些編號 (上一次較短的文字所符合的編號)
+    """
+    if not text:
+        return None
+    lower = pool.lower_strings()
+    if candidates is not None:
+        return {index for index in candidates if text in lower[index]}
+    text_index = pool.text_index
+    if text_index is not None:
+        ids = text_index.search(text, lower)
+        if ids is not None:
+            return ids
+    return {index for index, value in enumerate(lower) if text in value}
+
+
+def _match_table(table, indices, criteria, previous_ids=None, use_index=False):
+    """
+    按 criteria 篩選 table 的列索引 (不排序)。
+    previous_ids: 上一次各文字條件符合的字串編號 ({欄名: set})，新文字包含舊文字時只測試這些編號
+    use_index: 地址條件使用 table 的 AddressIndex (FormulaTable.address_index，每份資料建立一次)
+
+    Returns:
+        (array 列索引, 各文字條件符合的字串編號 {欄名: set 或 None})
+    """
+    pools = table.pools
+    types, sheets = table.column('types'), table.column('sheets')
+    row_numbers, col_numbers = table.column('rows'), table.column('cols')
+    previous_ids = previous_ids or {}
+
+    # 每個條件依次縮小候選列索引
+    selected = indices
+    address_bounds = None
+    if criteria['parsed_address_filters']:
+        address_bounds = _address_bounds_ids(pools, address_filter_bounds(criteria['parsed_address_filters']))
+    if address_bounds and use_index:
+        # 以索引取出地址範圍內的列 (不逐列比較)，再以其他條件篩選
+        address_index = table.address_index()
+        address_ids = set()
+        for bound in address_bounds:
+            address_ids.update(address_index.query(*bound))
+        if isinstance(indices, range):
+            selected = [i for i in sorted(address_ids) if i in indices]
+        else:
+            selected = [i for i in indices if i in address_ids]
+        address_bounds = None
+    type_flags = criteria['type_flags']
+    hidden_types = {index for index, name in enumerate(pools.types.strings) if not type_flags.get(name, True)}
+    if hidden_types:
+        selected = [i for i in selected if types[i] not in hidden_types]
+    matched_ids = {}
+    for name, pool, column_name in _TEXT_CRITERIA:
+        ids = matched_ids[name] = _matching_ids(pool(pools), criteria[name], previous_ids.get(name))
+        if ids is not None:
+            column = table.column(column_name)
+            selected = [i for i in selected if column[i] in ids]
+    sheet_name = criteria['sheet_name']
+    if sheet_name:
+        sheet_id = pools.sheets.find(sheet_name)
+        selected = [i for i in selected if sheets[i] < 0 or sheets[i] == sheet_id]
+    if address_bounds:
+        selected = [i for i in selected if row_numbers[i] and any(
+            (first_row is None or first_row <= row_numbers[i] <= last_row) and
+            (first_col is None or first_col <= col_numbers[i] <= last_col) and
+            (sheet_id is None or sheets[i] < 0 or sheets[i] == sheet_id)
+            for first_row, first_col, last_row, last_col, sheet_id in address_bounds)]
+    query = criteria['query']
+    if query is not None:
+        # 沒有其他條件時 selected 仍是整個 table 的 range，查詢可使用索引
+        selected = query.select(table, selected if use_index else list(selected))
+    return array('I', selected), matched_ids
+
+
+def _sort_table_indices(table, selected, sort_index, sort_reverse):
+    if sort_index is None:
+        return selected
+    pools = table.pools
+    sheets = table.column('sheets')
+    if sort_index == 1:
+        key = table.address
+    elif sort_index == 5:
+        sheet_names = pools.sheets.strings
+        key = lambda i: sheet_names[sheets[i]] if sheets[i] >= 0 else ''
+    else:
+        column_name, strings = {0: ('types', pools.types.strings), 2: ('formulas', pools.formulas.strings),
+                                3: ('results', pools.values.strings), 4: ('displays', pools.values.strings)}[sort_index]
+        column = table.column(column_name)
+        key = lambda i: strings[column[i]]
+    return array('I', sorted(selected, key=key, reverse=sort_reverse))
+
+
+# 文字條件：(criteria 鍵, TablePools 中的 pool, 欄名)
+_TEXT_CRITERIA = (
+    ('formula_text', lambda pools: pools.formulas, 'formulas'),
+    ('result_text', lambda pools: pools.values, 'results'),
+    ('display_text', lambda pools: pools.values, 'displays'),
+)
+
+
+def _criteria(type_flags, formula_text, result_text, display_text, parsed_address_filters, sheet_name, query=None):
+    return {
+        'type_flags': type_flags or {},
+        'formula_text': (formula_text or '').lower(),
+        'result_text': (result_text or '').lower(),
+        'display_text': (display_text or '').lower(),
+        'parsed_address_filters': list(parsed_address_filters or []),
+        'sheet_name': sheet_name or None,
+        'query': query,
+    }
+
+
+def _is_narrower(criteria, previous):
+    """criteria 的結果是否必定是 previous 結果的子集"""
+    new_flags, old_flags = criteria['type_flags'], previous['type_flags']
+    for name in set(new_flags) | set(old_flags):
+        if new_flags.get(name, True) and not old_flags.get(name, True):
+            return False
+    for name, _, _ in _TEXT_CRITERIA:
+        if previous[name] not in criteria[name]:
+            return False
+    if previous['sheet_name'] and criteria['sheet_name'] != previous['sheet_name']:
+        return False
+    if previous['parsed_address_filters'] and criteria['parsed_address_filters'] != previous['parsed_address_filters']:
+        return False
+    if previous['query'] is not None and criteria['query'] != previous['query']:
+        return False
+    return True
+
+
+class FilterEngine:
+    """
+    記住上一次的篩選結果的 filter_formulas。
+    同一份掃描結果的新條件比上一次更窄時 (例如在文字條件後加字、取消勾選類型、加上地址條件)，
+    只在上一次符合的列中篩選，文字條件也只測試上一次符合的字串；否則重新篩選全部列。
+    輸入不是 FormulaTable 時與 filter_formulas 相同。
+    """
+
+    def __init__(self):
+        self._table = None
+        self._length = 0
+        self._criteria = None
+        self._selected = None
+        self._matched_ids = None
+
+    def reset(self):
+        self._table = None
+        self._criteria = None
+        self._selected = None
+        self._matched_ids = None
+
+    def filter(self, all_formulas, type_flags=None, formula_text='', result_text='', display_text='',
+               parsed_address_filters=None, sort_index=None, sort_reverse=False, sheet_name=None, query=None):
+        """參數及返回值與 filter_formulas 相同"""
+        from core.formula_table import FormulaTable, FormulaView
+
+        if not isinstance(all_formulas, FormulaTable):
+            self.reset()
+            return filter_formulas(all_formulas, type_flags, formula_text, result_text, display_text,
+                                   parsed_address_filters, sort_index, sort_reverse, sheet_name, query)
+        table = all_formulas
+        criteria = _criteria(type_flags, formula_text, result_text, display_text, parsed_address_filters, sheet_name,
+                             query)
+        if (self._table is not None and table.same_data(self._table, self._length)
+                and _is_narrower(criteria, self._criteria)):
+            match_criteria = criteria
+            if criteria['parsed_address_filters'] and criteria['parsed_address_filters'] == self._criteria['parsed_address_filters']:
+                # 上一次的結果已符合同樣的地址條件
+                match_criteria = dict(criteria, parsed_address_filters=[])
+            if criteria['query'] is not None and criteria['query'] == self._criteria['query']:
+                match_criteria = dict(match_criteria, query=None)
+            selected, matched_ids = _match_table(table, self._selected, match_criteria, self._matched_ids,
+                                                 use_index=True)
+        else:
+            selected, matched_ids = _match_table(table, range(len(table)), criteria, use_index=True)
+        # FormulaView 記錄 table 當時的欄資料；table 之後被清除也不影響比較
+        self._table = FormulaView(table, selected).table
+        self._length = len(table)
+        self._criteria = criteria
+        self._selected = selected
+        self._matched_ids = matched_ids
+        # 返回的 view 可能被修改 (掃描時加入新的列)，不與快取共用 array
+        return FormulaView(table, _sort_table_indices(table, array('I', selected), sort_index, sort_reverse))
+
+
+def filter_formulas(all_formulas, type_flags=None, formula_text='', result_text='', display_text='',
+                    parsed_address_filters=None, sort_index=None, sort_reverse=False, sheet_name=None, query=None):
+    """
+    篩選 (type, address, formula, result, display_value) 公式列表。
+    整個工作簿掃描的資料列最後另有工作表名稱 (type, ..., display_value, sheet)。
+
+    Args:
+        all_formulas: 掃描結果列表
+        type_flags: {'formula': bool, 'local link': bool, 'external link': bool}；None 為全部顯示
+        formula_text / result_text / display_text: 需包含的文字 (不分大小寫)
+        parsed_address_filters: parse_address_filters 的結果
+        sort_index: 排序欄位索引 (None 為不排序)
+        sort_reverse: 是否倒序
+        sheet_name: 只保留此工作表的資料列 (None 為全部；沒有工作表欄的資料列不受影響)
+        query: core.formula_query.compile_query 的結果 (None 為不使用)
+
+    Returns:
+        list: 符合條件的資料列 (原有的 tuple)；輸入為 FormulaTable / FormulaView 時為 FormulaView
+    """
+    source = table_source(all_formulas)
+    if source is not None:
+        from core.formula_table import FormulaTable, FormulaView
+
+        table = source[0]
+        criteria = _criteria(type_flags, formula_text, result_text, display_text, parsed_address_filters, sheet_name,
+                             query)
+        selected = _match_table(table, source[1], criteria, use_index=isinstance(all_formulas, FormulaTable))[0]
+        return FormulaView(table, _sort_table_indices(table, selected, sort_index, sort_reverse))
+
+    type_flags = type_flags or {}
+    formula_text = (formula_text or '').lower()
+    result_text = (result_text or '').lower()
+    display_text = (display_text or '').lower()
+
+    filtered_formulas = []
+    for formula_data in all_formulas:
+        if len(formula_data) < 5: continue
+        formula_type, address, formula_content, result_val, display_val = formula_data[:5]
+        if not type_flags.get(formula_type, True): continue
+        if formula_text and formula_text not in str(formula_content).lower(): continue
+        if result_text and result_text not in str(result_val).lower(): continue
+        if display_text and display_text not in str(display_val).lower(): continue
+        if sheet_name and len(formula_data) > 5 and formula_data[5] != sheet_name: continue
+        if parsed_address_filters and not address_matches(address, parsed_address_filters,
+                                                          formula_data[5] if len(formula_data) > 5 else None): continue
+        if query is not None and not query.match_row(formula_data): continue
+        filtered_formulas.append(formula_data)
+
+    if sort_index is not None:
+        filtered_formulas.sort(key=lambda x: str(x[sort_index]) if sort_index < len(x) else '', reverse=sort_reverse)
+    return filtered_formulas
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Formula Patterns - 以 R1C1 文字將向下 / 向右複製的公式歸為同一組
+
+=B2*C2、=B3*C3 ... 的 R1C1 文字都是 =RC[-2]*RC[-1]，歸為一個 pattern。
+分類、引用解析及外部連結擷取只需對每個 pattern 的第一條公式進行一次
+(工作表前綴在同一 pattern 內必定相同)，列表亦只需為每個 pattern 顯示一列。
+
+R1C1 文字由 A1 公式及儲存格位置推導 (utils.formula_tokenizer.formula_to_r1c1)，
+所以 Excel 掃描、離線掃描及匯入 / 同步的結果都可以使用，不需要額外的 COM 讀取。
+
+FormulaTable 的每列 R1C1 pattern 編號由 PatternIndex 計算 (每份掃描結果一次，由
+FormulaTable.pattern_index 快取)；分組時只按編號把篩選結果的列索引分組，篩選 / 排序不需重新推導。
+"""
+
+import re
+from array import array
+
+from utils.formula_tokenizer import formula_to_r1c1, external_link_paths
+from core.formula_table import FormulaView, table_source
+
+_ADDRESS_PATTERN = re.compile(r"\$?([A-Za-z]{1,3})\$?(\d+)$")
+
+# 範圍文字過長時 (例如分散的儲存格) Range() 無法使用，改用第一個儲存格
+MAX_RANGE_ADDRESS_LENGTH = 255
+
+
+class FormulaPattern:
+    """
+    一組 R1C1 文字相同的公式儲存格；rows 為掃描結果列 (按出現次序)。
+    view: FormulaTable 的列索引 (FormulaView)；rows 在第一次存取時才建立，之後返回同一組 tuple
+    """
+
+    __slots__ = ('r1c1', 'sheet', 'view', '_rows', '_coverage')
+
+    def __init__(self, r1c1, sheet, view=None):
+        self.r1c1 = r1c1
+        self.sheet = sheet
+        self.view = view
+        self._rows = [] if view is None else None
+        self._coverage = None
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            self._rows = list(self.view)
+        return self._rows
+
+    @property
+    def first(self):
+        if self._rows is None:
+            return self.view[0]
+        return self._rows[0]
+
+    @property
+    def formula_type(self):
+        return self.first[0]
+
+    @property
+    def formula(self):
+        return self.first[2]
+
+    @property
+    def count(self):
+        return len(self.view) if self._rows is None else len(self._rows)
+
+    @property
+    def addresses(self):
+        return [row[1] for row in self.rows]
+
+    @property
+    def coverage(self):
+        """覆蓋範圍的精簡文字，例如 'B2:B100000' 或 'B2:D50,F2:F50'"""
+        if self._coverage is None:
+            self._coverage = cells_to_ranges(self._cells())
+        return self._coverage
+
+    def _cells(self):
+        if self.view is None:
+            return (parse_address(address) for address in self.addresses)
+        # 直接使用 table 的列號 / 欄號 (列號 0 為非標準地址)
+        table = self.view.table
+        row_numbers, col_numbers = table.column('rows'), table.column('cols')
+        return ((row_numbers[i], col_numbers[i]) for i in self.view.indices if row_numbers[i])
+
+    @property
+    def range_address(self):
+        """可以傳給 Range() 的地址 (覆蓋範圍過長時為第一個儲存格)"""
+        coverage = self.coverage
+        if len(coverage) <= MAX_RANGE_ADDRESS_LENGTH:
+            return coverage
+        return self.first[1].replace('$', '')
+
+    def selection_addresses(self):
+        """供 Range() 選取的地址列表：覆蓋範圍夠短時為一個範圍，否則為各儲存格"""
+        coverage = self.coverage
+        if len(coverage) <= MAX_RANGE_ADDRESS_LENGTH:
+            return [coverage]
+        return self.addresses
+
+    def external_links(self):
+        """外部連結路徑 (只分析第一條公式)"""
+        return external_link_paths(str(self.formula))
+
+
+_column_numbers = {}
+_column_letters = {}
+
+
+def _column_number(letters):
+    number = _column_numbers.get(letters)
+    if number is None:
+        number = 0
+        for char in letters.upper():
+            number = number * 26 + ord(char) - 64
+        _column_numbers[letters] = number
+    return number
+
+
+def _column_letter(number):
+    letters = _column_letters.get(number)
+    if letters is None:
+        from openpyxl.utils import get_column_letter
+        letters = _column_letters[number] = get_column_letter(number)
+    return letters
+
+
+def parse_address(address):
+    """'$B$12' -> (12, 2)；無法解析時返回 None"""
+    match = _ADDRESS_PATTERN.match(str(address))
+    if not match:
+        return None
+    return int(match.group(2)), _column_number(match.group(1))
+
+
+def cells_to_ranges(cells):
+    """
+    將 (row, column) 儲存格集合合併為矩形範圍文字。
+    先把每欄的連續列合併為區段，再把相鄰欄中列區段相同的合併為矩形；O(n log n)。
+    """
+    rows_by_column = {}
+    for cell in cells:
+        if cell is not None:
+            rows_by_column.setdefault(cell[1], []).append(cell[0])
+
+    # (first_row, last_row) -> [column, ...]
+    columns_by_run = {}
+    for column, rows in rows_by_column.items():
+        rows.sort()
+        run_start = previous = rows[0]
+        for row in rows[1:]:
+            if row == previous:
+                continue
+            if row != previous + 1:
+                columns_by_run.setdefault((run_start, previous), []).append(column)
+                run_start = row
+            previous = row
+        columns_by_run.setdefault((run_start, previous), []).append(column)
+
+    rectangles = []
+    for (first_row, last_row), columns in columns_by_run.items():
+        columns.sort()
+        start_column = previous = columns[0]
+        for column in columns[1:] + [None]:
+            if column is not None and column == previous + 1:
+                previous = column
+                continue
+            rectangles.append((start_column, first_row, previous, last_row))
+            start_column = previous = column
+
+    parts = []
+    for first_column, first_row, last_column, last_row in sorted(rectangles):
+        top_left = f"{_column_letter(first_column)}{first_row}"
+        if (first_column, first_row) == (last_column, last_row):
+            parts.append(top_left)
+        else:
+            parts.append(f"{top_left}:{_column_letter(last_column)}{last_row}")
+    return ','.join(parts)
+
+
+class PatternIndex:
+    """FormulaTable 每列的 R1C1 pattern 編號 (相同 R1C1 文字的列編號相同)"""
+
+    __slots__ = ('ids', 'r1c1', '_keys')
+
+    def __init__(self):
+        self.ids = array('I')
+        # pattern 編號 -> R1C1 文字
+        self.r1c1 = []
+        self._keys = {}
+
+    def update(self, table):
+        """計算 table 新增的列 (之前已計算的列不重新推導)"""
+        ids = self.ids
+        if len(ids) >= len(table):
+            return
+        formulas, row_numbers, col_numbers = table.column('formulas'), table.column('rows'), table.column('cols')
+        strings = table.pools.formulas.strings
+        keys, r1c1_texts = self._keys, self.r1c1
+        for index in range(len(ids), len(table)):
+            formula = strings[formulas[index]]
+            row = row_numbers[index]
+            r1c1 = formula_to_r1c1(formula, row, col_numbers[index]) if row else formula
+            pattern_id = keys.get(r1c1)
+            if pattern_id is None:
+                pattern_id = keys[r1c1] = len(r1c1_texts)
+                r1c1_texts.append(r1c1)
+            ids.append(pattern_id)
+
+
+def _group_table_patterns(table, indices):
+    pattern_index = table.pattern_index()
+    pattern_ids, sheets = pattern_index.ids, table.column('sheets')
+    groups = {}
+    for i in indices:
+        key = (sheets[i], pattern_ids[i])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = array('I')
+        group.append(i)
+    sheet_names = table.pools.sheets.strings
+    return [FormulaPattern(pattern_index.r1c1[pattern_id], sheet_names[sheet] if sheet >= 0 else None,
+                           FormulaView(table, group))
+            for (sheet, pattern_id), group in groups.items()]
+
+
+def group_formula_patterns(formula_rows):
+    """
+    將掃描結果列按 (工作表, R1C1 文字) 分組。
+
+    Args:
+        formula_rows: (type, address, formula, result, display_value[, sheet]) 列表；
+                      FormulaTable / FormulaView 時使用快取的 pattern 編號 (不重新推導 R1C1)
+
+    Returns:
+        list: FormulaPattern 列表，按每組第一個儲存格的出現次序
+    """
+    source = table_source(formula_rows)
+    if source is not None:
+        return _group_table_patterns(*source)
+    patterns = {}
+    for formula_data in formula_rows:
+        if len(formula_data) < 5:
+            continue
+        formula = str(formula_data[2])
+        position = parse_address(formula_data[1])
+        r1c1 = formula_to_r1c1(formula, *position) if position else formula
+        sheet = formula_data[5] if len(formula_data) > 5 else None
+        key = (sheet, r1c1)
+        pattern = patterns.get(key)
+        if pattern is None:
+            pattern = patterns[key] = FormulaPattern(r1c1, sheet)
+        pattern.rows.append(formula_data)
+    return list(patterns.values())
+
+
+def pattern_link_addresses(patterns):
+    """
+    外部連結 -> 地址列表；每個 pattern 只擷取一次連結，地址盡量以範圍表示。
+
+    Returns:
+        dict: {link_path: [address, ...]}
+    """
+    link_addresses = {}
+    for pattern in patterns:
+        for link in dict.fromkeys(pattern.external_links()):
+            link_addresses.setdefault(link, []).extend(pattern.selection_addresses())
+    return link_addresses
@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+"""
+Formula Query - 公式列表的查詢語言
+
+Query 欄的查詢只編譯一次，成為在 FormulaTable 欄資料上執行的查詢計劃，例如：
+    type:external AND formula~/VLOOKUP|INDEX/ AND NOT sheet:Archive AND row:100..500
+
+語法：
+    field:文字      包含該文字 (不分大小寫)；type: 比較類型名稱的開頭，sheet: 為完整的工作表名稱
+    field=文字      完全相同 (不分大小寫)
+    field~/regex/   regex (不分大小寫)
+    欄位            formula (f)、result (r / value)、display (d)、type (t)、sheet (s)、
+                    address (addr / a)、row、col
+    address:        與 Address 篩選相同 (A1:C3、B:D、10:20、工作簿名稱)
+    row: / col:     100..500、B..D、2..4 (可省略一端，例如 row:1000..)
+    沒有欄位的詞    公式包含該文字
+    組合            AND (可省略)、OR、NOT (或 -)、括號；文字包含空格或右括號時以 "..." 括住
+
+執行方式：
+    - 文字條件先在 StringPool 的不同字串上求出符合的編號 (trigram 索引可用時使用索引)，
+      再以整數比較篩選列；候選列很少時只測試候選列用到的字串
+    - address / row / col 條件在範圍未縮小時使用 AddressIndex
+    - AND 先執行有索引或較便宜的條件，之後的條件只處理已留下的列
+"""
+
+import re
+
+from core.formula_filter import parse_address_filters, address_filter_bounds, _address_bounds_ids
+from openpyxl.utils import column_index_from_string
+
+_FIELDS = {
+    'formula': 'formula', 'f': 'formula',
+    'result': 'result', 'r': 'result', 'value': 'result',
+    'display': 'display', 'd': 'display',
+    'type': 'type', 't': 'type',
+    'sheet': 'sheet', 's': 'sheet',
+    'address': 'address', 'addr': 'address', 'a': 'address',
+    'row': 'row',
+    'col': 'col', 'column': 'col',
+}
+
+# 文字欄位 -> (FormulaTable 欄名, TablePools 屬性, 結果 tuple 的索引)
+_TEXT_FIELDS = {
+    'formula': ('formulas', 'formulas', 2),
+    'result': ('results', 'values', 3),
+    'display': ('displays', 'values', 4),
+    'type': ('types', 'types', 0),
+    'sheet': ('sheets', 'sheets', 5),
+}
+
+_KEYWORDS = ('AND', 'OR', 'NOT')
+_FIELD_PATTERN = re.compile(r"([A-Za-z_]+)([:~=])")
+_CELL_PATTERN = re.compile(r"\$?([A-Za-z]{1,3})\$?([0-9]+)$")
+
+# 條件的相對成本 (AND 按成本由低至高執行)
+_COST_INDEX = 0
+_COST_SMALL_POOL = 1
+_COST_TEXT = 2
+_COST_REGEX = 3
+
+
+class QueryError(ValueError):
+    """查詢語法錯誤"""
+
+
+# --- 查詢計劃 ---
+class _TextPredicate:
+    """文字欄位的條件 (contains / equals / prefix / regex)"""
+
+    def __init__(self, field, kind, pattern):
+        self.column, self.pool, self.row_index = _TEXT_FIELDS[field]
+        self.kind = kind
+        if kind == 'regex':
+            try:
+                self.regex = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                raise QueryError(f"Invalid regular expression /{pattern}/: {e}")
+            self.cost = _COST_REGEX
+        else:
+            self.pattern = pattern.lower()
+            self.cost = _COST_SMALL_POOL if field in ('type', 'sheet') else _COST_TEXT
+
+    def _test(self, text):
+        kind = self.kind
+        if kind == 'regex':
+            return self.regex.search(text) is not None
+        text = text.lower()
+        if kind == 'contains':
+            return self.pattern in text
+        if kind == 'prefix':
+            return text.startswith(self.pattern)
+        return text == self.pattern
+
+    def _matching_ids(self, pool, subset):
+        """pool 中符合的字串編號；subset 不為 None 時只測試這些編號"""
+        if self.kind == 'contains':
+            lower = pool.lower_strings()
+            if subset is None and pool.text_index is not None:
+                ids = pool.text_index.search(self.pattern, lower)
+                if ids is not None:
+                    return ids
+            needle = self.pattern
+            candidates = range(len(lower)) if subset is None else subset
+            return {index for index in candidates if needle in lower[index]}
+        strings = pool.strings
+        candidates = range(len(strings)) if subset is None else subset
+        return {index for index in candidates if self._test(strings[index])}
+
+    def select(self, table, candidates):
+        column = table.column(self.column)
+        pool = getattr(table.pools, self.pool)
+        if candidates is None:
+            ids = self._matching_ids(pool, None)
+            return [i for i in range(len(column)) if column[i] in ids]
+        # 候選列很少時只測試它們用到的字串
+        subset = {column[i] for i in candidates} if len(candidates) * 4 < len(pool) else None
+        if subset is not None:
+            subset.discard(-1)
+        ids = self._matching_ids(pool, subset)
+        return [i for i in candidates if column[i] in ids]
+
+    def match_row(self, row):
+        if self.row_index >= len(row) or row[self.row_index] is None:
+            return False
+        return self._test(str(row[self.row_index]))
+
+
+def _in_bounds(row, col, first_row, first_col, last_row, last_col):
+    return ((first_row is None or first_row <= row) and (last_row is None or row <= last_row) and
+            (first_col is None or first_col <= col) and (last_col is None or col <= last_col))
+
+
+class _AddressPredicate:
+    """地址範圍條件 (address / row / col)；bounds 為 address_filter_bounds 格式"""
+
+    cost = _COST_INDEX
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+
+    def select(self, table, candidates):
+        bounds = _address_bounds_ids(table.pools, self.bounds)
+        if candidates is None:
+            address_index = table.address_index()
+            ids = set()
+            for bound in bounds:
+                ids.update(address_index.query(*bound))
+            return sorted(ids)
+        rows, cols, sheets = table.column('rows'), table.column('cols'), table.column('sheets')
+        return [i for i in candidates if rows[i] and any(
+            _in_bounds(rows[i], cols[i], first_row, first_col, last_row, last_col) and
+            (sheet_id is None or sheets[i] < 0 or sheets[i] == sheet_id)
+            for first_row, first_col, last_row, last_col, sheet_id in bounds)]
+
+    def match_row(self, row):
+        match = _CELL_PATTERN.match(str(row[1]))
+        if not match:
+            return False
+        row_number, col_number = int(match.group(2)), column_index_from_string(match.group(1).upper())
+        row_sheet = row[5] if len(row) > 5 and row[5] else None
+        for first_row, first_col, last_row, last_col, sheet_name in self.bounds:
+            if (_in_bounds(row_number, col_number, first_row, first_col, last_row, last_col) and
+                    (not sheet_name or not row_sheet or sheet_name == row_sheet)):
+                return True
+        return False
+
+
+class _AndNode:
+    def __init__(self, children):
+        # 有索引或較便宜的條件先執行，之後的條件只處理留下的列
+        self.children = sorted(children, key=lambda child: child.cost)
+        self.cost = self.children[0].cost
+
+    def select(self, table, candidates):
+        for child in self.children:
+            candidates = child.select(table, candidates)
+            if not candidates:
+                return []
+        return candidates
+
+    def match_row(self, row):
+        return all(child.match_row(row) for child in self.children)
+
+
+class _OrNode:
+    def __init__(self, children):
+        self.children = children
+        self.cost = max(child.cost for child in children)
+
+    def select(self, table, candidates):
+        matched = set()
+        for child in self.children:
+            matched.update(child.select(table, candidates))
+        base = range(len(table)) if candidates is None else candidates
+        return [i for i in base if i in matched]
+
+    def match_row(self, row):
+        return any(child.match_row(row) for child in self.children)
+
+
+class _NotNode:
+    def __init__(self, child):
+        self.child = child
+        self.cost = child.cost + 1
+
+    def select(self, table, candidates):
+        excluded = set(self.child.select(table, candidates))
+        base = range(len(table)) if candidates is None else candidates
+        return [i for i in base if i not in excluded]
+
+    def match_row(self, row):
+        return not self.child.match_row(row)
+
+
+class FormulaQuery:
+    """編譯後的查詢 (compile_query 的結果)；相同文字的查詢視為相等"""
+
+    def __init__(self, text, plan):
+        self.text = text
+        self.plan = plan
+
+    def select(self, table, indices):
+        """table 中符合查詢的列索引 (按 indices 的次序)；indices 為整個 table 的 range 時可使用索引"""
+        candidates = None if isinstance(indices, range) and indices == range(len(table)) else list(indices)
+        return self.plan.select(table, candidates)
+
+    def match_row(self, row):
+        """單一結果 tuple 是否符合 (不是 FormulaTable 的結果列表使用)"""
+        return self.plan.match_row(row)
+
+    def __eq__(self, other):
+        return isinstance(other, FormulaQuery) and other.text == self.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __repr__(self):
+        return f"<FormulaQuery {self.text!r}>"
+
+
+# --- 語法分析 ---
+def _read_quoted(text, position):
+    """position 為左引號；返回 (文字, 右引號之後的位置)"""
+    chars = []
+    position += 1
+    while position < len(text):
+        char = text[position]
+        if char == '\\' and position + 1 < len(text) and text[position + 1] in '"\\':
+            chars.append(text[position + 1])
+            position += 2
+            continue
+        if char == '"':
+            return ''.join(chars), position + 1
+        chars.append(char)
+        position += 1
+    raise QueryError("Missing closing quote.")
+
+
+def _read_value(text, position):
+    """返回 (文字, 下一個位置, 是否有引號)；沒有引號的文字到空白或右括號為止"""
+    if position < len(text) and text[position] == '"':
+        value, position = _read_quoted(text, position)
+        return value, position, True
+    start = position
+    while position < len(text) and not text[position].isspace() and text[position] != ')':
+        position += 1
+    return text[start:position], position, False
+
+
+def _read_regex(text, position):
+    """position 為開始的 '/'；'\\/' 代表 '/'"""
+    chars = []
+    position += 1
+    while position < len(text):
+        char = text[position]
+        if char == '\\' and position + 1 < len(text) and text[position + 1] == '/':
+            chars.append('/')
+            position += 2
+            continue
+        if char == '/':
+            return ''.join(chars), position + 1
+        chars.append(char)
+        position += 1
+    raise QueryError("Missing closing '/' in regular expression.")
+
+
+def _tokenize(text):
+    """返回 token 列表：('(',)、(')',)、('AND',)、('OR',)、('NOT',)、('TERM', field, operator, value)"""
+    tokens = []
+    position = 0
+    while position < len(text):
+        char = text[position]
+        if char.isspace():
+            position += 1
+            continue
+        if char in '()':
+            tokens.append((char,))
+            position += 1
+            continue
+        if char == '-' and position + 1 < len(text) and not text[position + 1].isspace():
+            tokens.append(('NOT',))
+            position += 1
+            continue
+        match = _FIELD_PATTERN.match(text, position)
+        if match and match.group(1).lower() in _FIELDS:
+            field, operator = _FIELDS[match.group(1).lower()], match.group(2)
+            position = match.end()
+            if operator == '~' and position < len(text) and text[position] == '/':
+                value, position = _read_regex(text, position)
+            else:
+                value, position, _ = _read_value(text, position)
+            if not value:
+                raise QueryError(f"Missing value after '{match.group(0)}'.")
+            tokens.append(('TERM', field, operator, value))
+            continue
+        value, position, quoted = _read_value(text, position)
+        if not quoted and value.upper() in _KEYWORDS:
+            tokens.append((value.upper(),))
+        elif value or quoted:
+            tokens.append(('TERM', 'formula', ':', value))
+    return tokens
+
+
+def _parse_number_range(value, parse_bound):
+    """'100..500' / '100' / '100..' / '..500' -> (first, last)；None 為不限"""
+    if '..' in value:
+        first_text, last_text = value.split('..', 1)
+    else:
+        first_text = last_text = value
+    first = parse_bound(first_text) if first_text else None
+    last = parse_bound(last_text) if last_text else None
+    if first is not None and last is not None and first > last:
+        first, last = last, first
+    return first, last
+
+
+def _row_number(text):
+    if not text.isdigit():
+        raise QueryError(f"Invalid row number '{text}'.")
+    return int(text)
+
+
+def _column_number(text):
+    if text.isdigit():
+        return int(text)
+    try:
+        return column_index_from_string(text.upper())
+    except ValueError:
+        raise QueryError(f"Invalid column '{text}'.")
+
+
+def _compile_term(field, operator, value, names):
+    if field in ('address', 'row', 'col'):
+        if operator == '~':
+            raise QueryError(f"'{field}' does not support regular expressions.")
+        if field == 'row':
+            first, last = _parse_number_range(value, _row_number)
+            return _AddressPredicate([(first, None, last, None, None)])
+        if field == 'col':
+            first, last = _parse_number_range(value, _column_number)
+            return _AddressPredicate([(None, first, None, last, None)])
+        try:
+            return _AddressPredicate(address_filter_bounds(parse_address_filters(value, names=names)))
+        except ValueError as e:
+            raise QueryError(str(e))
+    if operator == '~':
+        return _TextPredicate(field, 'regex', value)
+    if operator == '=':
+        return _TextPredicate(field, 'equals', value)
+    if field == 'type':
+        return _TextPredicate(field, 'prefix', value)
+    if field == 'sheet':
+        return _TextPredicate(field, 'equals', value)
+    return _TextPredicate(field, 'contains', value)
+
+
+class _Parser:
+    """or_expr := and_expr (OR and_expr)* ; and_expr := not_expr ([AND] not_expr)* ; not_expr := NOT not_expr | atom"""
+
+    def __init__(self, tokens, names):
+        self.tokens = tokens
+        self.position = 0
+        self.names = names
+
+    def _peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def parse(self):
+        node = self._or_expr()
+        if self.position < len(self.tokens):
+            raise QueryError(f"Unexpected '{self._peek()}'.")
+        return node
+
+    def _or_expr(self):
+        children = [self._and_expr()]
+        while self._peek() == 'OR':
+            self.position += 1
+            children.append(self._and_expr())
+        return children[0] if len(children) == 1 else _OrNode(children)
+
+    def _and_expr(self):
+        children = [self._not_expr()]
+        while self._peek() not in (None, 'OR', ')'):
+            if self._peek() == 'AND':
+                self.position += 1
+            children.append(self._not_expr())
+        return children[0] if len(children) == 1 else _AndNode(children)
+
+    def _not_expr(self):
+        if self._peek() == 'NOT':
+            self.position += 1
+            return _NotNode(self._not_expr())
+        return self._atom()
+
+    def _atom(self):
+        kind = self._peek()
+        if kind is None:
+            raise QueryError("Incomplete query.")
+        token = self.tokens[self.position]
+        self.position += 1
+        if kind == '(':
+            node = self._or_expr()
+            if self._peek() != ')':
+                raise QueryError("Missing ')'.")
+            self.position += 1
+            return node
+        if kind == 'TERM':
+            return _compile_term(token[1], token[2], token[3], self.names)
+        raise QueryError(f"Unexpected '{kind}'.")
+
+
+def compile_query(text, names=None):
+    """
+    編譯查詢文字；空白的查詢返回 None。語法錯誤時拋出 QueryError。
+    names: 工作簿名稱 (core.address_index.read_com_names 的結果)，address: 條件可使用
+    """
+    text = (text or '').strip()
+    if not text:
+        return None
+    tokens = _tokenize(text)
+    if not tokens:
+        return None
+    return FormulaQuery(text, _Parser(tokens, names).parse())
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Formula Table - 掃描結果的欄式 (columnar) 儲存
+
+controller.all_formulas 原本是 (type, address, formula, result, display_value[, sheet]) tuple 的列表，
+每個結果都有自己的 tuple 及字串，篩選時每次按鍵都要以 regex 重新解析地址。FormulaTable 按欄儲存：
+    - 類型、列號、欄號為整數 array
+    - 公式、數值 / 顯示文字、工作表名稱存入 StringPool (相同的字串只保存一次)，欄中只存編號
+
+FormulaTable 仍然是 tuple 的序列 (len、迭代、索引、切片)，逐列處理的程式不需修改；
+篩選、排序 (core.formula_filter) 及外部連結摘要則直接使用欄資料。
+
+FormulaView 是 table 的一組列索引 (篩選 / 排序 / 切片的結果)，不複製任何資料。
+copy() 與原 table 共用欄 array，任何一方修改前才複製 (copy-on-write)，兩個窗格同步結果時不需複製。
+StringPool 只會新增字串，編號不會改變，所以 copy / take / view 都直接共用同一組 pool。
+"""
+
+import re
+from array import array
+
+_ADDRESS_PATTERN = re.compile(r"\$?([A-Za-z]{1,3})\$?([0-9]+)$")
+
+# 欄名稱 -> array typecode
+_COLUMN_TYPES = (
+    ('types', 'H'),
+    ('rows', 'I'),
+    ('cols', 'H'),
+    ('formulas', 'I'),
+    ('results', 'I'),
+    ('displays', 'I'),
+    ('sheets', 'i'),
+)
+
+_column_letters = {}
+_column_numbers = {}
+
+
+def _column_letter(column):
+    letters = _column_letters.get(column)
+    if letters is None:
+        from openpyxl.utils import get_column_letter
+        letters = _column_letters[column] = get_column_letter(column)
+    return letters
+
+
+def _column_number(letters):
+    number = _column_numbers.get(letters)
+    if number is None:
+        number = 0
+        for char in letters.upper():
+            number = number * 26 + ord(char) - 64
+        _column_numbers[letters] = number
+    return number
+
+
+def _new_columns():
+    return {name: array(typecode) for name, typecode in _COLUMN_TYPES}
+
+
+class StringPool:
+    """字串 <-> 整數編號 (只新增不刪除，編號固定)"""
+
+    __slots__ = ('_ids', 'strings', '_lower', 'text_index')
+
+    def __init__(self):
+        self._ids = {}
+        self.strings = []
+        self._lower = []
+        # core.text_index.TrigramIndex (掃描完成後在背景建立；None 為未建立)
+        self.text_index = None
+
+    def add(self, text):
+        index = self._ids.get(text)
+        if index is None:
+            index = self._ids[text] = len(self.strings)
+            self.strings.append(text)
+        return index
+
+    def lower_strings(self):
+        """小寫的字串列表 (篩選用)；每個字串只轉換一次，pool 新增字串後只轉換新的部分"""
+        lower = self._lower
+        if len(lower) < len(self.strings):
+            lower.extend(text.lower() for text in self.strings[len(lower):])
+        return lower
+
+    def find(self, text):
+        """字串的編號；不在 pool 中時返回 None"""
+        return self._ids.get(text)
+
+    def __getitem__(self, index):
+        return self.strings[index]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class TablePools:
+    """FormulaTable 使用的字串 pool；可以在多個 table 之間共用"""
+
+    __slots__ = ('types', 'formulas', 'values', 'sheets')
+
+    def __init__(self):
+        self.types = StringPool()
+        self.formulas = StringPool()
+        # 結果及顯示文字共用 (例如 "No Value"、"N/A (Quick Scan)")
+        self.values = StringPool()
+        self.sheets = StringPool()
+
+
+def _text(value):
+    if value is None:
+        return ''
+    return value if isinstance(value, str) else str(value)
+
+
+class FormulaTable:
+    """
+    掃描結果的欄式儲存。
+
+    Args:
+        rows: 初始的結果列 (tuple 的 iterable)
+        pools: 共用的 TablePools (None 為新建)
+    """
+
+    __slots__ = ('pools', '_columns', '_raw_addresses', '_shared', '_address_index', '_pattern_index')
+
+    def __init__(self, rows=None, pools=None):
+        self.pools = pools if pools is not None else TablePools()
+        self._columns = _new_columns()
+        # 不是標準 "A1" 形式的地址 (例如 "ERROR_ADDR")：列索引 -> 原來的文字
+        self._raw_addresses = {}
+        self._shared = False
+        self._address_index = None
+        self._pattern_index = None
+        if rows is not None:
+            self.extend(rows)
+
+    # --- 修改 ---
+    def _own(self):
+        """copy-on-write：與其他 table 共用欄資料時，修改前先複製"""
+        if self._shared:
+            self._columns = {name: array(column.typecode, column) for name, column in self._columns.items()}
+            self._raw_addresses = dict(self._raw_addresses)
+            self._shared = False
+
+    def append(self, row):
+        self.extend((row,))
+
+    def extend(self, rows):
+        self._own()
+        pools = self.pools
+        columns = self._columns
+        types, row_numbers, col_numbers = columns['types'], columns['rows'], columns['cols']
+        formulas, results, displays, sheets = (columns['formulas'], columns['results'],
+                                               columns['displays'], columns['sheets'])
+        add_type, add_formula = pools.types.add, pools.formulas.add
+        add_value, add_sheet = pools.values.add, pools.sheets.add
+        for row in rows:
+            address = _text(row[1])
+            match = _ADDRESS_PATTERN.match(address)
+            if match:
+                letters, number = match.groups()
+                if address != letters + number or not letters.isupper():
+                    # 保留原來的文字 (例如 "$A$1")，列號 / 欄號仍用於地址篩選
+                    self._raw_addresses[len(types)] = address
+                row_numbers.append(int(number))
+                col_numbers.append(_column_number(letters))
+            else:
+                self._raw_addresses[len(types)] = address
+                row_numbers.append(0)
+                col_numbers.append(0)
+            types.append(add_type(_text(row[0])))
+            formulas.append(add_formula(_text(row[2])))
+            results.append(add_value(_text(row[3])))
+            displays.append(add_value(_text(row[4])))
+            sheets.append(add_sheet(row[5]) if len(row) > 5 and row[5] else -1)
+
+    def extend_from(self, other, indices):
+        """加入另一個 table 的指定列；共用 pools 時直接複製欄資料 (不重建 tuple)"""
+        if other.pools is not self.pools:
+            self.extend(other.row(i) for i in indices)
+            return
+        self._own()
+        offset = len(self)
+        for name, column in self._columns.items():
+            source = other._columns[name]
+            column.extend(source[i] for i in indices)
+        raw = other._raw_addresses
+        if raw:
+            for position, i in enumerate(indices, offset):
+                if i in raw:
+                    self._raw_addresses[position] = raw[i]
+
+    def clear(self):
+        # 以新的 array 取代 (現有的 view 仍然引用舊資料)
+        self._columns = _new_columns()
+        self._raw_addresses = {}
+        self._shared = False
+        self._address_index = None
+        self._pattern_index = None
+
+    def copy(self):
+        """與此 table 共用資料的複本 (copy-on-write)"""
+        other = FormulaTable.__new__(FormulaTable)
+        other.pools = self.pools
+        other._columns = self._columns
+        other._raw_addresses = self._raw_addresses
+        other._shared = self._shared = True
+        other._address_index = self._address_index
+        other._pattern_index = self._pattern_index
+        return other
+
+    def take(self, indices):
+        """指定列索引組成的新 table (共用 pools)"""
+        other = FormulaTable(pools=self.pools)
+        other.extend_from(self, indices)
+        return other
+
+    # --- 讀取 ---
+    def __len__(self):
+        return len(self._columns['types'])
+
+    def __iter__(self):
+        row_at = self.row
+        for index in range(len(self)):
+            yield row_at(index)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return FormulaView(self, array('I', range(*key.indices(len(self)))))
+        if key < 0:
+            key += len(self)
+        return self.row(key)
+
+    def column(self, name):
+        """欄資料 array ('types' / 'rows' / 'cols' / 'formulas' / 'results' / 'displays' / 'sheets')；不可修改"""
+        return self._columns[name]
+
+    def address(self, index):
+        raw = self._raw_addresses.get(index) if self._raw_addresses else None
+        if raw is not None:
+            return raw
+        return f"{_column_letter(self._columns['cols'][index])}{self._columns['rows'][index]}"
+
+    def row(self, index):
+        """第 index 列的結果 tuple (整個工作簿掃描的列另有工作表名稱)"""
+        columns = self._columns
+        pools = self.pools
+        values = pools.values.strings
+        row = (pools.types.strings[columns['types'][index]], self.address(index),
+               pools.formulas.strings[columns['formulas'][index]],
+               values[columns['results'][index]], values[columns['displays'][index]])
+        sheet = columns['sheets'][index]
+        if sheet >= 0:
+            row += (pools.sheets.strings[sheet],)
+        return row
+
+    def same_data(self, other, length):
+        """other 與此 table 共用同一份欄資料且長度為 length (篩選結果可以沿用)"""
+        return other._columns is self._columns and len(self) == length
+
+    def address_index(self):
+        """列號 / 欄號的排序索引 (core.address_index.AddressIndex)；資料改變後重新建立"""
+        cached = self._address_index
+        if cached is None or cached[0] is not self._columns or cached[1] != len(self):
+            from core.address_index import AddressIndex
+            cached = self._address_index = (self._columns, len(self), AddressIndex(self))
+        return cached[2]
+
+    def pattern_index(self):
+        """
+        每列的 R1C1 pattern 編號 (core.formula_patterns.PatternIndex)；同一份資料只計算新增的列。
+        FormulaView 共用建立時 table 已有的 PatternIndex，所以應先在 table 上呼叫。
+        """
+        cached = self._pattern_index
+        if cached is None or cached[0] is not self._columns:
+            from core.formula_patterns import PatternIndex
+            cached = self._pattern_index = (self._columns, PatternIndex())
+        cached[1].update(self)
+        return cached[1]
+
+    def view(self, indices=None):
+        return FormulaView(self, array('I', range(len(self)) if indices is None else indices))
+
+    def nbytes(self):
+        """欄資料佔用的 bytes (不包括共用的 pools)"""
+        return sum(column.itemsize * len(column) for column in self._columns.values())
+
+    def __repr__(self):
+        return f"<FormulaTable {len(self)} rows>"
+
+
+class FormulaView:
+    """
+    FormulaTable 的一組列索引 (篩選 / 排序 / 切片的結果)。
+    建立時記錄 table 當時的欄資料，之後 table 被清除或 copy-on-write 複製都不影響 view。
+    """
+
+    __slots__ = ('table', 'indices')
+
+    def __init__(self, table, indices):
+        snapshot = FormulaTable.__new__(FormulaTable)
+        snapshot.pools = table.pools
+        snapshot._columns = table._columns
+        snapshot._raw_addresses = table._raw_addresses
+        snapshot._shared = True
+        snapshot._address_index = table._address_index
+        snapshot._pattern_index = table._pattern_index
+        self.table = snapshot
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        row_at = self.table.row
+        for index in self.indices:
+            yield row_at(index)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return FormulaView(self.table, self.indices[key])
+        return self.table.row(self.indices[key])
+
+    def extend(self, other):
+        """加入同一個 table 的另一個 view 的列"""
+        if other.table._columns is not self.table._columns:
+            raise ValueError("Views belong to different formula tables.")
+        self.indices.extend(other.indices)
+
+    def to_table(self):
+        return self.table.take(self.indices)
+
+    def __repr__(self):
+        return f"<FormulaView {len(self)} of {len(self.table)} rows>"
+
+
+def table_source(rows):
+    """FormulaTable / FormulaView -> (table, 列索引序列)；其他序列返回 None"""
+    if isinstance(rows, FormulaTable):
+        return rows, range(len(rows))
+    if isinstance(rows, FormulaView):
+        return rows.table, rows.indices
+    return None
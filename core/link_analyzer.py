@@ -9,6 +9,8 @@ including external references and local references.
 import re
 import os
 
+from utils.formula_tokenizer import extract_references
+
 
 def is_external_link_regex_match(formula_str):
     """
@@ -45,103 +47,38 @@ def get_referenced_cell_values(
         dict: Dictionary mapping reference addresses to their values
     """
     referenced_data = {}
-    processed_spans = []
-
-    def is_span_processed(start, end):
-        for p_start, p_end in processed_spans:
-            if start < p_end and end > p_start:
-                return True
-        return False
-
-    def add_processed_span(start, end):
-        processed_spans.append((start, end))
 
-    patterns = [
-        (
-            'external',
-            re.compile(
-                r"'?((?:[a-zA-Z]:\\)?[^']*)\[([^\]]+\.(?:xlsx|xls|xlsm|xlsb))\]([^']*)'?\s*!\s*(\$?[A-Z]{1,3}\$?\d{1,7}(?::\$?[A-Z]{1,3}\$?\d{1,7})?)",
-                re.IGNORECASE
-            )
-        ),
-        (
-            'local_quoted',
-            re.compile(
-                r"'([^']+)'!(\$?[A-Z]{1,3}\$?\d{1,7}(?::\$?[A-Z]{1,3}\$?\d{1,7})?)",
-                re.IGNORECASE
-            )
-        ),
-        (
-            'local_unquoted',
-            re.compile(
-                r"([a-zA-Z0-9_\u4e00-\u9fa5][a-zA-Z0-9_\s\.\u4e00-\u9fa5]{0,30})!(\$?[A-Z]{1,3}\$?\d{1,7}(?::\$?[A-Z]{1,3}\$?\d{1,7})?)",
-                re.IGNORECASE
-            )
-        ),
-        (
-            'current_range',
-            re.compile(
-                r"(?<![!'\[\]a-zA-Z0-9_\u4e00-\u9fa5])(\$?[A-Z]{1,3}\$?\d{1,7}:\s*\$?[A-Z]{1,3}\$?\d{1,7})(?![a-zA-Z0-9_])",
-                re.IGNORECASE
-            )
-        ),
-        (
-            'current_single',
-            re.compile(
-                r"(?<![!'\[\]a-zA-Z0-9_\u4e00-\u9fa5])(\$?[A-Z]{1,3}\$?\d{1,7})(?![a-zA-Z0-9_:\(])",
-                re.IGNORECASE
-            )
-        )
-    ]
-
-    all_matches = []
     # Normalize backslashes to handle cases with single or double backslashes
     normalized_formula_str = formula_str.replace('\\\\', '\\')
-    for p_type, pattern in patterns:
-        for match in pattern.finditer(normalized_formula_str):
-            all_matches.append({'type': p_type, 'match': match, 'span': match.span()})
-
-    all_matches.sort(key=lambda x: (x['span'][0], x['span'][1] - x['span'][0]))
-
-    for item in all_matches:
-        match = item['match']
-        m_type = item['type']
-        start, end = item['span']
-
-        if is_span_processed(start, end):
+    for reference in extract_references(normalized_formula_str):
+        if reference.ref_kind not in ('cell', 'range'):
             continue
-
+        cell_ref = reference.address
         try:
-            if m_type == 'external':
-                dir_path, file_name, sheet_name, cell_ref = match.groups()
-                sheet_name = sheet_name.strip("'")
+            if reference.workbook is not None:
+                dir_path, file_name, sheet_name = reference.directory, reference.workbook, reference.sheet
                 
                 full_file_path = os.path.join(dir_path, file_name)
                 if not dir_path and file_name.lower() == os.path.basename(current_workbook_path).lower():
                     full_file_path = current_workbook_path
                 
-                display_ref = f"[{os.path.basename(full_file_path)}]{sheet_name}!{cell_ref.replace('$', '')}"
+                display_ref = f"[{os.path.basename(full_file_path)}]{sheet_name}!{cell_ref}"
                 display_ref_with_path = f"{full_file_path}|{display_ref}"
 
-                if ':' in cell_ref:
+                if reference.ref_kind == 'range':
                     value = "(Range Reference)"
                 else:
                     value = read_external_cell_value_func(
-                        current_workbook_path, full_file_path, sheet_name, cell_ref.replace('$', '')
+                        current_workbook_path, full_file_path, sheet_name, cell_ref
                     )
                 if display_ref_with_path not in referenced_data:
                     referenced_data[display_ref_with_path] = value
 
-            elif m_type in ('local_quoted', 'local_unquoted'):
-                sheet_name, cell_ref = match.groups()
-                sheet_name = sheet_name.strip("'")
-                
-                if sheet_name.lower().endswith(('.xlsx', '.xls', '.xlsm', '.xlsb')):
-                    continue
-
-                display_ref = f"{sheet_name}!{cell_ref.replace('$', '')}"
+            elif reference.sheet_prefix:
+                sheet_name = reference.sheet
+                display_ref = f"{sheet_name}!{cell_ref}"
                 
-                if ':' in cell_ref:
+                if reference.ref_kind == 'range':
                     value = "(Range Reference)"
                 else:
                     target_sheet = find_matching_sheet_func(sheet_name, current_sheet_com_obj)
@@ -154,11 +91,10 @@ def get_referenced_cell_values(
                 if display_ref not in referenced_data:
                     referenced_data[display_ref] = value
 
-            elif m_type in ('current_range', 'current_single'):
-                cell_ref = match.group(1)
-                display_ref = f"{current_sheet_com_obj.Name}!{cell_ref.replace('$', '')}"
+            else:
+                display_ref = f"{current_sheet_com_obj.Name}!{cell_ref}"
 
-                if ':' in cell_ref:
+                if reference.ref_kind == 'range':
                     value = "(Range Reference)"
                 else:
                     cell_val = current_sheet_com_obj.Range(cell_ref).Value
@@ -166,10 +102,8 @@ def get_referenced_cell_values(
                 
                 if display_ref not in referenced_data:
                     referenced_data[display_ref] = value
-
-            add_processed_span(start, end)
         except Exception as e:
-            print(f"ERROR: Could not process reference from match '{match.group(0)}': {e}")
+            print(f"ERROR: Could not process reference from match '{reference.sheet_prefix or ''}{reference.raw_address}': {e}")
 
     return referenced_data
 
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Offline Scanner - 不需要 Excel 的工作表公式掃描
+
+直接串流讀取 xlsx/xlsm 的 sheet XML (utils.sheet_xml_reader.iter_sheet_cells)，
+產生與 _get_formulas_from_excel 相同的 (type, address, formula, value, text) 結果，
+可以在沒有 Excel 的電腦上檢查已關閉的檔案。只保留公式儲存格，
+不建立 openpyxl 的完整物件模型，大型檔案的記憶體用量亦保持固定。
+
+與 Excel 掃描的差異：
+- value 欄模擬 Range.Value (數字為 float、錯誤為 COM 錯誤碼)，使用檔案內快取的計算結果
+- Full 掃描的 text 欄以「一般」格式近似 Range.Text (不套用數字格式，日期顯示為序號)
+- 結果按列順序排列 (Excel 按 SpecialCells 的 areas 排列)
+
+整個工作簿掃描 (OfflineWorkbookScanWorker) 把每個工作表交給 process pool 的一個 worker，
+結果列在最後加上工作表名稱 (type, address, formula, value, text, sheet)。
+"""
+
+import os
+import time
+
+from core.formula_classifier import classify_formula_type
+from core.scan_worker import ScanThread, SCAN_CHUNK_ROWS, SCAN_CHUNK_SECONDS
+
+# Range.Value 對錯誤值返回的 COM 錯誤碼
+COM_ERROR_CODES = {
+    '#NULL!': -2146826288,
+    '#DIV/0!': -2146826281,
+    '#VALUE!': -2146826273,
+    '#REF!': -2146826265,
+    '#NAME?': -2146826259,
+    '#NUM!': -2146826252,
+    '#N/A': -2146826246,
+}
+
+
+def list_sheet_names(file_path):
+    """返回工作簿的工作表名稱 (按檔案內次序)"""
+    from utils.sheet_xml_reader import get_workbook_xml_index
+    return list(get_workbook_xml_index(file_path).sheet_names)
+
+
+def _com_value(value):
+    """將 XML 快取值轉為 Range.Value 的形式"""
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value in COM_ERROR_CODES:
+        return COM_ERROR_CODES[value]
+    return value
+
+
+def _general_text(value):
+    """以「一般」格式近似 Range.Text"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        if float(value).is_integer():
+            return str(int(value))
+        return format(value, '.10g')
+    return str(value).strip()
+
+
+def _parse_scan_addresses(addresses):
+    """'A1:C10, E5' 或列表 -> 地址列表；None / 空白為整個工作表"""
+    if addresses is None:
+        return None
+    if isinstance(addresses, str):
+        addresses = [token for token in addresses.replace('$', '').split(',')]
+    addresses = [address.strip() for address in addresses if address and address.strip()]
+    return addresses or None
+
+
+def iter_offline_formula_rows(file_path, sheet_name, addresses=None, scan_mode='quick'):
+    """
+    串流讀取工作表的公式儲存格，逐一返回結果列。
+
+    Args:
+        file_path: xlsx/xlsm 檔案路徑
+        sheet_name: 工作表名稱
+        addresses: None 為整個工作表；否則為 'A1:C10, E5' 字串或地址列表 (Selected Range)
+        scan_mode: 'quick' 或 'full' (full 會填寫近似的顯示文字)
+
+    Yields:
+        tuple: (formula_type, address, formula, display_val, cell_text)
+    """
+    from utils.sheet_xml_reader import iter_sheet_cells, is_xml_workbook
+
+    if not is_xml_workbook(file_path):
+        raise ValueError("Offline scan supports .xlsx / .xlsm workbooks only.")
+
+    for record in iter_sheet_cells(file_path, sheet_name, _parse_scan_addresses(addresses), formulas_only=True):
+        formula = record['formula']
+        formula_type = "unknown"
+        display_val = "Error"
+        try:
+            formula_type = classify_formula_type(formula)
+            cell_value = _com_value(record['value'])
+            display_val = str(cell_value)[:50] if cell_value is not None else "No Value"
+            if scan_mode == 'quick':
+                cell_text = "N/A (Quick Scan)"
+            else:
+                cell_text = _general_text(record['value'])
+            row = (formula_type, record['address'], formula, display_val, cell_text)
+        except Exception as cell_processing_e:
+            row = (formula_type, record['address'], str(formula), str(display_val), f"ERROR: {cell_processing_e}")
+        yield row
+
+
+def scan_file_offline(file_path, sheet_name, addresses=None, scan_mode='quick'):
+    """同步掃描，返回結果列表"""
+    return list(iter_offline_formula_rows(file_path, sheet_name, addresses, scan_mode))
+
+
+def scan_sheet_job(file_path, sheet_name, scan_mode='quick'):
+    """process pool 的工作：掃描一個工作表，每列加上工作表名稱 (必須是模組層級函數以便 pickle)"""
+    return [row + (sheet_name,) for row in iter_offline_formula_rows(file_path, sheet_name, None, scan_mode)]
+
+
+def default_workbook_workers(sheet_count):
+    """整個工作簿掃描的 process 數目：不超過工作表數目及 CPU 核心數"""
+    return max(1, min(sheet_count, os.cpu_count() or 1))
+
+
+class OfflineScanWorker(ScanThread):
+    """
+    在背景執行緒離線掃描，事件格式與 core.scan_worker.ScanWorker 相同
+    ('start' / 'rows' / 'done' / 'error')；total 未知 (None)。
+    """
+
+    def __init__(self, file_path, sheet_name, addresses=None, scan_mode='quick',
+                 chunk_rows=SCAN_CHUNK_ROWS, chunk_seconds=SCAN_CHUNK_SECONDS):
+        super().__init__()
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        self.addresses = addresses
+        self.scan_mode = scan_mode
+        self.chunk_rows = chunk_rows
+        self.chunk_seconds = chunk_seconds
+
+    def run(self):
+        try:
+            self._scan()
+        except Exception as e:
+            self._put_error(e)
+
+    def _scan(self):
+        start_time = time.time()
+        self.events.put({'event': 'start', 'total': None, 'incremental': False})
+        reason = 'completed'
+        processed = 0
+        rows = []
+        last_flush = time.time()
+        for row in iter_offline_formula_rows(self.file_path, self.sheet_name, self.addresses, self.scan_mode):
+            if self._should_stop():
+                reason = 'cancelled'
+                break
+            rows.append(row)
+            processed += 1
+            if len(rows) >= self.chunk_rows or time.time() - last_flush >= self.chunk_seconds:
+                self.events.put({'event': 'rows', 'rows': rows, 'processed': processed, 'total': None})
+                rows = []
+                last_flush = time.time()
+        if rows:
+            self.events.put({'event': 'rows', 'rows': rows, 'processed': processed, 'total': None})
+        reason = 'no_formulas' if reason == 'completed' and processed == 0 else reason
+        self.events.put({'event': 'done', 'reason': reason, 'processed': processed, 'total': processed,
+                         'elapsed': time.time() - start_time})
+
+
+class OfflineWorkbookScanWorker(ScanThread):
+    """
+    離線掃描整個工作簿：每個工作表在 process pool 中獨立解析 (XML 解析受 GIL 限制，
+    thread 無法平行)，完成後按工作表次序送出 'rows' 事件，結果列包含工作表名稱。
+    事件另帶 'sheets_done' / 'sheets_total' 以顯示進度。workers <= 1 時在本執行緒逐一掃描。
+    Pause 只會延遲送出結果 (已提交的工作表仍在背景進行)；Cancel 會取消尚未開始的工作表。
+    """
+
+    def __init__(self, file_path, sheet_names=None, scan_mode='quick', workers=None,
+                 chunk_rows=SCAN_CHUNK_ROWS):
+        super().__init__()
+        self.file_path = file_path
+        self.sheet_names = sheet_names
+        self.scan_mode = scan_mode
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+
+    def run(self):
+        try:
+            self._scan()
+        except Exception as e:
+            self._put_error(e)
+
+    def _iter_sheet_results(self, sheet_names, workers):
+        """按工作表次序返回 (sheet_name, rows)；取消時返回 None 作為 rows"""
+        if workers <= 1 or len(sheet_names) <= 1:
+            for sheet_name in sheet_names:
+                if self._should_stop():
+                    yield sheet_name, None
+                    return
+                yield sheet_name, scan_sheet_job(self.file_path, sheet_name, self.scan_mode)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor, wait
+
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(scan_sheet_job, self.file_path, sheet_name, self.scan_mode)
+                       for sheet_name in sheet_names]
+            for sheet_name, future in zip(sheet_names, futures):
+                while not wait([future], timeout=0.1).done:
+                    if self.cancelled:
+                        break
+                if self._should_stop():
+                    yield sheet_name, None
+                    return
+                yield sheet_name, future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _scan(self):
+        start_time = time.time()
+        sheet_names = list(self.sheet_names or list_sheet_names(self.file_path))
+        workers = self.workers if self.workers is not None else default_workbook_workers(len(sheet_names))
+        self.events.put({'event': 'start', 'total': None, 'incremental': False, 'sheets': sheet_names})
+
+        reason = 'completed'
+        processed = 0
+        for sheets_done, (sheet_name, rows) in enumerate(self._iter_sheet_results(sheet_names, workers), 1):
+            if rows is None:
+                reason = 'cancelled'
+                break
+            processed += len(rows)
+            for offset in range(0, len(rows), self.chunk_rows):
+                self.events.put({'event': 'rows', 'rows': rows[offset:offset + self.chunk_rows],
+                                 'processed': processed - len(rows) + min(offset + self.chunk_rows, len(rows)),
+                                 'total': None, 'sheet': sheet_name,
+                                 'sheets_done': sheets_done, 'sheets_total': len(sheet_names)})
+        reason = 'no_formulas' if reason == 'completed' and processed == 0 else reason
+        self.events.put({'event': 'done', 'reason': reason, 'processed': processed, 'total': processed,
+                         'elapsed': time.time() - start_time})
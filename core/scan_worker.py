@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+"""
+Scan Worker - 在背景執行緒掃描工作表公式
+
+UI 執行緒把工作表的 COM 物件 marshal 到 worker 執行緒 (worker 有自己的 COM apartment)，
+worker 讀取公式後把結果分批放入 queue；UI 以 root.after 取出並逐步加入 Treeview。
+掃描期間 UI 執行緒不作任何 COM 呼叫；Pause / Cancel 會令 worker 停止讀取下一個儲存格。
+
+queue 中的事件 (dict)：
+    {'event': 'start', 'total': 公式儲存格數目}
+    {'event': 'rows', 'rows': [...], 'processed': 已處理數目, 'total': ...}
+    {'event': 'done', 'reason': 'completed' / 'cancelled' / 'no_formulas', 'processed', 'total', 'elapsed'}
+    {'event': 'error', 'error': 訊息, 'traceback': ...}
+
+WorkbookScanWorker 在同一個 COM 執行緒逐個工作表以陣列讀取 UsedRange 的公式，
+結果列最後加上工作表名稱，'rows' 事件另帶 'sheet' / 'sheets_done' / 'sheets_total'。
+"""
+
+import time
+import queue
+import threading
+
+from core.formula_classifier import classify_formula_type
+
+# 每次以陣列讀取的最大儲存格數目 (大範圍按列分段，避免單次傳回過大的陣列)
+BULK_CHUNK_CELLS = 20000
+
+# 每批送到 UI 的結果數目 / 最長間隔 (秒)
+SCAN_CHUNK_ROWS = 500
+SCAN_CHUNK_SECONDS = 0.25
+
+# 增量重新掃描：每個區塊的列數上限 (區塊橫跨整個掃描範圍的所有欄)
+SNAPSHOT_BLOCK_ROWS = 500
+
+# 延遲讀取顯示文字 (scan_mode 'lazy')：掃描時以此佔位，顯示時才由 DisplayTextWorker 讀取 Range.Text
+LAZY_TEXT = "(loading...)"
+
+# DisplayTextWorker 每批送回 UI 的儲存格數目
+DISPLAY_TEXT_BATCH = 25
+
+xlCellTypeFormulas = -4123
+
+
+def is_no_formula_error(e):
+    """SpecialCells 在範圍內沒有公式時拋出的錯誤"""
+    return (
+        "(-2146827284, 'OLE error.', None, None)" in str(e)
+        or "0x800A03EC" in str(e)
+        or '找不到所要找的儲存格' in str(e)
+        or 'Unable to get the' in str(e)
+    )
+
+
+def get_formula_areas(scan_range_com_obj):
+    """返回範圍內公式儲存格的 areas 列表及儲存格總數"""
+    formula_range = scan_range_com_obj.SpecialCells(xlCellTypeFormulas)
+
+    areas_to_process = []
+    if formula_range.Areas.Count > 1:
+        for area in formula_range.Areas:
+            areas_to_process.append(area)
+    else:
+        areas_to_process.append(formula_range)
+
+    return areas_to_process, sum(area.Count for area in areas_to_process)
+
+
+def _as_2d(com_value):
+    """COM 對單一儲存格返回純值，對多個儲存格返回 tuple of tuples；統一為二維"""
+    if isinstance(com_value, tuple):
+        return com_value
+    return ((com_value,),)
+
+
+def iter_cells_per_cell(cells, scan_mode):
+    """逐個儲存格讀取 (每個儲存格多次 COM 呼叫)；陣列讀取失敗時使用"""
+    for cell in cells:
+        formula = ""
+        formula_type = "unknown"
+        cell_value = None
+        display_val = "Error"
+        cell_text = "Error"
+        cell_address = ""
+
+        try:
+            formula = cell.Formula
+            formula_type = classify_formula_type(formula)
+            cell_value = cell.Value
+            display_val = str(cell_value)[:50] if cell_value is not None else "No Value"
+            if scan_mode == 'quick':
+                cell_text = "N/A (Quick Scan)"
+            elif scan_mode == 'lazy':
+                cell_text = LAZY_TEXT
+            else:
+                cell_text = str(cell.Text).strip()
+            cell_address = cell.Address.replace('$', '')
+            row = (formula_type, cell_address, formula, display_val, cell_text)
+        except Exception as cell_processing_e:
+            row = (formula_type, cell_address if cell_address else "ERROR_ADDR", str(formula), str(display_val), f"ERROR: {cell_processing_e}")
+        yield row
+
+
+def _rows_from_arrays(chunk, formulas, values, first_row, col_letters, scan_mode, formulas_only=False):
+    """
+    由 Formula / Value 陣列產生結果列。chunk 為陣列對應的範圍 (完整掃描時逐格讀取 Text 用)；
+    formulas_only 時略過不是公式的儲存格 (讀取整個 UsedRange 區塊時使用)。
+    """
+    for r_offset, (formula_row, value_row) in enumerate(zip(formulas, values)):
+        row_number = first_row + r_offset
+        for c_offset, (formula, cell_value) in enumerate(zip(formula_row, value_row)):
+            if formulas_only and not (isinstance(formula, str) and formula.startswith('=')):
+                continue
+            cell_address = f"{col_letters[c_offset]}{row_number}"
+            formula_type = "unknown"
+            display_val = "Error"
+            try:
+                formula_type = classify_formula_type(formula)
+                display_val = str(cell_value)[:50] if cell_value is not None else "No Value"
+                if scan_mode == 'quick':
+                    cell_text = "N/A (Quick Scan)"
+                elif scan_mode == 'lazy':
+                    cell_text = LAZY_TEXT
+                else:
+                    cell_text = str(chunk.Cells(r_offset + 1, c_offset + 1).Text).strip()
+                row = (formula_type, cell_address, formula, display_val, cell_text)
+            except Exception as cell_processing_e:
+                row = (formula_type, cell_address, str(formula), str(display_val), f"ERROR: {cell_processing_e}")
+            yield row
+
+
+def iter_area_bulk(area, scan_mode):
+    """
+    以陣列一次讀取整個 area (或一段列) 的 Formula 及 Value，地址由 area.Row / area.Column 計算。
+    COM 呼叫次數由每個儲存格 3-5 次降至每段 2 次 (完整掃描仍需逐格讀取 Text)。
+    """
+    from openpyxl.utils import get_column_letter
+
+    first_row = area.Row
+    first_col = area.Column
+    row_count = area.Rows.Count
+    col_count = area.Columns.Count
+    col_letters = [get_column_letter(first_col + i) for i in range(col_count)]
+    chunk_rows = max(1, BULK_CHUNK_CELLS // col_count)
+
+    for start in range(1, row_count + 1, chunk_rows):
+        end = min(row_count, start + chunk_rows - 1)
+        if start == 1 and end == row_count:
+            chunk = area
+        else:
+            # Range.Range 的地址相對於 area 左上角
+            chunk = area.Range(f"A{start}:{get_column_letter(col_count)}{end}")
+        try:
+            formulas = _as_2d(chunk.Formula)
+            values = _as_2d(chunk.Value)
+        except Exception as bulk_e:
+            print(f"Bulk read failed for rows {start}-{end}, reading cell by cell: {bulk_e}")
+            yield from iter_cells_per_cell(chunk.Cells, scan_mode)
+            continue
+
+        yield from _rows_from_arrays(chunk, formulas, values, first_row + start - 1, col_letters, scan_mode)
+
+
+def iter_area_rows(area, scan_mode, bulk=True):
+    """返回 area 的結果列 iterator"""
+    return iter_area_bulk(area, scan_mode) if bulk else iter_cells_per_cell(area.Cells, scan_mode)
+
+
+def get_range_geometry(scan_range):
+    """範圍的 (first_row, first_col, row_count, col_count)"""
+    return scan_range.Row, scan_range.Column, scan_range.Rows.Count, scan_range.Columns.Count
+
+
+def iter_row_blocks(scan_range, geometry=None):
+    """
+    將範圍按列分為區塊，yield (block_index, first_row, last_row, block_range)。
+    first_row / last_row 為工作表上的絕對列號。
+    """
+    from openpyxl.utils import get_column_letter
+
+    first_row, first_col, row_count, col_count = geometry or get_range_geometry(scan_range)
+    block_rows = max(1, min(SNAPSHOT_BLOCK_ROWS, BULK_CHUNK_CELLS // col_count))
+    last_col_letter = get_column_letter(col_count)
+    for block_index, start in enumerate(range(1, row_count + 1, block_rows)):
+        end = min(row_count, start + block_rows - 1)
+        block_range = scan_range if (start == 1 and end == row_count) else scan_range.Range(f"A{start}:{last_col_letter}{end}")
+        yield block_index, first_row + start - 1, first_row + end - 1, block_range
+
+
+def hash_formula_block(formulas):
+    """Formula 陣列的雜湊 (只在同一程序內比較)"""
+    return hash(_as_2d(formulas))
+
+
+def build_scan_snapshot(scan_range, scan_mode):
+    """
+    讀取範圍每個列區塊的 Formula 陣列並記錄雜湊，供之後的增量重新掃描比較。
+    """
+    geometry = get_range_geometry(scan_range)
+    hashes = [hash_formula_block(block_range.Formula) for _, _, _, block_range in iter_row_blocks(scan_range, geometry)]
+    return {'geometry': geometry, 'scan_mode': scan_mode, 'hashes': hashes}
+
+
+class ScanThread(threading.Thread):
+    """
+    掃描執行緒的共用部分：事件 queue、Pause / Resume / Cancel。
+    子類別實作 run()，在每個儲存格之間呼叫 _should_stop()。
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.events = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+
+    @property
+    def paused(self):
+        return not self._resume_event.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def pause(self):
+        self._resume_event.clear()
+
+    def resume(self):
+        self._resume_event.set()
+
+    def cancel(self):
+        self._cancel_event.set()
+        self._resume_event.set()
+
+    def _should_stop(self):
+        # 暫停時在這裡等待 (不讀取任何資料)，直到恢復或取消
+        while not self._resume_event.wait(0.1):
+            if self._cancel_event.is_set():
+                return True
+        return self._cancel_event.is_set()
+
+    def _put_error(self, e):
+        import traceback
+        self.events.put({'event': 'error', 'error': str(e), 'traceback': traceback.format_exc(),
+                         'no_formulas': is_no_formula_error(e)})
+
+
+class ScanWorker(ScanThread):
+    """
+    背景掃描執行緒。必須在擁有 worksheet COM 物件的執行緒 (UI 執行緒) 建立，
+    建構時會把 worksheet marshal 成 stream，worker 在自己的 apartment 取回。
+    """
+
+    def __init__(self, worksheet_com_obj, scan_address, scan_mode='quick', bulk=True,
+                 chunk_rows=SCAN_CHUNK_ROWS, chunk_seconds=SCAN_CHUNK_SECONDS,
+                 snapshot=None, record_snapshot=False):
+        """
+        scan_address: 掃描範圍地址；None 為工作表的 UsedRange
+        snapshot: 上次完整掃描的 build_scan_snapshot 結果；提供時只重新讀取公式有改變的列區塊
+        record_snapshot: 掃描完成後記錄新的 snapshot (事件 'snapshot')
+        """
+        super().__init__()
+        import pythoncom
+
+        self.scan_address = scan_address
+        self.snapshot = snapshot
+        self.record_snapshot = record_snapshot or snapshot is not None
+        self.scan_mode = scan_mode
+        self.bulk = bulk
+        self.chunk_rows = chunk_rows
+        self.chunk_seconds = chunk_seconds
+        self._stream = pythoncom.CoMarshalInterThreadInterfaceInStream(
+            pythoncom.IID_IDispatch, worksheet_com_obj._oleobj_
+        )
+
+    def run(self):
+        import pythoncom
+
+        pythoncom.CoInitialize()
+        try:
+            self._scan()
+        except Exception as e:
+            self._put_error(e)
+        finally:
+            # _scan 返回後其 COM 物件已釋放，才可以 CoUninitialize
+            pythoncom.CoUninitialize()
+
+    def _scan(self):
+        import pythoncom
+        import win32com.client
+
+        start_time = time.time()
+        dispatch = pythoncom.CoGetInterfaceAndReleaseStream(self._stream, pythoncom.IID_IDispatch)
+        self._stream = None
+        worksheet = win32com.client.Dispatch(dispatch)
+        scan_range = worksheet.UsedRange if self.scan_address is None else worksheet.Range(self.scan_address)
+        if self.snapshot is not None:
+            geometry = get_range_geometry(scan_range)
+            old_geometry = self.snapshot['geometry']
+            # 只有新增或減少列時可以沿用舊的區塊；欄或起始列改變時重新完整掃描
+            if (geometry[0], geometry[1], geometry[3]) == (old_geometry[0], old_geometry[1], old_geometry[3]) \
+                    and self.snapshot['scan_mode'] == self.scan_mode:
+                self._scan_incremental(scan_range, geometry, start_time)
+                return
+        try:
+            areas, total = get_formula_areas(scan_range)
+        except Exception as e:
+            if not is_no_formula_error(e):
+                raise
+            self.events.put({'event': 'done', 'reason': 'no_formulas', 'processed': 0, 'total': 0,
+                             'elapsed': time.time() - start_time})
+            return
+        self.events.put({'event': 'start', 'total': total, 'incremental': False})
+
+        reason = 'completed'
+        processed = 0
+        rows = []
+        last_flush = time.time()
+        for area in areas:
+            if reason != 'completed':
+                break
+            for row in iter_area_rows(area, self.scan_mode, self.bulk):
+                if self._should_stop():
+                    reason = 'cancelled'
+                    break
+                rows.append(row)
+                processed += 1
+                if len(rows) >= self.chunk_rows or time.time() - last_flush >= self.chunk_seconds:
+                    self.events.put({'event': 'rows', 'rows': rows, 'processed': processed, 'total': total})
+                    rows = []
+                    last_flush = time.time()
+        if rows:
+            self.events.put({'event': 'rows', 'rows': rows, 'processed': processed, 'total': total})
+        if reason == 'completed' and self.record_snapshot:
+            self.events.put({'event': 'snapshot', 'snapshot': build_scan_snapshot(scan_range, self.scan_mode)})
+        self.events.put({'event': 'done', 'reason': reason, 'processed': processed, 'total': total,
+                         'elapsed': time.time() - start_time})
+
+    def _scan_incremental(self, scan_range, geometry, start_time):
+        """
+        逐個列區塊讀取 Formula 陣列並與 snapshot 比較，只有雜湊改變的區塊才讀取 Value 並重新分類。
+        事件 'block' 的 rows 取代該區塊 (first_row..last_row) 原有的所有結果。
+        """
+        from openpyxl.utils import get_column_letter
+
+        old_hashes = self.snapshot['hashes']
+        first_col = geometry[1]
+        col_letters = [get_column_letter(first_col + i) for i in range(geometry[3])]
+        blocks = list(iter_row_blocks(scan_range, geometry))
+        self.events.put({'event': 'start', 'total': len(blocks), 'incremental': True})
+
+        hashes = []
+        changed_blocks = 0
+        processed = 0
+        reason = 'completed'
+        last_row = geometry[0] - 1
+        for block_index, block_first_row, block_last_row, block_range in blocks:
+            if self._should_stop():
+                reason = 'cancelled'
+                break
+            formulas = _as_2d(block_range.Formula)
+            block_hash = hash(formulas)
+            hashes.append(block_hash)
+            processed += 1
+            last_row = block_last_row
+            if block_index < len(old_hashes) and old_hashes[block_index] == block_hash:
+                continue
+            changed_blocks += 1
+            values = _as_2d(block_range.Value)
+            rows = list(_rows_from_arrays(block_range, formulas, values, block_first_row, col_letters,
+                                          self.scan_mode, formulas_only=True))
+            self.events.put({'event': 'block', 'first_row': block_first_row, 'last_row': block_last_row,
+                             'rows': rows, 'processed': processed, 'total': len(blocks)})
+
+        if reason == 'completed':
+            old_row_count = self.snapshot['geometry'][2]
+            if geometry[2] < old_row_count:
+                # 範圍縮小：移除超出新範圍的舊結果
+                self.events.put({'event': 'block', 'first_row': last_row + 1,
+                                 'last_row': geometry[0] + old_row_count - 1, 'rows': [],
+                                 'processed': processed, 'total': len(blocks)})
+            self.events.put({'event': 'snapshot',
+                             'snapshot': {'geometry': geometry, 'scan_mode': self.scan_mode, 'hashes': hashes}})
+        self.events.put({'event': 'done', 'reason': reason, 'processed': processed, 'total': len(blocks),
+                         'elapsed': time.time() - start_time, 'incremental': True,
+                         'changed_blocks': changed_blocks})
+
+
+class WorkbookScanWorker(ScanThread):
+    """
+    掃描整個工作簿 (所有 Worksheets)。COM 呼叫必須在同一個執行緒進行，
+    所以逐個工作表讀取，每個工作表都使用 iter_area_rows 的陣列讀取。
+    """
+
+    def __init__(self, workbook_com_obj, scan_mode='quick', bulk=True,
+                 chunk_rows=SCAN_CHUNK_ROWS, chunk_seconds=SCAN_CHUNK_SECONDS):
+        super().__init__()
+        import pythoncom
+
+        self.scan_mode = scan_mode
+        self.bulk = bulk
+        self.chunk_rows = chunk_rows
+        self.chunk_seconds = chunk_seconds
+        self._stream = pythoncom.CoMarshalInterThreadInterfaceInStream(
+            pythoncom.IID_IDispatch, workbook_com_obj._oleobj_
+        )
+
+    def run(self):
+        import pythoncom
+
+        pythoncom.CoInitialize()
+        try:
+            self._scan()
+        except Exception as e:
+            self._put_error(e)
+        finally:
+            pythoncom.CoUninitialize()
+
+    def _scan(self):
+        import pythoncom
+        import win32com.client
+
+        start_time = time.time()
+        dispatch = pythoncom.CoGetInterfaceAndReleaseStream(self._stream, pythoncom.IID_IDispatch)
+        self._stream = None
+        workbook = win32com.client.Dispatch(dispatch)
+        worksheets = [worksheet for worksheet in workbook.Worksheets]
+        sheet_names = [worksheet.Name for worksheet in worksheets]
+        self.events.put({'event': 'start', 'total': None, 'incremental': False, 'sheets': sheet_names})
+
+        reason = 'completed'
+        processed = 0
+        rows = []
+        last_flush = time.time()
+        for sheets_done, (sheet_name, worksheet) in enumerate(zip(sheet_names, worksheets), 1):
+            if reason != 'completed':
+                break
+            try:
+                areas = get_formula_areas(worksheet.UsedRange)[0]
+            except Exception as e:
+                if not is_no_formula_error(e):
+                    raise
+                areas = []
+            for area in areas:
+                if reason != 'completed':
+                    break
+                for row in iter_area_rows(area, self.scan_mode, self.bulk):
+                    if self._should_stop():
+                        reason = 'cancelled'
+                        break
+                    rows.append(row + (sheet_name,))
+                    processed += 1
+                    if len(rows) >= self.chunk_rows or time.time() - last_flush >= self.chunk_seconds:
+                        self.events.put({'event': 'rows', 'rows': rows, 'processed': processed, 'total': None,
+                                         'sheet': sheet_name, 'sheets_done': sheets_done - 1,
+                                         'sheets_total': len(sheet_names)})
+                        rows = []
+                        last_flush = time.time()
+            # 每個工作表結束時送出餘下的結果，令進度按工作表更新
+            self.events.put({'event': 'rows', 'rows': rows, 'processed': processed, 'total': None,
+                             'sheet': sheet_name, 'sheets_done': sheets_done if reason == 'completed' else sheets_done - 1,
+                             'sheets_total': len(sheet_names)})
+            rows = []
+            last_flush = time.time()
+        reason = 'no_formulas' if reason == 'completed' and processed == 0 else reason
+        self.events.put({'event': 'done', 'reason': reason, 'processed': processed, 'total': processed,
+                         'elapsed': time.time() - start_time})
+
+
+class DisplayTextWorker(threading.Thread):
+    """
+    在背景讀取儲存格的顯示文字 (Range.Text)，供延遲掃描 (scan_mode 'lazy') 的列表使用。
+    UI 以 request() 提交 (sheet_name, address)；最新的請求優先處理 (使用者正在看的列)，
+    結果以 {'event': 'texts', 'texts': {(sheet_name, address): text}} 分批放入 events。
+    sheet_name 為 None 時讀取建構時的工作表；否則 com_obj 為工作簿，按名稱取得工作表。
+    """
+
+    def __init__(self, com_obj, batch_size=DISPLAY_TEXT_BATCH):
+        super().__init__(daemon=True)
+        import pythoncom
+
+        self.batch_size = batch_size
+        self.events = queue.Queue()
+        self._requests = queue.Queue()
+        self._stop_event = threading.Event()
+        self._stream = pythoncom.CoMarshalInterThreadInterfaceInStream(pythoncom.IID_IDispatch, com_obj._oleobj_)
+
+    def request(self, keys):
+        keys = list(keys)
+        if keys:
+            self._requests.put(keys)
+
+    def stop(self):
+        self._stop_event.set()
+        self._requests.put(None)
+
+    def run(self):
+        import pythoncom
+
+        pythoncom.CoInitialize()
+        try:
+            self._serve()
+        except Exception as e:
+            import traceback
+            self.events.put({'event': 'error', 'error': str(e), 'traceback': traceback.format_exc()})
+        finally:
+            pythoncom.CoUninitialize()
+
+    def _take_requests(self, pending, block):
+        """把 queue 中的請求移到 pending 前面 (後提交的在前)；收到 stop 時返回 False"""
+        try:
+            keys = self._requests.get(timeout=0.2) if block else self._requests.get_nowait()
+        except queue.Empty:
+            return True
+        while True:
+            if keys is None:
+                return False
+            for key in reversed(keys):
+                pending.pop(key, None)
+                pending[key] = None
+            try:
+                keys = self._requests.get_nowait()
+            except queue.Empty:
+                return True
+
+    def _serve(self):
+        import pythoncom
+        import win32com.client
+
+        dispatch = pythoncom.CoGetInterfaceAndReleaseStream(self._stream, pythoncom.IID_IDispatch)
+        self._stream = None
+        com_obj = win32com.client.Dispatch(dispatch)
+        worksheets = {}
+        # dict 保持插入次序；最後插入的 (最新請求) 先處理
+        pending = {}
+        while not self._stop_event.is_set():
+            if not self._take_requests(pending, block=not pending):
+                break
+            texts = {}
+            while pending and len(texts) < self.batch_size:
+                key = next(reversed(pending))
+                del pending[key]
+                sheet_name, address = key
+                try:
+                    if sheet_name is None:
+                        worksheet = com_obj
+                    else:
+                        worksheet = worksheets.get(sheet_name)
+                        if worksheet is None:
+                            worksheet = worksheets[sheet_name] = com_obj.Worksheets(sheet_name)
+                    texts[key] = str(worksheet.Range(address).Text).strip()
+                except Exception as e:
+                    texts[key] = f"ERROR: {e}"
+            if texts:
+                self.events.put({'event': 'texts', 'texts': texts})
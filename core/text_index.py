@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Text Index - 公式及數值字串的 trigram 倒排索引
+
+文字篩選原本逐一測試 StringPool 中每個不同的字串 (text in value)。50 萬條公式的工作簿中，
+搜尋函數名稱、檔案名稱或工作表名稱時，符合的字串通常只佔很小部分。TrigramIndex 記錄每個
+三字元片段 (trigram) 出現在哪些字串：查詢時取查詢文字各 trigram 的 posting list 交集作為候選，
+只對候選字串確認是否真正包含查詢文字。
+
+    - 索引建立在 StringPool 上 (每個不同的字串一次)，由 TextIndexBuilder 在掃描完成後於背景執行緒建立，
+      完成後才設定 pool.text_index；建立期間及未建立索引時篩選照常逐一測試
+    - 出現在超過 1/16 字串中的 trigram (例如 "=su"、"xls") 幾乎沒有篩選作用，不保存其 posting list
+      (stop gram)，以控制記憶體；查詢只有這類 trigram 或少於 3 個字元時返回 None，由呼叫者逐一測試
+    - 索引之後 pool 新增的字串 (例如增量重新掃描) 不在索引中，查詢時逐一測試這部分
+"""
+
+import threading
+from array import array
+
+TRIGRAM = 3
+# 少於此數目的字串不建立索引 (逐一測試已經很快)
+MIN_INDEX_STRINGS = 20000
+# posting list 超過已索引字串數目的 1/16 (且超過 STOP_GRAM_MIN) 時改為 stop gram
+STOP_GRAM_SHIFT = 4
+STOP_GRAM_MIN = 1024
+# 每隔多少個字串檢查一次 stop gram 及是否已取消
+_PRUNE_INTERVAL = 8192
+# 候選數目少於此數目時不再交集 (直接確認較快)
+_VERIFY_CANDIDATES = 64
+
+
+def _trigrams(text):
+    return {text[i:i + TRIGRAM] for i in range(len(text) - TRIGRAM + 1)}
+
+
+class TrigramIndex:
+    """StringPool 小寫字串的 trigram 倒排索引 (建立後只讀)"""
+
+    __slots__ = ('_postings', '_stop_grams', 'count')
+
+    def __init__(self, postings, stop_grams, count):
+        self._postings = postings
+        self._stop_grams = stop_grams
+        # 已索引的字串數目 (編號 0 至 count - 1)
+        self.count = count
+
+    @classmethod
+    def build(cls, lower_strings, count, should_stop=None):
+        """
+        為 lower_strings[:count] 建立索引；should_stop() 返回 True 時中止並返回 None。
+        """
+        postings = {}
+        stop_grams = set()
+        get = postings.get
+        for index in range(count):
+            for gram in _trigrams(lower_strings[index]):
+                posting = get(gram)
+                if posting is not None:
+                    posting.append(index)
+                elif gram not in stop_grams:
+                    postings[gram] = [index]
+            if index % _PRUNE_INTERVAL == _PRUNE_INTERVAL - 1:
+                if should_stop is not None and should_stop():
+                    return None
+                _prune(postings, stop_grams, index + 1)
+        _prune(postings, stop_grams, count)
+        return cls({gram: array('I', posting) for gram, posting in postings.items()}, stop_grams, count)
+
+    def candidates(self, text):
+        """
+        可能包含 text 的字串編號 (只包括已索引的字串，未確認)；
+        無法以索引縮小範圍 (text 少於 3 個字元或只有 stop gram) 時返回 None。
+        """
+        postings = []
+        for gram in _trigrams(text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                postings.append(posting)
+            elif gram not in self._stop_grams:
+                # 沒有任何字串包含這個 trigram
+                return set()
+        if not postings:
+            return None
+        postings.sort(key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            if len(found) < _VERIFY_CANDIDATES:
+                break
+            found.intersection_update(posting)
+        return found
+
+    def search(self, text, lower_strings):
+        """
+        包含 text 的字串編號集合 (text 為小寫)；無法使用索引時返回 None。
+        lower_strings: pool 目前的小寫字串 (索引之後新增的字串逐一測試)
+        """
+        found = self.candidates(text)
+        if found is None:
+            return None
+        ids = {index for index in found if text in lower_strings[index]}
+        ids.update(index for index in range(self.count, len(lower_strings)) if text in lower_strings[index])
+        return ids
+
+    def search_all(self, terms, lower_strings):
+        """包含所有 terms 的字串編號集合 (多個詞的查詢)；任何一個詞無法使用索引時返回 None"""
+        ids = None
+        for term in sorted(terms, key=len, reverse=True):
+            found = self.search(term, lower_strings)
+            if found is None:
+                return None
+            ids = found if ids is None else ids & found
+            if not ids:
+                break
+        return ids
+
+    def nbytes(self):
+        return sum(posting.itemsize * len(posting) for posting in self._postings.values())
+
+
+def _prune(postings, stop_grams, indexed):
+    limit = max(STOP_GRAM_MIN, indexed >> STOP_GRAM_SHIFT)
+    for gram in [gram for gram, posting in postings.items() if len(posting) > limit]:
+        stop_grams.add(gram)
+        del postings[gram]
+
+
+class TextIndexBuilder(threading.Thread):
+    """
+    在背景為一組 StringPool 建立 TrigramIndex，每個 pool 完成後設定 pool.text_index。
+    小寫字串在 UI 執行緒預先取得 (StringPool.lower_strings)，本執行緒只讀取其中已有的部分。
+    """
+
+    def __init__(self, pools):
+        super().__init__(daemon=True)
+        self._jobs = [(pool, pool.lower_strings(), len(pool)) for pool in pools]
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def run(self):
+        try:
+            for pool, lower_strings, count in self._jobs:
+                index = TrigramIndex.build(lower_strings, count, should_stop=self._cancel_event.is_set)
+                if index is None:
+                    return
+                pool.text_index = index
+        except Exception as e:
+            print(f"Text index build failed: {e}")
+
+
+def stop_text_index(controller):
+    builder = getattr(controller, 'text_index_builder', None)
+    if builder is not None:
+        builder.cancel()
+    controller.text_index_builder = None
+
+
+def start_text_index(controller):
+    """掃描完成後為公式及數值字串建立索引 (字串數目少時不建立)"""
+    stop_text_index(controller)
+    pools = controller.all_formulas.pools
+    pending = [pool for pool in (pools.formulas, pools.values)
+               if pool.text_index is None and len(pool) >= MIN_INDEX_STRINGS]
+    if not pending:
+        return
+    builder = TextIndexBuilder(pending)
+    controller.text_index_builder = builder
+    builder.start()
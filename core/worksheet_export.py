@@ -12,7 +12,9 @@ from tkinter import messagebox, filedialog, ttk
 from openpyxl.utils import get_column_letter
 import re
 from core.excel_connector import activate_excel_window
-from core.excel_scanner import refresh_data
+from core.excel_scanner import rescan_incremental
+from core.worksheet_tree import get_visible_rows
+from utils.com_instrumentation import instrumented_operation
 
 def export_formulas_to_excel(controller):
     if not controller.view.result_tree.get_children():
@@ -27,7 +29,7 @@ def export_formulas_to_excel(controller):
         return
     workbook = openpyxl.Workbook()
     sheet_name = "Formulas"
-    if controller.worksheet:
+    if controller.worksheet and not controller.scan_sheets:
         sheet_name = controller.worksheet.Name
     sheet = workbook.active
     sheet.title = sheet_name
@@ -36,8 +38,7 @@ def export_formulas_to_excel(controller):
     sheet.column_dimensions[get_column_letter(2)].number_format = '@'
     address_idx = controller.view.tree_columns.index("address")
     formula_idx = controller.view.tree_columns.index("formula")
-    for i, item_id in enumerate(controller.view.result_tree.get_children()):
-        values = controller.view.result_tree.item(item_id, "values")
+    for i, values in enumerate(get_visible_rows(controller)):
         if len(values) > max(address_idx, formula_idx):
             sheet.cell(row=i + 2, column=1, value=values[address_idx])
             sheet.cell(row=i + 2, column=2, value="'" + values[formula_idx])
@@ -50,6 +51,7 @@ def export_formulas_to_excel(controller):
     os.startfile(file_path)
 
 
+@instrumented_operation("Import and update formulas")
 def import_and_update_formulas(controller):
     root = controller.view.winfo_toplevel()
     original_topmost = root.attributes("-topmost")
@@ -66,7 +68,7 @@ def import_and_update_formulas(controller):
     root.update_idletasks()
     newline = "\n"
 
-    if not controller.workbook or not controller.worksheet:
+    if not controller.workbook or not controller.worksheet or controller.scan_sheets:
         messagebox.showerror("Not Connected", "Please scan a worksheet first.\nThe tool needs an active worksheet to update.")
         progress_frame.grid_forget()
         root.attributes("-topmost", original_topmost)
@@ -214,4 +216,5 @@ def import_and_update_formulas(controller):
         progress_frame.grid_forget()
         root.update_idletasks()
         root.attributes("-topmost", original_topmost)
-        refresh_data(controller, None, scan_mode='quick')
+        # 只重新讀取公式有改變的列區塊 (沒有上次掃描記錄時為完整掃描)
+        rescan_incremental(controller, None, scan_mode='quick')
@@ -16,83 +16,293 @@ from functools import partial
 
 from utils.dependency_converter import convert_tree_to_graph_data
 from core.graph_generator import GraphGenerator
+from utils.com_instrumentation import instrumented_operation
 
 # Import functions from their new locations
 from core.link_analyzer import get_referenced_cell_values
 from utils.excel_io import find_matching_sheet, read_external_cell_value
-from utils.range_optimizer import parse_excel_address
+from core.formula_filter import filter_formulas, parse_address_filters
+from core.formula_query import compile_query, QueryError
+from core.formula_patterns import group_formula_patterns, MAX_RANGE_ADDRESS_LENGTH
+from core.display_text import (resolve_display_text, ensure_display_text, schedule_display_text,
+                               filter_lazy_display_text)
+from core.formula_table import table_source
 from core.excel_connector import activate_excel_window, find_external_workbook_path
-from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.utils import get_column_letter
+from utils.formula_tokenizer import extract_references, reference_workbook_path
 
-def apply_filter(controller, event=None):
+# Sheet 篩選中代表全部工作表的選項
+ALL_SHEETS = "All"
+# 篩選欄輸入後等待的時間 (毫秒)；不改變文字的按鍵不觸發篩選
+FILTER_DEBOUNCE_MS = 150
+_NON_EDIT_KEYS = ('Return', 'KP_Enter', 'Tab', 'Escape')
+
+
+def iter_cell_references(formula, current_workbook_path, current_sheet_name):
+    """
+    使用共用的 tokenizer 列出公式中的儲存格引用 (範圍只取起始儲存格)。
+
+    Yields:
+        dict: {'kind': 'external' / 'local' / 'relative', 'file_name', 'workbook_path',
+               'sheet_name', 'cell_address'}
+    """
+    for reference in extract_references(formula):
+        if reference.ref_kind not in ('cell', 'range'):
+            continue
+        if reference.workbook is not None:
+            kind = 'external'
+        elif reference.sheet_prefix:
+            kind = 'local'
+        else:
+            kind = 'relative'
+        yield {
+            'kind': kind,
+            'file_name': reference.workbook,
+            'workbook_path': reference_workbook_path(reference, current_workbook_path),
+            'sheet_name': reference.sheet if reference.sheet_prefix else current_sheet_name,
+            'cell_address': reference.address.split(':')[0],
+        }
+
+def _current_filter_arguments(controller):
+    """從介面讀取篩選條件 (filter_formulas 的參數)；地址無效時拋出異常，查詢無效時拋出 QueryError"""
+    return {
+        'type_flags': {'formula': controller.show_formula.get(),
+                       'local link': controller.show_local_link.get(),
+                       'external link': controller.show_external_link.get()},
+        'formula_text': controller.view.filter_entries['formula'].get(),
+        'result_text': controller.view.filter_entries['result'].get(),
+        'display_text': controller.view.filter_entries['display_value'].get(),
+        'parsed_address_filters': parse_address_filters(controller.view.filter_entries['address'].get(),
+                                                         controller.placeholder_text,
+                                                         names=getattr(controller, 'address_names', None)),
+        'sheet_name': _selected_sheet_filter(controller),
+        'query': compile_query(controller.view.filter_entries['query'].get(),
+                               names=getattr(controller, 'address_names', None)),
+    }
+
+def _selected_sheet_filter(controller):
+    """整個工作簿掃描時 Sheet 篩選所選的工作表；None 為全部"""
+    sheet_name = controller.sheet_filter.get()
+    if controller.scan_sheets and sheet_name in controller.scan_sheets:
+        return sheet_name
+    return None
+
+def set_scan_sheets(controller, sheet_names):
+    """
+    設定目前結果所屬的工作表 (整個工作簿掃描)；None 為單一工作表掃描。
+    有工作表時顯示 Sheet 欄並啟用 Sheet 篩選。
+    """
+    controller.scan_sheets = list(sheet_names) if sheet_names is not None else None
+    view = controller.view
+    controller.sheet_filter.set(ALL_SHEETS)
+    if controller.scan_sheets is None:
+        view.result_tree.configure(displaycolumns=[column for column in view.tree_columns if column != "sheet"])
+        view.sheet_filter_combo.configure(values=[ALL_SHEETS], state='disabled')
+    else:
+        view.result_tree.configure(displaycolumns=("sheet",) + tuple(column for column in view.tree_columns if column != "sheet"))
+        view.sheet_filter_combo.configure(values=[ALL_SHEETS] + controller.scan_sheets, state='readonly')
+
+def get_row_sheet_name(controller, item_id):
+    """列表項目所屬的工作表 (整個工作簿掃描)；單一工作表掃描返回 None"""
+    values = controller.view.result_tree.item(item_id, "values")
+    sheet_index = controller.view.tree_columns.index("sheet")
+    if len(values) > sheet_index and values[sheet_index]:
+        return values[sheet_index]
+    return None
+
+def _insert_result_rows(controller, rows, start_index=0, parent=""):
+    address_index = controller.view.tree_columns.index("address")
+    if controller.display_text_cache:
+        rows = [resolve_display_text(controller, data) for data in rows]
+    for i, data in enumerate(rows, start_index):
+        tag = "evenrow" if i % 2 == 0 else "oddrow"
+        item_id = controller.view.result_tree.insert(parent, "end", values=data, tags=(tag,))
+        if address_index < len(data):
+            controller.cell_addresses[item_id] = data[address_index]
+
+def _virtual_row_values(controller, row):
+    """虛擬列表顯示列時的 values (已讀取的顯示文字取代佔位)"""
+    if controller.display_text_cache:
+        return resolve_display_text(controller, row)
+    return row
+
+def _on_virtual_item_shown(controller, item_id, values):
+    address_index = controller.view.tree_columns.index("address")
+    if address_index < len(values):
+        controller.cell_addresses[item_id] = values[address_index]
+
+def _on_virtual_item_hidden(controller, item_id):
+    controller.cell_addresses.pop(item_id, None)
+
+def create_virtual_list(controller, tree, scrollbar):
+    """結果列表的 VirtualTreeList：平面列表只為可見的列建立項目"""
+    from ui.virtual_tree import VirtualTreeList
+    return VirtualTreeList(tree, scrollbar,
+                           on_scroll=lambda: schedule_display_text(controller),
+                           row_values=lambda row: _virtual_row_values(controller, row),
+                           on_item_shown=lambda item_id, values: _on_virtual_item_shown(controller, item_id, values),
+                           on_item_hidden=lambda item_id: _on_virtual_item_hidden(controller, item_id))
+
+def clear_result_tree(controller):
+    """刪除結果列表的所有項目 (包括虛擬列表) 及其地址"""
+    controller.view.virtual_list.clear()
     controller.view.result_tree.delete(*controller.view.result_tree.get_children())
     controller.cell_addresses.clear()
-    address_filter_str = controller.view.filter_entries['address'].get().strip()
-    parsed_address_filters = []
-    if address_filter_str and address_filter_str != controller.placeholder_text:
-        address_tokens = [token.strip() for token in address_filter_str.split(',') if token.strip()]
-        if address_tokens:
-            try:
-                for token in address_tokens:
-                    parsed_address_filters.append(parse_excel_address(token))
-            except Exception as e:
-                messagebox.showerror("Invalid Excel Address", str(e))
-                return
-    other_filters = {
-        'type': (controller.show_formula.get(), controller.show_local_link.get(), controller.show_external_link.get()),
-        'formula': controller.view.filter_entries['formula'].get().lower(),
-        'result': controller.view.filter_entries['result'].get().lower(),
-        'display_value': controller.view.filter_entries['display_value'].get().lower()
-    }
-    filtered_formulas = []
-    for formula_data in controller.all_formulas:
-        if len(formula_data) < 5: continue
-        formula_type, address, formula_content, result_val, display_val = formula_data
-        type_map = {'formula': other_filters['type'][0], 'local link': other_filters['type'][1], 'external link': other_filters['type'][2]}
-        if not type_map.get(formula_type, True): continue
-        if other_filters['formula'] and other_filters['formula'] not in str(formula_content).lower(): continue
-        if other_filters['result'] and other_filters['result'] not in str(result_val).lower(): continue
-        if other_filters['display_value'] and other_filters['display_value'] not in str(display_val).lower(): continue
-        if parsed_address_filters:
-            addr_upper = address.replace("$", "").upper()
-            current_cell_match = re.match(r"([A-Z]+)([0-9]+)", addr_upper)
-            if not current_cell_match: continue
-            cell_col_str, cell_row_str = current_cell_match.groups()
-            cell_col_idx = column_index_from_string(cell_col_str)
-            cell_row_idx = int(cell_row_str)
-            is_match = False
-            for f_type, f_val in parsed_address_filters:
-                if f_type == 'cell' and addr_upper == f_val:
-                    is_match = True; break
-                elif f_type == 'row_range':
-                    start_r, end_r = map(int, f_val.split(':'))
-                    if start_r <= cell_row_idx <= end_r:
-                        is_match = True; break
-                elif f_type == 'col_range':
-                    start_c, end_c = f_val.split(':')
-                    if column_index_from_string(start_c) <= cell_col_idx <= column_index_from_string(end_c):
-                        is_match = True; break
-                elif f_type == 'range':
-                    start_cell, end_cell = f_val.split(':')
-                    sc_str, sr_str = re.match(r"([A-Z]+)([0-9]+)", start_cell).groups()
-                    ec_str, er_str = re.match(r"([A-Z]+)([0-9]+)", end_cell).groups()
-                    if (column_index_from_string(sc_str) <= cell_col_idx <= column_index_from_string(ec_str) and
-                        int(sr_str) <= cell_row_idx <= int(er_str)):
-                        is_match = True; break
-            if not is_match: continue
-        filtered_formulas.append(formula_data)
+
+def _insert_pattern_rows(controller, patterns):
+    """
+    Group by Pattern 檢視：每個 R1C1 pattern 一列 (地址欄為覆蓋範圍)，
+    展開時才加入各儲存格 (on_tree_open)，避免一次建立大量項目。
+    """
+    tree = controller.view.result_tree
+    for i, pattern in enumerate(patterns):
+        if pattern.count == 1:
+            _insert_result_rows(controller, [pattern.first], start_index=i)
+            continue
+        tag = "evenrow" if i % 2 == 0 else "oddrow"
+        coverage = pattern.coverage
+        if len(coverage) > MAX_RANGE_ADDRESS_LENGTH:
+            coverage = coverage[:MAX_RANGE_ADDRESS_LENGTH] + "..."
+        values = (pattern.formula_type, coverage, pattern.formula, f"{pattern.count} cells", f"R1C1: {pattern.r1c1}",
+                  pattern.sheet or "")
+        item_id = tree.insert("", "end", values=values, tags=(tag,))
+        # 佔位子項目令列表顯示展開符號
+        tree.insert(item_id, "end", values=("",))
+        controller.pattern_items[item_id] = pattern
+        controller.cell_addresses[item_id] = pattern.range_address
+
+def on_tree_open(controller, event=None):
+    """展開 pattern 列時加入其儲存格"""
+    tree = controller.view.result_tree
+    item_id = tree.focus()
+    pattern = controller.pattern_items.get(item_id)
+    if pattern is None or item_id in controller.loaded_pattern_items:
+        return
+    controller.loaded_pattern_items.add(item_id)
+    tree.delete(*tree.get_children(item_id))
+    _insert_result_rows(controller, pattern.rows, parent=item_id)
+
+def set_pattern_view(controller):
+    """按 Group by Pattern 的狀態切換列表的顯示方式並重新整理"""
+    if controller.group_patterns.get():
+        controller.view.result_tree.configure(show="tree headings")
+    else:
+        controller.view.result_tree.configure(show="headings")
+    apply_filter(controller)
+
+def get_visible_rows(controller):
+    """
+    列表目前顯示的資料列 (Treeview 的 values)；Group by Pattern 檢視時展開為各儲存格的資料列。
+    匯出、摘要及連結替換應使用這個函數而不是直接讀取 Treeview。
+    """
+    tree = controller.view.result_tree
+    virtual_list = controller.view.virtual_list
+    if virtual_list.active:
+        return [_virtual_row_values(controller, row) for row in virtual_list.rows]
+    rows = []
+    for item_id in tree.get_children():
+        pattern = controller.pattern_items.get(item_id)
+        if pattern is not None:
+            rows.extend(pattern.rows)
+        else:
+            rows.append(tree.item(item_id, "values"))
+    return rows
+
+def get_visible_patterns(controller):
+    """
+    Group by Pattern 檢視時返回顯示中的 pattern 列表 (單一儲存格的 pattern 除外)；
+    沒有 pattern 列時返回 None。
+    """
+    patterns = [controller.pattern_items[item_id] for item_id in controller.view.result_tree.get_children()
+                if item_id in controller.pattern_items]
+    return patterns or None
+
+def _detail_cell_address(controller, item_id):
+    """Explode / Impact 分析的儲存格：pattern 列使用其第一個儲存格"""
+    pattern = controller.pattern_items.get(item_id)
+    if pattern is not None:
+        return pattern.first[1].replace('$', '')
+    return controller.cell_addresses.get(item_id, "A1")
+
+def schedule_filter(controller, event=None):
+    """篩選欄輸入文字時稍作等待才篩選，連續輸入時只在停下後篩選一次"""
+    if event is not None and (event.keysym in _NON_EDIT_KEYS or
+                              (not event.char and event.keysym not in ('BackSpace', 'Delete'))):
+        return
+    pending = getattr(controller, 'filter_after', None)
+    if pending is not None:
+        controller.root.after_cancel(pending)
+    controller.filter_after = controller.root.after(FILTER_DEBOUNCE_MS, lambda: apply_filter(controller))
+
+def apply_filter(controller, event=None):
+    pending = getattr(controller, 'filter_after', None)
+    if pending is not None:
+        controller.root.after_cancel(pending)
+        controller.filter_after = None
+    clear_result_tree(controller)
+    controller.pattern_items = {}
+    controller.loaded_pattern_items = set()
+    try:
+        filter_arguments = _current_filter_arguments(controller)
+    except QueryError as e:
+        messagebox.showerror("Invalid Query", str(e))
+        return
+    except Exception as e:
+        messagebox.showerror("Invalid Excel Address", str(e))
+        return
+    sort_index = None
+    sort_reverse = False
     if controller.current_sort_column:
-        col_index = controller.view.tree_columns.index(controller.current_sort_column)
-        sort_dir = controller.sort_directions[controller.current_sort_column]
-        filtered_formulas.sort(key=lambda x: str(x[col_index]), reverse=(sort_dir == -1))
+        sort_index = controller.view.tree_columns.index(controller.current_sort_column)
+        sort_reverse = controller.sort_directions[controller.current_sort_column] == -1
+    all_formulas = controller.all_formulas
+    sort_display = controller.current_sort_column == "display_value"
+    lazy_display = controller.display_text_cache and (filter_arguments['display_text'] or sort_display)
+    if lazy_display and table_source(all_formulas) is None:
+        all_formulas = [resolve_display_text(controller, data) for data in all_formulas]
+        lazy_display = False
+    group_patterns = controller.group_patterns.get()
+    if group_patterns and table_source(all_formulas) is not None:
+        # R1C1 pattern 編號每份掃描結果只計算一次；先在 table 上建立，篩選結果的 view 共用
+        all_formulas.pattern_index()
+    if lazy_display:
+        # 延遲讀取的顯示文字：其他條件仍以欄資料篩選，只有結果列以已讀取的文字比較顯示文字條件及排序
+        filtered_formulas = controller.filter_engine.filter(
+            all_formulas, sort_index=None if sort_display else sort_index, sort_reverse=sort_reverse,
+            **dict(filter_arguments, display_text=''))
+        filtered_formulas = filter_lazy_display_text(controller, filtered_formulas, filter_arguments['display_text'],
+                                                     sort_reverse if sort_display else None)
+    else:
+        # 條件比上一次更窄時 (例如逐字輸入) 只篩選上一次符合的列
+        filtered_formulas = controller.filter_engine.filter(all_formulas, sort_index=sort_index,
+                                                           sort_reverse=sort_reverse, **filter_arguments)
     count = len(filtered_formulas)
+    if group_patterns:
+        # 已排序的資料列按出現次序分組，pattern 的次序跟隨其第一個儲存格
+        patterns = group_formula_patterns(filtered_formulas)
+        controller.view.formula_list_label.config(text=f"Formula List ({count} records in {len(patterns)} patterns):")
+        _insert_pattern_rows(controller, patterns)
+        return
     controller.view.formula_list_label.config(text=f"Formula List ({count} records):")
-    for i, data in enumerate(filtered_formulas):
-        tag = "evenrow" if i % 2 == 0 else "oddrow"
-        item_id = controller.view.result_tree.insert("", "end", values=data, tags=(tag,))
-        address_index = controller.view.tree_columns.index("address")
-        if address_index < len(data):
-            controller.cell_addresses[item_id] = data[address_index]
+    controller.view.virtual_list.set_rows(filtered_formulas)
+
+def append_scan_results(controller, rows):
+    """
+    掃描進行中把新一批結果加到列表末端 (按目前的篩選條件，不排序)。
+    掃描完成後 apply_filter 會按排序重新整理整個列表。
+    """
+    if controller.group_patterns.get():
+        # 分組需要完整的結果，掃描完成後由 apply_filter 建立
+        controller.view.formula_list_label.config(text=f"Formula List ({len(controller.all_formulas)} formulas scanned, grouping when complete...):")
+        return
+    try:
+        filter_arguments = _current_filter_arguments(controller)
+    except Exception:
+        filter_arguments = {}
+    filtered_rows = filter_formulas(rows, **filter_arguments)
+    virtual_list = controller.view.virtual_list
+    virtual_list.append_rows(filtered_rows)
+    controller.view.formula_list_label.config(text=f"Formula List ({len(virtual_list.rows)} records, scanning...):")
 
 def sort_column(controller, col_id):
     controller.current_sort_column = col_id
@@ -105,6 +315,7 @@ def sort_column(controller, col_id):
     current_text = controller.view.result_tree.heading(col_id, "text").split(' ')[0]
     controller.view.result_tree.heading(col_id, text=current_text + current_direction)
 
+@instrumented_operation("Go to reference")
 def go_to_reference(controller, workbook_path, sheet_name, cell_address):
     try:
         try:
@@ -428,13 +639,36 @@ def on_select(controller, event):
         current_detail_text.insert(1.0, "Selected item has incomplete data.")
         return
         
-    formula_type, cell_address, formula, result, display_value = values
+    formula_type, cell_address, formula, result, display_value = values[:5]
+    display_value = ensure_display_text(controller, item_id, values)
+    # 整個工作簿掃描：使用該列所屬的工作表，否則為掃描的工作表
+    row_sheet_name = get_row_sheet_name(controller, item_id)
+    row_worksheet = controller.worksheet
+    if row_sheet_name and controller.workbook:
+        try:
+            row_worksheet = controller.workbook.Worksheets(row_sheet_name)
+        except Exception:
+            row_worksheet = None
     
     current_detail_text.delete(1.0, 'end')
     current_detail_text.insert('end', "Type: ", "label")
     current_detail_text.insert('end', f"{formula_type} / ", "value")
+    if row_sheet_name:
+        current_detail_text.insert('end', "Sheet: ", "label")
+        current_detail_text.insert('end', f"{row_sheet_name} / ", "value")
     current_detail_text.insert('end', "Cell Address: ", "label")
     current_detail_text.insert('end', f"{cell_address}\n", "value")
+    pattern = controller.pattern_items.get(item_id)
+    if pattern is not None:
+        # pattern 列顯示第一個儲存格的公式；引用解析只對這條公式進行
+        cell_address = pattern.first[1]
+        result, display_value = resolve_display_text(controller, pattern.first)[3:5]
+        current_detail_text.insert('end', "Pattern: ", "label")
+        current_detail_text.insert('end', f"{pattern.count} cells ({pattern.coverage}) / ", "value")
+        current_detail_text.insert('end', "R1C1: ", "label")
+        current_detail_text.insert('end', f"{pattern.r1c1}\n", "value")
+        current_detail_text.insert('end', "First Cell: ", "label")
+        current_detail_text.insert('end', f"{cell_address}\n", "value")
     current_detail_text.insert('end', "Calculated Result: ", "label")
     current_detail_text.insert('end', f"{result} / ", "result_value")
     current_detail_text.insert('end', "Displayed Value: ", "label")
@@ -449,13 +683,13 @@ def on_select(controller, event):
                 # 使用當前 cell 的信息進行爆炸分析
                 if hasattr(controller, 'workbook') and controller.workbook:
                     current_workbook_path = controller.workbook.FullName
-                    current_sheet_name = controller.worksheet.Name if hasattr(controller, 'worksheet') and controller.worksheet else "Unknown"
+                    current_sheet_name = row_sheet_name or (controller.worksheet.Name if hasattr(controller, 'worksheet') and controller.worksheet else "Unknown")
                     
                     # 從選中的項目獲取 cell 地址
                     selected_item = controller.view.result_tree.selection()
                     if selected_item:
                         item_id = selected_item[0]
-                        current_cell_address = controller.cell_addresses.get(item_id, "A1")
+                        current_cell_address = _detail_cell_address(controller, item_id)
                         explode_dependencies_popup(controller, current_workbook_path, current_sheet_name, current_cell_address, f"{current_sheet_name}!{current_cell_address}")
                     else:
                         from tkinter import messagebox
@@ -470,18 +704,41 @@ def on_select(controller, event):
     except Exception as e:
         print(f"Could not create Explode button: {e}")
     
+    # Add Impact button (dependents of the selected cell across the workbook)
+    try:
+        def build_impact_handler():
+            def handler():
+                if hasattr(controller, 'workbook') and controller.workbook:
+                    current_workbook_path = controller.workbook.FullName
+                    current_sheet_name = row_sheet_name or (controller.worksheet.Name if hasattr(controller, 'worksheet') and controller.worksheet else "Unknown")
+                    selected_item = controller.view.result_tree.selection()
+                    if selected_item:
+                        current_cell_address = _detail_cell_address(controller, selected_item[0])
+                        impact_analysis_popup(controller, current_workbook_path, current_sheet_name, current_cell_address, f"{current_sheet_name}!{current_cell_address}")
+                    else:
+                        messagebox.showwarning("No Selection", "Please select a cell first.")
+                else:
+                    messagebox.showerror("Excel Not Connected", "Excel connection not available for impact analysis.")
+            return handler
+        
+        current_detail_text.insert('end', " ")
+        impact_btn = tk.Button(current_detail_text, text="Impact", font=("Arial", 8, "bold"), cursor="hand2", bg="#ffcc80", command=build_impact_handler())
+        current_detail_text.window_create('end', window=impact_btn)
+    except Exception as e:
+        print(f"Could not create Impact button: {e}")
+    
     current_detail_text.insert('end', "\n\n")
     
     # 嘗試獲取引用的儲存格值，但即使失敗也要提供 Go to Reference 功能
     referenced_values = None
-    excel_connected = controller.xl and controller.worksheet
+    excel_connected = controller.xl and row_worksheet
     
     if excel_connected:
         try:
             read_func = read_external_cell_value
             referenced_values = get_referenced_cell_values(
                 formula,
-                controller.worksheet,
+                row_worksheet,
                 controller.workbook.FullName,
                 read_func,
                 lambda name, obj: find_matching_sheet(controller.workbook, name)
@@ -494,84 +751,24 @@ def on_select(controller, event):
     formula_references = []
     if formula and formula.startswith('='):
         try:
-            # 解析外部引用 (例如: ='C:\path\[file.xlsx]Sheet'!$A$1)
-            import re
-            
-            # 預處理：標準化公式中的路徑，將雙反斜線轉為單反斜線
-            def normalize_formula_paths(formula):
-                if not formula:
-                    return formula
-                
-                def normalize_path_match(match):
-                    full_match = match.group(0)
-                    path_part = match.group(1)
-                    normalized_path = os.path.normpath(path_part)
-                    return full_match.replace(path_part, normalized_path)
-                
-                external_ref_pattern = r"'([^']*\[[^\]]+\][^']*)'!"
-                return re.sub(external_ref_pattern, normalize_path_match, formula)
-            
-            normalized_formula = normalize_formula_paths(formula)
-            
-            external_pattern = r"'([^']*\[[^\]]+\][^']*)'!\$?([A-Z]+)\$?(\d+)"
-            external_matches = re.findall(external_pattern, normalized_formula)
-            
-            # 創建一個副本來移除已處理的外部引用
-            remaining_formula = normalized_formula
-            
-            for match in external_matches:
-                full_ref, col, row = match
-                # 提取檔案路徑和工作表名稱
-                if '[' in full_ref and ']' in full_ref:
-                    path_part = full_ref.split('[')[0]
-                    file_part = full_ref.split('[')[1].split(']')[0]
-                    sheet_part = full_ref.split(']')[1] if ']' in full_ref else 'Sheet1'
-                    
-                    # 修復路徑中的雙反斜線問題 - 使用更直接的方法
-                    # 先解碼 URL 編碼的字符（如 %20）
-                    from urllib.parse import unquote
-                    decoded_path_part = unquote(path_part)
-                    decoded_file_part = unquote(file_part)
-                    
-                    # 直接組合路徑，然後用 normpath 處理所有斜線問題
-                    raw_path = decoded_path_part + decoded_file_part
-                    workbook_path = os.path.normpath(raw_path)
-                    sheet_name = sheet_part
-                    cell_address = f"{col}{row}"
-                    
-                    formula_references.append({
-                        'display': f"{file_part}]{sheet_name}!{cell_address}",
-                        'workbook_path': workbook_path,
-                        'sheet_name': sheet_name,
-                        'cell_address': cell_address,
-                        'value': 'N/A (Excel not connected)' if not excel_connected else None
-                    })
-                    
-                    # 從剩餘公式中移除這個外部引用，避免路徑被誤認為 cell address
-                    external_ref_full = f"'{full_ref}'!${col}${row}"
-                    remaining_formula = remaining_formula.replace(external_ref_full, "")
-                    # 也處理沒有 $ 符號的情況
-                    external_ref_no_dollar = f"'{full_ref}'!{col}{row}"
-                    remaining_formula = remaining_formula.replace(external_ref_no_dollar, "")
-            
-            # 解析本地引用 (例如: Sheet1!A1, 工作表1!A1)
-            # 修復：支援中文工作表名稱，但排除公式開頭的 = 號
-            # 使用移除外部引用後的公式
-            local_pattern = r"(?<!=)([^'!\[\]=]+)!\$?([A-Z]+)\$?(\d+)"
-            local_matches = re.findall(local_pattern, remaining_formula)
+            if excel_connected and controller.workbook:
+                local_workbook_path = controller.workbook.FullName
+            else:
+                local_workbook_path = "Current Workbook"
             
-            for match in local_matches:
-                sheet, col, row = match
-                if excel_connected and controller.workbook:
-                    workbook_path = controller.workbook.FullName
+            # 外部引用 (例如: ='C:\path\[file.xlsx]Sheet'!$A$1) 及本地引用 (例如: Sheet1!A1, 工作表1!A1)
+            for ref in iter_cell_references(formula, local_workbook_path, None):
+                if ref['kind'] == 'relative':
+                    continue
+                if ref['kind'] == 'external':
+                    display = f"[{ref['file_name']}]{ref['sheet_name']}!{ref['cell_address']}"
                 else:
-                    workbook_path = "Current Workbook"
-                
+                    display = f"{ref['sheet_name']}!{ref['cell_address']}"
                 formula_references.append({
-                    'display': f"{sheet}!{col}{row}",
-                    'workbook_path': workbook_path,
-                    'sheet_name': sheet,
-                    'cell_address': f"{col}{row}",
+                    'display': display,
+                    'workbook_path': ref['workbook_path'],
+                    'sheet_name': ref['sheet_name'],
+                    'cell_address': ref['cell_address'],
                     'value': 'N/A (Excel not connected)' if not excel_connected else None
                 })
                 
@@ -779,12 +976,13 @@ def on_double_click(controller, event):
                 return
             
             controller.workbook = target_workbook
-            if controller.last_worksheet_name and controller.workbook:
+            worksheet_name = get_row_sheet_name(controller, item_id) or controller.last_worksheet_name
+            if worksheet_name and controller.workbook:
                 try:
-                    controller.worksheet = controller.workbook.Worksheets(controller.last_worksheet_name)
+                    controller.worksheet = controller.workbook.Worksheets(worksheet_name)
                 except Exception:
                     controller.worksheet = controller.workbook.ActiveSheet
-                    messagebox.showwarning("Worksheet Not Found", f"Worksheet '{controller.last_worksheet_name}' not found in '{controller.workbook.Name}'. Activating current sheet.")
+                    messagebox.showwarning("Worksheet Not Found", f"Worksheet '{worksheet_name}' not found in '{controller.workbook.Name}'. Activating current sheet.")
             elif controller.workbook:
                 controller.worksheet = controller.workbook.ActiveSheet
             else:
@@ -974,220 +1172,45 @@ def read_reference_openpyxl(controller, workbook_path, sheet_name, cell_address,
                 resolved_formula = cell_info['formula']
                 formula_references = []
                 
-                if resolved_formula and resolved_formula.startswith('='):
-                    import re
-                    
-                    # 預處理：標準化公式中的路徑
-                    def normalize_formula_paths_readonly(formula):
-                        if not formula:
-                            return formula
-                        
-                        def normalize_path_match(match):
-                            full_match = match.group(0)
-                            path_part = match.group(1)
-                            normalized_path = os.path.normpath(path_part)
-                            return full_match.replace(path_part, normalized_path)
-                        
-                        external_ref_pattern = r"'([^']*\[[^\]]+\][^']*)'!"
-                        return re.sub(external_ref_pattern, normalize_path_match, formula)
-                    
-                    normalized_resolved_formula = normalize_formula_paths_readonly(resolved_formula)
-                    
-                    # Parse external references (e.g., ='C:\path\[file.xlsx]Sheet'!$A$1)
-                    external_pattern = r"'([^']*\[[^\]]+\][^']*)'!\$?([A-Z]+)\$?(\d+)"
-                    external_matches = re.findall(external_pattern, normalized_resolved_formula)
-                    
-                    # 創建一個副本來移除已處理的外部引用
-                    remaining_resolved_formula = normalized_resolved_formula
-                    
-                    for match in external_matches:
-                        full_ref, col, row = match
-                        # Extract file path and sheet name
-                        if '[' in full_ref and ']' in full_ref:
-                            path_part = full_ref.split('[')[0]
-                            file_part = full_ref.split('[')[1].split(']')[0]
-                            sheet_part = full_ref.split(']')[1] if ']' in full_ref else 'Sheet1'
-                            
-                            # 修復路徑中的雙反斜線問題 - 使用更直接的方法
-                            # 先解碼 URL 編碼的字符（如 %20）
-                            decoded_path_part = unquote(path_part)
-                            decoded_file_part = unquote(file_part)
-                            
-                            # 直接組合路徑，然後用 normpath 處理所有斜線問題
-                            raw_path = decoded_path_part + decoded_file_part
-                            workbook_path = os.path.normpath(raw_path)
-                            sheet_name = sheet_part
-                            cell_address = f"{col}{row}"
-                            
-                            # 讀取目標 cell 的實際內容
-                            try:
-                                from utils.openpyxl_resolver import read_cell_with_resolved_references
-                                
-                                # 修復：如果工作表名稱包含中文或特殊字符，嘗試加上單引號
-                                sheet_name_to_use = sheet_name
-                                target_cell_info = read_cell_with_resolved_references(workbook_path, sheet_name_to_use, cell_address)
-                                
-                                # 如果失敗且工作表名稱不是純英文數字，嘗試加單引號
-                                if 'error' in target_cell_info and not sheet_name.replace('_', '').isalnum():
-                                    sheet_name_to_use = f"'{sheet_name}'"
-                                    target_cell_info = read_cell_with_resolved_references(workbook_path, sheet_name_to_use, cell_address)
-                                
-                                if 'error' in target_cell_info:
-                                    cell_value = f"Error: {target_cell_info['error']}"
-                                else:
-                                    cell_value = target_cell_info.get('display_value', 'N/A')
-                            except Exception as e:
-                                cell_value = f"Read Error: {str(e)}"
-                            
-                            formula_references.append({
-                                'display': f"[{file_part}]{sheet_name}!{cell_address}",  # 修復：添加開頭的 [
-                                'workbook_path': workbook_path,
-                                'sheet_name': sheet_name,
-                                'cell_address': cell_address,
-                                'value': cell_value  # 顯示實際讀取的值
-                            })
-                            
-                            # 從剩餘公式中移除這個外部引用，避免路徑被誤認為 cell address
-                            external_ref_full = f"'{full_ref}'!${col}${row}"
-                            remaining_resolved_formula = remaining_resolved_formula.replace(external_ref_full, "")
-                            # 也處理沒有 $ 符號的情況
-                            external_ref_no_dollar = f"'{full_ref}'!{col}{row}"
-                            remaining_resolved_formula = remaining_resolved_formula.replace(external_ref_no_dollar, "")
-                    
-                    # Parse local references (e.g., Sheet1!A1) - but only if not part of external references
-                    # First, get all external reference patterns to exclude them
-                    external_refs_in_formula = set()
-                    for match in external_matches:
-                        full_ref, col, row = match
-                        if '[' in full_ref and ']' in full_ref:
-                            sheet_part = full_ref.split(']')[1] if ']' in full_ref else 'Sheet1'
-                            external_refs_in_formula.add(f"{sheet_part}!{col}{row}")
-                    
-                    # Parse local references using a more robust method
-                    # 先移除公式開頭的 = 號，然後尋找所有 worksheet!cell 模式
-                    # 使用移除外部引用後的公式
-                    formula_without_equals = remaining_resolved_formula[1:] if remaining_resolved_formula.startswith('=') else remaining_resolved_formula
-                    
-                    # 使用更精確的方法：尋找 ! 符號，然後向前和向後解析
-                    import re
-                    local_matches = []
-                    
-                    # 找到所有 ! 的位置
-                    exclamation_positions = [i for i, char in enumerate(formula_without_equals) if char == '!']
-                    
-                    for pos in exclamation_positions:
-                        # 向前找工作表名稱
-                        start = pos - 1
-                        
-                        # 檢查是否以單引號結尾（如 'GDP11'!）
-                        if start >= 0 and formula_without_equals[start] == "'":
-                            # 向前找到開始的單引號
-                            quote_start = start - 1
-                            while quote_start >= 0 and formula_without_equals[quote_start] != "'":
-                                quote_start -= 1
-                            
-                            if quote_start >= 0:
-                                # 提取單引號內的工作表名稱
-                                sheet_name = formula_without_equals[quote_start + 1:start]
-                            else:
-                                continue
-                        else:
-                            # 沒有單引號，向前找到邊界
-                            while start >= 0 and formula_without_equals[start] not in "+'*/-()=,":
-                                start -= 1
-                            start += 1
-                            sheet_name = formula_without_equals[start:pos]
+                def read_reference_value(target_path, target_sheet, target_cell):
+                    """讀取目標 cell 的實際內容"""
+                    try:
+                        from utils.openpyxl_resolver import read_cell_with_resolved_references
+                        target_cell_info = read_cell_with_resolved_references(target_path, target_sheet, target_cell)
                         
-                        # 向後找 cell 地址
-                        remaining = formula_without_equals[pos + 1:]
-                        cell_match = re.match(r'\$?([A-Z]+)\$?(\d+)', remaining)
+                        # 如果失敗且工作表名稱不是純英文數字，嘗試加單引號
+                        if 'error' in target_cell_info and not target_sheet.replace('_', '').isalnum():
+                            target_cell_info = read_cell_with_resolved_references(target_path, f"'{target_sheet}'", target_cell)
                         
-                        if cell_match and sheet_name:
-                            col, row = cell_match.groups()
-                            
-                            # 檢查是否為外部引用（包含 [ ] 或已在外部引用列表中）
-                            if '[' not in sheet_name and ']' not in sheet_name:
-                                ref_key = f"{sheet_name}!{col}{row}"
-                                if ref_key not in external_refs_in_formula:
-                                    local_matches.append((sheet_name, col, row))
-                    
-                    for match in local_matches:
-                        sheet, col, row = match
-                        ref_key = f"{sheet}!{col}{row}"
-                        # Skip if it's part of an external reference
-                        if ref_key not in external_refs_in_formula:
-                            # 讀取本地引用的實際內容
-                            try:
-                                from utils.openpyxl_resolver import read_cell_with_resolved_references
-                                
-                                # 修復：如果工作表名稱包含中文或特殊字符，嘗試加上單引號
-                                sheet_name_to_use = sheet
-                                target_cell_info = read_cell_with_resolved_references(workbook_path, sheet_name_to_use, f"{col}{row}")
-                                
-                                # 如果失敗且工作表名稱不是純英文數字，嘗試加單引號
-                                if 'error' in target_cell_info and not sheet.replace('_', '').isalnum():
-                                    sheet_name_to_use = f"'{sheet}'"
-                                    target_cell_info = read_cell_with_resolved_references(workbook_path, sheet_name_to_use, f"{col}{row}")
-                                
-                                if 'error' in target_cell_info:
-                                    cell_value = f"Error: {target_cell_info['error']}"
-                                else:
-                                    cell_value = target_cell_info.get('display_value', 'N/A')
-                            except Exception as e:
-                                cell_value = f"Read Error: {str(e)}"
-                            
-                            formula_references.append({
-                                'display': f"{sheet}!{col}{row}",
-                                'workbook_path': workbook_path,  # Same workbook as the current Read Only tab
-                                'sheet_name': sheet,
-                                'cell_address': f"{col}{row}",
-                                'value': cell_value  # 顯示實際讀取的值
-                            })
+                        if 'error' in target_cell_info:
+                            return f"Error: {target_cell_info['error']}"
+                        return target_cell_info.get('display_value', 'N/A')
+                    except Exception as e:
+                        return f"Read Error: {str(e)}"
                 
-                # Parse relative references (e.g., A12, B5) - cells without worksheet prefix
-                if normalized_resolved_formula and normalized_resolved_formula.startswith('='):
-                    # 解析相對引用：沒有工作表名稱的 cell 引用
-                    relative_pattern = r"(?<![A-Za-z0-9_!'])([A-Z]+)(\d+)(?![A-Za-z0-9_])"
-                    relative_matches = re.findall(relative_pattern, formula_without_equals)
+                if resolved_formula and resolved_formula.startswith('='):
+                    # 使用共用的 tokenizer：外部引用、本地引用 (Sheet1!A1)、相對引用 (A12)，按此次序顯示
+                    parsed_references = list(iter_cell_references(resolved_formula, workbook_path, sheet_name))
+                    kind_order = {'external': 0, 'local': 1, 'relative': 2}
+                    parsed_references.sort(key=lambda ref: kind_order[ref['kind']])
                     
-                    for col, row in relative_matches:
-                        cell_address_rel = f"{col}{row}"
-                        
-                        # 檢查是否已經在絕對引用中（避免重複）
-                        already_exists = any(
-                            ref['cell_address'] == cell_address_rel 
-                            for ref in formula_references
-                        )
-                        
-                        if not already_exists:
-                            # 相對引用使用當前工作表
-                            try:
-                                from utils.openpyxl_resolver import read_cell_with_resolved_references
-                                
-                                # 使用當前工作表名稱（從 Cell Address 中提取）
-                                current_sheet = sheet_name  # 這是當前 Read Only tab 的工作表
-                                
-                                target_cell_info = read_cell_with_resolved_references(workbook_path, current_sheet, cell_address_rel)
-                                
-                                # 如果失敗且工作表名稱包含特殊字符，嘗試加單引號
-                                if 'error' in target_cell_info and not current_sheet.replace('_', '').isalnum():
-                                    sheet_name_to_use = f"'{current_sheet}'"
-                                    target_cell_info = read_cell_with_resolved_references(workbook_path, sheet_name_to_use, cell_address_rel)
-                                
-                                if 'error' in target_cell_info:
-                                    cell_value = f"Error: {target_cell_info['error']}"
-                                else:
-                                    cell_value = target_cell_info.get('display_value', 'N/A')
-                            except Exception as e:
-                                cell_value = f"Read Error: {str(e)}"
-                            
-                            formula_references.append({
-                                'display': f"{current_sheet}!{cell_address_rel}",  # 顯示完整引用
-                                'workbook_path': workbook_path,
-                                'sheet_name': current_sheet,
-                                'cell_address': cell_address_rel,
-                                'value': cell_value
-                            })
+                    for ref in parsed_references:
+                        if ref['kind'] == 'relative' and any(
+                            existing['cell_address'] == ref['cell_address'] for existing in formula_references
+                        ):
+                            # 已經在絕對引用中（避免重複）
+                            continue
+                        if ref['kind'] == 'external':
+                            display = f"[{ref['file_name']}]{ref['sheet_name']}!{ref['cell_address']}"
+                        else:
+                            display = f"{ref['sheet_name']}!{ref['cell_address']}"
+                        formula_references.append({
+                            'display': display,
+                            'workbook_path': ref['workbook_path'],
+                            'sheet_name': ref['sheet_name'],
+                            'cell_address': ref['cell_address'],
+                            'value': read_reference_value(ref['workbook_path'], ref['sheet_name'], ref['cell_address'])
+                        })
                 
                 # Display referenced cell values with Go to Reference buttons
                 if formula_references:
@@ -1253,7 +1276,11 @@ def explode_dependencies_popup(controller, workbook_path, sheet_name, cell_addre
     彈出視窗顯示公式依賴關係爆炸圖
     """
     try:
-        from utils.dependency_exploder import explode_cell_dependencies
+        from utils.dependency_exploder import RANGE_PAGE_SIZE
+        from utils.level_exploder import LevelDependencyExploder
+        from utils.parallel_exploder import get_explosion_pool
+        import threading
+        import queue
         import tkinter as tk
         from tkinter import ttk, messagebox
         
@@ -1283,6 +1310,9 @@ def explode_dependencies_popup(controller, workbook_path, sheet_name, cell_addre
         analyze_btn = ttk.Button(control_frame, text="Start Analysis", command=lambda: start_analysis())
         analyze_btn.pack(side=tk.LEFT, padx=5)
         
+        stop_btn = ttk.Button(control_frame, text="Stop", state='disabled', command=lambda: stop_analysis())
+        stop_btn.pack(side=tk.LEFT, padx=5)
+        
         progress_var = tk.StringVar(value="Ready to analyze...")
         progress_label = ttk.Label(control_frame, textvariable=progress_var)
         progress_label.pack(side=tk.LEFT, padx=10)
@@ -1391,38 +1421,151 @@ def explode_dependencies_popup(controller, workbook_path, sheet_name, cell_addre
         summary_text = tk.Text(summary_frame, height=4, wrap=tk.WORD)
         summary_text.pack(fill='x')
         
+        # 延遲載入：item_id -> 尚未插入子節點的樹節點
+        pending_nodes = {}
+        # 範圍節點：range item_id -> 節點；"載入更多" item_id -> range item_id
+        range_items = {}
+        load_more_items = {}
+        explosion_max_depth = 8
+        range_exploder_holder = []
+        # 串流展開：每次最多建立的節點數目及秒數，超過後可 "Expand Further"
+        stream_node_budget = 5000
+        stream_time_budget = 60
+        # item_id -> 帶 continuation 的節點；id(node) -> item_id；item_id -> 節點
+        continuation_items = {}
+        node_items = {}
+        item_nodes = {}
+        stream_state = {'running': False, 'cancel': None, 'exploder': None, 'queue': None, 'count': 0}
+        
         def start_analysis():
-            """開始依賴關係分析"""
-            try:
-                analyze_btn.config(state='disabled')
-                progress_var.set("Analyzing dependencies...")
-                popup.update()
-                
-                # 清空樹狀視圖
-                for item in dependency_tree.get_children():
-                    dependency_tree.delete(item)
-                
-                # 執行爆炸分析
-                dependency_tree_data, summary = explode_cell_dependencies(
-                    workbook_path, sheet_name, cell_address, max_depth=8
-                )
-                
-                # 儲存樹狀數據供刷新使用
-                refresh_tree_display.tree_data = dependency_tree_data
-                
-                # 填充樹狀視圖
-                populate_tree(dependency_tree_data)
-                
-                # 顯示摘要
+            """開始依賴關係分析 (背景執行緒串流展開，節點到達即加入樹狀視圖)"""
+            if stream_state['running']:
+                return
+            # 清空樹狀視圖
+            for item in dependency_tree.get_children():
+                dependency_tree.delete(item)
+            pending_nodes.clear()
+            range_items.clear()
+            load_more_items.clear()
+            continuation_items.clear()
+            node_items.clear()
+            item_nodes.clear()
+            refresh_tree_display.tree_data = None
+            summary_text.delete(1.0, tk.END)
+            
+            pool = get_explosion_pool()
+            exploder = LevelDependencyExploder(max_depth=explosion_max_depth, pool=pool if pool.parallel else None)
+            stream_state['exploder'] = exploder
+            run_stream(lambda cancel_event: exploder.iter_explode(
+                workbook_path, sheet_name, cell_address, node_budget=stream_node_budget,
+                time_budget=stream_time_budget, cancel_event=cancel_event
+            ))
+        
+        def expand_further(item_id):
+            """從 truncated / limit_reached / 共用節點的 continuation 繼續展開"""
+            node = continuation_items.get(item_id)
+            if node is None or stream_state['running'] or stream_state['exploder'] is None:
+                return
+            continuation = node.pop('continuation')
+            continuation_items.pop(item_id, None)
+            if continuation['replace']:
+                # 以真正的節點取代 truncated 節點
+                parent_node = item_nodes.get(dependency_tree.parent(item_id))
+                if parent_node is not None and node in parent_node.get('children', []):
+                    parent_node['children'].remove(node)
+                dependency_tree.delete(item_id)
+                node_items.pop(id(node), None)
+            else:
+                parent_node = node
+                for placeholder in dependency_tree.get_children(item_id):
+                    dependency_tree.delete(placeholder)
+                dependency_tree.item(item_id, open=True)
+            exploder = stream_state['exploder']
+            run_stream(lambda cancel_event: exploder.resume_explode(
+                continuation, parent_node, node_budget=stream_node_budget,
+                time_budget=stream_time_budget, cancel_event=cancel_event
+            ))
+        
+        def run_stream(make_generator):
+            """在背景執行緒執行展開 generator，事件經 queue 交給 Tk 執行緒"""
+            cancel_event = threading.Event()
+            events = queue.Queue()
+            stream_state.update(running=True, cancel=cancel_event, queue=events, count=0)
+            analyze_btn.config(state='disabled')
+            stop_btn.config(state='normal')
+            progress_var.set("Analyzing dependencies...")
+            
+            def worker():
+                try:
+                    for event in make_generator(cancel_event):
+                        events.put(event)
+                except Exception as e:
+                    events.put({'event': 'error', 'error': str(e)})
+            
+            threading.Thread(target=worker, daemon=True).start()
+            popup.after(50, drain_stream)
+        
+        def stop_analysis():
+            if stream_state['cancel'] is not None:
+                stream_state['cancel'].set()
+                progress_var.set("Stopping...")
+        
+        def drain_stream():
+            """每次最多處理 500 個事件，保持介面反應"""
+            if not popup.winfo_exists():
+                stream_state['cancel'].set()
+                return
+            events = stream_state['queue']
+            for _ in range(500):
+                try:
+                    event = events.get_nowait()
+                except queue.Empty:
+                    break
+                if event['event'] == 'node':
+                    append_stream_node(event['node'], event['parent'])
+                    continue
+                finish_stream(event)
+                return
+            progress_var.set(f"Analyzing dependencies... {stream_state['count']} nodes")
+            popup.after(50, drain_stream)
+        
+        def append_stream_node(node, parent):
+            if parent is None:
+                refresh_tree_display.tree_data = node
+                parent_item = ''
+            else:
+                parent_item = node_items.get(id(parent))
+                if parent_item is None or not dependency_tree.exists(parent_item):
+                    return
+                # 較深的節點在串流時也直接插入，移除延遲載入的記錄
+                pending_nodes.pop(parent_item, None)
+            # 子節點會以各自的事件到達，這裡只插入節點本身
+            populate_tree(node, parent_item, recurse=False)
+            if node.get('type') != 'truncated':
+                stream_state['count'] += 1
+        
+        def finish_stream(event):
+            stream_state.update(running=False, cancel=None)
+            analyze_btn.config(state='normal')
+            stop_btn.config(state='disabled')
+            if event['event'] == 'error':
+                messagebox.showerror("Analysis Error", f"Could not analyze dependencies:\n{event['error']}")
+                progress_var.set(f"Analysis failed: {event['error']}")
+                return
+            root_node = getattr(refresh_tree_display, 'tree_data', None)
+            if root_node:
+                summary = stream_state['exploder'].get_explosion_summary(root_node)
                 show_summary(summary)
-                
-                progress_var.set(f"Analysis complete! Found {summary['total_nodes']} nodes, max depth: {summary['max_depth']}")
-                
-            except Exception as e:
-                messagebox.showerror("Analysis Error", f"Could not analyze dependencies:\n{str(e)}")
-                progress_var.set(f"Analysis failed: {str(e)}")
-            finally:
-                analyze_btn.config(state='normal')
+            reasons = {
+                'complete': "Analysis complete!",
+                'node_budget': f"Stopped at node budget ({stream_node_budget}).",
+                'time_budget': f"Stopped after {stream_time_budget}s.",
+                'cancelled': "Stopped by user.",
+            }
+            message = f"{reasons.get(event['reason'], event['reason'])} {event['node_count']} nodes in {event['elapsed']:.1f}s"
+            if event['truncated']:
+                message += f", {event['truncated']} branches not expanded (double-click ⏩ to expand further)"
+            progress_var.set(message)
         
         def format_formula_display(formula):
             """根據顯示選項格式化公式"""
@@ -1458,8 +1601,8 @@ def explode_dependencies_popup(controller, workbook_path, sheet_name, cell_addre
                 # 完整顯示：使用 full_address 格式
                 return node.get('full_address', address)
         
-        def populate_tree(node, parent=''):
-            """遞歸填充樹狀視圖"""
+        def populate_tree(node, parent='', recurse=True):
+            """遞歸填充樹狀視圖；recurse=False 時只插入節點本身 (串流模式)"""
             try:
                 # 準備顯示數據
                 raw_address = node.get('address', 'Unknown')
@@ -1468,6 +1611,9 @@ def explode_dependencies_popup(controller, workbook_path, sheet_name, cell_addre
                 # 根據顯示選項格式化
                 address = format_address_display(raw_address, node)
                 formula = format_formula_display(raw_formula)
+                if node.get('type') == 'range':
+                    # 範圍節點：公式欄顯示儲存格數目和彙總
+                    formula = node.get('range_summary_text', '')
                 
                 value = str(node.get('value', ''))
                 if len(value) > 20:
@@ -1485,6 +1631,10 @@ def explode_dependencies_popup(controller, workbook_path, sheet_name, cell_addre
                     icon = "❌"
                 elif node_type == 'circular_ref':
                     icon = "🔄"
+                elif node_type == 'range':
+                    icon = "📦"
+                elif node_type == 'truncated':
+                    icon = "⏩"
                 else:
                     icon = "📋"
                 
@@ -1521,22 +1671,100 @@ def explode_dependencies_popup(controller, workbook_path, sheet_name, cell_addre
                     basic_info = f"{node_details['workbook_path']}|{node_details['sheet_name']}|{node_details['cell_address']}"
                     dependency_tree.item(item_id, tags=(basic_info,))
                 
-                # 遞歸添加子節點
-                for child in node.get('children', []):
-                    populate_tree(child, item_id)
+                node_items[id(node)] = item_id
+                item_nodes[item_id] = node
+                if node.get('continuation'):
+                    continuation_items[item_id] = node
+                    if not node['continuation']['replace']:
+                        # 共用節點：展開時才繼續
+                        dependency_tree.insert(item_id, 'end', text="...")
+                        return item_id
                 
-                # 展開前幾層
+                # 範圍節點：已載入的儲存格 + "載入更多"
+                if node_type == 'range':
+                    range_items[item_id] = node
+                    if recurse:
+                        for child in node.get('children', []):
+                            populate_tree(child, item_id)
+                    add_load_more_item(item_id, node)
+                    return item_id
+                
+                # 展開前幾層；較深的節點在展開時才插入子節點
+                children = node.get('children', []) if recurse else []
                 if depth < 3:
+                    for child in children:
+                        populate_tree(child, item_id)
                     dependency_tree.item(item_id, open=True)
+                elif children:
+                    dependency_tree.insert(item_id, 'end', text="...")
+                    pending_nodes[item_id] = node
+                return item_id
                     
             except Exception as e:
                 print(f"Error populating tree node: {e}")
         
+        def load_pending_children(item_id):
+            """插入延遲載入的子節點"""
+            node = pending_nodes.pop(item_id, None)
+            if node is None:
+                return
+            for placeholder in dependency_tree.get_children(item_id):
+                dependency_tree.delete(placeholder)
+            for child in node.get('children', []):
+                populate_tree(child, item_id)
+        
+        def add_load_more_item(range_item_id, node):
+            """範圍節點還有未載入的儲存格時，加入 "載入更多" 項目"""
+            offset = node.get('range_next_offset')
+            if offset is None:
+                return
+            total = node.get('range_summary', {}).get('non_empty', 0)
+            load_item = dependency_tree.insert(
+                range_item_id, 'end',
+                text=f"➕ Load cells {offset + 1}-{min(offset + RANGE_PAGE_SIZE, total)} of {total} (double-click)"
+            )
+            load_more_items[load_item] = range_item_id
+        
+        def load_range_page(range_item_id):
+            """展開範圍節點的下一頁儲存格"""
+            node = range_items.get(range_item_id)
+            if node is None:
+                return
+            for load_item in [item for item, owner in load_more_items.items() if owner == range_item_id]:
+                load_more_items.pop(load_item, None)
+                if dependency_tree.exists(load_item):
+                    dependency_tree.delete(load_item)
+            try:
+                if not range_exploder_holder:
+                    range_exploder_holder.append(LevelDependencyExploder(max_depth=explosion_max_depth))
+                progress_var.set(f"Loading cells of {node.get('address', '')}...")
+                popup.update()
+                children, has_more = range_exploder_holder[0].expand_range_node(node)
+                for child in children:
+                    populate_tree(child, range_item_id)
+                add_load_more_item(range_item_id, node)
+                dependency_tree.item(range_item_id, open=True)
+                progress_var.set(f"Loaded {len(node.get('children', []))} cells of {node.get('address', '')}")
+            except Exception as e:
+                messagebox.showerror("Range Error", f"Could not load range cells:\n{str(e)}")
+        
+        def on_tree_open(event):
+            item_id = dependency_tree.focus()
+            load_pending_children(item_id)
+            node = continuation_items.get(item_id)
+            if node is not None and not node['continuation']['replace']:
+                expand_further(item_id)
+            # 第一次展開範圍節點時自動載入第一頁
+            node = range_items.get(item_id)
+            if node is not None and not node.get('children') and node.get('range_next_offset') == 0:
+                load_range_page(item_id)
+        
         def show_summary(summary):
             """顯示分析摘要"""
             summary_text.delete(1.0, tk.END)
             
             summary_content = f"""Total Nodes: {summary['total_nodes']}
+Unique Cells: {summary.get('unique_cells', summary['total_nodes'])} (Paths: {summary.get('total_paths', summary['total_nodes'])})
 Maximum Depth: {summary['max_depth']}
 Circular References: {summary['circular_references']}
 
@@ -1567,10 +1795,19 @@ Node Type Distribution:
                 save_expanded_state()
                 
                 # 重新填充樹狀視圖
-                if hasattr(refresh_tree_display, 'tree_data'):
+                if stream_state['running']:
+                    print("Analysis is still running; refresh skipped")
+                    return
+                if getattr(refresh_tree_display, 'tree_data', None):
                     # 清空現有內容
                     for item in dependency_tree.get_children():
                         dependency_tree.delete(item)
+                    pending_nodes.clear()
+                    range_items.clear()
+                    load_more_items.clear()
+                    continuation_items.clear()
+                    node_items.clear()
+                    item_nodes.clear()
                     
                     # 重新填充
                     populate_tree(refresh_tree_display.tree_data)
@@ -1599,6 +1836,13 @@ Node Type Distribution:
                     return
                     
                 item = dependency_tree.selection()[0]
+                if item in load_more_items:
+                    load_range_page(load_more_items[item])
+                    return
+                node = continuation_items.get(item)
+                if node is not None and node['continuation']['replace']:
+                    expand_further(item)
+                    return
                 item_text = dependency_tree.item(item, "text")
                 tags = dependency_tree.item(item, "tags")
                 
@@ -1703,6 +1947,7 @@ Node Type Distribution:
                 traceback.print_exc()
         
         dependency_tree.bind("<Double-1>", on_tree_double_click)
+        dependency_tree.bind("<<TreeviewOpen>>", on_tree_open)
         
         # 右鍵菜單
         def show_context_menu(event):
@@ -1715,6 +1960,8 @@ Node Type Distribution:
                     context_menu = tk.Menu(popup, tearoff=0)
                     context_menu.add_command(label="Go to Reference", command=lambda: on_tree_double_click(None))
                     context_menu.add_command(label="Copy Address", command=lambda: copy_address(item))
+                    if item in continuation_items:
+                        context_menu.add_command(label="Expand Further", command=lambda: expand_further(item))
                     context_menu.add_separator()
                     context_menu.add_command(label="Expand All", command=lambda: expand_all(item))
                     context_menu.add_command(label="Collapse All", command=lambda: collapse_all(item))
@@ -1732,6 +1979,7 @@ Node Type Distribution:
         
         def expand_all(item):
             """展開所有子節點"""
+            load_pending_children(item)
             dependency_tree.item(item, open=True)
             for child in dependency_tree.get_children(item):
                 expand_all(child)
@@ -1754,3 +2002,125 @@ Node Type Distribution:
         print(f"Explosion Error: {e}")
         import traceback
         traceback.print_exc()
+
+
+def impact_analysis_popup(controller, workbook_path, sheet_name, cell_address, reference_display):
+    """
+    彈出視窗顯示影響分析：哪些公式 (直接/遞移) 引用了該儲存格，或該儲存格的 N 層前置儲存格。
+    使用工作簿層級的依賴索引，首次建立後每次查詢只需毫秒。
+    """
+    try:
+        import threading
+        import queue
+        from utils.dependency_index import get_dependency_index
+        
+        if not os.path.exists(workbook_path):
+            messagebox.showerror("File Not Found", f"Workbook file not found:\n{workbook_path}")
+            return
+        
+        popup = tk.Toplevel()
+        popup.title(f"Impact Analysis: {reference_display}")
+        popup.geometry("900x600")
+        popup.resizable(True, True)
+        
+        main_frame = ttk.Frame(popup)
+        main_frame.pack(fill='both', expand=True, padx=10, pady=10)
+        
+        control_frame = ttk.Frame(main_frame)
+        control_frame.pack(fill='x', pady=(0, 10))
+        
+        direction_var = tk.StringVar(value="dependents")
+        ttk.Radiobutton(control_frame, text="Dependents (what breaks)", variable=direction_var, value="dependents", command=lambda: run_query()).pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(control_frame, text="Precedents", variable=direction_var, value="precedents", command=lambda: run_query()).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(control_frame, text="Max depth (0 = all):").pack(side=tk.LEFT, padx=(15, 2))
+        depth_var = tk.StringVar(value="0")
+        depth_spin = ttk.Spinbox(control_frame, from_=0, to=50, width=4, textvariable=depth_var, command=lambda: run_query())
+        depth_spin.pack(side=tk.LEFT)
+        depth_spin.bind('<Return>', lambda e: run_query())
+        
+        progress_var = tk.StringVar(value="Building dependency index...")
+        ttk.Label(control_frame, textvariable=progress_var).pack(side=tk.LEFT, padx=10)
+        
+        tree_frame = ttk.Frame(main_frame)
+        tree_frame.pack(fill='both', expand=True)
+        tree_scroll = ttk.Scrollbar(tree_frame)
+        tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        impact_tree = ttk.Treeview(tree_frame, columns=('depth', 'sheet', 'address', 'formula'), show='headings', yscrollcommand=tree_scroll.set)
+        impact_tree.pack(fill='both', expand=True)
+        tree_scroll.config(command=impact_tree.yview)
+        for column_id, text, width in (('depth', 'Depth', 60), ('sheet', 'Sheet', 160), ('address', 'Address', 100), ('formula', 'Formula', 500)):
+            impact_tree.heading(column_id, text=text, anchor=tk.W)
+            impact_tree.column(column_id, width=width, minwidth=40)
+        
+        index_holder = []
+        row_targets = {}
+        
+        def run_query():
+            if not index_holder:
+                return
+            index = index_holder[0]
+            try:
+                max_depth = int(depth_var.get() or 0) or None
+            except ValueError:
+                max_depth = None
+            for item in impact_tree.get_children():
+                impact_tree.delete(item)
+            row_targets.clear()
+            try:
+                if direction_var.get() == "dependents":
+                    results = index.get_dependents(workbook_path, sheet_name, cell_address, max_depth=max_depth)
+                else:
+                    results = index.get_precedents(workbook_path, sheet_name, cell_address, max_depth=max_depth)
+            except Exception as e:
+                progress_var.set(f"Query failed: {e}")
+                return
+            
+            current_file = os.path.normcase(os.path.normpath(workbook_path))
+            for result in results:
+                sheet_display = result['sheet_name']
+                if os.path.normcase(os.path.normpath(result['workbook_path'])) != current_file:
+                    sheet_display = f"[{os.path.basename(result['workbook_path'])}]{sheet_display}"
+                item = impact_tree.insert('', 'end', values=(result['depth'], sheet_display, result['cell_address'], result['formula'] or ("(range)" if result['is_range'] else "")))
+                row_targets[item] = result
+            stats = index.get_stats()
+            progress_var.set(f"{len(results)} {direction_var.get()} found (index: {stats['formula_cells']} formulas, built in {stats['build_seconds']:.1f}s, saved file)")
+        
+        def on_double_click(event):
+            item = impact_tree.identify_row(event.y)
+            result = row_targets.get(item)
+            if result and not result['is_range']:
+                go_to_reference(controller, result['workbook_path'], result['sheet_name'], result['cell_address'])
+        
+        impact_tree.bind('<Double-1>', on_double_click)
+        
+        build_results = queue.Queue()
+        
+        def build_index():
+            """背景執行緒：結果經 queue 交給 Tk 執行緒 (不在此執行緒呼叫 Tk)"""
+            try:
+                build_results.put(('index', get_dependency_index(workbook_path)))
+            except Exception as e:
+                build_results.put(('error', str(e)))
+        
+        def poll_index():
+            if not popup.winfo_exists():
+                return
+            try:
+                kind, value = build_results.get_nowait()
+            except queue.Empty:
+                popup.after(100, poll_index)
+                return
+            if kind == 'error':
+                progress_var.set(f"Could not build dependency index: {value}")
+                return
+            index_holder.append(value)
+            run_query()
+        
+        # 建立索引可能需要數秒，在背景執行緒完成 (只讀取磁碟上的檔案，不使用 COM)
+        threading.Thread(target=build_index, daemon=True).start()
+        popup.after(100, poll_index)
+        
+    except Exception as e:
+        messagebox.showerror("Impact Analysis Error", f"Could not create impact analysis view:\nError: {e}")
+        print(f"Impact Analysis Error: {e}")
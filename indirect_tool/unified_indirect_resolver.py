@@ -16,6 +16,7 @@ import re
 import stat
 from urllib.parse import unquote
 sys.path.append('.')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
     import openpyxl
@@ -23,6 +24,11 @@ try:
 except ImportError:
     HAS_OPENPYXL = False
 
+try:
+    from utils.workbook_cache import workbook_cache
+except ImportError:
+    workbook_cache = None
+
 try:
     import win32com.client as win32
     HAS_WIN32COM = True
@@ -156,8 +162,11 @@ class UnifiedIndirectResolver:
             return
         
         try:
-            # 載入工作簿
-            self.workbook = openpyxl.load_workbook(file_path, data_only=False)
+            # 載入工作簿 (經由共用 workbook cache，重複載入同一檔案不會重新解析)
+            if workbook_cache is not None:
+                self.workbook = workbook_cache.get_formula_workbook(file_path)
+            else:
+                self.workbook = openpyxl.load_workbook(file_path, data_only=False)
             self.current_file = file_path
             
             self.add_result(f"File loaded: {os.path.basename(file_path)}")
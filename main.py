@@ -178,6 +178,8 @@ class ExcelToolsApp:
 
 def main():
     """Main entry point"""
+    from utils.com_instrumentation import install_from_environment
+    install_from_environment()
     app = ExcelToolsApp()
     app.run()
 
@@ -268,12 +268,12 @@ class SimplifiedWorksheetController(WorksheetController):
                     temp_button.pack_forget()  # Hide it immediately
                     
                     # Call refresh_data with "quick" mode (same default as Normal Mode)
-                    refresh_data(self, temp_button, scan_mode="quick")
-                    
-                    print(f"Scanned selected cell {original_selected_address} in {self.pane_name}")
-                    
                     # Auto-select the first result to show details in main tab (Inspect Mode feature)
-                    self.view.after(100, self.auto_select_first_result)
+                    # 掃描在背景執行，完成後才選取第一個結果
+                    refresh_data(self, temp_button, scan_mode="quick",
+                                 on_complete=lambda controller: controller.view.after(100, controller.auto_select_first_result))
+                    
+                    print(f"Started scan of selected cell {original_selected_address} in {self.pane_name}")
                     
                 else:
                     messagebox.showwarning("No Selection", "Please select a cell in Excel first.")
@@ -6,6 +6,9 @@ import collections
 from ui.visualizer import show_visual_chart
 from utils.excel_helpers import select_ranges_in_excel, replace_links_in_excel
 from utils.range_optimizer import smart_range_display
+from utils.formula_tokenizer import external_path_matcher
+from core.formula_patterns import pattern_link_addresses
+from core.worksheet_tree import get_visible_patterns
 
 class SummaryWindow(tk.Toplevel):
     def __init__(self, parent, pane, formulas_to_summarize, is_filtered):
@@ -71,7 +74,8 @@ class SummaryWindow(tk.Toplevel):
         self.summary_tree.configure(yscrollcommand=scrollbar.set)
         
         # Optimized external link extraction with progress indication
-        self.external_path_pattern = re.compile(r"'([^']+\\[^\]]+\.(?:xlsx|xls|xlsm|xlsb)\][^']*?)'", re.IGNORECASE)
+        # 共用的 tokenizer 提供 findall() 介面，結果按公式字串快取
+        self.external_path_pattern = external_path_matcher
         
         # Show progress dialog for large datasets
         total_formulas = len(self.formulas_to_summarize)
@@ -178,7 +182,17 @@ class SummaryWindow(tk.Toplevel):
         self.link_to_addresses_cache = collections.defaultdict(list)
         address_idx = self.pane.view.tree_columns.index("address")
         formula_idx = self.pane.view.tree_columns.index("formula")
+        # Group by Pattern 檢視：每個 pattern 只擷取一次連結，地址以覆蓋範圍表示
+        visible_patterns = get_visible_patterns(self.pane)
+        if visible_patterns:
+            for link, addresses in pattern_link_addresses(visible_patterns).items():
+                self.link_to_addresses_cache[link].extend(addresses)
+            pattern_rows = {id(row) for pattern in visible_patterns for row in pattern.rows}
+        else:
+            pattern_rows = set()
         for formula_data in self.formulas_to_summarize:
+            if id(formula_data) in pattern_rows:
+                continue
             if len(formula_data) > formula_idx:
                 formula_content = formula_data[formula_idx]
                 matches = self.external_path_pattern.findall(str(formula_content))
@@ -268,10 +282,7 @@ class SummaryWindow(tk.Toplevel):
 
     def on_summary_close(self):
         if hasattr(self, "did_replace") and self.did_replace and self.rescan_var.get():
-            app = self.parent.winfo_toplevel().app if hasattr(self.parent.winfo_toplevel(), "app") else None
-            if app:
-                if self.pane.pane_name == "Worksheet1":
-                    app.scan_left_quick()
-                elif self.pane.pane_name == "Worksheet2":
-                    app.scan_right_quick()
+            # 只重新掃描公式被取代的列區塊
+            from core.excel_scanner import rescan_incremental
+            rescan_incremental(self.pane)
         self.destroy()
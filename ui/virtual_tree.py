@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Virtual Tree List - 只為可見的列建立 Treeview 項目
+
+10 萬條結果全部插入 Treeview 時，每次篩選 / 排序都要刪除及重建所有項目，
+Tk 的插入時間遠超過 Python 的篩選時間。VirtualTreeList 只保留畫面上可見的列數目的項目：
+    - 結果列 (FormulaView 或 list) 保存在 Python 端，捲動位置為第一個可見列的索引 (offset)
+    - 捲動時重用同一組項目，只以 tree.item 更新其 values 及 tags
+    - 捲動條、滑鼠滾輪及 Up / Down / PageUp / PageDown / Home / End 由這裡處理
+    - 選取的列以列索引記錄，捲出畫面後再捲回時恢復選取
+
+只用於一般 (平面) 的列表；Group by Pattern 檢視有展開的子項目，仍直接插入 Treeview。
+"""
+
+WHEEL_ROWS = 3
+DEFAULT_ROW_HEIGHT = 20
+
+
+class VirtualTreeList:
+    """
+    Args:
+        tree: ttk.Treeview
+        scrollbar: 垂直的 ttk.Scrollbar
+        on_scroll: 可見的列改變後的回呼 (例如請求顯示文字)
+        row_values: 列 -> Treeview values 的函數 (None 為原樣使用)
+        on_item_shown: (item_id, values) 回呼，項目顯示新的列時呼叫
+        on_item_hidden: (item_id) 回呼，項目被收起時呼叫
+    """
+
+    def __init__(self, tree, scrollbar, on_scroll=None, row_values=None, on_item_shown=None, on_item_hidden=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.on_scroll = on_scroll
+        self.row_values = row_values
+        self.on_item_shown = on_item_shown
+        self.on_item_hidden = on_item_hidden
+        self.active = False
+        self.rows = []
+        self.offset = 0
+        self.selected_index = None
+        self._items = []
+        self._free_items = []
+        self._item_rows = {}
+        self._row_height = None
+        self._heading_height = None
+
+        tree.configure(yscrollcommand=self._tree_scrolled)
+        scrollbar.configure(command=self.yview)
+        tree.bind("<Configure>", lambda event: self._on_configure(), add="+")
+        tree.bind("<MouseWheel>", self._on_mousewheel, add="+")
+        tree.bind("<Button-4>", self._on_mousewheel, add="+")
+        tree.bind("<Button-5>", self._on_mousewheel, add="+")
+        for key in ("<Up>", "<Down>", "<Prior>", "<Next>", "<Home>", "<End>"):
+            tree.bind(key, self._on_key, add="+")
+
+    # --- 結果列 ---
+    def set_rows(self, rows):
+        """以 rows 取代列表內容並捲到頂端"""
+        self.active = True
+        self.rows = rows
+        self.offset = 0
+        self.selected_index = None
+        self._item_rows.clear()
+        self.refresh()
+
+    def append_rows(self, rows):
+        """加入列到末端 (掃描進行中)；只有可見範圍改變時才更新項目"""
+        if not self.active:
+            self.set_rows(rows)
+            return
+        try:
+            self.rows.extend(rows)
+        except (AttributeError, ValueError):
+            # 不同 table 的 view (例如掃描中 table 被 copy-on-write 複製)
+            self.rows = list(self.rows) + list(rows)
+        self.refresh()
+
+    def clear(self):
+        """離開虛擬模式並刪除所有項目 (之後 Treeview 可直接插入項目)"""
+        tree = self.tree
+        for item_id in self._items + self._free_items:
+            if self.on_item_hidden and item_id in self._item_rows:
+                self.on_item_hidden(item_id)
+            if tree.exists(item_id):
+                tree.delete(item_id)
+        self._items = []
+        self._free_items = []
+        self._item_rows.clear()
+        self.active = False
+        self.rows = []
+        self.offset = 0
+        self.selected_index = None
+
+    def row_index(self, item_id):
+        """項目目前顯示的列索引；不是虛擬列表的項目時返回 None"""
+        return self._item_rows.get(item_id) if self.active else None
+
+    # --- 繪製 ---
+    def visible_count(self):
+        tree = self.tree
+        height = tree.winfo_height()
+        if height <= 1:
+            # 尚未顯示：使用 Treeview 的 height 選項
+            return max(1, int(tree.cget("height")))
+        if self._row_height is None and self._items:
+            bbox = tree.bbox(self._items[0])
+            if bbox:
+                self._heading_height, self._row_height = bbox[1], bbox[3]
+        row_height = self._row_height or DEFAULT_ROW_HEIGHT
+        heading_height = self._heading_height if self._heading_height is not None else DEFAULT_ROW_HEIGHT + 4
+        return max(1, (height - heading_height) // row_height)
+
+    def refresh(self, force=False):
+        """
+        按 offset 更新可見的項目。
+        force: 即使項目已顯示同一列也重新設定 values (例如顯示文字已讀取)
+        """
+        if not self.active:
+            return
+        tree = self.tree
+        total = len(self.rows)
+        visible = self.visible_count()
+        self.offset = max(0, min(self.offset, total - visible))
+        needed = min(visible, total - self.offset)
+
+        while len(self._items) < needed:
+            if self._free_items:
+                item_id = self._free_items.pop()
+                tree.move(item_id, "", "end")
+            else:
+                item_id = tree.insert("", "end")
+            self._items.append(item_id)
+        while len(self._items) > needed:
+            item_id = self._items.pop()
+            tree.detach(item_id)
+            self._free_items.append(item_id)
+            if self._item_rows.pop(item_id, None) is not None and self.on_item_hidden:
+                self.on_item_hidden(item_id)
+
+        row_values = self.row_values
+        for position, item_id in enumerate(self._items):
+            index = self.offset + position
+            if not force and self._item_rows.get(item_id) == index:
+                continue
+            values = self.rows[index]
+            if row_values is not None:
+                values = row_values(values)
+            tree.item(item_id, values=values, tags=("evenrow" if index % 2 == 0 else "oddrow",))
+            self._item_rows[item_id] = index
+            if self.on_item_shown:
+                self.on_item_shown(item_id, values)
+
+        self._update_scrollbar(total, needed)
+        self._restore_selection()
+        if self.on_scroll:
+            self.on_scroll()
+
+    def _update_scrollbar(self, total, shown):
+        if total <= 0:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        self.scrollbar.set(self.offset / total, (self.offset + shown) / total)
+
+    def _restore_selection(self):
+        tree = self.tree
+        current = tree.selection()
+        index = self.selected_index
+        if index is not None and self.offset <= index < self.offset + len(self._items):
+            item_id = self._items[index - self.offset]
+            if current != (item_id,):
+                tree.selection_set(item_id)
+            tree.focus(item_id)
+        elif current:
+            # 選取的列已捲出畫面：項目現在顯示其他列
+            tree.selection_remove(*current)
+
+    def selection_changed(self):
+        """
+        <<TreeviewSelect>> 處理前呼叫：選取的是新的列時返回 True。
+        捲動時恢復 / 移除選取也會產生這個事件，這些情況返回 False，避免重複處理同一列。
+        """
+        if not self.active:
+            return True
+        selection = self.tree.selection()
+        if not selection:
+            return False
+        index = self._item_rows.get(selection[0])
+        if index is None or index == self.selected_index:
+            return False
+        self.selected_index = index
+        return True
+
+    # --- 捲動 ---
+    def scroll_to(self, offset):
+        if not self.active:
+            return
+        offset = max(0, min(int(offset), len(self.rows) - self.visible_count()))
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+
+    def yview(self, *args):
+        """捲動條的 command"""
+        if not self.active:
+            return self.tree.yview(*args)
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= max(1, self.visible_count() - 1)
+            self.scroll_to(self.offset + step)
+
+    def _tree_scrolled(self, first, last):
+        # 虛擬模式下 Treeview 自己不會捲動 (項目數目等於可見列數)，捲動條由 refresh 設定
+        if not self.active:
+            self.scrollbar.set(first, last)
+            if self.on_scroll:
+                self.on_scroll()
+
+    def _on_configure(self):
+        if self.active:
+            self._row_height = None
+            self.refresh()
+
+    def _on_mousewheel(self, event):
+        if not self.active:
+            return None
+        if getattr(event, "num", None) == 4:
+            step = -WHEEL_ROWS
+        elif getattr(event, "num", None) == 5:
+            step = WHEEL_ROWS
+        else:
+            step = -WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS
+        self.scroll_to(self.offset + step)
+        return "break"
+
+    def _on_key(self, event):
+        if not self.active or not self.rows:
+            return None
+        visible = self.visible_count()
+        page = max(1, visible - 1)
+        selection = self.tree.selection()
+        current = self._item_rows.get(selection[0]) if selection else None
+        if current is None:
+            current = self.selected_index if self.selected_index is not None else self.offset
+        target = {
+            "Up": current - 1,
+            "Down": current + 1,
+            "Prior": current - page,
+            "Next": current + page,
+            "Home": 0,
+            "End": len(self.rows) - 1,
+        }.get(event.keysym)
+        if target is None:
+            return None
+        target = max(0, min(target, len(self.rows) - 1))
+        if target < self.offset:
+            self.scroll_to(target)
+        elif target >= self.offset + visible:
+            self.scroll_to(target - visible + 1)
+        position = target - self.offset
+        if 0 <= position < len(self._items):
+            item_id = self._items[position]
+            self.tree.selection_set(item_id)
+            self.tree.focus(item_id)
+        return "break"
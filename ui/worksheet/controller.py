@@ -9,6 +9,8 @@ and business logic for a single worksheet pane.
 import tkinter as tk
 from ui.worksheet.tab_manager import TabManager
 from ui.worksheet.view import WorksheetView
+from core.formula_table import FormulaTable
+from core.formula_filter import FilterEngine
 
 class WorksheetController:
     """Manages the state and logic for a single worksheet pane."""
@@ -20,13 +22,22 @@ class WorksheetController:
         self.xl = None
         self.workbook = None
         self.worksheet = None
-        self.all_formulas = []
+        # 掃描結果 (core.formula_table.FormulaTable，按欄儲存)
+        self.all_formulas = FormulaTable()
         self.cell_addresses = {}
         self.use_openpyxl = tk.BooleanVar(value=True)
         self.show_formula = tk.BooleanVar(value=True)
         self.show_local_link = tk.BooleanVar(value=True)
         self.show_external_link = tk.BooleanVar(value=True)
-        self.sort_directions = {col: 1 for col in ("type", "address", "formula", "result", "display_value")}
+        self.sheet_filter = tk.StringVar(value="All")
+        # Group by Pattern 檢視 (core.formula_patterns)：item_id -> FormulaPattern
+        self.group_patterns = tk.BooleanVar(value=False)
+        self.pattern_items = {}
+        self.loaded_pattern_items = set()
+        # 記住上一次篩選結果的 FilterEngine；篩選欄輸入時延遲篩選的 after id
+        self.filter_engine = FilterEngine()
+        self.filter_after = None
+        self.sort_directions = {col: 1 for col in ("type", "address", "formula", "result", "display_value", "sheet")}
         self.current_sort_column = None
         self.last_workbook_path = None
         self.last_worksheet_name = None
@@ -37,6 +48,25 @@ class WorksheetController:
         self.selected_scan_count = None
         self.original_user_selection = None
         self.original_user_count = None
+        # 背景掃描 (core.scan_worker.ScanWorker) 及其 UI 狀態
+        self.scan_worker = None
+        self.scan_context = None
+        # 上次完整掃描的列區塊雜湊 (core.excel_scanner.rescan_incremental)
+        self.scan_snapshot = None
+        # 延遲讀取的顯示文字 (core.display_text)
+        self.display_text_worker = None
+        # 顯示文字所屬的 worksheet / workbook (延遲讀取的列從這裡讀取)
+        self.display_text_source = None
+        self.display_text_cache = {}
+        self.display_text_requested = set()
+        self.display_text_items = {}
+        self.display_text_after = None
+        # 整個工作簿掃描的工作表名稱 (結果列第 6 欄)；None 為單一工作表掃描
+        self.scan_sheets = None
+        # 地址篩選可使用的工作簿名稱 (core.address_index.read_com_names)
+        self.address_names = {}
+        # 文字篩選的 trigram 索引在背景建立 (core.text_index)
+        self.text_index_builder = None
 
         # Placeholder attributes for UI
         self.placeholder_text = "e.g. A, A:A, A:C, Z:A, 10, 10:10, 10:20, 88:17, A1:C3, D40:B5"
@@ -68,14 +98,14 @@ class WorksheetController:
         
         original_address = self.original_user_selection.replace('$', '')
         # Filter all_formulas to only include the original user selection
-        filtered_formulas = []
-        for formula_data in self.all_formulas:
+        selected_indices = []
+        for index, formula_data in enumerate(self.all_formulas):
             if len(formula_data) >= 2:
-                formula_type, cell_address, formula, display_val, cell_text = formula_data
+                formula_type, cell_address, formula, display_val, cell_text = formula_data[:5]
                 # Remove $ signs for comparison
                 clean_cell_address = cell_address.replace('$', '')
                 if clean_cell_address == original_address:
-                    filtered_formulas.append(formula_data)
+                    selected_indices.append(index)
         
         # Update the formulas list
-        self.all_formulas = filtered_formulas
+        self.all_formulas = self.all_formulas.take(selected_indices)
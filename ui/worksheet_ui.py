@@ -14,7 +14,9 @@ from tkinter import ttk
 from core.excel_connector import reconnect_to_excel
 from core.worksheet_export import export_formulas_to_excel, import_and_update_formulas
 from core.worksheet_summary import summarize_external_links
-from core.worksheet_tree import apply_filter, sort_column, on_select, on_double_click
+from core.worksheet_tree import apply_filter, sort_column, on_select, on_double_click, on_tree_open, set_pattern_view, create_virtual_list, schedule_filter
+from core.excel_scanner import toggle_scan_pause, cancel_scan
+from core.display_text import schedule_display_text
 
 def create_ui_widgets(self):
     """Creates and places all UI widgets without binding commands."""
@@ -54,6 +56,12 @@ def create_ui_widgets(self):
     self.progress_label.pack(fill=tk.X)
     self.progress_bar = ttk.Progressbar(self.progress_frame, mode='determinate')
     self.progress_bar.pack(fill=tk.X, pady=(2, 0))
+    scan_control_frame = ttk.Frame(self.progress_frame)
+    scan_control_frame.pack(fill=tk.X, pady=(2, 0))
+    self.cancel_scan_button = ttk.Button(scan_control_frame, text="Cancel", style="Toolbutton.TButton", state="disabled")
+    self.cancel_scan_button.pack(side=tk.RIGHT)
+    self.pause_scan_button = ttk.Button(scan_control_frame, text="Pause", style="Toolbutton.TButton", state="disabled")
+    self.pause_scan_button.pack(side=tk.RIGHT, padx=(0, 5))
 
     filter_main_frame = ttk.LabelFrame(self, text="Filters", borderwidth=2, relief=tk.GROOVE, padding=10)
     filter_main_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=5)
@@ -69,15 +77,21 @@ def create_ui_widgets(self):
     self.show_external_link_check.pack(side=tk.LEFT, padx=5)
     self.openpyxl_check = ttk.Checkbutton(filter_checkbox_frame, text="Enable Non-GUI File Reading for Cell Results", variable=self.controller.use_openpyxl)
     self.openpyxl_check.pack(side=tk.LEFT, padx=15)
+    self.group_patterns_check = ttk.Checkbutton(filter_checkbox_frame, text="Group by Pattern", variable=self.controller.group_patterns)
+    self.group_patterns_check.pack(side=tk.LEFT, padx=5)
+    # 整個工作簿掃描時才啟用 (core.worksheet_tree.set_scan_sheets)
+    self.sheet_filter_combo = ttk.Combobox(filter_checkbox_frame, textvariable=self.controller.sheet_filter, state="disabled", width=24)
+    self.sheet_filter_combo.pack(side=tk.RIGHT, padx=(0, 5))
+    ttk.Label(filter_checkbox_frame, text="Sheet:", font=filter_label_font).pack(side=tk.RIGHT, padx=(15, 5))
 
     filter_entry_frame = ttk.Frame(filter_main_frame)
     filter_entry_frame.pack(side=tk.TOP, fill=tk.X)
     filter_entry_frame.columnconfigure(1, weight=1)
     filter_entry_frame.columnconfigure(2, weight=0)
-    self.tree_columns = ("type", "address", "formula", "result", "display_value")
-    self.columns_with_entries = ("address", "formula", "result", "display_value")
+    self.tree_columns = ("type", "address", "formula", "result", "display_value", "sheet")
+    self.columns_with_entries = ("address", "formula", "result", "display_value", "query")
     self.filter_entries = {}
-    column_display_names = {"address": "Address", "formula": "Formula", "result": "Result", "display_value": "Display Value"}
+    column_display_names = {"address": "Address", "formula": "Formula", "result": "Result", "display_value": "Display Value", "query": "Query"}
     row_idx = 0
     for col_id in self.columns_with_entries:
         ttk.Label(filter_entry_frame, text=f"{column_display_names[col_id]}:", font=filter_label_font).grid(row=row_idx, column=0, sticky=tk.W, padx=(5,0), pady=2)
@@ -115,17 +129,20 @@ def create_ui_widgets(self):
     tree_frame.grid(row=5, column=0, sticky="nsew")
     tree_frame.columnconfigure(0, weight=1)
     tree_frame.rowconfigure(0, weight=1)
-    self.result_tree = ttk.Treeview(tree_frame, columns=self.tree_columns, show="headings", height=12)
-    headings = {"type": "Type", "address": "Address", "formula": "Formula Content", "result": "Result", "display_value": "Display Value"}
-    widths = {"type": 70, "address": 70, "formula": 400, "result": 120, "display_value": 120}
+    # Sheet 欄只在整個工作簿掃描時顯示 (displaycolumns)
+    self.result_tree = ttk.Treeview(tree_frame, columns=self.tree_columns, displaycolumns=self.tree_columns[:-1], show="headings", height=12)
+    headings = {"type": "Type", "address": "Address", "formula": "Formula Content", "result": "Result", "display_value": "Display Value", "sheet": "Sheet"}
+    widths = {"type": 70, "address": 70, "formula": 400, "result": 120, "display_value": 120, "sheet": 100}
     for col_id, text in headings.items():
         self.result_tree.heading(col_id, text=text)
         self.result_tree.column(col_id, width=widths[col_id], minwidth=60)
+    # Group by Pattern 檢視的展開符號欄
+    self.result_tree.column("#0", width=24, minwidth=24, stretch=False)
     self.result_tree.grid(row=0, column=0, sticky="nsew")
     scrollbar = ttk.Scrollbar(tree_frame, orient="vertical")
     scrollbar.grid(row=0, column=1, sticky="ns")
-    self.result_tree.configure(yscrollcommand=scrollbar.set)
-    scrollbar.configure(command=self.result_tree.yview)
+    # 平面列表只為可見的列建立項目；捲動時讀取可見列的顯示文字 (延遲 Full 掃描)
+    self.virtual_list = create_virtual_list(self.controller, self.result_tree, scrollbar)
 
     detail_header_frame = ttk.Frame(self)
     detail_header_frame.grid(row=6, column=0, sticky=(tk.W, tk.E), pady=(10, 0))
@@ -148,24 +165,34 @@ def bind_ui_commands(self):
     self.show_local_link_check.config(command=lambda: apply_filter(self.controller))
     self.show_external_link_check.config(command=lambda: apply_filter(self.controller))
     self.openpyxl_check.config(command=lambda: on_select(self.controller, event=None))
+    self.sheet_filter_combo.bind("<<ComboboxSelected>>", lambda event, s=self.controller: apply_filter(s, event))
+    self.group_patterns_check.config(command=lambda: set_pattern_view(self.controller))
 
     for col_id, entry in self.filter_entries.items():
         entry.bind("<Return>", lambda event, s=self.controller: apply_filter(s, event))
         if col_id == 'address':
             entry.bind("<FocusIn>", self._on_focus_in)
             entry.bind("<FocusOut>", self._on_focus_out)
+        elif col_id != 'query':
+            # 文字條件邊輸入邊篩選 (地址條件及查詢輸入中途通常無效，仍按 Enter 才篩選)
+            entry.bind("<KeyRelease>", lambda event, s=self.controller: schedule_filter(s, event))
         entry.master.children['!button'].config(command=lambda s=self.controller: apply_filter(s))
 
     self.summarize_button.config(command=lambda: summarize_external_links(self.controller))
     self.export_button.config(command=lambda: export_formulas_to_excel(self.controller))
     self.import_button.config(command=lambda: import_and_update_formulas(self.controller))
     self.reconnect_button.config(command=lambda: reconnect_to_excel(self.controller))
+    self.pause_scan_button.config(command=lambda: toggle_scan_pause(self.controller))
+    self.cancel_scan_button.config(command=lambda: cancel_scan(self.controller))
 
     for col_id in self.tree_columns:
         self.result_tree.heading(col_id, command=lambda c=col_id, s=self.controller: sort_column(s, c))
     
     self.result_tree.bind("<Double-Button-1>", lambda event, s=self.controller: on_double_click(s, event))
-    self.result_tree.bind("<<TreeviewSelect>>", lambda event, s=self.controller: on_select(s, event))
+    # 虛擬列表捲動時恢復選取也會產生 <<TreeviewSelect>>，只處理選取新的列
+    self.result_tree.bind("<<TreeviewSelect>>", lambda event, s=self.controller: on_select(s, event) if self.virtual_list.selection_changed() else None)
+    self.result_tree.bind("<<TreeviewOpen>>", lambda event, s=self.controller: on_tree_open(s, event))
+    self.result_tree.bind("<Configure>", lambda event, s=self.controller: schedule_display_text(s, event), add="+")
 
     self.close_tabs_button.config(command=self.controller.tab_manager.close_all_tabs_except_main)
 
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+COM Instrumentation - 統計每個 Excel COM 屬性讀取、寫入及方法呼叫的次數及時間
+
+預設停用，沒有任何額外開銷 (不包裝任何物件)。啟用方法：
+    設定環境變數 EXCEL_TOOLS_COM_TRACE=1 後啟動 (main.py 呼叫 install_from_environment)，
+    或在程式中呼叫 install()。
+
+啟用後 win32com.client.GetActiveObject / Dispatch 返回代理物件，由它們取得的
+Application / Workbook / Worksheet / Range 等物件亦全部包裝，按 (API, 種類, 呼叫者) 累計。
+每個操作 (掃描、取代連結、Go to Reference ...) 結束時輸出按時間排序的報告，例如：
+    Range.Formula get: 48,211 calls, 71.02 s
+        core.scan_worker.iter_cells_per_cell: 48,211 calls, 71.02 s
+"""
+
+import os
+import sys
+import time
+import threading
+import functools
+import contextlib
+
+COM_TRACE_ENV = 'EXCEL_TOOLS_COM_TRACE'
+
+# 報告顯示的 API 數目 / 每個 API 顯示的呼叫者數目
+REPORT_TOP = 20
+REPORT_CALLERS = 3
+
+_lock = threading.Lock()
+# None 表示停用；啟用時為 {(api, kind): {caller: [count, seconds]}}
+_stats = None
+_operation = None
+# 目前執行緒是否在 com_operation / instrumented_operation 之內 (巢狀的操作不另外輸出報告)
+_local = threading.local()
+_originals = {}
+# (父類型, 屬性名稱) -> 子物件的類型名稱 (由 type info 取得，每種組合只查詢一次)
+_type_names = {}
+
+
+def is_enabled():
+    return _stats is not None
+
+
+def _caller(depth):
+    frame = sys._getframe(depth)
+    # 略過本模組的 frame (例如迭代時由 __iter__ 包裝的物件)
+    while frame is not None and frame.f_globals.get('__name__') == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return '<unknown>'
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+def _record(api, kind, caller, seconds):
+    stats = _stats
+    if stats is None:
+        return
+    with _lock:
+        callers = stats.setdefault((api, kind), {})
+        entry = callers.get(caller)
+        if entry is None:
+            callers[caller] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+
+def _is_com_object(value):
+    return hasattr(value, '_oleobj_') and not isinstance(value, InstrumentedCOM)
+
+
+def _com_type_name(com_object, fallback):
+    try:
+        name = com_object._oleobj_.GetTypeInfo().GetDocumentation(-1)[0]
+        return name.lstrip('_') or fallback
+    except Exception:
+        return fallback
+
+
+def _wrap_result(value, parent_type, member):
+    if not _is_com_object(value):
+        return value
+    key = (parent_type, member)
+    type_name = _type_names.get(key)
+    if type_name is None:
+        type_name = _type_names[key] = _com_type_name(value, member)
+    return InstrumentedCOM(value, type_name)
+
+
+def _unwrap(value):
+    return value._com if isinstance(value, InstrumentedCOM) else value
+
+
+class _InstrumentedMethod:
+    """COM 方法 (或帶參數的屬性，例如 Cells(r, c)) 的計時包裝"""
+
+    __slots__ = ('_method', '_api', '_type', '_name')
+
+    def __init__(self, method, type_name, name):
+        self._method = method
+        self._api = f"{type_name}.{name}"
+        self._type = type_name
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        args = tuple(_unwrap(arg) for arg in args)
+        kwargs = {key: _unwrap(value) for key, value in kwargs.items()}
+        start = time.perf_counter()
+        try:
+            result = self._method(*args, **kwargs)
+        finally:
+            _record(self._api, 'call', _caller(2), time.perf_counter() - start)
+        return _wrap_result(result, self._type, self._name)
+
+
+class InstrumentedCOM:
+    """
+    COM 物件的代理：屬性讀取 / 寫入及方法呼叫都會計時。
+    以 '_' 開頭的屬性 (例如 _oleobj_，marshal 到其他執行緒時使用) 直接取自原物件。
+    """
+
+    __slots__ = ('_com', '_type')
+
+    def __init__(self, com_object, type_name):
+        object.__setattr__(self, '_com', com_object)
+        object.__setattr__(self, '_type', type_name)
+
+    def __getattr__(self, name):
+        com_object = self._com
+        if name.startswith('_'):
+            return getattr(com_object, name)
+        start = time.perf_counter()
+        value = getattr(com_object, name)
+        if callable(value) and not _is_com_object(value):
+            return _InstrumentedMethod(value, self._type, name)
+        _record(f"{self._type}.{name}", 'get', _caller(2), time.perf_counter() - start)
+        return _wrap_result(value, self._type, name)
+
+    def __setattr__(self, name, value):
+        start = time.perf_counter()
+        try:
+            setattr(self._com, name, _unwrap(value))
+        finally:
+            _record(f"{self._type}.{name}", 'set', _caller(2), time.perf_counter() - start)
+
+    def __call__(self, *args):
+        # 集合的預設成員，例如 Worksheets("Sheet1")、Areas(1)
+        start = time.perf_counter()
+        try:
+            result = self._com(*(_unwrap(arg) for arg in args))
+        finally:
+            _record(f"{self._type}()", 'call', _caller(2), time.perf_counter() - start)
+        return _wrap_result(result, self._type, '()')
+
+    def __iter__(self):
+        start = time.perf_counter()
+        items = list(self._com)
+        _record(f"{self._type}.__iter__", 'call', _caller(2), time.perf_counter() - start)
+        return iter([_wrap_result(item, self._type, '__iter__') for item in items])
+
+    def __len__(self):
+        return len(self._com)
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        return self._com == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._com)
+
+    def __repr__(self):
+        return f"<Instrumented {self._type}: {self._com!r}>"
+
+
+def instrument(com_object, type_name='Object'):
+    """啟用時返回 com_object 的代理；停用時原樣返回"""
+    if _stats is None or not _is_com_object(com_object):
+        return com_object
+    return InstrumentedCOM(com_object, type_name)
+
+
+def install():
+    """啟用統計：包裝 win32com.client.GetActiveObject / Dispatch 返回的物件"""
+    global _stats
+    import win32com.client
+
+    if _stats is not None:
+        return
+    _stats = {}
+    _originals['GetActiveObject'] = win32com.client.GetActiveObject
+    _originals['Dispatch'] = win32com.client.Dispatch
+
+    def get_active_object(prog_id, *args, **kwargs):
+        return instrument(_originals['GetActiveObject'](prog_id, *args, **kwargs), 'Application')
+
+    def dispatch(dispatch_target, *args, **kwargs):
+        com_object = _originals['Dispatch'](dispatch_target, *args, **kwargs)
+        fallback = 'Application' if isinstance(dispatch_target, str) else 'Object'
+        return instrument(com_object, _com_type_name(com_object, fallback))
+
+    win32com.client.GetActiveObject = get_active_object
+    win32com.client.Dispatch = dispatch
+    print("COM instrumentation enabled.")
+
+
+def uninstall():
+    """停用統計並還原 win32com.client (已包裝的物件繼續運作但不再記錄)"""
+    global _stats, _operation
+    if _stats is None:
+        return
+    import win32com.client
+
+    win32com.client.GetActiveObject = _originals.pop('GetActiveObject')
+    win32com.client.Dispatch = _originals.pop('Dispatch')
+    _stats = None
+    _operation = None
+
+
+def install_from_environment():
+    """環境變數 EXCEL_TOOLS_COM_TRACE 為 1 / true / yes 時啟用"""
+    if os.environ.get(COM_TRACE_ENV, '').strip().lower() in ('1', 'true', 'yes'):
+        install()
+
+
+def reset_stats():
+    if _stats is not None:
+        with _lock:
+            _stats.clear()
+
+
+def get_stats():
+    """
+    返回累計結果 (按總時間排序)：
+    [{'api', 'kind', 'calls', 'seconds', 'callers': [(caller, calls, seconds), ...]}, ...]
+    """
+    if _stats is None:
+        return []
+    with _lock:
+        snapshot = {key: {caller: tuple(entry) for caller, entry in callers.items()}
+                    for key, callers in _stats.items()}
+    rows = []
+    for (api, kind), callers in snapshot.items():
+        ranked_callers = sorted(((caller, calls, seconds) for caller, (calls, seconds) in callers.items()),
+                                key=lambda item: item[2], reverse=True)
+        rows.append({
+            'api': api,
+            'kind': kind,
+            'calls': sum(item[1] for item in ranked_callers),
+            'seconds': sum(item[2] for item in ranked_callers),
+            'callers': ranked_callers,
+        })
+    rows.sort(key=lambda row: row['seconds'], reverse=True)
+    return rows
+
+
+def format_report(title, top=REPORT_TOP, callers=REPORT_CALLERS):
+    rows = get_stats()
+    total_calls = sum(row['calls'] for row in rows)
+    total_seconds = sum(row['seconds'] for row in rows)
+    lines = [f"=== COM calls: {title} ({total_calls:,} calls, {total_seconds:.2f} s) ==="]
+    for row in rows[:top]:
+        lines.append(f"{row['api']} {row['kind']}: {row['calls']:,} calls, {row['seconds']:.2f} s")
+        for caller, calls, seconds in row['callers'][:callers]:
+            lines.append(f"    {caller}: {calls:,} calls, {seconds:.2f} s")
+    if len(rows) > top:
+        lines.append(f"... and {len(rows) - top} more APIs")
+    return "\n".join(lines)
+
+
+def begin_operation(name):
+    """
+    開始一個操作 (清除統計)。用於非同步的操作，例如背景掃描：
+    開始時呼叫 begin_operation，完成時呼叫 end_operation 輸出報告。
+    """
+    global _operation
+    if _stats is None:
+        return
+    reset_stats()
+    _operation = name
+
+
+def end_operation(name=None):
+    """輸出目前操作的報告；name 與目前操作不同時不處理 (操作已被新的操作取代)"""
+    global _operation
+    if _stats is None or _operation is None or (name is not None and name != _operation):
+        return
+    print(format_report(_operation))
+    _operation = None
+
+
+@contextlib.contextmanager
+def _operation_context(name):
+    _local.active = True
+    begin_operation(name)
+    try:
+        yield
+    finally:
+        _local.active = False
+        end_operation(name)
+
+
+def com_operation(name):
+    """同步操作的 context manager；停用或在另一個同步操作之內時不做任何事"""
+    if _stats is None or getattr(_local, 'active', False):
+        return contextlib.nullcontext()
+    return _operation_context(name)
+
+
+def instrumented_operation(name):
+    """函數 decorator：整個函數作為一個操作 (停用時只多一次判斷)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _stats is None or getattr(_local, 'active', False):
+                return func(*args, **kwargs)
+            with _operation_context(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
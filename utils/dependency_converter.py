@@ -267,6 +267,10 @@ def _format_formula_for_tooltip(formula):
     
     return formatted
 
+# 按路徑截斷的節點類型 (同一儲存格在其他位置可能展開得更深)
+_CUTOFF_TYPES = ('limit_reached', 'circular_ref', 'truncated')
+
+
 def convert_tree_to_graph_data(dependency_tree_data):
     """
     將從 explode_cell_dependencies 得到的樹狀資料，轉換為 pyvis 需要的格式。
@@ -277,12 +281,20 @@ def convert_tree_to_graph_data(dependency_tree_data):
     nodes_data = []
     edges_data = []
     processed_nodes = set()
+    # 子樹完整 (沒有深度限制 / 循環引用截斷) 的地址與已加入的連線；
+    # 截斷與否取決於節點在樹中的位置，只有完整的子樹在其他位置必定相同，共用的前置儲存格 (DAG) 才只走訪一次
+    complete_nodes = set()
+    processed_edges = set()
     
     # 首先收集所有檔案名稱以生成唯一顏色
     all_filenames = set()
+    complete_addresses = set()
     
     def collect_filenames(node):
         address = node.get('address', '')
+        shared = node.get('type') in ('formula', 'value')
+        if shared and address in complete_addresses:
+            return True
         if '[' in address and ']' in address:
             match = re.search(r'\[([^\]]+)\]', address)
             if match:
@@ -290,8 +302,12 @@ def convert_tree_to_graph_data(dependency_tree_data):
         else:
             all_filenames.add('Current File')
         
+        complete = node.get('type') not in _CUTOFF_TYPES
         for child in node.get('children', []):
-            collect_filenames(child)
+            complete = collect_filenames(child) and complete
+        if complete and shared:
+            complete_addresses.add(address)
+        return complete
     
     collect_filenames(dependency_tree_data)
     
@@ -360,11 +376,21 @@ def convert_tree_to_graph_data(dependency_tree_data):
                 "value_label": formatted_value
             })
 
-        if parent_id is not None:
+        if parent_id is not None and (parent_id, node_id) not in processed_edges:
+            processed_edges.add((parent_id, node_id))
             edges_data.append((parent_id, node_id))
 
+        # 同一儲存格之前的子樹完整時，這裡的子樹必定相同，不必重複走訪
+        shared = node.get('type') in ('formula', 'value')
+        if shared and node_id in complete_nodes:
+            return True
+
+        complete = node.get('type') not in _CUTOFF_TYPES
         for child in node.get('children', []):
-            traverse_tree(child, parent_id=node_id)
+            complete = traverse_tree(child, parent_id=node_id) and complete
+        if complete and shared:
+            complete_nodes.add(node_id)
+        return complete
 
     traverse_tree(dependency_tree_data)
     return nodes_data, edges_data
@@ -6,7 +6,18 @@ Dependency Exploder - 公式依賴鏈遞歸分析器
 import re
 import os
 from urllib.parse import unquote
-from utils.openpyxl_resolver import read_cell_with_resolved_references
+from utils.formula_tokenizer import extract_references
+from utils.sheet_xml_reader import (read_cell_info, get_sheet_dimension, summarize_ranges,
+                                    list_range_cells, split_cell_address, column_letter_to_index,
+                                    column_index_to_letter)
+
+# 範圍節點每次展開的儲存格數目
+RANGE_PAGE_SIZE = 100
+
+
+def is_range_address(cell_address):
+    """'A1:B5' / 'A:A' / '1:3' 為範圍地址"""
+    return ':' in cell_address
 
 class DependencyExploder:
     """公式依賴鏈爆炸分析器"""
@@ -15,6 +26,218 @@ class DependencyExploder:
         self.max_depth = max_depth
         self.visited_cells = set()
         self.circular_refs = []
+        # DAG 模式使用：cell_id -> 共用節點
+        self.dag_nodes = {}
+    
+    @staticmethod
+    def make_cell_id(workbook_path, sheet_name, cell_address):
+        """DAG 模式下的節點 id：標準化路徑|工作表|儲存格"""
+        normalized_path = os.path.normcase(os.path.normpath(workbook_path))
+        return f"{normalized_path}|{sheet_name}|{cell_address.replace('$', '').upper()}"
+    
+    @staticmethod
+    def _clean_formula(original_formula):
+        """增強的公式清理：處理雙反斜線、URL 編碼和雙引號"""
+        if not original_formula:
+            return None
+        # 步驟1: 處理雙反斜線
+        fixed_formula = original_formula.replace('\\\\', '\\')
+        # 步驟2: 解碼 URL 編碼字符（如 %20 -> 空格）
+        fixed_formula = unquote(fixed_formula)
+        # 步驟3: 處理雙引號問題 - 將 ''path'' 改為 'path'
+        return re.sub(r"''([^']*?)''", r"'\1'", fixed_formula)
+    
+    @staticmethod
+    def _stub_display_address(workbook_path, sheet_name, cell_address, root_workbook_path):
+        """特殊節點 (limit / circular / error) 的顯示地址"""
+        current_workbook_path = root_workbook_path if root_workbook_path else workbook_path
+        if os.path.normpath(current_workbook_path) != os.path.normpath(workbook_path):
+            filename = os.path.basename(workbook_path)
+            if filename.endswith('.xlsx') or filename.endswith('.xls') or filename.endswith('.xlsm'):
+                filename = filename.rsplit('.', 1)[0]
+            return f"[{filename}]{sheet_name}!{cell_address}"
+        return f"{sheet_name}!{cell_address}"
+    
+    def _make_stub_node(self, workbook_path, sheet_name, cell_address, depth, root_workbook_path, node_type, error):
+        """建立 limit_reached / circular_ref / error / truncated 節點"""
+        values = {
+            'limit_reached': 'Max depth reached',
+            'circular_ref': 'Circular reference',
+            'truncated': 'Not expanded',
+        }
+        return {
+            'address': self._stub_display_address(workbook_path, sheet_name, cell_address, root_workbook_path),
+            'workbook_path': workbook_path,
+            'sheet_name': sheet_name,
+            'cell_address': cell_address,
+            'value': values.get(node_type, 'Error'),
+            'formula': None,
+            'type': node_type,
+            'children': [],
+            'depth': depth,
+            'error': error
+        }
+    
+    def _make_cell_node(self, cell_info, workbook_path, sheet_name, cell_address, depth, root_workbook_path):
+        """根據讀取結果建立一般節點 (children 為空)"""
+        fixed_formula = self._clean_formula(cell_info.get('formula'))
+
+        # 決定顯示格式：外部引用顯示為 [filename]sheet!cell，本地引用顯示為 sheet!cell
+        # 使用 root_workbook_path 來判斷是否為外部引用
+        current_workbook_path = root_workbook_path if root_workbook_path else workbook_path
+        # --- FIX: 強制根節點也顯示檔案名 ---
+        if os.path.normpath(current_workbook_path) != os.path.normpath(workbook_path) or depth == 0:
+            # 外部引用或根節點：準備 short 和 full 兩種格式
+            filename = os.path.basename(workbook_path)
+            dir_path = os.path.dirname(workbook_path)
+            # Short format: [filename.xlsx]sheet!cell
+            short_display_address = f"[{filename}]{sheet_name}!{cell_address}"
+            # Full format: 'C:\path\[filename.xlsx]sheet'!cell
+            full_display_address = f"'{dir_path}\\[{filename}]{sheet_name}'!{cell_address}"
+            # 預設使用 short format
+            display_address = short_display_address
+        else:
+            # 本地引用：顯示 sheet!cell 格式 (short 和 full 相同)
+            display_address = f"{sheet_name}!{cell_address}"
+            short_display_address = display_address
+            full_display_address = display_address
+
+        return {
+            'address': display_address,
+            'short_address': short_display_address,
+            'full_address': full_display_address,
+            'workbook_path': workbook_path,
+            'sheet_name': sheet_name,
+            'cell_address': cell_address,
+            'value': cell_info.get('display_value', 'N/A'),
+            'calculated_value': cell_info.get('calculated_value', 'N/A'),
+            'formula': fixed_formula,
+            'type': cell_info.get('cell_type', 'unknown'),
+            'children': [],
+            'depth': depth,
+            'error': None
+        }
+    
+    @staticmethod
+    def get_range_bounds(workbook_path, sheet_name, range_address):
+        """
+        返回範圍的 (min_row, max_row, min_col, max_col)。
+        整欄 (A:A) / 整列 (1:3) 會按工作表已使用範圍裁剪；空白工作表返回 None。
+        """
+        start, end = range_address.replace('$', '').upper().split(':', 1)
+        if start.isdigit() and end.isdigit():
+            dimension = get_sheet_dimension(workbook_path, sheet_name)
+            if not dimension:
+                return None
+            min_row, max_row = sorted((int(start), int(end)))
+            min_row, max_row = max(min_row, dimension[0]), min(max_row, dimension[2])
+            if min_row > max_row:
+                return None
+            return (min_row, max_row, dimension[1], dimension[3])
+        if start.isalpha() and end.isalpha():
+            dimension = get_sheet_dimension(workbook_path, sheet_name)
+            if not dimension:
+                return None
+            min_col, max_col = sorted((column_letter_to_index(start), column_letter_to_index(end)))
+            min_col, max_col = max(min_col, dimension[1]), min(max_col, dimension[3])
+            if min_col > max_col:
+                return None
+            return (dimension[0], dimension[2], min_col, max_col)
+        start_pos, end_pos = split_cell_address(start), split_cell_address(end)
+        if not start_pos or not end_pos:
+            raise ValueError(f"Invalid range address: {range_address}")
+        min_row, max_row = sorted((start_pos[0], end_pos[0]))
+        min_col, max_col = sorted((start_pos[1], end_pos[1]))
+        return (min_row, max_row, min_col, max_col)
+    
+    @staticmethod
+    def _format_range_summary(summary, clipped_address):
+        """範圍彙總的文字說明"""
+        text = f"{summary['cell_count']:,} cells ({clipped_address}): {summary['non_empty']:,} non-empty, " \
+               f"{summary['numeric']:,} numeric, {summary['formulas']:,} formulas"
+        if summary['numeric']:
+            text += f", SUM={summary['sum']:,.2f}, MIN={summary['min']:,}, MAX={summary['max']:,}"
+        if summary['errors']:
+            text += f", {summary['errors']:,} errors"
+        return text
+    
+    def _make_range_node(self, workbook_path, sheet_name, range_address, depth, root_workbook_path,
+                         bounds=None, summary=None):
+        """
+        建立範圍節點：顯示儲存格數目和彙總，子儲存格由 expand_range_node 按需分頁展開。
+        bounds / summary 可由批次讀取預先計算。
+        """
+        if bounds is None:
+            bounds = self.get_range_bounds(workbook_path, sheet_name, range_address)
+        if bounds is None:
+            clipped_address = range_address
+            summary = {'cell_count': 0, 'non_empty': 0, 'numeric': 0, 'formulas': 0, 'errors': 0,
+                       'sum': 0, 'min': None, 'max': None}
+        else:
+            min_row, max_row, min_col, max_col = bounds
+            clipped_address = f"{column_index_to_letter(min_col)}{min_row}:{column_index_to_letter(max_col)}{max_row}"
+            if summary is None:
+                summary = summarize_ranges(workbook_path, sheet_name, [bounds])[0]
+        
+        value = f"SUM={summary['sum']:,.2f}" if summary['numeric'] else f"{summary['non_empty']:,} values"
+        node = self._make_cell_node({
+            'display_value': value,
+            'calculated_value': summary['sum'] if summary['numeric'] else None,
+            'cell_type': 'range',
+            'formula': None
+        }, workbook_path, sheet_name, range_address, depth, root_workbook_path)
+        node.update({
+            'cell_count': summary['cell_count'],
+            'range_summary': summary,
+            'range_summary_text': self._format_range_summary(summary, clipped_address),
+            'range_info': {
+                'workbook_path': workbook_path,
+                'sheet_name': sheet_name,
+                'range_address': range_address,
+                'clipped_address': clipped_address,
+                'bounds': bounds,
+                'root_workbook_path': root_workbook_path
+            },
+            'range_next_offset': 0 if summary['non_empty'] else None
+        })
+        return node
+    
+    def explode_range_reference(self, workbook_path, sheet_name, range_address, current_depth=0,
+                                root_workbook_path=None):
+        """範圍引用的節點 (不遞歸，子儲存格按需展開)"""
+        if current_depth >= self.max_depth:
+            return self._make_stub_node(workbook_path, sheet_name, range_address, current_depth,
+                                        root_workbook_path, 'limit_reached', 'Maximum recursion depth reached')
+        try:
+            return self._make_range_node(workbook_path, sheet_name, range_address, current_depth, root_workbook_path)
+        except Exception as e:
+            return self._make_stub_node(workbook_path, sheet_name, range_address, current_depth,
+                                        root_workbook_path, 'error', str(e))
+    
+    def expand_range_node(self, range_node, page_size=RANGE_PAGE_SIZE):
+        """
+        展開範圍節點的下一頁非空白儲存格，並加入 range_node['children']。
+        
+        Returns:
+            tuple: (新加入的子節點列表, 是否還有下一頁)
+        """
+        offset = range_node.get('range_next_offset')
+        info = range_node.get('range_info')
+        if offset is None or not info or not info.get('bounds'):
+            return [], False
+        
+        addresses, has_more = list_range_cells(info['workbook_path'], info['sheet_name'], info['bounds'],
+                                               offset=offset, limit=page_size)
+        children = self._explode_range_cells(info, addresses, range_node.get('depth', 0) + 1)
+        range_node['children'].extend(children)
+        range_node['range_next_offset'] = offset + len(addresses) if has_more else None
+        return children, has_more
+    
+    def _explode_range_cells(self, range_info, cell_addresses, depth):
+        """逐個展開範圍內的儲存格"""
+        return [self.explode_dependencies(range_info['workbook_path'], range_info['sheet_name'], address,
+                                          depth, range_info['root_workbook_path'])
+                for address in cell_addresses]
     
     def explode_dependencies(self, workbook_path, sheet_name, cell_address, current_depth=0, root_workbook_path=None):
         """
@@ -34,136 +257,29 @@ class DependencyExploder:
         
         # 檢查遞歸深度限制
         if current_depth >= self.max_depth:
-            # 決定顯示格式
-            current_workbook_path = root_workbook_path if root_workbook_path else workbook_path
-            if os.path.normpath(current_workbook_path) != os.path.normpath(workbook_path):
-                filename = os.path.basename(workbook_path)
-                if filename.endswith('.xlsx') or filename.endswith('.xls') or filename.endswith('.xlsm'):
-                    filename = filename.rsplit('.', 1)[0]
-                display_address = f"[{filename}]{sheet_name}!{cell_address}"
-            else:
-                display_address = f"{sheet_name}!{cell_address}"
-            
-            return {
-                'address': display_address,
-                'workbook_path': workbook_path,
-                'sheet_name': sheet_name,
-                'cell_address': cell_address,
-                'value': 'Max depth reached',
-                'formula': None,
-                'type': 'limit_reached',
-                'children': [],
-                'depth': current_depth,
-                'error': 'Maximum recursion depth reached'
-            }
+            return self._make_stub_node(workbook_path, sheet_name, cell_address, current_depth,
+                                        root_workbook_path, 'limit_reached', 'Maximum recursion depth reached')
         
         # 檢查循環引用
         if cell_id in self.visited_cells:
             self.circular_refs.append(cell_id)
-            # 決定顯示格式
-            current_workbook_path = root_workbook_path if root_workbook_path else workbook_path
-            if os.path.normpath(current_workbook_path) != os.path.normpath(workbook_path):
-                filename = os.path.basename(workbook_path)
-                if filename.endswith('.xlsx') or filename.endswith('.xls') or filename.endswith('.xlsm'):
-                    filename = filename.rsplit('.', 1)[0]
-                display_address = f"[{filename}]{sheet_name}!{cell_address}"
-            else:
-                display_address = f"{sheet_name}!{cell_address}"
-            
-            return {
-                'address': display_address,
-                'workbook_path': workbook_path,
-                'sheet_name': sheet_name,
-                'cell_address': cell_address,
-                'value': 'Circular reference',
-                'formula': None,
-                'type': 'circular_ref',
-                'children': [],
-                'depth': current_depth,
-                'error': 'Circular reference detected'
-            }
+            return self._make_stub_node(workbook_path, sheet_name, cell_address, current_depth,
+                                        root_workbook_path, 'circular_ref', 'Circular reference detected')
         
         # 標記為已訪問
         self.visited_cells.add(cell_id)
         
         try:
-            # 讀取儲存格內容
-            cell_info = read_cell_with_resolved_references(workbook_path, sheet_name, cell_address)
+            # 讀取儲存格內容 (直接串流 sheet XML，一次取得公式和快取值)
+            cell_info = read_cell_info(workbook_path, sheet_name, cell_address)
             
             if 'error' in cell_info:
-                # 決定顯示格式
-                current_workbook_path = root_workbook_path if root_workbook_path else workbook_path
-                if os.path.normpath(current_workbook_path) != os.path.normpath(workbook_path):
-                    filename = os.path.basename(workbook_path)
-                    if filename.endswith('.xlsx') or filename.endswith('.xls') or filename.endswith('.xlsm'):
-                        filename = filename.rsplit('.', 1)[0]
-                    display_address = f"[{filename}]{sheet_name}!{cell_address}"
-                else:
-                    display_address = f"{sheet_name}!{cell_address}"
-                
-                return {
-                    'address': display_address,
-                    'workbook_path': workbook_path,
-                    'sheet_name': sheet_name,
-                    'cell_address': cell_address,
-                    'value': 'Error',
-                    'formula': None,
-                    'type': 'error',
-                    'children': [],
-                    'depth': current_depth,
-                    'error': cell_info['error']
-                }
+                return self._make_stub_node(workbook_path, sheet_name, cell_address, current_depth,
+                                            root_workbook_path, 'error', cell_info['error'])
             
             # 基本節點信息
-            original_formula = cell_info.get('formula')
-            # 增強的公式清理：處理雙反斜線、URL 編碼和雙引號
-            fixed_formula = None
-            if original_formula:
-                # 步驟1: 處理雙反斜線
-                fixed_formula = original_formula.replace('\\\\', '\\')
-                # 步驟2: 解碼 URL 編碼字符（如 %20 -> 空格）
-                from urllib.parse import unquote
-                fixed_formula = unquote(fixed_formula)
-                # 步驟3: 處理雙引號問題 - 將 ''path'' 改為 'path'
-                import re
-                # 匹配 ''...'' 模式並替換為 '...'
-                fixed_formula = re.sub(r"''([^']*?)''", r"'\1'", fixed_formula)
-
-            # 決定顯示格式：外部引用顯示為 [filename]sheet!cell，本地引用顯示為 sheet!cell
-            # 使用 root_workbook_path 來判斷是否為外部引用
-            current_workbook_path = root_workbook_path if root_workbook_path else workbook_path
-            # --- FIX: 強制根節點也顯示檔案名 ---
-            if os.path.normpath(current_workbook_path) != os.path.normpath(workbook_path) or current_depth == 0:
-                # 外部引用或根節點：準備 short 和 full 兩種格式
-                filename = os.path.basename(workbook_path)
-                dir_path = os.path.dirname(workbook_path)
-                # Short format: [filename.xlsx]sheet!cell
-                short_display_address = f"[{filename}]{sheet_name}!{cell_address}"
-                # Full format: 'C:\path\[filename.xlsx]sheet'!cell
-                full_display_address = f"'{dir_path}\[{filename}]{sheet_name}'!{cell_address}"
-                # 預設使用 short format
-                display_address = short_display_address
-            else:
-                # 本地引用：顯示 sheet!cell 格式 (short 和 full 相同)
-                display_address = f"{sheet_name}!{cell_address}"
-                short_display_address = display_address
-                full_display_address = display_address
-
-            node = {
-                'address': display_address,
-                'short_address': short_display_address,
-                'full_address': full_display_address,
-                'workbook_path': workbook_path,
-                'sheet_name': sheet_name,
-                'cell_address': cell_address,
-                'value': cell_info.get('display_value', 'N/A'),
-                'calculated_value': cell_info.get('calculated_value', 'N/A'),
-                'formula': fixed_formula,
-                'type': cell_info.get('cell_type', 'unknown'),
-                'children': [],
-                'depth': current_depth,
-                'error': None
-            }
+            node = self._make_cell_node(cell_info, workbook_path, sheet_name, cell_address,
+                                        current_depth, root_workbook_path)
             
             # 如果是公式，解析依賴關係
             if cell_info.get('cell_type') == 'formula' and cell_info.get('formula'):
@@ -171,6 +287,11 @@ class DependencyExploder:
                 
                 # 遞歸展開每個引用
                 for ref in references:
+                    if ref.get('is_range'):
+                        node['children'].append(self.explode_range_reference(
+                            ref['workbook_path'], ref['sheet_name'], ref['cell_address'],
+                            current_depth + 1, root_workbook_path or workbook_path))
+                        continue
                     try:
                         child_node = self.explode_dependencies(
                             ref['workbook_path'],
@@ -182,29 +303,9 @@ class DependencyExploder:
                         node['children'].append(child_node)
                     except Exception as e:
                         # 添加錯誤節點
-                        # 決定顯示格式
-                        current_workbook_path = root_workbook_path if root_workbook_path else workbook_path
-                        if os.path.normpath(current_workbook_path) != os.path.normpath(ref['workbook_path']):
-                            filename = os.path.basename(ref['workbook_path'])
-                            if filename.endswith('.xlsx') or filename.endswith('.xls') or filename.endswith('.xlsm'):
-                                filename = filename.rsplit('.', 1)[0]
-                            error_display_address = f"[{filename}]{ref['sheet_name']}!{ref['cell_address']}"
-                        else:
-                            error_display_address = f"{ref['sheet_name']}!{ref['cell_address']}"
-                        
-                        error_node = {
-                            'address': error_display_address,
-                            'workbook_path': ref['workbook_path'],
-                            'sheet_name': ref['sheet_name'],
-                            'cell_address': ref['cell_address'],
-                            'value': 'Error',
-                            'formula': None,
-                            'type': 'error',
-                            'children': [],
-                            'depth': current_depth + 1,
-                            'error': str(e)
-                        }
-                        node['children'].append(error_node)
+                        node['children'].append(self._make_stub_node(
+                            ref['workbook_path'], ref['sheet_name'], ref['cell_address'],
+                            current_depth + 1, root_workbook_path, 'error', str(e)))
             
             # 移除已訪問標記（允許在不同分支中重複訪問）
             self.visited_cells.discard(cell_id)
@@ -214,116 +315,257 @@ class DependencyExploder:
         except Exception as e:
             # 移除已訪問標記
             self.visited_cells.discard(cell_id)
-            
-            # 決定顯示格式
-            current_workbook_path = root_workbook_path if root_workbook_path else workbook_path
-            if os.path.normpath(current_workbook_path) != os.path.normpath(workbook_path):
-                filename = os.path.basename(workbook_path)
-                if filename.endswith('.xlsx') or filename.endswith('.xls') or filename.endswith('.xlsm'):
-                    filename = filename.rsplit('.', 1)[0]
-                display_address = f"[{filename}]{sheet_name}!{cell_address}"
+            return self._make_stub_node(workbook_path, sheet_name, cell_address, current_depth,
+                                        root_workbook_path, 'error', str(e))
+    
+    def explode_dependencies_dag(self, workbook_path, sheet_name, cell_address):
+        """
+        DAG 模式：每個 workbook|sheet|cell 只讀取和展開一次，共用節點以 id 引用。
+        
+        Returns:
+            dict: {'root_id', 'nodes', 'root_workbook_path', 'max_depth'}
+                  nodes 為 {cell_id: 節點}，節點以 'child_refs' 記錄子節點 id
+        """
+        self.dag_nodes = {}
+        self.circular_refs = []
+        root_id = self.make_cell_id(workbook_path, sheet_name, cell_address)
+        self._expand_dag_node(workbook_path, sheet_name, cell_address, 0, workbook_path, set())
+        return {
+            'root_id': root_id,
+            'nodes': self.dag_nodes,
+            'root_workbook_path': workbook_path,
+            'max_depth': self.max_depth
+        }
+    
+    def _expand_dag_node(self, workbook_path, sheet_name, cell_address, depth, root_workbook_path, stack):
+        """
+        展開 DAG 節點。若節點先前在較深位置被截斷 (max depth)，
+        現在從較淺位置到達時會以較大的深度預算再展開其子節點。
+        """
+        node_id = self.make_cell_id(workbook_path, sheet_name, cell_address)
+        budget = self.max_depth - depth
+        if budget <= 0:
+            return
+        
+        node = self.dag_nodes.get(node_id)
+        if node is None and is_range_address(cell_address):
+            # 範圍節點沒有子節點 (按需展開)，只需建立一次
+            node = self.explode_range_reference(workbook_path, sheet_name, cell_address, depth, root_workbook_path)
+            node.pop('children', None)
+            node.update({'child_refs': [], 'id': node_id, '_budget': budget, '_truncated': False})
+            self.dag_nodes[node_id] = node
+            return
+        if node is not None:
+            if node_id in stack:
+                self.circular_refs.append(f"{workbook_path}|{sheet_name}|{cell_address}")
+                return
+            if node['_budget'] >= budget or not node['_truncated']:
+                return
+        else:
+            try:
+                cell_info = read_cell_info(workbook_path, sheet_name, cell_address)
+                if 'error' in cell_info:
+                    node = self._make_stub_node(workbook_path, sheet_name, cell_address, depth,
+                                                root_workbook_path, 'error', cell_info['error'])
+                else:
+                    node = self._make_cell_node(cell_info, workbook_path, sheet_name, cell_address,
+                                                depth, root_workbook_path)
+                    if cell_info.get('cell_type') == 'formula' and cell_info.get('formula'):
+                        node['child_refs'] = [
+                            (self.make_cell_id(ref['workbook_path'], ref['sheet_name'], ref['cell_address']), ref)
+                            for ref in self.parse_formula_references(cell_info['formula'], workbook_path, sheet_name)
+                        ]
+            except Exception as e:
+                node = self._make_stub_node(workbook_path, sheet_name, cell_address, depth,
+                                            root_workbook_path, 'error', str(e))
+            node.pop('children', None)
+            node.setdefault('child_refs', [])
+            node['id'] = node_id
+            self.dag_nodes[node_id] = node
+        
+        node['_budget'] = budget
+        truncated = False
+        stack.add(node_id)
+        for child_id, ref in node['child_refs']:
+            if budget - 1 <= 0:
+                truncated = True
+                continue
+            self._expand_dag_node(ref['workbook_path'], ref['sheet_name'], ref['cell_address'],
+                                  depth + 1, root_workbook_path, stack)
+            child = self.dag_nodes.get(child_id)
+            if child is not None and child.get('_truncated'):
+                truncated = True
+        stack.discard(node_id)
+        node['_truncated'] = truncated
+    
+    def dag_to_tree(self, dag):
+        """
+        將 DAG 轉換為 populate_tree / convert_tree_to_graph_data 使用的樹狀結構。
+        子節點在第一次存取 'children' 時才建立，不會一次展開所有路徑。
+        """
+        root = dag['nodes'][dag['root_id']]
+        return LazyDependencyNode(self, dag, root, 0, (dag['root_id'],))
+    
+    def _derive_tree_children(self, dag, node, depth, path_ids):
+        """按路徑建立某個 DAG 節點的子節點 (深度限制和循環引用按路徑判斷)"""
+        children = []
+        root_workbook_path = dag['root_workbook_path']
+        for child_id, ref in node.get('child_refs', []):
+            child_depth = depth + 1
+            if child_depth >= self.max_depth:
+                children.append(self._make_stub_node(
+                    ref['workbook_path'], ref['sheet_name'], ref['cell_address'], child_depth,
+                    root_workbook_path, 'limit_reached', 'Maximum recursion depth reached'))
+            elif child_id in path_ids:
+                children.append(self._make_stub_node(
+                    ref['workbook_path'], ref['sheet_name'], ref['cell_address'], child_depth,
+                    root_workbook_path, 'circular_ref', 'Circular reference detected'))
+            elif child_id not in dag['nodes']:
+                children.append(self._make_stub_node(
+                    ref['workbook_path'], ref['sheet_name'], ref['cell_address'], child_depth,
+                    root_workbook_path, 'error', 'Node was not expanded'))
             else:
-                display_address = f"{sheet_name}!{cell_address}"
+                children.append(LazyDependencyNode(self, dag, dag['nodes'][child_id], child_depth,
+                                                   path_ids + (child_id,)))
+        return children
+    
+    def get_dag_summary(self, dag):
+        """
+        DAG 模式的摘要：unique_cells 為實際讀取的儲存格數，
+        total_nodes / total_paths 為對應樹狀視圖的節點數 (不需展開整棵樹)。
+        circular_references 按樹狀視圖的路徑計算 (與 dag_to_tree 的 circular_ref 節點數目相同)，
+        circular_ref_list 為形成循環的儲存格 (不重複)。
+        """
+        nodes = dag['nodes']
+        # 子樹的結果只取決於路徑上與節點同一強連通分量的節點 (其他路徑節點不能從此節點到達)
+        components = _cyclic_components(nodes)
+        memo = {}
+        
+        def visit(node_id, depth, path_ids):
+            component = components.get(node_id)
+            key = (node_id, depth) if component is None else (node_id, depth, path_ids & component)
+            if key in memo:
+                return memo[key]
+            node = nodes[node_id]
+            count = 1
+            max_depth = depth
+            type_counts = {node.get('type', 'unknown'): 1}
+            circular_ids = set()
+            for child_id, ref in node.get('child_refs', []):
+                child_depth = depth + 1
+                if child_depth >= self.max_depth:
+                    child_result = (1, child_depth, {'limit_reached': 1}, ())
+                elif child_id in path_ids:
+                    child_result = (1, child_depth, {'circular_ref': 1}, (child_id,))
+                elif child_id not in nodes:
+                    child_result = (1, child_depth, {'error': 1}, ())
+                else:
+                    child_result = visit(child_id, child_depth, path_ids | {child_id})
+                count += child_result[0]
+                max_depth = max(max_depth, child_result[1])
+                for node_type, type_count in child_result[2].items():
+                    type_counts[node_type] = type_counts.get(node_type, 0) + type_count
+                circular_ids.update(child_result[3])
+            memo[key] = (count, max_depth, type_counts, frozenset(circular_ids))
+            return memo[key]
+        
+        total_paths, max_depth, type_distribution, circular_ids = visit(dag['root_id'], 0,
+                                                                        frozenset([dag['root_id']]))
+        unique_types = {}
+        for node in nodes.values():
+            node_type = node.get('type', 'unknown')
+            unique_types[node_type] = unique_types.get(node_type, 0) + 1
+        
+        return {
+            'total_nodes': total_paths,
+            'total_paths': total_paths,
+            'unique_cells': len(nodes),
+            'max_depth': max_depth,
+            'type_distribution': type_distribution,
+            'unique_type_distribution': unique_types,
+            'circular_references': type_distribution.get('circular_ref', 0),
+            'circular_ref_list': sorted(circular_ids)
+        }
+    
+    def _resolve_sheet_part(self, sheet_part_raw, current_workbook_path):
+        """
+        將工作表前綴解析為 (workbook_path, sheet_name, ref_type)；無法解析返回 None
+        """
+        # Check if it's an external reference
+        if '[' in sheet_part_raw and ']' in sheet_part_raw:
+            # --- Enhanced Robust External Path Cleaning ---
+            decoded_ref = unquote(sheet_part_raw)
+            # More thorough cleaning: remove all combinations of quotes, spaces, and exclamation marks
+            cleaned_ref = decoded_ref.strip("\' ! \"").strip()
+            # Handle double backslashes in paths
+            cleaned_ref = cleaned_ref.replace('\\\\', '\\')
             
-            return {
-                'address': display_address,
-                'workbook_path': workbook_path,
-                'sheet_name': sheet_name,
-                'cell_address': cell_address,
-                'value': 'Error',
-                'formula': None,
-                'type': 'error',
-                'children': [],
-                'depth': current_depth,
-                'error': str(e)
-            }
+            # Special handling for double quotes pattern: ''path''!
+            if cleaned_ref.startswith("'") and cleaned_ref.endswith("'"):
+                cleaned_ref = cleaned_ref[1:-1]  # Remove outer quotes
+                cleaned_ref = cleaned_ref.strip()  # Clean any remaining spaces
+            
+            try:
+                workbook_part, sheet_name = cleaned_ref.rsplit(']', 1)
+                workbook_part += ']'
+                dir_path, file_name = workbook_part.rsplit('[', 1)
+                file_name = file_name.rstrip(']')
+            except ValueError:
+                return None
+            
+            # Final clean path
+            workbook_path = os.path.normpath(os.path.join(dir_path, file_name))
+            return workbook_path, sheet_name, 'external'
+        
+        # It's a local absolute reference
+        return current_workbook_path, sheet_part_raw.strip("\'!"), 'local_absolute'
+    
+    # 範圍引用按種類排列，與舊版逐個 pattern 掃描的次序相同
+    RANGE_KIND_ORDER = {'cells': 0, 'columns': 1, 'rows': 2}
+    RANGE_KIND_NAMES = {'range': 'cells', 'columns': 'columns', 'rows': 'rows'}
     
     def parse_formula_references(self, formula, current_workbook_path, current_sheet_name):
         """
-        Parses all references from a formula string in a single, robust pass.
-        This new implementation avoids modifying the formula string during parsing.
+        Parses all references from a formula string using the shared, memoized tokenizer.
+        
+        Ranges (A1:B10, A:A, 1:5, sheet-qualified or external) are returned as a single
+        reference with 'is_range': True and the range address in 'cell_address'.
+        Order: sheet-qualified cells, unqualified cells, then ranges.
         """
         if not formula or not formula.startswith('='):
             return []
 
-        references = []
-        processed_spans = set()
-
-        # Regex to find absolute references (both local and external)
-        # It captures: 1. Sheet part (quoted or not, including double quotes), 2. Column, 3. Row
-        # Enhanced to handle double quotes: ''path'' format
-        abs_pattern = r"((?:''[^']*''|'[^']+'|[^'!,=+\-*/^&()<> ]+)!)\$?([A-Z]{1,3})\$?([0-9]{1,7})"
-        
-        for match in re.finditer(abs_pattern, formula):
-            sheet_part_raw = match.group(1)  # e.g., "'C:\\path\\[file.xlsx]Sheet1'!" or "Sheet1!"
-            col = match.group(2)
-            row = match.group(3)
-            cell_address = f"{col}{row}"
-            
-            # Mark this part of the string as processed
-            processed_spans.add(match.span())
-
-            # Check if it's an external reference
-            if '[' in sheet_part_raw and ']' in sheet_part_raw:
-                # --- Enhanced Robust External Path Cleaning ---
-                decoded_ref = unquote(sheet_part_raw)
-                # More thorough cleaning: remove all combinations of quotes, spaces, and exclamation marks
-                cleaned_ref = decoded_ref.strip("\' ! \"").strip()
-                # Handle double backslashes in paths
-                cleaned_ref = cleaned_ref.replace('\\\\', '\\')
-                
-                # Special handling for double quotes pattern: ''path''!
-                if cleaned_ref.startswith("'") and cleaned_ref.endswith("'"):
-                    cleaned_ref = cleaned_ref[1:-1]  # Remove outer quotes
-                    cleaned_ref = cleaned_ref.strip()  # Clean any remaining spaces
-                
-                try:
-                    workbook_part, sheet_name = cleaned_ref.rsplit(']', 1)
-                    workbook_part += ']'
-                    dir_path, file_name = workbook_part.rsplit('[', 1)
-                    file_name = file_name.rstrip(']')
-                    
-                    # Final clean path
-                    workbook_path = os.path.normpath(os.path.join(dir_path, file_name))
-                    
-                    references.append({
-                        'workbook_path': workbook_path,
-                        'sheet_name': sheet_name,
-                        'cell_address': cell_address,
-                        'type': 'external'
-                    })
-                except ValueError:
+        qualified = []
+        unqualified = []
+        range_references = []
+        for reference in extract_references(formula):
+            if reference.ref_kind not in ('cell', 'range', 'columns', 'rows'):
+                continue
+            if reference.sheet_prefix and reference.workbook is None:
+                workbook_path, sheet_name, ref_type = current_workbook_path, reference.sheet, 'local_absolute'
+            elif reference.sheet_prefix:
+                resolved = self._resolve_sheet_part(reference.sheet_prefix, current_workbook_path)
+                if not resolved:
                     continue
+                workbook_path, sheet_name, ref_type = resolved
             else:
-                # It's a local absolute reference
-                sheet_name = sheet_part_raw.strip("\'!")
-                references.append({
-                    'workbook_path': current_workbook_path,
-                    'sheet_name': sheet_name,
-                    'cell_address': cell_address,
-                    'type': 'local_absolute'
-                })
-
-        # Regex for relative references (e.g., A1)
-        rel_pattern = r"\b([A-Z]{1,3})([0-9]{1,7})\b"
-        for match in re.finditer(rel_pattern, formula):
-            is_processed = False
-            for span_start, span_end in processed_spans:
-                if span_start <= match.start() and match.end() <= span_end:
-                    is_processed = True
-                    break
+                workbook_path, sheet_name, ref_type = current_workbook_path, current_sheet_name, 'relative'
             
-            if not is_processed:
-                col = match.group(1)
-                row = match.group(2)
-                references.append({
-                    'workbook_path': current_workbook_path,
-                    'sheet_name': current_sheet_name,
-                    'cell_address': f"{col}{row}",
-                    'type': 'relative'
-                })
+            entry = {
+                'workbook_path': workbook_path,
+                'sheet_name': sheet_name,
+                'cell_address': reference.address,
+                'type': ref_type
+            }
+            if reference.ref_kind == 'cell':
+                (qualified if reference.sheet_prefix else unqualified).append(entry)
+            else:
+                entry['is_range'] = True
+                entry['range_kind'] = self.RANGE_KIND_NAMES[reference.ref_kind]
+                range_references.append(entry)
 
-        return references
+        range_references.sort(key=lambda ref: self.RANGE_KIND_ORDER[ref['range_kind']])
+        return qualified + unqualified + range_references
     
     def _normalize_formula_paths(self, formula):
         """
@@ -388,8 +630,19 @@ class DependencyExploder:
             
             return type_counts
         
+        def collect_unique_cells(node, cell_ids):
+            if node.get('type') in ('formula', 'value'):
+                cell_ids.add(self.make_cell_id(node.get('workbook_path', ''), node.get('sheet_name', ''),
+                                               node.get('cell_address', '')))
+            for child in node.get('children', []):
+                collect_unique_cells(child, cell_ids)
+            return cell_ids
+        
+        total_nodes = count_nodes(root_node)
         return {
-            'total_nodes': count_nodes(root_node),
+            'total_nodes': total_nodes,
+            'total_paths': total_nodes,
+            'unique_cells': len(collect_unique_cells(root_node, set())),
             'max_depth': get_max_depth(root_node),
             'type_distribution': count_by_type(root_node),
             'circular_references': len(self.circular_refs),
@@ -397,7 +650,109 @@ class DependencyExploder:
         }
 
 
-def explode_cell_dependencies(workbook_path, sheet_name, cell_address, max_depth=10):
+def _cyclic_components(nodes):
+    """
+    DAG 節點的強連通分量 (迭代 Tarjan)：{node_id: frozenset(分量)}，
+    只包括屬於循環的節點 (多於一個節點的分量，或引用自己的節點)。
+    """
+    index_of = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = {}
+    for start_id in nodes:
+        if start_id in index_of:
+            continue
+        index_of[start_id] = lowlink[start_id] = len(index_of)
+        stack.append(start_id)
+        on_stack.add(start_id)
+        work = [(start_id, iter(nodes[start_id].get('child_refs', [])))]
+        while work:
+            node_id, children = work[-1]
+            advanced = False
+            for child_id, _ in children:
+                if child_id not in nodes:
+                    continue
+                if child_id not in index_of:
+                    index_of[child_id] = lowlink[child_id] = len(index_of)
+                    stack.append(child_id)
+                    on_stack.add(child_id)
+                    work.append((child_id, iter(nodes[child_id].get('child_refs', []))))
+                    advanced = True
+                    break
+                if child_id in on_stack:
+                    lowlink[node_id] = min(lowlink[node_id], index_of[child_id])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent_id = work[-1][0]
+                lowlink[parent_id] = min(lowlink[parent_id], lowlink[node_id])
+            if lowlink[node_id] == index_of[node_id]:
+                members = []
+                while True:
+                    member_id = stack.pop()
+                    on_stack.discard(member_id)
+                    members.append(member_id)
+                    if member_id == node_id:
+                        break
+                self_reference = any(child_id == node_id for child_id, _ in nodes[node_id].get('child_refs', []))
+                if len(members) > 1 or self_reference:
+                    component = frozenset(members)
+                    for member_id in members:
+                        components[member_id] = component
+    return components
+
+
+class LazyDependencyNode(dict):
+    """
+    DAG 節點在樹狀視圖中的一個位置 (路徑)。
+    行為與一般節點 dict 相同，但 'children' 在第一次存取時才建立。
+    """
+
+    def __init__(self, exploder, dag, dag_node, depth, path_ids):
+        fields = {key: value for key, value in dag_node.items()
+                  if key not in ('child_refs', 'id') and not key.startswith('_')}
+        fields['depth'] = depth
+        fields['children'] = []
+        super().__init__(fields)
+        self._exploder = exploder
+        self._dag = dag
+        self._dag_node = dag_node
+        self._path_ids = path_ids
+        self._children_loaded = not dag_node.get('child_refs')
+
+    def _load_children(self):
+        if not self._children_loaded:
+            self._children_loaded = True
+            dict.__setitem__(self, 'children', self._exploder._derive_tree_children(
+                self._dag, self._dag_node, self['depth'], self._path_ids))
+
+    def __getitem__(self, key):
+        if key == 'children':
+            self._load_children()
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key == 'children':
+            self._load_children()
+        return dict.get(self, key, default)
+
+    def items(self):
+        self._load_children()
+        return dict.items(self)
+
+    def values(self):
+        self._load_children()
+        return dict.values(self)
+
+    @property
+    def node_id(self):
+        return self._dag_node.get('id')
+
+
+def explode_cell_dependencies(workbook_path, sheet_name, cell_address, max_depth=10, dag=False, engine='dfs',
+                              workers=None):
     """
     便捷函數：爆炸分析指定儲存格的依賴關係
     
@@ -406,11 +761,26 @@ def explode_cell_dependencies(workbook_path, sheet_name, cell_address, max_depth
         sheet_name: 工作表名稱
         cell_address: 儲存格地址
         max_depth: 最大遞歸深度
+        dag: True 時使用 DAG 模式，共用的前置儲存格只展開一次；
+             返回的樹在存取 children 時才按需建立
+        engine: 'dfs' 逐個儲存格遞歸讀取；'bfs' 按層展開，每層每個工作表批次讀取一次
+        workers: 'bfs' 時同一層涉及多個工作簿所用的 worker process 數目；
+                 None 使用預設值 (EXCEL_TOOLS_EXPLODE_WORKERS 或 CPU 數目)，0/1 為不平行
         
     Returns:
         tuple: (依賴樹, 摘要信息)
     """
-    exploder = DependencyExploder(max_depth=max_depth)
+    if engine == 'bfs':
+        from utils.level_exploder import LevelDependencyExploder
+        from utils.parallel_exploder import get_explosion_pool
+        pool = get_explosion_pool(workers)
+        exploder = LevelDependencyExploder(max_depth=max_depth, pool=pool if pool.parallel else None)
+    else:
+        exploder = DependencyExploder(max_depth=max_depth)
+    if dag:
+        dependency_dag = exploder.explode_dependencies_dag(workbook_path, sheet_name, cell_address)
+        return exploder.dag_to_tree(dependency_dag), exploder.get_dag_summary(dependency_dag)
+    
     dependency_tree = exploder.explode_dependencies(workbook_path, sheet_name, cell_address)
     summary = exploder.get_explosion_summary(dependency_tree)
     
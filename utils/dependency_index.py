@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+Dependency Index - 工作簿層級的前置/從屬儲存格索引
+
+一次過掃描工作簿所有工作表的公式，建立：
+- forward adjacency：公式儲存格 -> 它引用的儲存格 / 範圍 (precedents)
+- reverse adjacency：儲存格 -> 引用它的公式儲存格 (dependents)
+- 範圍引用以區間 (interval tree) 儲存，A1:A100000 / A:A 不會被展開成逐格的邊
+
+建立後的查詢 (直接/遞移的 dependents、N 層 precedents) 只需毫秒，
+適合做「修改這個輸入會影響哪些公式」的影響分析。
+"""
+
+import os
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+from utils.workbook_cache import workbook_cache, normalize_workbook_path
+from utils.sheet_xml_reader import (iter_sheet_cells, get_workbook_xml_index, is_xml_workbook,
+                                    split_cell_address, column_letter_to_index, column_index_to_letter)
+
+DEPENDENCY_INDEX_VIEW = 'dependency_index'
+
+# Excel 工作表上限，用於整欄 (A:A) / 整列 (1:3) 引用
+MAX_ROW = 1048576
+MAX_COL = 16384
+
+# 每個索引項目的大約記憶體用量 (bytes)，用來向 workbook cache 報告
+BYTES_PER_FORMULA = 600
+
+
+def _sheet_key(workbook_path, sheet_name):
+    return (normalize_workbook_path(workbook_path), sheet_name.lower())
+
+
+def _range_rect(range_address):
+    """'A1:B5' / 'A:C' / '2:4' -> (min_row, max_row, min_col, max_col)；無效返回 None"""
+    start, _, end = range_address.replace('$', '').upper().partition(':')
+    if start.isdigit() and end.isdigit():
+        min_row, max_row = sorted((int(start), int(end)))
+        return (min_row, max_row, 1, MAX_COL)
+    if start.isalpha() and end.isalpha():
+        min_col, max_col = sorted((column_letter_to_index(start), column_letter_to_index(end)))
+        return (1, MAX_ROW, min_col, max_col)
+    start_pos, end_pos = split_cell_address(start), split_cell_address(end)
+    if not start_pos or not end_pos:
+        return None
+    min_row, max_row = sorted((start_pos[0], end_pos[0]))
+    min_col, max_col = sorted((start_pos[1], end_pos[1]))
+    return (min_row, max_row, min_col, max_col)
+
+
+class _IntervalNode:
+    """Centered interval tree 的節點 (以列為區間，欄在命中後再過濾)"""
+
+    __slots__ = ('center', 'left', 'right', 'by_start', 'by_end')
+
+    def __init__(self, center):
+        self.center = center
+        self.left = None
+        self.right = None
+        self.by_start = []
+        self.by_end = []
+
+
+class RangeIntervalIndex:
+    """
+    單一工作表的範圍索引：rect (min_row, max_row, min_col, max_col) -> 引用該範圍的公式儲存格。
+    相同的範圍只儲存一次，查詢某儲存格落在哪些範圍內為 O(log n + k)。
+    """
+
+    def __init__(self):
+        self.rects = {}
+        self._root = None
+        self._dirty = False
+
+    def add(self, rect, dependent_key):
+        self.rects.setdefault(rect, set()).add(dependent_key)
+        self._dirty = True
+
+    def __len__(self):
+        return len(self.rects)
+
+    def _build(self):
+        self._root = self._build_node(list(self.rects.keys()))
+        self._dirty = False
+
+    def _build_node(self, rects):
+        if not rects:
+            return None
+        endpoints = sorted([r[0] for r in rects] + [r[1] for r in rects])
+        node = _IntervalNode(endpoints[len(endpoints) // 2])
+        left, right, overlap = [], [], []
+        for rect in rects:
+            if rect[1] < node.center:
+                left.append(rect)
+            elif rect[0] > node.center:
+                right.append(rect)
+            else:
+                overlap.append(rect)
+        node.by_start = sorted(overlap, key=lambda r: r[0])
+        node.by_end = sorted(overlap, key=lambda r: r[1], reverse=True)
+        node.left = self._build_node(left)
+        node.right = self._build_node(right)
+        return node
+
+    def find(self, row, col):
+        """返回包含 (row, col) 的所有範圍 rect"""
+        if self._dirty:
+            self._build()
+        found = []
+        node = self._root
+        while node is not None:
+            if row < node.center:
+                for rect in node.by_start:
+                    if rect[0] > row:
+                        break
+                    if rect[2] <= col <= rect[3]:
+                        found.append(rect)
+                node = node.left
+            elif row > node.center:
+                for rect in node.by_end:
+                    if rect[1] < row:
+                        break
+                    if rect[2] <= col <= rect[3]:
+                        found.append(rect)
+                node = node.right
+            else:
+                found.extend(rect for rect in node.by_start if rect[2] <= col <= rect[3])
+                break
+        return found
+
+
+class WorkbookDependencyIndex:
+    """
+    工作簿層級的依賴索引。
+
+    Cell key 為 (標準化路徑, 工作表名稱小寫, row, col)；範圍 key 為
+    (標準化路徑, 工作表名稱小寫, min_row, max_row, min_col, max_col)。
+    """
+
+    def __init__(self):
+        # cell key -> tuple of ('cell', cell key) / ('range', range key)
+        self.precedents = {}
+        # cell key -> set(公式 cell key)，只記錄單一儲存格引用
+        self.dependents = {}
+        # sheet key -> RangeIntervalIndex
+        self.range_dependents = {}
+        # sheet key -> {col: sorted rows}，展開範圍內的公式儲存格
+        self.formula_positions = {}
+        self.formulas = {}
+        # 顯示用名稱
+        self.workbook_paths = {}
+        self.sheet_names = {}
+        self.range_addresses = {}
+        self.indexed_workbooks = []
+        self.formula_count = 0
+        self.reference_count = 0
+        self.build_seconds = 0.0
+        self._positions_dirty = {}
+
+    # ------------------------------------------------------------------
+    # Build
+    # ------------------------------------------------------------------
+
+    def add_workbook(self, workbook_path, progress_callback=None):
+        """
+        掃描工作簿所有工作表的公式並加入索引。
+
+        Args:
+            workbook_path (str): 工作簿路徑
+            progress_callback (callable): progress_callback(sheet_name, formula_count)
+        """
+        from utils.dependency_exploder import DependencyExploder
+
+        start_time = time.perf_counter()
+        parser = DependencyExploder()
+        workbook_path = os.path.normpath(workbook_path)
+
+        for sheet_name, records in self._iter_workbook_formulas(workbook_path):
+            # 同一工作表內 (相對引用已展開) 重複的公式字串只解析一次
+            parsed_formulas = {}
+            for address, formula in records:
+                references = parsed_formulas.get(formula)
+                if references is None:
+                    references = parser.parse_formula_references(formula, workbook_path, sheet_name)
+                    parsed_formulas[formula] = references
+                self._add_formula(workbook_path, sheet_name, address, formula, references)
+            if progress_callback:
+                progress_callback(sheet_name, self.formula_count)
+
+        self.indexed_workbooks.append(workbook_path)
+        self.build_seconds += time.perf_counter() - start_time
+        return self
+
+    @staticmethod
+    def _iter_workbook_formulas(workbook_path):
+        """逐一工作表返回 (sheet_name, [(address, formula), ...])"""
+        import zipfile
+
+        if is_xml_workbook(workbook_path) and zipfile.is_zipfile(workbook_path):
+            for sheet_name in get_workbook_xml_index(workbook_path).sheet_names:
+                try:
+                    records = [(record['address'], record['formula'])
+                               for record in iter_sheet_cells(workbook_path, sheet_name, formulas_only=True)]
+                except Exception as e:
+                    print(f"Skipped sheet '{sheet_name}' while indexing: {e}")
+                    continue
+                yield sheet_name, records
+            return
+
+        from utils.openpyxl_resolver import _resolve_formula_string
+        workbook = workbook_cache.get_formula_workbook(workbook_path)
+        link_map = workbook_cache.get_external_link_map(workbook_path)
+        for worksheet in workbook.worksheets:
+            records = []
+            for row in worksheet.iter_rows():
+                for cell in row:
+                    if cell.data_type == 'f' and isinstance(cell.value, str):
+                        records.append((cell.coordinate, _resolve_formula_string(cell.value, link_map)))
+            yield worksheet.title, records
+
+    def _add_formula(self, workbook_path, sheet_name, address, formula, references):
+        position = split_cell_address(address)
+        if not position:
+            return
+        sheet_key = _sheet_key(workbook_path, sheet_name)
+        cell_key = sheet_key + position
+        self.workbook_paths.setdefault(sheet_key[0], workbook_path)
+        self.sheet_names.setdefault(sheet_key, sheet_name)
+        self.formulas[cell_key] = formula
+        self.formula_positions.setdefault(sheet_key, {}).setdefault(position[1], []).append(position[0])
+        self._positions_dirty[sheet_key] = True
+
+        edges = []
+        for ref in references:
+            ref_sheet_key = _sheet_key(ref['workbook_path'], ref['sheet_name'])
+            self.workbook_paths.setdefault(ref_sheet_key[0], ref['workbook_path'])
+            self.sheet_names.setdefault(ref_sheet_key, ref['sheet_name'])
+            if ref.get('is_range'):
+                rect = _range_rect(ref['cell_address'])
+                if not rect:
+                    continue
+                range_key = ref_sheet_key + rect
+                self.range_addresses.setdefault(range_key, ref['cell_address'].replace('$', '').upper())
+                if ref_sheet_key not in self.range_dependents:
+                    self.range_dependents[ref_sheet_key] = RangeIntervalIndex()
+                self.range_dependents[ref_sheet_key].add(rect, cell_key)
+                edges.append(('range', range_key))
+            else:
+                ref_position = split_cell_address(ref['cell_address'].replace('$', '').upper())
+                if not ref_position:
+                    continue
+                ref_key = ref_sheet_key + ref_position
+                self.dependents.setdefault(ref_key, set()).add(cell_key)
+                edges.append(('cell', ref_key))
+
+        self.precedents[cell_key] = tuple(edges)
+        self.formula_count += 1
+        self.reference_count += len(edges)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _cell_key(self, workbook_path, sheet_name, cell_address):
+        position = split_cell_address(cell_address.replace('$', '').upper())
+        if not position:
+            raise ValueError(f"Invalid cell address: {cell_address}")
+        return _sheet_key(workbook_path, sheet_name) + position
+
+    def direct_dependents(self, cell_key):
+        """返回直接引用該儲存格的公式 cell key (單一儲存格及範圍引用)"""
+        found = set(self.dependents.get(cell_key, ()))
+        interval_index = self.range_dependents.get(cell_key[:2])
+        if interval_index is not None:
+            for rect in interval_index.find(cell_key[2], cell_key[3]):
+                found.update(interval_index.rects[rect])
+        found.discard(cell_key)
+        return found
+
+    def get_dependents(self, workbook_path, sheet_name, cell_address, transitive=True, max_depth=None):
+        """
+        返回引用該儲存格的公式 (修改它會受影響的儲存格)。
+
+        Args:
+            transitive (bool): False 只返回直接 dependents
+            max_depth (int): 遞移查詢的最大層數；None 為不限
+
+        Returns:
+            list: [{'workbook_path', 'sheet_name', 'cell_address', 'formula', 'depth', 'is_range'}, ...]
+                  按層數排序
+        """
+        start_key = self._cell_key(workbook_path, sheet_name, cell_address)
+        if not transitive:
+            max_depth = 1
+
+        visited = {start_key}
+        results = []
+        queue = deque([(start_key, 0)])
+        while queue:
+            cell_key, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for dependent_key in sorted(self.direct_dependents(cell_key)):
+                if dependent_key in visited:
+                    continue
+                visited.add(dependent_key)
+                results.append(self._describe(dependent_key, depth + 1))
+                queue.append((dependent_key, depth + 1))
+        return results
+
+    def _formula_cells_in_range(self, range_key):
+        """返回範圍內所有公式儲存格的 cell key"""
+        sheet_key = range_key[:2]
+        min_row, max_row, min_col, max_col = range_key[2:]
+        positions = self.formula_positions.get(sheet_key)
+        if not positions:
+            return []
+        if self._positions_dirty.pop(sheet_key, False):
+            for rows in positions.values():
+                rows.sort()
+        found = []
+        for col in sorted(positions):
+            if min_col <= col <= max_col:
+                rows = positions[col]
+                for row in rows[bisect_left(rows, min_row):bisect_right(rows, max_row)]:
+                    found.append(sheet_key + (row, col))
+        return found
+
+    def get_precedents(self, workbook_path, sheet_name, cell_address, max_depth=1):
+        """
+        返回該儲存格 N 層內引用的儲存格及範圍。範圍本身作為一個結果返回，
+        範圍內的公式儲存格會繼續向下追蹤。
+
+        Args:
+            max_depth (int): 最大層數；None 為不限
+
+        Returns:
+            list: [{'workbook_path', 'sheet_name', 'cell_address', 'formula', 'depth', 'is_range'}, ...]
+        """
+        start_key = self._cell_key(workbook_path, sheet_name, cell_address)
+        visited = {start_key}
+        results = []
+        queue = deque([(start_key, 0)])
+        while queue:
+            cell_key, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for edge_type, target_key in self.precedents.get(cell_key, ()):
+                if target_key in visited:
+                    continue
+                visited.add(target_key)
+                if edge_type == 'range':
+                    results.append(self._describe_range(target_key, depth + 1))
+                    for inner_key in self._formula_cells_in_range(target_key):
+                        if inner_key not in visited:
+                            visited.add(inner_key)
+                            results.append(self._describe(inner_key, depth + 1))
+                            queue.append((inner_key, depth + 1))
+                else:
+                    results.append(self._describe(target_key, depth + 1))
+                    queue.append((target_key, depth + 1))
+        return results
+
+    def _describe(self, cell_key, depth):
+        return {
+            'workbook_path': self.workbook_paths.get(cell_key[0], cell_key[0]),
+            'sheet_name': self.sheet_names.get(cell_key[:2], cell_key[1]),
+            'cell_address': f"{column_index_to_letter(cell_key[3])}{cell_key[2]}",
+            'formula': self.formulas.get(cell_key),
+            'depth': depth,
+            'is_range': False,
+        }
+
+    def _describe_range(self, range_key, depth):
+        return {
+            'workbook_path': self.workbook_paths.get(range_key[0], range_key[0]),
+            'sheet_name': self.sheet_names.get(range_key[:2], range_key[1]),
+            'cell_address': self.range_addresses.get(range_key, ''),
+            'formula': None,
+            'depth': depth,
+            'is_range': True,
+        }
+
+    def get_stats(self):
+        """返回索引統計資料"""
+        return {
+            'workbooks': len(self.indexed_workbooks),
+            'formula_cells': self.formula_count,
+            'references': self.reference_count,
+            'referenced_cells': len(self.dependents),
+            'unique_ranges': sum(len(index) for index in self.range_dependents.values()),
+            'build_seconds': self.build_seconds,
+        }
+
+
+def build_dependency_index(workbook_paths, progress_callback=None):
+    """為一個或多個工作簿建立 (不快取的) 依賴索引"""
+    if isinstance(workbook_paths, str):
+        workbook_paths = [workbook_paths]
+    index = WorkbookDependencyIndex()
+    for workbook_path in workbook_paths:
+        index.add_workbook(workbook_path, progress_callback=progress_callback)
+    return index
+
+
+def get_dependency_index(workbook_path, progress_callback=None):
+    """
+    返回工作簿的依賴索引；經 workbook cache 快取，檔案儲存後自動重建。
+    """
+    def loader(path):
+        return WorkbookDependencyIndex().add_workbook(path, progress_callback=progress_callback)
+
+    return workbook_cache.get_view(
+        workbook_path, DEPENDENCY_INDEX_VIEW, loader,
+        estimated_bytes=lambda index: index.formula_count * BYTES_PER_FORMULA
+    )
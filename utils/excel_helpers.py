@@ -4,6 +4,7 @@ import os
 import re
 import openpyxl
 from core.excel_connector import activate_excel_window
+from utils.com_instrumentation import instrumented_operation
 
 def _perform_excel_selection(pane, affected_addresses):
     """
@@ -59,6 +60,9 @@ def select_ranges_in_excel(summary_window, summary_tree, pane, link_to_addresses
     if not pane.xl or not pane.worksheet:
         messagebox.showerror("Excel Connection Error", "Not connected to Excel.", parent=summary_window)
         return
+    if getattr(pane, 'scan_sheets', None):
+        messagebox.showerror("Excel Operation Error", "Selecting ranges is only available for single-worksheet scans.", parent=summary_window)
+        return
 
     # --- Call Core Logic ---
     success, error_message = _perform_excel_selection(pane, affected_addresses)
@@ -67,6 +71,7 @@ def select_ranges_in_excel(summary_window, summary_tree, pane, link_to_addresses
     if not success:
         messagebox.showerror("Excel Operation Error", f"An error occurred while trying to select ranges in Excel:\n\n{error_message}", parent=summary_window)
 
+@instrumented_operation("Replace links")
 def replace_links_in_excel(summary_window, replace_frame, pane, summary_tree, old_link_var, new_link_entry, rescan_var, formulas_to_summarize, link_to_addresses_cache, external_path_pattern, show_summary_by_workbook, show_summary_by_worksheet, current_mode, sorted_full_paths, btn_by_sheet, btn_by_workbook, browse_button, replace_button):
     calc_mode_prev = None
     calc_before_save_prev = None
@@ -269,6 +274,14 @@ def replace_links_in_excel(summary_window, replace_frame, pane, summary_tree, ol
         )
         return
 
+    if getattr(pane, 'scan_sheets', None):
+        messagebox.showerror(
+            "Replacement Failed - Entire Workbook Scan!",
+            f"Reason: Link replacement updates a single worksheet, but the current list comes from an entire workbook scan.{newline}{newline}Please scan the worksheet to update and try again.",
+            parent=summary_window
+        )
+        return
+
     if not pane.worksheet:
         messagebox.showerror(
             "Replacement Failed - Not Connected to Excel!",
@@ -281,7 +294,8 @@ def replace_links_in_excel(summary_window, replace_frame, pane, summary_tree, ol
     formula_idx = pane.view.tree_columns.index("formula")
     address_idx = pane.view.tree_columns.index("address")
 
-    current_formulas = [pane.view.result_tree.item(item_id, "values") for item_id in pane.view.result_tree.get_children()]
+    from core.worksheet_tree import get_visible_rows
+    current_formulas = get_visible_rows(pane)
 
     for item_data in current_formulas:
         if len(item_data) > formula_idx and old_link in str(item_data[formula_idx]):
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Formula Tokenizer - Excel 公式詞法分析及引用擷取
+
+一次過將公式分解為 token (函數、字串、數字、運算符、名稱、引用...)，
+引用 token 附帶結構化資料：外部檔案目錄、[檔名]、工作表、地址及種類。
+
+結果按公式字串快取 (lru_cache)，相同的公式 (例如向下複製且只含絕對引用的公式、
+同一外部連結) 只會分析一次。所有解析公式引用的地方都應使用這個模組。
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# 快取大小：足夠容納大型工作表的所有不同公式
+TOKEN_CACHE_SIZE = 65536
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls', '.xlsm', '.xlsb')
+
+# kind: 'string' / 'number' / 'bool' / 'error' / 'function' / 'name' / 'reference' /
+#       'operator' / 'paren' / 'separator' / 'whitespace' / 'unknown'
+Token = namedtuple('Token', 'kind text start end reference')
+
+# ref_kind: 'cell' / 'range' / 'columns' / 'rows' / 'name' / 'error'
+# address 已移除 $ 並轉為大寫；sheet_prefix 為原始的 "Sheet1!" / "'C:\dir\[a.xlsx]S'!" 文字
+FormulaReference = namedtuple(
+    'FormulaReference',
+    'ref_kind address raw_address sheet_prefix directory workbook sheet start end'
+)
+
+_SHEET_CHARS = r"[^\s'!\"(),;:=+\-*/^&<>{}\[\]#%@]+"
+
+_CELL = r"\$?[A-Za-z]{1,3}\$?\d{1,7}"
+
+# 帶工作表前綴的引用作為一個 token：前綴 + 引用主體 (主體缺少時為 unknown)
+_TOKEN_PATTERN = re.compile(r"""
+    (?P<string>"(?:[^"]|"")*"?)
+  | (?P<qref>
+        (?P<qprefix>
+            ''[^']*''!
+          | '(?:[^']|'')+'!
+          | \[[^\]]+\](?:<SHEET>(?::<SHEET>)?)?!
+          | <SHEET>(?::<SHEET>)?!
+        )
+        (?:
+            (?P<qrange><CELL>:<CELL>(?![\w.(]))
+          | (?P<qcolumns>\$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3}(?![\w.(]))
+          | (?P<qrows>\$?\d{1,7}:\$?\d{1,7}(?![\w.(]))
+          | (?P<qcell><CELL>(?![\w.(\[]))
+          | (?P<qerror>\#REF!)
+          | (?P<qname>[A-Za-z_\\ -￿][\w.?\\]*)
+        )?
+    )
+  | (?P<error>\#(?:NULL!|DIV/0!|VALUE!|REF!|NAME\?|NUM!|N/A|GETTING_DATA|SPILL!|CALC!|FIELD!|BLOCKED!|CONNECT!|BUSY!|UNKNOWN!))
+  | (?P<rows>\$?\d{1,7}:\$?\d{1,7}(?![\w.(]))
+  | (?P<range><CELL>:<CELL>(?![\w.(]))
+  | (?P<columns>\$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3}(?![\w.(!]))
+  | (?P<cell><CELL>(?![\w.(!\[]))
+  | (?P<function>[A-Za-z_\\][\w.]*(?=\())
+  | (?P<bool>(?:TRUE|FALSE)(?![\w.(\[]))
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[Ee][+-]?\d+)?)
+  | (?P<name>[A-Za-z_\\ -￿][\w.?\\]*(?:\[(?:[^\[\]]|\[[^\]]*\])*\])?)
+  | (?P<whitespace>\s+)
+  | (?P<operator><>|<=|>=|[-+*/^&=<>%:@])
+  | (?P<paren>[(){}])
+  | (?P<separator>[,;])
+  | (?P<unknown>.)
+""".replace('<SHEET>', _SHEET_CHARS).replace('<CELL>', _CELL), re.VERBOSE | re.UNICODE | re.DOTALL)
+
+_REFERENCE_KINDS = frozenset(('cell', 'range', 'columns', 'rows'))
+_PREFIXED_BODY_GROUPS = (('qrange', 'range'), ('qcolumns', 'columns'), ('qrows', 'rows'), ('qcell', 'cell'),
+                         ('qerror', 'error'), ('qname', 'name'))
+
+
+def split_sheet_prefix(sheet_prefix):
+    """
+    將工作表前綴拆為 (directory, workbook, sheet)。
+
+    "'C:\\dir\\[a.xlsx]Sheet 1'!" -> ('C:\\dir\\', 'a.xlsx', 'Sheet 1')
+    "[1]Sheet1!" -> ('', '1', 'Sheet1')；"Sheet1!" -> (None, None, 'Sheet1')
+    """
+    inner = sheet_prefix[:-1] if sheet_prefix.endswith('!') else sheet_prefix
+    if inner.startswith("''") and inner.endswith("''") and len(inner) >= 4:
+        inner = inner[2:-2]
+    elif inner.startswith("'") and inner.endswith("'") and len(inner) >= 2:
+        inner = inner[1:-1].replace("''", "'")
+    if '[' in inner and ']' in inner:
+        bracket_end = inner.rfind(']')
+        bracket_start = inner.rfind('[', 0, bracket_end)
+        if bracket_start >= 0:
+            return inner[:bracket_start], inner[bracket_start + 1:bracket_end], inner[bracket_end + 1:]
+    return None, None, inner
+
+
+def _match_reference(match, kind):
+    """由 token match 建立 FormulaReference；不是引用 (或前綴缺少主體) 返回 None"""
+    if kind in _REFERENCE_KINDS:
+        text = match.group()
+        return FormulaReference(kind, text.replace('$', '').upper(), text, None, None, None, None,
+                                match.start(), match.end())
+    if kind != 'qref':
+        return None
+    for group_name, ref_kind in _PREFIXED_BODY_GROUPS:
+        body = match.group(group_name)
+        if body is not None:
+            sheet_prefix = match.group('qprefix')
+            directory, workbook, sheet = split_sheet_prefix(sheet_prefix)
+            address = body if ref_kind == 'name' else body.replace('$', '').upper()
+            return FormulaReference(ref_kind, address, body, sheet_prefix, directory, workbook, sheet,
+                                    match.start(), match.end())
+    return None
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def tokenize_formula(formula):
+    """
+    將公式分解為 Token tuple (快取結果，請勿修改)。
+
+    Args:
+        formula (str): 公式字串 (可以 '=' 開頭)
+
+    Returns:
+        tuple: (Token, ...)；引用 token 的 reference 欄為 FormulaReference
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(formula):
+        kind = match.lastgroup
+        reference = _match_reference(match, kind) if kind in _REFERENCE_KINDS or kind == 'qref' else None
+        if reference is not None:
+            kind = 'reference'
+        elif kind == 'qref':
+            kind = 'unknown'
+        tokens.append(Token(kind, match.group(), match.start(), match.end(), reference))
+    return tuple(tokens)
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def extract_references(formula):
+    """
+    返回公式中的所有引用 (FormulaReference tuple)，按出現次序；
+    包括儲存格、範圍、整欄、整列及帶工作表前綴的名稱。字串常數內的文字不會被當作引用。
+    """
+    references = []
+    for match in _TOKEN_PATTERN.finditer(formula):
+        kind = match.lastgroup
+        if kind in _REFERENCE_KINDS or kind == 'qref':
+            reference = _match_reference(match, kind)
+            if reference is not None:
+                references.append(reference)
+    return tuple(references)
+
+
+# A1 -> R1C1 轉換只需要找出儲存格 / 整欄 / 整列引用，使用比 _TOKEN_PATTERN 簡單得多的 pattern：
+# 字串常數、帶引號的工作表名稱及 [檔名] 整段跳過，其餘與 tokenizer 的引用規則相同
+_R1C1_SOURCE_PATTERN = re.compile(r"""
+    "(?:[^"]|"")*"?
+  | '(?:[^']|'')*'
+  | \[[^\]]*\]
+  | (?<![\w.$])
+    (?:
+        (?P<col_abs>\$?)(?P<col>[A-Za-z]{1,3})(?P<row_abs>\$?)(?P<row>\d{1,7})(?![\w.(!\[])
+      | (?P<rows>\$?\d{1,7}:\$?\d{1,7})(?![\w.(])
+      | (?P<columns>\$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3})(?![\w.(!])
+    )
+""", re.VERBOSE | re.DOTALL)
+
+_column_numbers = {}
+
+
+def _column_number(letters):
+    number = _column_numbers.get(letters)
+    if number is None:
+        number = 0
+        for char in letters.upper():
+            number = number * 26 + ord(char) - 64
+        _column_numbers[letters] = number
+    return number
+
+
+def _r1c1_part(axis, absolute, value, origin):
+    """R / C 部分：絕對引用為 R5，相對引用為 R[偏移] (偏移為 0 時只有 R)"""
+    if absolute:
+        return f"{axis}{value}"
+    offset = value - origin
+    return f"{axis}[{offset}]" if offset else axis
+
+
+def formula_to_r1c1(formula, row, column):
+    """
+    將位於 (row, column) 的 A1 公式轉為 R1C1 形式 (與 Range.FormulaR1C1 相同的相對 / 絕對表示)。
+    向下或向右複製的公式有相同的 R1C1 文字。字串常數、名稱及工作表前綴保持不變。
+
+    每個儲存格的公式通常都不相同，所以不快取結果。
+    """
+    def convert(match):
+        if match.group('col') is not None:
+            return (_r1c1_part('R', match.group('row_abs'), int(match.group('row')), row)
+                    + _r1c1_part('C', match.group('col_abs'), _column_number(match.group('col')), column))
+        if match.group('rows') is not None:
+            return ':'.join(_r1c1_part('R', part.startswith('$'), int(part.lstrip('$')), row)
+                            for part in match.group('rows').split(':'))
+        if match.group('columns') is not None:
+            return ':'.join(_r1c1_part('C', part.startswith('$'), _column_number(part.lstrip('$')), column)
+                            for part in match.group('columns').split(':'))
+        return match.group()
+
+    return _R1C1_SOURCE_PATTERN.sub(convert, formula)
+
+
+def is_external_reference(reference):
+    """引用是否指向外部工作簿 ([檔名] 或 [n] 連結索引)"""
+    return reference.workbook is not None
+
+
+def reference_workbook_path(reference, current_workbook_path):
+    """
+    外部引用返回完整路徑 (目錄 + 檔名，解碼 %20 並標準化)；其他引用返回 current_workbook_path。
+    """
+    if reference.workbook is None:
+        return current_workbook_path
+    import os
+    from urllib.parse import unquote
+    return os.path.normpath(unquote(reference.directory or '') + unquote(reference.workbook))
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def external_link_paths(formula):
+    """
+    返回公式中帶目錄的外部連結前綴內文 ("C:\\dir\\[a.xlsx]Sheet1")，按出現次序 (可重複)。
+    """
+    paths = []
+    for reference in extract_references(formula):
+        prefix = reference.sheet_prefix
+        if (reference.workbook and reference.directory and prefix.startswith("'") and not prefix.startswith("''")
+                and '\\' in reference.directory and reference.workbook.lower().endswith(EXCEL_EXTENSIONS)):
+            paths.append(prefix[1:-2])
+    return tuple(paths)
+
+
+class ExternalPathMatcher:
+    """提供與 re pattern 相同的 findall() 介面，內部使用快取的 tokenizer"""
+
+    def findall(self, formula):
+        return list(external_link_paths(str(formula)))
+
+
+external_path_matcher = ExternalPathMatcher()
+
+
+def clear_tokenizer_cache():
+    """清除 tokenizer 快取"""
+    tokenize_formula.cache_clear()
+    extract_references.cache_clear()
+    external_link_paths.cache_clear()
+
+
+def get_tokenizer_cache_info():
+    """返回 tokenize / extract 的快取統計"""
+    return {
+        'tokenize': tokenize_formula.cache_info()._asdict(),
+        'references': extract_references.cache_info()._asdict(),
+        'external_paths': external_link_paths.cache_info()._asdict(),
+    }
@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+"""
+Level Exploder - 按層 (breadth-first) 展開公式依賴鏈
+
+每一層先收集所有未讀取的引用，按 (workbook, sheet) 分組，
+每組只掃描工作表一次 (sheet_xml_reader 批次讀取)，然後才處理下一層。
+N 個隨機儲存格讀取因此變成約「每層每個工作表一次」，
+依賴鏈跨越多個網絡磁碟上的外部檔案時差別最明顯。
+
+返回的節點 dict 與 DependencyExploder 完全相同。
+"""
+
+import os
+import time
+import zipfile
+
+from utils.dependency_exploder import DependencyExploder, is_range_address
+from utils.sheet_xml_reader import is_xml_workbook, read_cells_with_resolved_references, summarize_ranges
+
+
+def read_cell_group(workbook_path, sheet_name, cell_addresses):
+    """讀取同一工作表的多個儲存格，返回 {cell_address: cell_info} (可在 worker process 執行)"""
+    if is_xml_workbook(workbook_path) and os.path.exists(workbook_path) and zipfile.is_zipfile(workbook_path):
+        infos = read_cells_with_resolved_references(workbook_path, sheet_name, cell_addresses)
+        if not any('error' in info for info in infos.values()):
+            return infos
+
+    # 非 xlsx 或 XML 讀取失敗：退回 openpyxl (經 workbook cache)
+    from utils.openpyxl_resolver import read_cell_with_resolved_references
+    return {address: read_cell_with_resolved_references(workbook_path, sheet_name, address)
+            for address in cell_addresses}
+
+
+def summarize_range_group(workbook_path, sheet_name, range_addresses):
+    """
+    彙總同一工作表的多個範圍 (一次掃描)。
+
+    Returns:
+        dict: {range_address: (bounds, summary)}；空白範圍為 (None, None)，失敗為 {'error': ...}
+    """
+    results = {}
+    pending = []
+    for range_address in range_addresses:
+        try:
+            bounds = DependencyExploder.get_range_bounds(workbook_path, sheet_name, range_address)
+        except Exception as e:
+            results[range_address] = {'error': str(e)}
+            continue
+        if bounds is None:
+            results[range_address] = (None, None)
+        else:
+            pending.append((range_address, bounds))
+    if not pending:
+        return results
+    try:
+        summaries = summarize_ranges(workbook_path, sheet_name, [bounds for range_address, bounds in pending])
+    except Exception as e:
+        for range_address, bounds in pending:
+            results[range_address] = {'error': str(e)}
+        return results
+    for (range_address, bounds), summary in zip(pending, summaries):
+        results[range_address] = (bounds, summary)
+    return results
+
+
+def run_group_job(func, args):
+    """執行單一讀取工作；未預期的例外轉為每個地址的 error"""
+    try:
+        return func(*args)
+    except Exception as e:
+        return {address: {'error': str(e)} for address in args[2]}
+
+
+class LevelDependencyExploder(DependencyExploder):
+    """Breadth-first 版本的 DependencyExploder，每層批次讀取儲存格"""
+
+    def __init__(self, max_depth=10, pool=None):
+        super().__init__(max_depth=max_depth)
+        # WorkbookAffinityPool (utils.parallel_exploder)；None 時在本程序內逐組讀取
+        self.pool = pool
+        # cell_id -> cell_info，跨層共用，同一儲存格只讀取一次
+        self.cell_info_cache = {}
+        # range_id -> (bounds, summary) 或 {'error': ...}
+        self.range_summary_cache = {}
+        self.batch_reads = 0
+
+    # ------------------------------------------------------------------
+    # 批次讀取
+    # ------------------------------------------------------------------
+
+    def read_level(self, requests):
+        """
+        批次讀取一層的儲存格。
+
+        Args:
+            requests: [(workbook_path, sheet_name, cell_address), ...]
+
+        Returns:
+            dict: {cell_id: cell_info}
+        """
+        groups = {}
+        range_groups = {}
+        for workbook_path, sheet_name, cell_address in requests:
+            cell_id = self.make_cell_id(workbook_path, sheet_name, cell_address)
+            if cell_id in self.cell_info_cache or cell_id in self.range_summary_cache:
+                continue
+            group_key = (os.path.normcase(os.path.normpath(workbook_path)), sheet_name)
+            target = range_groups if is_range_address(cell_address) else groups
+            group = target.setdefault(group_key, (workbook_path, sheet_name, {}))
+            group[2].setdefault(cell_address, cell_id)
+
+        # 每組一個工作：範圍彙總 (同一工作表的所有範圍一次掃描) 及儲存格批次讀取
+        jobs = []
+        for workbook_path, sheet_name, ranges in range_groups.values():
+            jobs.append((workbook_path, summarize_range_group, (workbook_path, sheet_name, list(ranges)),
+                         self.range_summary_cache, ranges))
+        for workbook_path, sheet_name, addresses in groups.values():
+            jobs.append((workbook_path, read_cell_group, (workbook_path, sheet_name, list(addresses)),
+                         self.cell_info_cache, addresses))
+        if not jobs:
+            return self.cell_info_cache
+
+        self.batch_reads += len(jobs)
+        workbook_count = len({key[0] for key in list(range_groups) + list(groups)})
+        if self.pool is not None and self.pool.parallel and workbook_count > 1:
+            # 涉及多個工作簿：按工作簿分派到各自固定的 worker process
+            results = self.pool.run([(workbook_path, func, args) for workbook_path, func, args, cache, ids in jobs])
+        else:
+            results = [run_group_job(func, args) for workbook_path, func, args, cache, ids in jobs]
+
+        for (workbook_path, func, args, cache, ids), infos in zip(jobs, results):
+            for address, cell_id in ids.items():
+                cache[cell_id] = infos.get(address, {'error': 'Cell was not read'})
+
+        return self.cell_info_cache
+
+    def _build_range_node(self, workbook_path, sheet_name, range_address, depth, root_workbook_path):
+        """按批次彙總結果建立範圍節點"""
+        cached = self.range_summary_cache.get(self.make_cell_id(workbook_path, sheet_name, range_address))
+        if isinstance(cached, dict):
+            return self._make_stub_node(workbook_path, sheet_name, range_address, depth, root_workbook_path,
+                                        'error', cached['error'])
+        bounds, summary = cached if cached else (None, None)
+        try:
+            return self._make_range_node(workbook_path, sheet_name, range_address, depth, root_workbook_path,
+                                         bounds=bounds, summary=summary)
+        except Exception as e:
+            return self._make_stub_node(workbook_path, sheet_name, range_address, depth, root_workbook_path,
+                                        'error', str(e))
+
+    # ------------------------------------------------------------------
+    # 樹狀模式
+    # ------------------------------------------------------------------
+
+    def explode_dependencies(self, workbook_path, sheet_name, cell_address, current_depth=0, root_workbook_path=None):
+        """
+        按層展開依賴樹，結果與 DependencyExploder.explode_dependencies 相同。
+        """
+        root_workbook_path = root_workbook_path or workbook_path
+        return self._explode_tree_roots([(workbook_path, sheet_name, cell_address)], current_depth,
+                                        root_workbook_path)[0]
+
+    def _explode_tree_roots(self, roots, depth, root_workbook_path):
+        """同時按層展開多個根節點 (例如範圍的一頁儲存格)，返回節點列表"""
+        root_holder = {'children': []}
+        # (workbook_path, sheet_name, cell_address, depth, parent_node, ancestor_ids)
+        level = [(workbook_path, sheet_name, cell_address, depth, root_holder, ())
+                 for workbook_path, sheet_name, cell_address in roots]
+
+        while level:
+            self.read_level([(wb, sheet, cell) for wb, sheet, cell, depth, parent, ancestors in level
+                             if depth < self.max_depth])
+            next_level = []
+            for item_workbook, item_sheet, item_cell, depth, parent, ancestors in level:
+                node, child_items = self._build_tree_node(item_workbook, item_sheet, item_cell, depth,
+                                                          ancestors, root_workbook_path)
+                parent['children'].append(node)
+                next_level.extend(child_items)
+            level = next_level
+
+        return root_holder['children']
+
+    def _explode_range_cells(self, range_info, cell_addresses, depth):
+        """範圍的一頁儲存格一起按層展開，共用批次讀取"""
+        roots = [(range_info['workbook_path'], range_info['sheet_name'], address) for address in cell_addresses]
+        return self._explode_tree_roots(roots, depth, range_info['root_workbook_path'])
+
+    def _build_tree_node(self, workbook_path, sheet_name, cell_address, depth, ancestors, root_workbook_path):
+        """建立一個樹節點，並返回下一層要處理的子項目"""
+        if depth >= self.max_depth:
+            return self._make_stub_node(workbook_path, sheet_name, cell_address, depth, root_workbook_path,
+                                        'limit_reached', 'Maximum recursion depth reached'), []
+
+        if is_range_address(cell_address):
+            return self._build_range_node(workbook_path, sheet_name, cell_address, depth, root_workbook_path), []
+
+        cell_id = self.make_cell_id(workbook_path, sheet_name, cell_address)
+        if cell_id in ancestors:
+            self.circular_refs.append(f"{workbook_path}|{sheet_name}|{cell_address}")
+            return self._make_stub_node(workbook_path, sheet_name, cell_address, depth, root_workbook_path,
+                                        'circular_ref', 'Circular reference detected'), []
+
+        try:
+            cell_info = self.cell_info_cache[cell_id]
+            if 'error' in cell_info:
+                return self._make_stub_node(workbook_path, sheet_name, cell_address, depth, root_workbook_path,
+                                            'error', cell_info['error']), []
+
+            node = self._make_cell_node(cell_info, workbook_path, sheet_name, cell_address, depth,
+                                        root_workbook_path)
+            child_items = []
+            if cell_info.get('cell_type') == 'formula' and cell_info.get('formula'):
+                child_ancestors = ancestors + (cell_id,)
+                for ref in self.parse_formula_references(cell_info['formula'], workbook_path, sheet_name):
+                    child_items.append((ref['workbook_path'], ref['sheet_name'], ref['cell_address'],
+                                        depth + 1, node, child_ancestors))
+            return node, child_items
+        except Exception as e:
+            return self._make_stub_node(workbook_path, sheet_name, cell_address, depth, root_workbook_path,
+                                        'error', str(e)), []
+
+    # ------------------------------------------------------------------
+    # 串流模式
+    # ------------------------------------------------------------------
+
+    def iter_explode(self, workbook_path, sheet_name, cell_address, node_budget=None, time_budget=None,
+                     cancel_event=None, share_subtrees=True):
+        """
+        按層展開依賴樹，每建立一個節點即 yield，呼叫者可以即時顯示部分結果。
+
+        Args:
+            node_budget (int): 最多建立的節點數目；None 為不限
+            time_budget (float): 最長執行秒數；None 為不限
+            cancel_event (threading.Event): set() 後在下一個節點前停止
+            share_subtrees (bool): 已在本次展開過的公式儲存格再次出現時不重複展開，
+                                   改為附上 continuation 讓使用者按需展開
+
+        Yields:
+            dict: {'event': 'node', 'node': 節點, 'parent': 父節點 (根節點為 None)}；
+                  最後一個為 {'event': 'done', 'reason', 'node_count', 'truncated', 'elapsed'}，
+                  reason 為 'complete' / 'node_budget' / 'time_budget' / 'cancelled'
+
+        未展開的分支以 'truncated' 節點 (或 limit_reached 節點) 表示，
+        node['continuation'] 可傳給 resume_explode 繼續展開。
+        """
+        self.stream_expanded_ids = set()
+        items = [(workbook_path, sheet_name, cell_address, 0, None, ())]
+        return self._iter_levels(items, workbook_path, node_budget, time_budget, cancel_event, share_subtrees)
+
+    def resume_explode(self, continuation, parent_node, node_budget=None, time_budget=None, cancel_event=None,
+                       share_subtrees=True):
+        """
+        從 continuation 繼續展開，新節點加到 parent_node 之下。
+        continuation['replace'] 為 True 時，呼叫者應先移除原本的 truncated/limit 節點，
+        parent_node 為該節點的父節點；否則 parent_node 即為帶 continuation 的共用節點。
+        """
+        if not hasattr(self, 'stream_expanded_ids'):
+            self.stream_expanded_ids = set()
+        # 超過最大深度的分支：按需要放寬深度限制
+        self.max_depth = max(self.max_depth, continuation.get('max_depth', self.max_depth))
+        items = [(wb, sheet, cell, depth, parent_node, ancestors)
+                 for wb, sheet, cell, depth, ancestors in continuation['items']]
+        return self._iter_levels(items, continuation['root_workbook_path'], node_budget, time_budget,
+                                 cancel_event, share_subtrees)
+
+    @staticmethod
+    def _stream_stop_reason(node_count, node_budget, start_time, time_budget, cancel_event):
+        if cancel_event is not None and cancel_event.is_set():
+            return 'cancelled'
+        if node_budget is not None and node_count >= node_budget:
+            return 'node_budget'
+        if time_budget is not None and time.perf_counter() - start_time >= time_budget:
+            return 'time_budget'
+        return None
+
+    def _iter_levels(self, level, root_workbook_path, node_budget, time_budget, cancel_event, share_subtrees):
+        start_time = time.perf_counter()
+        node_count = 0
+        reason = 'complete'
+        leftover = []
+
+        while level:
+            reason = self._stream_stop_reason(node_count, node_budget, start_time, time_budget, cancel_event)
+            if reason:
+                leftover = level
+                break
+            # 只讀取預算內會用到的儲存格
+            batch = level if node_budget is None else level[:node_budget - node_count]
+            self.read_level([(wb, sheet, cell) for wb, sheet, cell, depth, parent, ancestors in batch
+                             if depth < self.max_depth])
+
+            next_level = []
+            for index, item in enumerate(level):
+                reason = self._stream_stop_reason(node_count, node_budget, start_time, time_budget, cancel_event)
+                if reason:
+                    leftover = level[index:] + next_level
+                    break
+                item_workbook, item_sheet, item_cell, depth, parent, ancestors = item
+                node, child_items = self._build_stream_node(item_workbook, item_sheet, item_cell, depth,
+                                                            ancestors, root_workbook_path, share_subtrees)
+                if parent is not None:
+                    parent['children'].append(node)
+                node_count += 1
+                yield {'event': 'node', 'node': node, 'parent': parent}
+                next_level.extend(child_items)
+            if reason:
+                break
+            level = next_level
+            reason = 'complete'
+
+        # 未處理的項目按父節點分組，每組一個可繼續展開的 truncated 節點
+        groups = {}
+        for item in leftover:
+            groups.setdefault(id(item[4]), (item[4], []))[1].append(item)
+        for parent, items in groups.values():
+            node = self._make_truncated_node(items, root_workbook_path)
+            if parent is not None:
+                parent['children'].append(node)
+            yield {'event': 'node', 'node': node, 'parent': parent}
+
+        yield {
+            'event': 'done',
+            'reason': reason or 'complete',
+            'node_count': node_count,
+            'truncated': len(leftover),
+            'elapsed': time.perf_counter() - start_time,
+        }
+
+    def _make_continuation(self, items, root_workbook_path, replace, extend_depth=False):
+        return {
+            'items': [(wb, sheet, cell, depth, ancestors) for wb, sheet, cell, depth, parent, ancestors in items],
+            'root_workbook_path': root_workbook_path,
+            # 超過最大深度的節點：繼續展開時再給一個完整的深度預算
+            'max_depth': max(item[3] for item in items) + self.max_depth if extend_depth else self.max_depth,
+            'replace': replace,
+        }
+
+    def _make_truncated_node(self, items, root_workbook_path):
+        workbook_path, sheet_name, cell_address, depth = items[0][:4]
+        node = self._make_stub_node(workbook_path, sheet_name, cell_address, depth, root_workbook_path,
+                                    'truncated', 'Explosion stopped before this branch was expanded')
+        if len(items) > 1:
+            node['address'] = f"{node['address']} (+{len(items) - 1} more)"
+        node['continuation'] = self._make_continuation(items, root_workbook_path, replace=True)
+        return node
+
+    def _build_stream_node(self, workbook_path, sheet_name, cell_address, depth, ancestors, root_workbook_path,
+                           share_subtrees):
+        node, child_items = self._build_tree_node(workbook_path, sheet_name, cell_address, depth, ancestors,
+                                                  root_workbook_path)
+        if node.get('type') == 'limit_reached':
+            parent_items = [(workbook_path, sheet_name, cell_address, depth, None, ancestors)]
+            node['continuation'] = self._make_continuation(parent_items, root_workbook_path, replace=True,
+                                                           extend_depth=True)
+        elif child_items and share_subtrees:
+            cell_id = self.make_cell_id(workbook_path, sheet_name, cell_address)
+            if cell_id in self.stream_expanded_ids:
+                # 已在其他路徑展開過，子節點改為按需展開
+                node['shared'] = True
+                node['continuation'] = self._make_continuation(child_items, root_workbook_path, replace=False)
+                return node, []
+            self.stream_expanded_ids.add(cell_id)
+        return node, child_items
+
+    # ------------------------------------------------------------------
+    # DAG 模式
+    # ------------------------------------------------------------------
+
+    def explode_dependencies_dag(self, workbook_path, sheet_name, cell_address):
+        """
+        按層建立 DAG。每個儲存格第一次出現時即為最淺的深度，
+        所以只需展開一次，不需要 DFS 版本的深度預算重展。
+        返回結構與 DependencyExploder.explode_dependencies_dag 相同。
+        """
+        self.dag_nodes = {}
+        self.circular_refs = []
+        root_id = self.make_cell_id(workbook_path, sheet_name, cell_address)
+        frontier = {root_id: {'workbook_path': workbook_path, 'sheet_name': sheet_name,
+                              'cell_address': cell_address}}
+        depth = 0
+
+        while frontier and depth < self.max_depth:
+            self.read_level([(ref['workbook_path'], ref['sheet_name'], ref['cell_address'])
+                             for ref in frontier.values()])
+            next_frontier = {}
+            for node_id, ref in frontier.items():
+                node = self._build_dag_node(node_id, ref, depth, workbook_path)
+                self.dag_nodes[node_id] = node
+                if depth + 1 >= self.max_depth:
+                    continue
+                for child_id, child_ref in node['child_refs']:
+                    if child_id not in self.dag_nodes and child_id not in frontier:
+                        next_frontier.setdefault(child_id, child_ref)
+            frontier = next_frontier
+            depth += 1
+
+        self._collect_dag_cycles(root_id)
+        return {
+            'root_id': root_id,
+            'nodes': self.dag_nodes,
+            'root_workbook_path': workbook_path,
+            'max_depth': self.max_depth
+        }
+
+    def _build_dag_node(self, node_id, ref, depth, root_workbook_path):
+        workbook_path, sheet_name, cell_address = ref['workbook_path'], ref['sheet_name'], ref['cell_address']
+        try:
+            if is_range_address(cell_address):
+                node = self._build_range_node(workbook_path, sheet_name, cell_address, depth, root_workbook_path)
+            elif 'error' in self.cell_info_cache[node_id]:
+                cell_info = self.cell_info_cache[node_id]
+                node = self._make_stub_node(workbook_path, sheet_name, cell_address, depth,
+                                            root_workbook_path, 'error', cell_info['error'])
+            else:
+                cell_info = self.cell_info_cache[node_id]
+                node = self._make_cell_node(cell_info, workbook_path, sheet_name, cell_address, depth,
+                                            root_workbook_path)
+                if cell_info.get('cell_type') == 'formula' and cell_info.get('formula'):
+                    node['child_refs'] = [
+                        (self.make_cell_id(child['workbook_path'], child['sheet_name'], child['cell_address']), child)
+                        for child in self.parse_formula_references(cell_info['formula'], workbook_path, sheet_name)
+                    ]
+        except Exception as e:
+            node = self._make_stub_node(workbook_path, sheet_name, cell_address, depth,
+                                        root_workbook_path, 'error', str(e))
+        node.pop('children', None)
+        node.setdefault('child_refs', [])
+        node['id'] = node_id
+        node['_budget'] = self.max_depth - depth
+        node['_truncated'] = False
+        return node
+
+    def _collect_dag_cycles(self, root_id):
+        """以迭代 DFS 找出 back edge，記錄為循環引用"""
+        state = {}
+        stack = [(root_id, iter(self.dag_nodes[root_id]['child_refs']))]
+        state[root_id] = 'active'
+        while stack:
+            node_id, children = stack[-1]
+            advanced = False
+            for child_id, ref in children:
+                if child_id not in self.dag_nodes:
+                    continue
+                child_state = state.get(child_id)
+                if child_state == 'active':
+                    self.circular_refs.append(f"{ref['workbook_path']}|{ref['sheet_name']}|{ref['cell_address']}")
+                elif child_state is None:
+                    state[child_id] = 'active'
+                    stack.append((child_id, iter(self.dag_nodes[child_id]['child_refs'])))
+                    advanced = True
+                    break
+            if not advanced:
+                state[node_id] = 'done'
+                stack.pop()
@@ -8,26 +8,26 @@ import openpyxl
 import os
 import re
 
+# 輔助函數：將外部連結的 target 轉換為公式中使用的路徑格式
+def _format_external_link_target(target_path):
+    if target_path.startswith('file:///'):
+        actual_path = target_path[len('file:///'):]
+        actual_path = actual_path.replace('\\', '\\\\')
+        actual_path = actual_path.replace('/', '\\\\')
+
+        dirname = os.path.dirname(actual_path)
+        basename = os.path.basename(actual_path)
+        # 修復格式：應該是 'path\[file.xlsx]sheet' 而不是 'path\[file.xlsx]'sheet
+        return f"'{dirname}\\\\[{basename}]"
+    return f"'[{target_path}]"
+
 # 輔助函數：從工作簿中獲取外部連結映射
 def _get_external_link_map(workbook):
     external_link_map = {}
     if hasattr(workbook, '_external_links') and workbook._external_links:
         for i, link in enumerate(workbook._external_links):
             if hasattr(link, 'file_link') and hasattr(link.file_link, 'target'):
-                target_path = link.file_link.target
-                excel_formatted_path_part = ""
-                if target_path.startswith('file:///'):
-                    actual_path = target_path[len('file:///'):]
-                    actual_path = actual_path.replace('\\', '\\\\')
-                    actual_path = actual_path.replace('/', '\\\\')
-
-                    dirname = os.path.dirname(actual_path)
-                    basename = os.path.basename(actual_path)
-                    # 修復格式：應該是 'path\[file.xlsx]sheet' 而不是 'path\[file.xlsx]'sheet
-                    excel_formatted_path_part = f"'{dirname}\\\\[{basename}]"
-                else:
-                    excel_formatted_path_part = f"'[{target_path}]"
-                external_link_map[str(i + 1)] = excel_formatted_path_part
+                external_link_map[str(i + 1)] = _format_external_link_target(link.file_link.target)
     return external_link_map
 
 # 輔助函數：解析公式字串
@@ -220,9 +220,11 @@ class ResolvedWorkbookView:
     """
     _wrapped_attrs = ('_workbook', '_external_link_map') # 內部屬性列表
 
-    def __init__(self, openpyxl_workbook):
+    def __init__(self, openpyxl_workbook, external_link_map=None):
+        if external_link_map is None:
+            external_link_map = _get_external_link_map(openpyxl_workbook)
         object.__setattr__(self, '_workbook', openpyxl_workbook)
-        object.__setattr__(self, '_external_link_map', _get_external_link_map(openpyxl_workbook))
+        object.__setattr__(self, '_external_link_map', external_link_map)
 
     # 明確定義常用屬性/方法，並處理返回值的包裝
     @property
@@ -288,14 +290,26 @@ def load_resolved_workbook(file_path):
     return ResolvedWorkbookView(workbook)
 
 
+def load_cached_resolved_workbook(file_path):
+    """
+    同 load_resolved_workbook，但經由全域 workbook cache 取得工作簿。
+    返回的物件由多處共用，只可用作讀取，不可修改或儲存。
+    """
+    from utils.workbook_cache import workbook_cache
+    return ResolvedWorkbookView(
+        workbook_cache.get_formula_workbook(file_path),
+        workbook_cache.get_external_link_map(file_path)
+    )
+
+
 def read_cell_with_resolved_references(file_path, sheet_name, cell_address):
     """
     使用 ResolvedWorkbookView 讀取指定 cell 的資訊
     返回: (formula, calculated_value, display_value, cell_type)
     """
     try:
-        # 使用 resolved workbook 讀取
-        resolved_wb = load_resolved_workbook(file_path)
+        # 使用 resolved workbook 讀取 (經由 workbook cache，避免每個 cell 都重新解析)
+        resolved_wb = load_cached_resolved_workbook(file_path)
         
         resolved_sheet = resolved_wb[sheet_name]
         resolved_cell = resolved_sheet[cell_address]
@@ -311,7 +325,8 @@ def read_cell_with_resolved_references(file_path, sheet_name, cell_address):
             
             # 嘗試獲取計算值 (使用 data_only=True)
             try:
-                data_wb = openpyxl.load_workbook(file_path, data_only=True)
+                from utils.workbook_cache import workbook_cache
+                data_wb = workbook_cache.get_value_workbook(file_path)
                 data_sheet = data_wb[sheet_name]
                 data_cell = data_sheet[cell_address]
                 calculated_value = data_cell.value
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel Exploder - 以多個 worker process 讀取跨外部工作簿的依賴鏈
+
+LevelDependencyExploder 每層按 (workbook, sheet) 分組讀取。當一層涉及多個工作簿時，
+各組會分派到 worker process 同時讀取：
+
+- 每個工作簿固定由同一個 worker 處理 (workbook affinity)，
+  worker 內的 workbook cache 因此保持該工作簿已解析的資料
+- worker 數目可設定 (參數或環境變數 EXCEL_TOOLS_EXPLODE_WORKERS)；0/1 即為逐組執行
+- process pool 無法建立或中途失效時，自動退回本程序逐組讀取
+"""
+
+import os
+import threading
+import atexit
+
+from utils.workbook_cache import normalize_workbook_path
+
+
+def default_worker_count():
+    """環境變數 EXCEL_TOOLS_EXPLODE_WORKERS，否則為 CPU 數目 (最多 8)"""
+    configured = os.environ.get('EXCEL_TOOLS_EXPLODE_WORKERS')
+    if configured is not None:
+        try:
+            return max(0, int(configured))
+        except ValueError:
+            pass
+    return min(8, os.cpu_count() or 1)
+
+
+class WorkbookAffinityPool:
+    """
+    多個單一 process 的 executor；同一工作簿的工作總是送到同一個 executor。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = default_worker_count() if max_workers is None else max_workers
+        self._executors = []
+        self._assignments = {}
+        self._lock = threading.Lock()
+        self.broken = False
+
+    @property
+    def parallel(self):
+        return self.max_workers > 1 and not self.broken
+
+    def _executor_for(self, workbook_path):
+        from concurrent.futures import ProcessPoolExecutor
+
+        key = normalize_workbook_path(workbook_path)
+        with self._lock:
+            index = self._assignments.get(key)
+            if index is None:
+                if len(self._executors) < self.max_workers:
+                    self._executors.append(ProcessPoolExecutor(max_workers=1))
+                    index = len(self._executors) - 1
+                else:
+                    # 分配給負責最少工作簿的 worker
+                    loads = [0] * len(self._executors)
+                    for assigned in self._assignments.values():
+                        loads[assigned] += 1
+                    index = loads.index(min(loads))
+                self._assignments[key] = index
+            return self._executors[index]
+
+    def run(self, jobs):
+        """
+        執行 [(workbook_path, func, args), ...]，按原次序返回結果。
+        func 必須是模組層級函數 (可 pickle)；worker 失敗的工作會在本程序重新執行。
+        """
+        from concurrent.futures.process import BrokenProcessPool
+        from utils.level_exploder import run_group_job
+
+        futures = []
+        for workbook_path, func, args in jobs:
+            future = None
+            if self.parallel:
+                try:
+                    future = self._executor_for(workbook_path).submit(run_group_job, func, args)
+                except Exception as e:
+                    print(f"Parallel explosion disabled, falling back to serial reads: {e}")
+                    self._mark_broken()
+            futures.append(future)
+
+        results = []
+        for (workbook_path, func, args), future in zip(jobs, futures):
+            if future is not None:
+                try:
+                    results.append(future.result())
+                    continue
+                except BrokenProcessPool as e:
+                    print(f"Parallel explosion disabled, falling back to serial reads: {e}")
+                    self._mark_broken()
+                except Exception as e:
+                    print(f"Worker failed for {workbook_path}, reading serially: {e}")
+            results.append(run_group_job(func, args))
+        return results
+
+    def _mark_broken(self):
+        # 任何 worker 失效後不再嘗試平行，避免每層重複等待失敗
+        with self._lock:
+            self.broken = True
+            self._shutdown_locked()
+
+    def shutdown(self):
+        with self._lock:
+            self._shutdown_locked()
+
+    def _shutdown_locked(self):
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors = []
+        self._assignments = {}
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'active_workers': len(self._executors),
+                'assigned_workbooks': len(self._assignments),
+                'parallel': self.parallel,
+            }
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_explosion_pool(max_workers=None):
+    """
+    返回全域共用的 WorkbookAffinityPool (worker 在多次爆炸分析之間保留已解析的工作簿)。
+    max_workers 與現有 pool 不同時會重新建立。
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        wanted = default_worker_count() if max_workers is None else max_workers
+        if _shared_pool is None or _shared_pool.max_workers != wanted or _shared_pool.broken:
+            if _shared_pool is not None:
+                _shared_pool.shutdown()
+            _shared_pool = WorkbookAffinityPool(wanted)
+        return _shared_pool
+
+
+def shutdown_explosion_pool():
+    """結束共用 pool 的所有 worker"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.shutdown()
+            _shared_pool = None
+
+
+atexit.register(shutdown_explosion_pool)
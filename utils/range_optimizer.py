@@ -171,20 +171,38 @@ def optimize_ranges(parsed_addresses):
             rect_ranges.append(format_range(current_start, current_end))
     return rect_ranges
 
+def _range_cell_count(range_address):
+    """'B2:B10,D1' 形式的範圍所包含的儲存格數目"""
+    from openpyxl.utils.cell import range_boundaries
+    count = 0
+    for part in range_address.split(','):
+        min_col, min_row, max_col, max_row = range_boundaries(part.replace('$', ''))
+        count += (max_col - min_col + 1) * (max_row - min_row + 1)
+    return count
+
 def smart_range_display(addresses):
     if not addresses:
         return ""
-    parsed = [p for p in (parse_cell_address(addr) for addr in addresses) if p]
-    if not parsed:
+    # 已合併的範圍 (例如 formula pattern 的覆蓋範圍) 直接顯示，只合併單一儲存格
+    merged_ranges = []
+    cell_count = 0
+    cell_addresses = []
+    for addr in addresses:
+        if ':' in addr or ',' in addr:
+            merged_ranges.extend(addr.split(','))
+            cell_count += _range_cell_count(addr)
+        else:
+            cell_addresses.append(addr)
+    parsed_with_addr = sorted((p, addr) for p, addr in ((parse_cell_address(addr), addr) for addr in cell_addresses) if p)
+    if not parsed_with_addr and not merged_ranges:
         return f"{len(addresses)} cells"
-    
-    parsed_with_addr = sorted([(p, addr) for p, addr in zip(parsed, addresses)])
+    cell_count += len(cell_addresses)
     
     # This is a simplified version for display, can be enhanced
-    ranges = optimize_ranges(parsed_with_addr)
+    ranges = (optimize_ranges(parsed_with_addr) if parsed_with_addr else []) + merged_ranges
     
     if len(ranges) <= 8:
-        return f"{len(addresses)} cells: {', '.join(ranges)}"
+        return f"{cell_count} cells: {', '.join(ranges)}"
     else:
         sample_ranges = ranges[:5]
-        return f"{len(addresses)} cells: {', '.join(sample_ranges)}, ... and {len(ranges)-5} more ranges"
\ No newline at end of file
+        return f"{cell_count} cells: {', '.join(sample_ranges)}, ... and {len(ranges)-5} more ranges"
\ No newline at end of file
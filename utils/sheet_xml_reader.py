@@ -0,0 +1,640 @@
+# -*- coding: utf-8 -*-
+"""
+Sheet XML Reader Module
+
+This module reads cells straight from the worksheet XML inside an xlsx
+package. A ``<c>`` element already carries both the ``<f>`` formula and the
+cached ``<v>`` value, so one streaming pass over ``xl/worksheets/sheetN.xml``
+gives formula, calculated value and data type without building a full
+openpyxl workbook (styles, two parses, etc.).
+
+Notes:
+    - Shared formulas are expanded relative to their master cell.
+    - ``[n]`` external link indexes are resolved with the same map format
+      as ``openpyxl_resolver._get_external_link_map``.
+    - Number formats are not applied, so dates are returned as serial
+      numbers (openpyxl's data_only view would return datetime objects).
+"""
+
+import os
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+from utils.openpyxl_resolver import _format_external_link_target, _resolve_formula_string
+from utils.workbook_cache import workbook_cache
+
+# 支援 sheet XML 的檔案類型 (xlsb / xls 不是 XML 格式)
+XML_WORKBOOK_EXTENSIONS = ('.xlsx', '.xlsm', '.xltx', '.xltm')
+
+XML_INDEX_VIEW = 'xml_index'
+SHARED_STRINGS_VIEW = 'xml_shared_strings'
+
+_CELL_RE = re.compile(r'^\$?([A-Za-z]{1,3})\$?([0-9]{1,7})$')
+
+
+def _local(tag):
+    """去除 XML namespace，只保留 local name"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _rel_attr(element, name):
+    """讀取 r:id 一類帶 namespace 的屬性 (兼容 transitional / strict)"""
+    for key, value in element.attrib.items():
+        if _local(key) == name and key.startswith('{'):
+            return value
+    return None
+
+
+def column_letter_to_index(letters):
+    """'A' -> 1, 'AA' -> 27"""
+    index = 0
+    for ch in letters.upper():
+        index = index * 26 + (ord(ch) - 64)
+    return index
+
+
+def column_index_to_letter(index):
+    """1 -> 'A', 27 -> 'AA'"""
+    letters = ''
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def split_cell_address(cell_address):
+    """'$B$12' -> (12, 2)；格式不正確則返回 None"""
+    match = _CELL_RE.match(cell_address.strip())
+    if not match:
+        return None
+    return int(match.group(2)), column_letter_to_index(match.group(1))
+
+
+def is_xml_workbook(file_path):
+    """檔案是否為可用本模組讀取的 OOXML 工作簿"""
+    return os.path.splitext(file_path)[1].lower() in XML_WORKBOOK_EXTENSIONS
+
+
+def _resolve_part_path(base_part, target):
+    """將 relationship target 轉換為 zip 內的 part 路徑"""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_part), target))
+
+
+def _rels_path(part):
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, '_rels', name + '.rels')
+
+
+def _read_relationships(archive, part):
+    """返回 {rId: (target, type)}"""
+    rels = {}
+    try:
+        with archive.open(_rels_path(part)) as handle:
+            root = ET.parse(handle).getroot()
+    except KeyError:
+        return rels
+    for rel in root:
+        if _local(rel.tag) == 'Relationship':
+            rels[rel.get('Id')] = (rel.get('Target'), rel.get('Type', ''))
+    return rels
+
+
+class WorkbookXmlIndex:
+    """
+    工作簿層級的 XML 資訊：工作表名稱 -> part 路徑、外部連結映射、sharedStrings 位置、已定義的名稱。
+    透過 workbook_cache 快取，檔案改動後自動重建。
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.sheet_parts = {}
+        self.sheet_names = []
+        self.external_link_map = {}
+        self.shared_strings_part = None
+        # (名稱, 參照文字)；工作表層級的名稱為 "Sheet1!Name" (與 Excel 的 Name.Name 相同)
+        self.defined_names = []
+
+        with zipfile.ZipFile(file_path) as archive:
+            workbook_part = 'xl/workbook.xml'
+            for rel_id, (target, rel_type) in _read_relationships(archive, '').items():
+                if rel_type.endswith('/officeDocument'):
+                    workbook_part = _resolve_part_path('', target)
+                    break
+
+            workbook_rels = _read_relationships(archive, workbook_part)
+            for target, rel_type in workbook_rels.values():
+                if rel_type.endswith('/sharedStrings'):
+                    self.shared_strings_part = _resolve_part_path(workbook_part, target)
+
+            with archive.open(workbook_part) as handle:
+                root = ET.parse(handle).getroot()
+
+            link_index = 0
+            sheet_order = []
+            name_elements = []
+            for element in root.iter():
+                tag = _local(element.tag)
+                if tag == 'sheet':
+                    sheet_order.append(element.get('name'))
+                    rel = workbook_rels.get(_rel_attr(element, 'id'))
+                    if rel:
+                        name = element.get('name')
+                        self.sheet_names.append(name)
+                        self.sheet_parts[name] = _resolve_part_path(workbook_part, rel[0])
+                elif tag == 'externalReference':
+                    # 與 openpyxl 相同：按 externalReferences 的次序編號 [1], [2], ...
+                    link_index += 1
+                    rel = workbook_rels.get(_rel_attr(element, 'id'))
+                    if not rel:
+                        continue
+                    link_part = _resolve_part_path(workbook_part, rel[0])
+                    for link_target, link_type in _read_relationships(archive, link_part).values():
+                        if link_type.endswith('/externalLinkPath') or 'externalLinkPath' in link_type:
+                            self.external_link_map[str(link_index)] = _format_external_link_target(link_target)
+                            break
+                elif tag == 'definedName' and element.get('hidden') not in ('1', 'true'):
+                    name_elements.append((element.get('name'), element.get('localSheetId'), element.text or ''))
+
+            for name, local_sheet_id, refers_to in name_elements:
+                if local_sheet_id is not None and local_sheet_id.isdigit() and int(local_sheet_id) < len(sheet_order):
+                    name = f"{sheet_order[int(local_sheet_id)]}!{name}"
+                self.defined_names.append((name, refers_to))
+
+    def find_sheet_part(self, sheet_name):
+        """按名稱尋找工作表 part (先精確，再不分大小寫)"""
+        if sheet_name in self.sheet_parts:
+            return self.sheet_parts[sheet_name]
+        lowered = sheet_name.lower()
+        for name, part in self.sheet_parts.items():
+            if name.lower() == lowered:
+                return part
+        raise KeyError(f"Worksheet {sheet_name} does not exist.")
+
+
+def get_workbook_xml_index(file_path):
+    """返回快取的 WorkbookXmlIndex"""
+    return workbook_cache.get_view(file_path, XML_INDEX_VIEW, WorkbookXmlIndex, estimated_bytes=64 * 1024)
+
+
+def _load_shared_strings(file_path):
+    index = get_workbook_xml_index(file_path)
+    strings = []
+    if not index.shared_strings_part:
+        return strings
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open(index.shared_strings_part) as handle:
+            for event, element in ET.iterparse(handle, events=('end',)):
+                if _local(element.tag) != 'si':
+                    continue
+                # 只取 <t> 文字 (包括 rich text run)，忽略注音 <rPh>
+                parts = []
+                for child in element:
+                    child_tag = _local(child.tag)
+                    if child_tag == 't':
+                        parts.append(child.text or '')
+                    elif child_tag == 'r':
+                        for run_child in child:
+                            if _local(run_child.tag) == 't':
+                                parts.append(run_child.text or '')
+                strings.append(''.join(parts))
+                element.clear()
+    return strings
+
+
+def get_shared_strings(file_path):
+    """返回快取的 shared string 列表"""
+    return workbook_cache.get_view(file_path, SHARED_STRINGS_VIEW, _load_shared_strings,
+                                   estimated_bytes=os.path.getsize(file_path) * 4)
+
+
+class CellSelection:
+    """
+    要讀取的儲存格集合：單一儲存格與矩形範圍。
+    addresses 為 None 代表整個工作表。
+    """
+
+    def __init__(self, addresses=None):
+        self.cells = set()
+        self.rects = []
+        self.select_all = addresses is None
+        self.max_row = None
+        if self.select_all:
+            return
+        for address in addresses:
+            address = address.replace('$', '').strip().upper()
+            if ':' in address:
+                start, end = address.split(':', 1)
+                start_pos, end_pos = split_cell_address(start), split_cell_address(end)
+                if not start_pos or not end_pos:
+                    raise ValueError(f"Invalid range address: {address}")
+                min_row, max_row = sorted((start_pos[0], end_pos[0]))
+                min_col, max_col = sorted((start_pos[1], end_pos[1]))
+                self.rects.append((min_row, max_row, min_col, max_col))
+                self.max_row = max(self.max_row or 0, max_row)
+            else:
+                position = split_cell_address(address)
+                if not position:
+                    raise ValueError(f"Invalid cell address: {address}")
+                self.cells.add(position)
+                self.max_row = max(self.max_row or 0, position[0])
+
+    def contains(self, row, col):
+        if self.select_all or (row, col) in self.cells:
+            return True
+        for min_row, max_row, min_col, max_col in self.rects:
+            if min_row <= row <= max_row and min_col <= col <= max_col:
+                return True
+        return False
+
+
+def _convert_value(raw, cell_type, inline_text, shared_strings_getter):
+    """按 <c t="..."> 將 <v> 轉換為 Python 值，並返回 (value, data_type)"""
+    if cell_type == 'inlineStr':
+        return inline_text, 's'
+    if raw is None:
+        return None, 'n'
+    if cell_type == 's':
+        try:
+            return shared_strings_getter()[int(raw)], 's'
+        except (IndexError, ValueError):
+            return None, 's'
+    if cell_type == 'str':
+        return raw, 's'
+    if cell_type == 'b':
+        return raw.strip() in ('1', 'true'), 'b'
+    if cell_type == 'e':
+        return raw, 'e'
+    if cell_type == 'd':
+        return raw, 'd'
+    try:
+        number = float(raw)
+    except ValueError:
+        return raw, 's'
+    if number.is_integer() and not any(ch in raw for ch in '.eE'):
+        return int(raw), 'n'
+    return number, 'n'
+
+
+def _translate_shared_formula(master_formula, master_address, target_address):
+    """按 master cell 的偏移量展開 shared formula"""
+    from openpyxl.formula.translate import Translator
+    return Translator('=' + master_formula, origin=master_address).translate_formula(target_address)[1:]
+
+
+def iter_sheet_cells(file_path, sheet_name, addresses=None, formulas_only=False, resolve_external=True):
+    """
+    以 iterparse 串流讀取工作表，逐一返回所選儲存格的資料。
+
+    Args:
+        file_path (str): xlsx/xlsm 檔案路徑
+        sheet_name (str): 工作表名稱
+        addresses (iterable): 'A1' / 'A1:C10' 地址列表；None 代表整個工作表
+        formulas_only (bool): 只返回公式儲存格
+        resolve_external (bool): 是否將 [n] 外部連結索引轉為完整路徑
+
+    Yields:
+        dict: {'address', 'row', 'column', 'formula', 'value', 'data_type'}
+              formula 以 '=' 開頭；value 為快取的計算值
+    """
+    index = get_workbook_xml_index(file_path)
+    part = index.find_sheet_part(sheet_name)
+    selection = addresses if isinstance(addresses, CellSelection) else CellSelection(addresses)
+    link_map = index.external_link_map if resolve_external else {}
+
+    shared_strings = []
+
+    def shared_strings_getter():
+        if not shared_strings:
+            shared_strings.extend(get_shared_strings(file_path))
+        return shared_strings
+
+    # si -> (master formula, master address)；需要保存所有 master 以展開未被選取 master 的子儲存格
+    shared_masters = {}
+
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open(part) as handle:
+            sheet_data = None
+            current_row = 0
+            current_col = 0
+            for event, element in ET.iterparse(handle, events=('start', 'end')):
+                tag = _local(element.tag)
+
+                if event == 'start':
+                    if tag == 'sheetData':
+                        sheet_data = element
+                    elif tag == 'row':
+                        row_attr = element.get('r')
+                        current_row = int(row_attr) if row_attr else current_row + 1
+                        current_col = 0
+                        if selection.max_row is not None and current_row > selection.max_row:
+                            # 已超過最後一個要求的列，不必再讀下去
+                            return
+                    continue
+
+                if tag == 'row':
+                    # 釋放已處理的列，保持記憶體用量固定
+                    element.clear()
+                    if sheet_data is not None:
+                        sheet_data.clear()
+                    continue
+                if tag != 'c':
+                    continue
+
+                coordinate = element.get('r')
+                if coordinate:
+                    position = split_cell_address(coordinate)
+                    row, col = position if position else (current_row, current_col + 1)
+                else:
+                    row, col = current_row, current_col + 1
+                    coordinate = f"{column_index_to_letter(col)}{row}"
+                current_col = col
+
+                formula_element = None
+                value_text = None
+                inline_text = None
+                for child in element:
+                    child_tag = _local(child.tag)
+                    if child_tag == 'f':
+                        formula_element = child
+                    elif child_tag == 'v':
+                        value_text = child.text
+                    elif child_tag == 'is':
+                        inline_text = ''.join(t.text or '' for t in child.iter() if _local(t.tag) == 't')
+
+                if formula_element is not None and formula_element.get('t') == 'shared' and formula_element.text:
+                    # 記錄所有 shared formula master，未被選取的 master 亦需要用來展開子儲存格
+                    shared_masters[formula_element.get('si')] = (formula_element.text, coordinate)
+
+                if not selection.contains(row, col):
+                    continue
+
+                formula = None
+                if formula_element is not None:
+                    formula_kind = formula_element.get('t')
+                    if formula_kind == 'shared':
+                        formula = formula_element.text
+                        if not formula and formula_element.get('si') in shared_masters:
+                            master_formula, master_address = shared_masters[formula_element.get('si')]
+                            formula = _translate_shared_formula(master_formula, master_address, coordinate)
+                    elif formula_kind != 'dataTable':
+                        formula = formula_element.text or None
+
+                if formulas_only and formula is None:
+                    continue
+
+                value, data_type = _convert_value(value_text, element.get('t'), inline_text, shared_strings_getter)
+                if formula is not None:
+                    formula = '=' + formula
+                    if link_map:
+                        formula = _resolve_formula_string(formula, link_map)
+
+                yield {
+                    'address': coordinate,
+                    'row': row,
+                    'column': col,
+                    'formula': formula,
+                    'value': value,
+                    'data_type': 'f' if formula is not None else data_type,
+                }
+
+
+def read_cells(file_path, sheet_name, addresses, resolve_external=True):
+    """
+    一次過讀取多個儲存格/範圍 (單次工作表掃描)。
+
+    Returns:
+        dict: {'A1': record, ...}；工作表中不存在的儲存格會返回空白 record
+    """
+    addresses = list(addresses)
+    selection = CellSelection(addresses)
+    records = {}
+    for record in iter_sheet_cells(file_path, sheet_name, selection, resolve_external=resolve_external):
+        records[record['address']] = record
+
+    # 補上空白儲存格 (只限單一儲存格的要求)
+    for row, col in selection.cells:
+        coordinate = f"{column_index_to_letter(col)}{row}"
+        if coordinate not in records:
+            records[coordinate] = {
+                'address': coordinate,
+                'row': row,
+                'column': col,
+                'formula': None,
+                'value': None,
+                'data_type': 'n',
+            }
+    return records
+
+
+def _record_to_cell_info(record):
+    """轉換為與 read_cell_with_resolved_references 相同格式的 dict"""
+    formula = record['formula']
+    if formula is not None:
+        calculated_value = record['value']
+        return {
+            'formula': formula,
+            'calculated_value': calculated_value,
+            'display_value': str(calculated_value) if calculated_value is not None else "N/A",
+            'cell_type': 'formula',
+            'has_external_references': '[' in formula and ']' in formula
+        }
+    value = record['value']
+    return {
+        'formula': None,
+        'calculated_value': value,
+        'display_value': str(value) if value is not None else "",
+        'cell_type': 'value',
+        'has_external_references': False
+    }
+
+
+def read_cells_with_resolved_references(file_path, sheet_name, cell_addresses):
+    """
+    批次版本的 read_cell_with_resolved_references，只掃描工作表 XML 一次。
+
+    Returns:
+        dict: {原始地址: cell_info}；cell_info 格式與 read_cell_with_resolved_references 相同
+    """
+    cell_addresses = list(cell_addresses)
+    try:
+        records = read_cells(file_path, sheet_name, cell_addresses)
+    except Exception as e:
+        error_info = {
+            'error': str(e),
+            'formula': None,
+            'calculated_value': None,
+            'display_value': None,
+            'cell_type': 'error',
+            'has_external_references': False
+        }
+        return {address: dict(error_info) for address in cell_addresses}
+
+    results = {}
+    for address in cell_addresses:
+        record = records.get(address.replace('$', '').strip().upper())
+        if record is None:
+            results[address] = _record_to_cell_info({'formula': None, 'value': None})
+        else:
+            results[address] = _record_to_cell_info(record)
+    return results
+
+
+def read_cell_info(file_path, sheet_name, cell_address):
+    """
+    讀取單一儲存格；可用 XML 讀取時走串流路徑，否則退回 openpyxl 版本。
+    返回格式與 read_cell_with_resolved_references 相同。
+    """
+    if is_xml_workbook(file_path) and zipfile.is_zipfile(file_path):
+        info = read_cells_with_resolved_references(file_path, sheet_name, [cell_address])[cell_address]
+        if 'error' not in info:
+            return info
+    from utils.openpyxl_resolver import read_cell_with_resolved_references
+    return read_cell_with_resolved_references(file_path, sheet_name, cell_address)
+
+
+def _load_sheet_dimension(file_path, sheet_name):
+    """讀取 <dimension ref="A1:Z100">；沒有時掃描整個工作表計算"""
+    index = get_workbook_xml_index(file_path)
+    part = index.find_sheet_part(sheet_name)
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open(part) as handle:
+            for event, element in ET.iterparse(handle, events=('start',)):
+                tag = _local(element.tag)
+                if tag == 'dimension':
+                    ref = (element.get('ref') or '').replace('$', '').upper()
+                    start, _, end = ref.partition(':')
+                    start_pos = split_cell_address(start) if start else None
+                    end_pos = split_cell_address(end) if end else start_pos
+                    if start_pos and end_pos:
+                        return (start_pos[0], start_pos[1], end_pos[0], end_pos[1])
+                    break
+                if tag == 'sheetData':
+                    break
+
+    bounds = None
+    for record in iter_sheet_cells(file_path, sheet_name, resolve_external=False):
+        row, col = record['row'], record['column']
+        if bounds is None:
+            bounds = [row, col, row, col]
+        else:
+            bounds = [min(bounds[0], row), min(bounds[1], col), max(bounds[2], row), max(bounds[3], col)]
+    return tuple(bounds) if bounds else None
+
+
+def get_sheet_dimension(file_path, sheet_name):
+    """
+    返回工作表已使用範圍 (min_row, min_col, max_row, max_col)；空白工作表返回 None。
+    非 XML 工作簿會使用 openpyxl (經 workbook cache)。
+    """
+    def loader(path):
+        if is_xml_workbook(path) and zipfile.is_zipfile(path):
+            return _load_sheet_dimension(path, sheet_name)
+        worksheet = workbook_cache.get_formula_workbook(path)[sheet_name]
+        if worksheet.max_row is None or worksheet.max_column is None:
+            return None
+        return (worksheet.min_row, worksheet.min_column, worksheet.max_row, worksheet.max_column)
+
+    return workbook_cache.get_view(file_path, f"dimension:{sheet_name}", loader, estimated_bytes=0)
+
+
+def _empty_range_summary(rect):
+    min_row, max_row, min_col, max_col = rect
+    return {
+        'cell_count': (max_row - min_row + 1) * (max_col - min_col + 1),
+        'non_empty': 0,
+        'numeric': 0,
+        'formulas': 0,
+        'errors': 0,
+        'sum': 0,
+        'min': None,
+        'max': None,
+    }
+
+
+def _add_to_range_summary(summary, value, is_formula):
+    if value is None and not is_formula:
+        return
+    summary['non_empty'] += 1
+    if is_formula:
+        summary['formulas'] += 1
+    if isinstance(value, bool):
+        return
+    if isinstance(value, (int, float)):
+        summary['numeric'] += 1
+        summary['sum'] += value
+        summary['min'] = value if summary['min'] is None else min(summary['min'], value)
+        summary['max'] = value if summary['max'] is None else max(summary['max'], value)
+    elif isinstance(value, str) and value.startswith('#'):
+        summary['errors'] += 1
+
+
+def summarize_ranges(file_path, sheet_name, rects):
+    """
+    一次掃描計算多個範圍的彙總 (儲存格數、數值個數、SUM/MIN/MAX、公式數、錯誤數)。
+
+    Args:
+        rects: [(min_row, max_row, min_col, max_col), ...]
+
+    Returns:
+        list: 與 rects 同序的 summary dict
+    """
+    summaries = [_empty_range_summary(rect) for rect in rects]
+    if not rects:
+        return summaries
+
+    if is_xml_workbook(file_path) and zipfile.is_zipfile(file_path):
+        addresses = [f"{column_index_to_letter(r[2])}{r[0]}:{column_index_to_letter(r[3])}{r[1]}" for r in rects]
+        for record in iter_sheet_cells(file_path, sheet_name, addresses, resolve_external=False):
+            row, col = record['row'], record['column']
+            for rect, summary in zip(rects, summaries):
+                if rect[0] <= row <= rect[1] and rect[2] <= col <= rect[3]:
+                    _add_to_range_summary(summary, record['value'], record['formula'] is not None)
+        return summaries
+
+    formula_sheet = workbook_cache.get_formula_workbook(file_path)[sheet_name]
+    value_sheet = workbook_cache.get_value_workbook(file_path)[sheet_name]
+    for rect, summary in zip(rects, summaries):
+        min_row, max_row, min_col, max_col = rect
+        formula_rows = formula_sheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col)
+        value_rows = value_sheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col,
+                                           values_only=True)
+        for formula_row, value_row in zip(formula_rows, value_rows):
+            for formula_cell, value in zip(formula_row, value_row):
+                _add_to_range_summary(summary, value, formula_cell.data_type == 'f')
+    return summaries
+
+
+def list_range_cells(file_path, sheet_name, rect, offset=0, limit=None):
+    """
+    按列順序返回範圍內非空白儲存格的地址 (分頁)。
+
+    Returns:
+        tuple: (地址列表, 是否還有更多)
+    """
+    min_row, max_row, min_col, max_col = rect
+    addresses = []
+    skipped = 0
+    if is_xml_workbook(file_path) and zipfile.is_zipfile(file_path):
+        range_address = f"{column_index_to_letter(min_col)}{min_row}:{column_index_to_letter(max_col)}{max_row}"
+        records = iter_sheet_cells(file_path, sheet_name, [range_address], resolve_external=False)
+        cells = ((record['address'], record['value'], record['formula']) for record in records)
+    else:
+        worksheet = workbook_cache.get_formula_workbook(file_path)[sheet_name]
+        cells = ((cell.coordinate, cell.value, None)
+                 for row in worksheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col)
+                 for cell in row)
+
+    for address, value, formula in cells:
+        if value is None and formula is None:
+            continue
+        if skipped < offset:
+            skipped += 1
+            continue
+        if limit is not None and len(addresses) >= limit:
+            return addresses, True
+        addresses.append(address)
+    return addresses, False
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Workbook Cache Module
+
+This module keeps parsed openpyxl workbooks in memory so that repeated
+cell reads against the same file (dependency explosion, reference reading,
+INDIRECT resolution) do not re-parse the workbook every time.
+
+Entries are keyed by the normalized file path and validated against the
+file's mtime/size, so a workbook saved on disk is re-loaded automatically.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+# 預設記憶體上限 (bytes)，可用環境變數覆寫
+DEFAULT_MEMORY_BUDGET = int(os.environ.get('EXCEL_TOOLS_WORKBOOK_CACHE_MB', '1024')) * 1024 * 1024
+
+# openpyxl 解析後的物件大約是壓縮檔大小的數十倍，用來估算每個 view 的記憶體
+MEMORY_FACTOR = 30
+
+# view 種類
+FORMULA_VIEW = 'formula'
+VALUE_VIEW = 'values'
+EXTERNAL_LINKS = 'external_links'
+
+
+def normalize_workbook_path(file_path):
+    """將路徑標準化為 cache key (大小寫、分隔符號、相對路徑)"""
+    return os.path.normcase(os.path.abspath(os.path.normpath(file_path)))
+
+
+def _file_signature(normalized_path):
+    """返回 (mtime_ns, size)，用來判斷檔案是否已被修改"""
+    stat_result = os.stat(normalized_path)
+    return (stat_result.st_mtime_ns, stat_result.st_size)
+
+
+class _CacheEntry:
+    """單一工作簿的快取資料"""
+
+    def __init__(self, signature):
+        self.signature = signature
+        self.views = {}
+        self.sizes = {}
+
+    @property
+    def estimated_bytes(self):
+        return sum(self.sizes.values())
+
+
+class WorkbookCache:
+    """
+    Process-wide LRU cache of parsed workbooks.
+
+    Each entry may hold a formula view (data_only=False), a value view
+    (data_only=True) and the external link map; views are loaded lazily
+    the first time they are requested.
+    """
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_reloads = 0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get_formula_workbook(self, file_path):
+        """返回公式版本的 openpyxl workbook (data_only=False)"""
+        return self.get_view(file_path, FORMULA_VIEW, self._load_formula_view)
+
+    def get_value_workbook(self, file_path):
+        """返回計算值版本的 openpyxl workbook (data_only=True)"""
+        return self.get_view(file_path, VALUE_VIEW, self._load_value_view)
+
+    def get_external_link_map(self, file_path):
+        """返回 {'1': "'dir\\\\[file.xlsx]", ...} 形式的外部連結映射"""
+        return self.get_view(file_path, EXTERNAL_LINKS, self._load_external_link_map)
+
+    def get_view(self, file_path, kind, loader, estimated_bytes=None):
+        """
+        取得指定種類的快取資料；如不存在則呼叫 loader(file_path) 載入。
+
+        Args:
+            file_path (str): 工作簿路徑
+            kind (str): view 種類 (亦可為其他模組自訂的名稱)
+            loader (callable): 載入函數，接收檔案路徑
+            estimated_bytes (int|callable): 記憶體估算值；可為 callable(view)，
+                在載入後按內容估算；None 則按檔案大小估算
+        """
+        key = normalize_workbook_path(file_path)
+        signature = _file_signature(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature != signature:
+                # 檔案已被修改，丟棄舊的 views
+                del self._entries[key]
+                self.stale_reloads += 1
+                entry = None
+
+            if entry is not None and kind in entry.views:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.views[kind]
+
+            self.misses += 1
+
+        # 在 lock 以外載入，避免長時間阻塞其他執行緒
+        view = loader(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.signature != signature:
+                entry = _CacheEntry(signature)
+                self._entries[key] = entry
+            if kind not in entry.views:
+                entry.views[kind] = view
+                if callable(estimated_bytes):
+                    estimated_bytes = estimated_bytes(view)
+                elif estimated_bytes is None:
+                    estimated_bytes = signature[1] * MEMORY_FACTOR if kind in (FORMULA_VIEW, VALUE_VIEW) else 0
+                entry.sizes[kind] = estimated_bytes
+            self._entries.move_to_end(key)
+            self._evict_if_needed(keep=key)
+            return entry.views[kind]
+
+    def invalidate(self, file_path=None):
+        """移除指定工作簿 (或全部) 的快取"""
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+                return
+            self._entries.pop(normalize_workbook_path(file_path), None)
+
+    def clear(self):
+        """清空快取並重設統計"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.stale_reloads = 0
+
+    def get_stats(self):
+        """返回快取統計資料"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0.0,
+                'evictions': self.evictions,
+                'stale_reloads': self.stale_reloads,
+                'estimated_bytes': sum(e.estimated_bytes for e in self._entries.values()),
+                'memory_budget': self.memory_budget,
+            }
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _evict_if_needed(self, keep=None):
+        """按 LRU 次序移除工作簿，直到總估算記憶體低於上限"""
+        total = sum(e.estimated_bytes for e in self._entries.values())
+        for key in list(self._entries.keys()):
+            if total <= self.memory_budget:
+                break
+            if key == keep:
+                continue
+            total -= self._entries.pop(key).estimated_bytes
+            self.evictions += 1
+
+    @staticmethod
+    def _load_formula_view(file_path):
+        import openpyxl
+        return openpyxl.load_workbook(file_path, data_only=False)
+
+    @staticmethod
+    def _load_value_view(file_path):
+        import openpyxl
+        return openpyxl.load_workbook(file_path, data_only=True)
+
+    def _load_external_link_map(self, file_path):
+        from utils.openpyxl_resolver import _get_external_link_map
+        return _get_external_link_map(self.get_formula_workbook(file_path))
+
+
+# 全域共用的快取
+workbook_cache = WorkbookCache()
+
+
+def get_workbook_cache():
+    """返回全域 WorkbookCache"""
+    return workbook_cache